@@ -0,0 +1,138 @@
+/*
+ * This file is part of the libsigrokdecode project.
+ *
+ * Copyright (C) 2026 agent <agent@local>
+ *
+ * This program is free software; you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation; either version 2 of the License, or
+ * (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with this program; if not, see <http://www.gnu.org/licenses/>.
+ */
+
+/*
+ * Measure how decoding scales with the number of decoder stacks, in
+ * sequential and in parallel send mode.
+ *
+ * Every stack runs a UART decoder on a mostly idle line (10MHz samplerate,
+ * 115200 baud, one byte per 1000 bit times), where the sample matching in
+ * C dominates the decoding time.
+ *
+ * Usage: stacks [max. number of stacks] [number of samples] [chunk size]
+ */
+
+#include <config.h>
+#include <libsigrokdecode.h> /* First, to avoid compiler warning. */
+#include <inttypes.h>
+#include <stdio.h>
+#include <stdlib.h>
+
+#define SAMPLERATE 10000000
+#define BAUDRATE 115200
+
+static uint8_t *gen_uart(uint64_t num_samples)
+{
+	uint8_t *buf;
+	uint64_t i, bit, byte;
+
+	/* Idle high, one byte every 1000 bit times (LSB first, 8N1). */
+	buf = g_malloc(num_samples);
+	for (i = 0; i < num_samples; i++) {
+		bit = i * BAUDRATE / SAMPLERATE;
+		byte = bit / 1000;
+		bit %= 1000;
+		if (bit == 0)
+			buf[i] = 0x00;
+		else if (bit <= 8)
+			buf[i] = ((byte * 37) >> (bit - 1)) & 1 ? 0x03 : 0x00;
+		else
+			buf[i] = 0x03;
+	}
+
+	return buf;
+}
+
+static int64_t run(int mode, int num_stacks, const uint8_t *buf,
+		uint64_t num_samples, uint64_t chunksize)
+{
+	struct srd_session *sess;
+	GHashTable *options;
+	uint64_t i, len;
+	int64_t start;
+	int s;
+
+	srd_session_new(&sess);
+	srd_session_send_mode_set(sess, mode);
+	options = g_hash_table_new_full(g_str_hash, g_str_equal, g_free,
+			(GDestroyNotify)g_variant_unref);
+	for (s = 0; s < num_stacks; s++) {
+		if (!srd_inst_new(sess, "uart", options)) {
+			fprintf(stderr, "Failed to create UART instance.\n");
+			exit(EXIT_FAILURE);
+		}
+	}
+	g_hash_table_destroy(options);
+	srd_session_metadata_set(sess, SRD_CONF_SAMPLERATE,
+			g_variant_new_uint64(SAMPLERATE));
+	srd_session_start(sess);
+
+	start = g_get_monotonic_time();
+	for (i = 0; i < num_samples; i += len) {
+		len = MIN(chunksize, num_samples - i);
+		if (srd_session_send(sess, i, i + len, buf + i, len, 1) != SRD_OK) {
+			fprintf(stderr, "Failed to send samples.\n");
+			exit(EXIT_FAILURE);
+		}
+	}
+	start = g_get_monotonic_time() - start;
+
+	srd_session_destroy(sess);
+
+	return start;
+}
+
+int main(int argc, char **argv)
+{
+	int max_stacks, num_stacks;
+	uint64_t num_samples, chunksize;
+	int64_t seq, par;
+	uint8_t *buf;
+
+	max_stacks = (argc > 1) ? atoi(argv[1]) : 16;
+	num_samples = (argc > 2) ? g_ascii_strtoull(argv[2], NULL, 10) : 50000000;
+	chunksize = (argc > 3) ? g_ascii_strtoull(argv[3], NULL, 10) : 1048576;
+	if (max_stacks < 1 || !num_samples || !chunksize) {
+		fprintf(stderr, "Usage: %s [stacks] [samples] [chunksize]\n", argv[0]);
+		return EXIT_FAILURE;
+	}
+
+	srd_log_loglevel_set(SRD_LOG_ERR);
+	if (srd_init(DECODERS_BENCHDIR) != SRD_OK || srd_decoder_load("uart") != SRD_OK) {
+		fprintf(stderr, "Failed to initialize libsigrokdecode.\n");
+		return EXIT_FAILURE;
+	}
+
+	buf = gen_uart(num_samples);
+
+	printf("# %" PRIu64 " samples, chunk size %" PRIu64 "\n",
+		num_samples, chunksize);
+	printf("# stacks  sequential_ms  parallel_ms  speedup\n");
+	for (num_stacks = 1; num_stacks <= max_stacks; num_stacks *= 2) {
+		seq = run(SRD_SEND_SEQUENTIAL, num_stacks, buf, num_samples, chunksize);
+		par = run(SRD_SEND_PARALLEL, num_stacks, buf, num_samples, chunksize);
+		printf("%8d  %13" PRId64 "  %11" PRId64 "  %7.2f\n", num_stacks,
+			seq / 1000, par / 1000, par ? (double)seq / par : 0.0);
+	}
+
+	g_free(buf);
+	srd_exit();
+
+	return EXIT_SUCCESS;
+}
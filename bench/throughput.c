@@ -0,0 +1,643 @@
+/*
+ * This file is part of the libsigrokdecode project.
+ *
+ * Copyright (C) 2026 agent <agent@local>
+ *
+ * This program is free software; you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation; either version 2 of the License, or
+ * (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with this program; if not, see <http://www.gnu.org/licenses/>.
+ */
+
+/*
+ * Measure the throughput of decoders on synthetic captures.
+ *
+ * Every scenario generates a deterministic capture of one protocol, and
+ * feeds it through srd_session_send() in chunks. One line of JSON per
+ * scenario reports the sample and annotation rates, the latency of the
+ * srd_session_send() calls, the peak RSS, and the decoder instance's
+ * performance counters. Comparing these over time tracks regressions
+ * in the library or in a decoder.
+ *
+ * Usage: throughput [-l] [-s scenario,...] [-n samples] [-r samplerate]
+ *                   [-u unitsize] [-c chunksize]
+ */
+
+#include <config.h>
+#include <libsigrokdecode.h> /* First, to avoid compiler warning. */
+#include <inttypes.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#ifndef _WIN32
+#include <sys/resource.h>
+#endif
+
+/* Writes a capture, as the levels of channels 0-7 over time. */
+struct gen {
+	uint8_t *buf;
+	unsigned int unitsize;
+	uint64_t num_samples;
+	uint64_t samplerate;
+	/* The number of samples written so far. */
+	uint64_t samplenum;
+	/* The current time, in seconds. */
+	double time;
+	/* The current levels, bit n is channel n. */
+	uint8_t levels;
+	uint64_t rng;
+};
+
+struct protocol {
+	/* The decoder, whose channels are the capture's channels 0-n. */
+	const char *decoder;
+	/* Fill in the decoder's options for a scenario parameter. */
+	void (*options)(GHashTable *options, uint64_t param);
+	/* Generate one transfer, followed by some idle time. */
+	void (*transfer)(struct gen *g, uint64_t param);
+};
+
+struct scenario {
+	const char *name;
+	const struct protocol *protocol;
+	/* Baud rate, bit rate, or SPI mode. */
+	uint64_t param;
+	uint64_t samplerate;
+};
+
+static uint32_t gen_random(struct gen *g)
+{
+	/* xorshift64, for captures which are the same on every run. */
+	g->rng ^= g->rng << 13;
+	g->rng ^= g->rng >> 7;
+	g->rng ^= g->rng << 17;
+
+	return g->rng >> 32;
+}
+
+static void gen_set(struct gen *g, int channel, int level)
+{
+	if (level)
+		g->levels |= 1 << channel;
+	else
+		g->levels &= ~(1 << channel);
+}
+
+/* Keep the current levels for some time. */
+static void gen_hold(struct gen *g, double duration)
+{
+	uint64_t end;
+
+	g->time += duration;
+	end = MIN((uint64_t)(g->time * g->samplerate + 0.5), g->num_samples);
+	for (; g->samplenum < end; g->samplenum++)
+		g->buf[g->samplenum * g->unitsize] = g->levels;
+}
+
+static void option_int(GHashTable *options, const char *key, int64_t value)
+{
+	g_hash_table_insert(options, g_strdup(key),
+		g_variant_ref_sink(g_variant_new_int64(value)));
+}
+
+/* UART, 8N1: rx, tx. The parameter is the baud rate. */
+static void uart_options(GHashTable *options, uint64_t param)
+{
+	option_int(options, "baudrate", param);
+}
+
+static void uart_transfer(struct gen *g, uint64_t param)
+{
+	double bit;
+	unsigned int byte, i;
+
+	bit = 1.0 / param;
+	byte = gen_random(g) & 0xff;
+	gen_set(g, 1, 1);
+	gen_set(g, 0, 0);
+	gen_hold(g, bit);
+	for (i = 0; i < 8; i++) {
+		gen_set(g, 0, (byte >> i) & 1);
+		gen_hold(g, bit);
+	}
+	gen_set(g, 0, 1);
+	gen_hold(g, bit * (1 + gen_random(g) % 4));
+}
+
+/* SPI, 1MHz: clk, miso, mosi, cs. The parameter is the SPI mode. */
+static void spi_options(GHashTable *options, uint64_t param)
+{
+	option_int(options, "cpol", param >> 1);
+	option_int(options, "cpha", param & 1);
+}
+
+static void spi_transfer(struct gen *g, uint64_t param)
+{
+	const double half = 0.5e-6;
+	unsigned int cpol, cpha, num_bytes, miso, mosi, i, b;
+
+	cpol = param >> 1;
+	cpha = param & 1;
+	num_bytes = 1 + gen_random(g) % 8;
+
+	gen_set(g, 0, cpol);
+	gen_set(g, 3, 0);
+	gen_hold(g, half);
+	for (i = 0; i < num_bytes; i++) {
+		miso = gen_random(g) & 0xff;
+		mosi = gen_random(g) & 0xff;
+		for (b = 8; b-- > 0; ) {
+			/* Data changes on the trailing edge, or before it. */
+			if (cpha)
+				gen_set(g, 0, !cpol);
+			gen_set(g, 1, (miso >> b) & 1);
+			gen_set(g, 2, (mosi >> b) & 1);
+			if (!cpha) {
+				gen_hold(g, half);
+				gen_set(g, 0, !cpol);
+			}
+			gen_hold(g, half);
+			if (cpha) {
+				gen_set(g, 0, cpol);
+				gen_hold(g, half);
+			} else {
+				gen_set(g, 0, cpol);
+			}
+		}
+	}
+	gen_hold(g, half);
+	gen_set(g, 3, 1);
+	gen_hold(g, half * (4 + gen_random(g) % 32));
+}
+
+/*
+ * I2C: scl, sda. The parameter is the bit rate. The slave stretches
+ * the clock after some of its ACKs.
+ */
+static void i2c_bit(struct gen *g, double quarter, int bit, double stretch)
+{
+	gen_set(g, 0, 0);
+	gen_hold(g, quarter);
+	gen_set(g, 1, bit);
+	gen_hold(g, quarter + stretch);
+	gen_set(g, 0, 1);
+	gen_hold(g, 2 * quarter);
+}
+
+static void i2c_transfer(struct gen *g, uint64_t param)
+{
+	double quarter, stretch;
+	unsigned int num_bytes, byte, i, b;
+
+	quarter = 0.25 / param;
+	num_bytes = 1 + gen_random(g) % 4;
+
+	/* Start condition. */
+	gen_set(g, 0, 1);
+	gen_set(g, 1, 1);
+	gen_hold(g, 2 * quarter);
+	gen_set(g, 1, 0);
+	gen_hold(g, 2 * quarter);
+
+	for (i = 0; i <= num_bytes; i++) {
+		/* Address and write bit, then data. */
+		byte = gen_random(g) & (i ? 0xff : 0xfe);
+		for (b = 8; b-- > 0; )
+			i2c_bit(g, quarter, (byte >> b) & 1, 0);
+		stretch = (gen_random(g) % 4 == 0) ?
+			quarter * (4 + gen_random(g) % 16) : 0;
+		i2c_bit(g, quarter, 0, stretch);
+	}
+
+	/* Stop condition. */
+	gen_set(g, 0, 0);
+	gen_hold(g, quarter);
+	gen_set(g, 1, 0);
+	gen_hold(g, quarter);
+	gen_set(g, 0, 1);
+	gen_hold(g, 2 * quarter);
+	gen_set(g, 1, 1);
+	gen_hold(g, quarter * (4 + gen_random(g) % 32));
+}
+
+/* CAN, standard data frames: can_rx. The parameter is the bit rate. */
+static void can_options(GHashTable *options, uint64_t param)
+{
+	option_int(options, "bitrate", param);
+}
+
+static void can_transfer(struct gen *g, uint64_t param)
+{
+	uint8_t bits[128];
+	unsigned int num_bits, num_bytes, id, crc, i, b, run, last;
+	double bit;
+
+	bit = 1.0 / param;
+	num_bytes = gen_random(g) % 9;
+	/* Identifier bits 10-4 must not be all recessive. */
+	id = gen_random(g) & 0x7ff;
+	if ((id & 0x7f0) == 0x7f0)
+		id &= 0x3ff;
+
+	/* SOF, identifier, RTR, IDE, r0, DLC and data. */
+	num_bits = 0;
+	bits[num_bits++] = 0;
+	for (b = 11; b-- > 0; )
+		bits[num_bits++] = (id >> b) & 1;
+	bits[num_bits++] = 0;
+	bits[num_bits++] = 0;
+	bits[num_bits++] = 0;
+	for (b = 4; b-- > 0; )
+		bits[num_bits++] = (num_bytes >> b) & 1;
+	for (i = 0; i < num_bytes * 8; i++)
+		bits[num_bits++] = gen_random(g) & 1;
+
+	/* CRC-15 over all of these. */
+	crc = 0;
+	for (i = 0; i < num_bits; i++) {
+		b = bits[i] ^ ((crc >> 14) & 1);
+		crc = (crc << 1) & 0x7fff;
+		if (b)
+			crc ^= 0x4599;
+	}
+	for (b = 15; b-- > 0; )
+		bits[num_bits++] = (crc >> b) & 1;
+
+	/*
+	 * Bit stuffing, up to the end of the CRC. Like the decoder, don't
+	 * stuff after the CRC's last bit.
+	 */
+	run = 0;
+	last = 2;
+	for (i = 0; i < num_bits; i++) {
+		gen_set(g, 0, bits[i]);
+		gen_hold(g, bit);
+		run = (bits[i] == last) ? run + 1 : 1;
+		last = bits[i];
+		if (run == 5 && i + 1 < num_bits) {
+			last = !last;
+			run = 1;
+			gen_set(g, 0, last);
+			gen_hold(g, bit);
+		}
+	}
+
+	/* CRC delimiter, ACK slot, ACK delimiter, EOF and interframe space. */
+	gen_set(g, 0, 1);
+	gen_hold(g, bit);
+	gen_set(g, 0, 0);
+	gen_hold(g, bit);
+	gen_set(g, 0, 1);
+	gen_hold(g, bit * (1 + 7 + 3 + gen_random(g) % 16));
+}
+
+/*
+ * 1-Wire, standard speed: owr. A reset and presence pulse, the Skip ROM
+ * command (random commands may switch to overdrive speed), and data.
+ */
+static void onewire_transfer(struct gen *g, uint64_t param)
+{
+	unsigned int num_bytes, byte, i, b;
+
+	(void)param;
+
+	num_bytes = gen_random(g) % 9;
+
+	gen_set(g, 0, 0);
+	gen_hold(g, 480e-6);
+	gen_set(g, 0, 1);
+	gen_hold(g, 30e-6);
+	gen_set(g, 0, 0);
+	gen_hold(g, 120e-6);
+	gen_set(g, 0, 1);
+	gen_hold(g, 330e-6);
+
+	for (i = 0; i <= num_bytes; i++) {
+		byte = i ? gen_random(g) & 0xff : 0xcc;
+		for (b = 0; b < 8; b++) {
+			gen_set(g, 0, 0);
+			gen_hold(g, (byte >> b) & 1 ? 6e-6 : 60e-6);
+			gen_set(g, 0, 1);
+			gen_hold(g, (byte >> b) & 1 ? 64e-6 : 10e-6);
+		}
+	}
+	gen_hold(g, 100e-6 * (1 + gen_random(g) % 8));
+}
+
+/*
+ * USB full speed, DATA0 packets: dp, dm. NRZI, with bit stuffing. The
+ * parameter is the bit rate.
+ */
+static void usb_options(GHashTable *options, uint64_t param)
+{
+	(void)param;
+
+	g_hash_table_insert(options, g_strdup("signalling"),
+		g_variant_ref_sink(g_variant_new_string("full-speed")));
+}
+
+/* Send a bit, NRZI encoded: a 0 toggles between J and K. */
+static void usb_bit(struct gen *g, double bit, int value, unsigned int *ones)
+{
+	if (!value)
+		g->levels ^= 0x03;
+	gen_hold(g, bit);
+	*ones = value ? *ones + 1 : 0;
+	if (*ones == 6) {
+		g->levels ^= 0x03;
+		gen_hold(g, bit);
+		*ones = 0;
+	}
+}
+
+static void usb_transfer(struct gen *g, uint64_t param)
+{
+	uint8_t packet[1 + 64 + 2];
+	unsigned int num_bytes, crc, ones, i, b;
+	double bit;
+
+	bit = 1.0 / param;
+	num_bytes = 1 + gen_random(g) % 64;
+
+	/* PID DATA0, data, and the data's CRC-16. */
+	packet[0] = 0xc3;
+	crc = 0xffff;
+	for (i = 1; i <= num_bytes; i++) {
+		packet[i] = gen_random(g) & 0xff;
+		crc ^= packet[i];
+		for (b = 0; b < 8; b++)
+			crc = (crc & 1) ? (crc >> 1) ^ 0xa001 : crc >> 1;
+	}
+	crc ^= 0xffff;
+	packet[i++] = crc & 0xff;
+	packet[i++] = crc >> 8;
+
+	/* Idle (J), SYNC, the packet, EOP. */
+	g->levels = 0x01;
+	gen_hold(g, bit * 8);
+	ones = 0;
+	for (b = 0; b < 8; b++)
+		usb_bit(g, bit, b == 7, &ones);
+	for (i = 0; i < num_bytes + 3; i++)
+		for (b = 0; b < 8; b++)
+			usb_bit(g, bit, (packet[i] >> b) & 1, &ones);
+	g->levels = 0x00;
+	gen_hold(g, bit * 2);
+	g->levels = 0x01;
+	gen_hold(g, bit * (1 + gen_random(g) % 32));
+}
+
+static const struct protocol uart = { "uart", uart_options, uart_transfer };
+static const struct protocol spi = { "spi", spi_options, spi_transfer };
+static const struct protocol i2c = { "i2c", NULL, i2c_transfer };
+static const struct protocol can = { "can", can_options, can_transfer };
+static const struct protocol onewire = { "onewire_link", NULL, onewire_transfer };
+static const struct protocol usb = { "usb_signalling", usb_options, usb_transfer };
+
+static const struct scenario scenarios[] = {
+	{ "uart-9600", &uart, 9600, 1000000 },
+	{ "uart-115200", &uart, 115200, 4000000 },
+	{ "uart-1000000", &uart, 1000000, 16000000 },
+	{ "spi-mode0", &spi, 0, 8000000 },
+	{ "spi-mode1", &spi, 1, 8000000 },
+	{ "spi-mode2", &spi, 2, 8000000 },
+	{ "spi-mode3", &spi, 3, 8000000 },
+	{ "i2c-100k", &i2c, 100000, 4000000 },
+	{ "i2c-400k", &i2c, 400000, 10000000 },
+	{ "can-500k", &can, 500000, 8000000 },
+	{ "can-1m", &can, 1000000, 16000000 },
+	{ "onewire", &onewire, 0, 1000000 },
+	{ "usb-fs", &usb, 12000000, 48000000 },
+};
+
+/* Options, see main(). */
+static char *opt_scenarios = NULL;
+static gint64 opt_samples = 10000000;
+static gint64 opt_samplerate = 0;
+static gint opt_unitsize = 1;
+static gint64 opt_chunksize = 1048576;
+static gboolean opt_list = FALSE;
+
+static uint64_t num_annotations;
+
+static void ann_cb(struct srd_proto_data *pdata, void *cb_data)
+{
+	(void)pdata;
+	(void)cb_data;
+
+	num_annotations++;
+}
+
+static uint8_t *generate(const struct scenario *sc, uint64_t samplerate)
+{
+	struct gen g;
+
+	memset(&g, 0, sizeof(g));
+	g.buf = g_malloc0(opt_samples * opt_unitsize);
+	g.unitsize = opt_unitsize;
+	g.num_samples = opt_samples;
+	g.samplerate = samplerate;
+	g.rng = 88172645463325252ULL;
+
+	/* All lines idle high, except for the protocol's own setup. */
+	g.levels = 0xff;
+	gen_hold(&g, 100.0 / samplerate);
+	while (g.samplenum < g.num_samples)
+		sc->protocol->transfer(&g, sc->param);
+
+	return g.buf;
+}
+
+static int cmp_int64(const void *a, const void *b)
+{
+	int64_t x = *(const int64_t *)a, y = *(const int64_t *)b;
+
+	return (x > y) - (x < y);
+}
+
+static int64_t percentile(const int64_t *sorted, uint64_t n, unsigned int p)
+{
+	return sorted[MIN(n - 1, n * p / 100)];
+}
+
+static long peak_rss_kb(void)
+{
+#ifndef _WIN32
+	struct rusage ru;
+
+	if (getrusage(RUSAGE_SELF, &ru) == 0)
+		return ru.ru_maxrss;
+#endif
+
+	return -1;
+}
+
+static void run(const struct scenario *sc)
+{
+	struct srd_session *sess;
+	struct srd_decoder_inst *di;
+	struct srd_inst_stats stats;
+	GHashTable *options;
+	uint8_t *buf;
+	uint64_t samplerate, i, len, num_chunks;
+	int64_t *latency, start, t, elapsed;
+	double seconds;
+
+	samplerate = opt_samplerate ? (uint64_t)opt_samplerate : sc->samplerate;
+	buf = generate(sc, samplerate);
+	num_chunks = (opt_samples + opt_chunksize - 1) / opt_chunksize;
+	latency = g_malloc(num_chunks * sizeof(int64_t));
+
+	srd_session_new(&sess);
+	options = g_hash_table_new_full(g_str_hash, g_str_equal, g_free,
+			(GDestroyNotify)g_variant_unref);
+	if (sc->protocol->options)
+		sc->protocol->options(options, sc->param);
+	if (!(di = srd_inst_new(sess, sc->protocol->decoder, options))) {
+		fprintf(stderr, "Failed to create %s instance.\n",
+			sc->protocol->decoder);
+		exit(EXIT_FAILURE);
+	}
+	g_hash_table_destroy(options);
+	srd_pd_output_callback_add(sess, SRD_OUTPUT_ANN, ann_cb, NULL);
+	srd_session_metadata_set(sess, SRD_CONF_SAMPLERATE,
+			g_variant_new_uint64(samplerate));
+	srd_session_start(sess);
+
+	num_annotations = 0;
+	start = g_get_monotonic_time();
+	for (i = 0, num_chunks = 0; i < (uint64_t)opt_samples; i += len) {
+		len = MIN((uint64_t)opt_chunksize, opt_samples - i);
+		t = g_get_monotonic_time();
+		if (srd_session_send(sess, i, i + len, buf + i * opt_unitsize,
+				len * opt_unitsize, opt_unitsize) != SRD_OK) {
+			fprintf(stderr, "Failed to send samples.\n");
+			exit(EXIT_FAILURE);
+		}
+		latency[num_chunks++] = g_get_monotonic_time() - t;
+	}
+	elapsed = g_get_monotonic_time() - start;
+	seconds = elapsed ? elapsed / 1e6 : 1e-6;
+
+	srd_inst_stats_get(di, &stats);
+	qsort(latency, num_chunks, sizeof(int64_t), cmp_int64);
+
+	printf("{\"scenario\": \"%s\", \"decoder\": \"%s\", "
+		"\"samplerate\": %" PRIu64 ", \"samples\": %" G_GINT64_FORMAT ", "
+		"\"unitsize\": %d, \"chunksize\": %" G_GINT64_FORMAT ", "
+		"\"seconds\": %.6f, \"msamples_per_s\": %.3f, "
+		"\"annotations\": %" PRIu64 ", \"annotations_per_s\": %.1f, "
+		"\"chunk_latency_us\": {\"p50\": %" PRId64 ", \"p90\": %" PRId64
+		", \"p99\": %" PRId64 ", \"max\": %" PRId64 "}, "
+		"\"peak_rss_kb\": %ld, "
+		"\"wait_calls\": %" PRIu64 ", \"python_time_us\": %" PRId64 ", "
+		"\"match_time_us\": %" PRId64 ", \"cpu_time_us\": %" PRId64 "}\n",
+		sc->name, sc->protocol->decoder, samplerate, opt_samples,
+		opt_unitsize, opt_chunksize, seconds,
+		opt_samples / seconds / 1e6, num_annotations,
+		num_annotations / seconds,
+		percentile(latency, num_chunks, 50),
+		percentile(latency, num_chunks, 90),
+		percentile(latency, num_chunks, 99),
+		latency[num_chunks - 1], peak_rss_kb(),
+		stats.wait_calls, stats.python_time, stats.match_time,
+		stats.cpu_time);
+	fflush(stdout);
+
+	if (!num_annotations)
+		fprintf(stderr, "Scenario %s: No annotations.\n", sc->name);
+
+	srd_session_destroy(sess);
+	g_free(latency);
+	g_free(buf);
+}
+
+static const GOptionEntry entries[] = {
+	{ "scenarios", 's', 0, G_OPTION_ARG_STRING, &opt_scenarios,
+		"Comma-separated scenarios to run (default: all)", "NAMES" },
+	{ "samples", 'n', 0, G_OPTION_ARG_INT64, &opt_samples,
+		"Number of samples per scenario", "N" },
+	{ "samplerate", 'r', 0, G_OPTION_ARG_INT64, &opt_samplerate,
+		"Samplerate (default: per scenario)", "HZ" },
+	{ "unitsize", 'u', 0, G_OPTION_ARG_INT, &opt_unitsize,
+		"Bytes per sample", "N" },
+	{ "chunksize", 'c', 0, G_OPTION_ARG_INT64, &opt_chunksize,
+		"Samples per srd_session_send() call", "N" },
+	{ "list", 'l', 0, G_OPTION_ARG_NONE, &opt_list,
+		"List the scenarios", NULL },
+	{ NULL, 0, 0, 0, NULL, NULL, NULL }
+};
+
+int main(int argc, char **argv)
+{
+	GOptionContext *context;
+	GError *error;
+	char **names;
+	unsigned int i, j;
+	gboolean found;
+
+	error = NULL;
+	context = g_option_context_new("- measure decoder throughput");
+	g_option_context_add_main_entries(context, entries, NULL);
+	if (!g_option_context_parse(context, &argc, &argv, &error)) {
+		fprintf(stderr, "%s\n", error->message);
+		return EXIT_FAILURE;
+	}
+	g_option_context_free(context);
+	if (opt_samples < 1 || opt_unitsize < 1 || opt_chunksize < 1
+			|| opt_samplerate < 0) {
+		fprintf(stderr, "Invalid options.\n");
+		return EXIT_FAILURE;
+	}
+
+	if (opt_list) {
+		for (i = 0; i < G_N_ELEMENTS(scenarios); i++)
+			printf("%-14s %-16s %" PRIu64 " Hz\n", scenarios[i].name,
+				scenarios[i].protocol->decoder,
+				scenarios[i].samplerate);
+		return EXIT_SUCCESS;
+	}
+
+	srd_log_loglevel_set(SRD_LOG_ERR);
+	if (srd_init(DECODERS_BENCHDIR) != SRD_OK) {
+		fprintf(stderr, "Failed to initialize libsigrokdecode.\n");
+		return EXIT_FAILURE;
+	}
+
+	names = g_strsplit(opt_scenarios ? opt_scenarios : "", ",", 0);
+	for (j = 0; names[j]; j++) {
+		found = FALSE;
+		for (i = 0; i < G_N_ELEMENTS(scenarios); i++)
+			found |= !strcmp(names[j], scenarios[i].name);
+		if (!found) {
+			fprintf(stderr, "Unknown scenario %s.\n", names[j]);
+			return EXIT_FAILURE;
+		}
+	}
+	for (i = 0; i < G_N_ELEMENTS(scenarios); i++) {
+		found = !names[0];
+		for (j = 0; names[j]; j++)
+			found |= !strcmp(names[j], scenarios[i].name);
+		if (!found)
+			continue;
+		if (srd_decoder_load(scenarios[i].protocol->decoder) != SRD_OK) {
+			fprintf(stderr, "Failed to load decoder %s.\n",
+				scenarios[i].protocol->decoder);
+			return EXIT_FAILURE;
+		}
+		run(&scenarios[i]);
+	}
+	g_strfreev(names);
+
+	srd_exit();
+
+	return EXIT_SUCCESS;
+}
@@ -22,6 +22,7 @@
 #include "libsigrokdecode-internal.h" /* First, so we avoid a _POSIX_C_SOURCE warning. */
 #include "libsigrokdecode.h"
 #include <glib.h>
+#include <glib/gstdio.h>
 
 /**
  * @file
@@ -42,6 +43,24 @@
 /* The list of loaded protocol decoders. */
 static GSList *pd_list = NULL;
 
+/*
+ * The metadata index which tools/install-decoders writes into a decoder
+ * directory, so decoders can be listed without importing them.
+ */
+#define DECODER_INDEX_FILE "decoders.index"
+#define DECODER_INDEX_VERSION 1
+
+/* A decoder which was loaded from the index. */
+struct decoder_index_entry {
+	/* The Python module to import once the decoder gets used. */
+	char *module_name;
+	/* The module's docstring, or NULL. */
+	char *doc;
+};
+
+/* Decoders loaded from an index (struct srd_decoder * -> entry). */
+static GHashTable *pd_index = NULL;
+
 /* srd.c */
 extern SRD_PRIV GSList *searchpaths;
 
@@ -150,6 +169,15 @@ static void decoder_option_free(void *data)
 	g_free(opt);
 }
 
+static void decoder_index_entry_free(void *data)
+{
+	struct decoder_index_entry *entry = data;
+
+	g_free(entry->doc);
+	g_free(entry->module_name);
+	g_free(entry);
+}
+
 static void decoder_free(struct srd_decoder *dec)
 {
 	PyGILState_STATE gstate;
@@ -162,6 +190,9 @@ static void decoder_free(struct srd_decoder *dec)
 	Py_XDECREF(dec->py_mod);
 	PyGILState_Release(gstate);
 
+	if (pd_index)
+		g_hash_table_remove(pd_index, dec);
+
 	g_slist_free_full(dec->options, &decoder_option_free);
 	g_slist_free_full(dec->binary, (GDestroyNotify)&g_strfreev);
 	g_slist_free_full(dec->annotation_rows, &annotation_row_free);
@@ -180,6 +211,25 @@ static void decoder_free(struct srd_decoder *dec)
 	g_free(dec);
 }
 
+/* Return the decoder loaded from an index for the given module, if any. */
+static struct srd_decoder *decoder_index_find(const char *module_name)
+{
+	GHashTableIter iter;
+	gpointer dec, entry;
+
+	if (!pd_index)
+		return NULL;
+
+	g_hash_table_iter_init(&iter, pd_index);
+	while (g_hash_table_iter_next(&iter, &dec, &entry)) {
+		if (!strcmp(((struct decoder_index_entry *)entry)->module_name,
+				module_name))
+			return dec;
+	}
+
+	return NULL;
+}
+
 static int get_channels(const struct srd_decoder *d, const char *attr,
 		GSList **out_pdchl, int offset)
 {
@@ -664,66 +714,43 @@ SRD_PRIV long srd_decoder_apiver(const struct srd_decoder *d)
 	return apiver;
 }
 
-/**
- * Load a protocol decoder module into the embedded Python interpreter.
- *
- * @param module_name The module name to be loaded.
- *
- * @return SRD_OK upon success, a (negative) error code otherwise.
+/*
+ * Import a decoder's Python module, and check that its Decoder class
+ * can be used. Must be called with the GIL held.
  *
- * @since 0.1.0
+ * Returns SRD_ERR_PYTHON with a Python exception pending, or SRD_ERR
+ * if a check failed. Either way, *fail_txt tells which step failed.
  */
-SRD_API int srd_decoder_load(const char *module_name)
+static int decoder_import(struct srd_decoder *d, const char *module_name,
+		const char **fail_txt)
 {
 	PyObject *py_basedec;
-	struct srd_decoder *d;
 	long apiver;
 	int is_subclass;
-	const char *fail_txt;
-	PyGILState_STATE gstate;
-
-	if (!srd_check_init())
-		return SRD_ERR;
-
-	if (!module_name)
-		return SRD_ERR_ARG;
-
-	gstate = PyGILState_Ensure();
-
-	if (PyDict_GetItemString(PyImport_GetModuleDict(), module_name)) {
-		/* Module was already imported. */
-		PyGILState_Release(gstate);
-		return SRD_OK;
-	}
-
-	srd_dbg("Loading protocol decoder '%s'.", module_name);
-
-	d = g_malloc0(sizeof(struct srd_decoder));
-	fail_txt = NULL;
 
 	d->py_mod = py_import_by_name(module_name);
 	if (!d->py_mod) {
-		fail_txt = "import by name failed";
-		goto except_out;
-	}
-
-	if (!mod_sigrokdecode) {
-		srd_err("sigrokdecode module not loaded.");
-		fail_txt = "sigrokdecode(3) not loaded";
-		goto err_out;
+		*fail_txt = "import by name failed";
+		return SRD_ERR_PYTHON;
 	}
 
 	/* Get the 'Decoder' class as Python object. */
 	d->py_dec = PyObject_GetAttrString(d->py_mod, "Decoder");
 	if (!d->py_dec) {
-		fail_txt = "no 'Decoder' attribute in imported module";
-		goto except_out;
+		*fail_txt = "no 'Decoder' attribute in imported module";
+		return SRD_ERR_PYTHON;
+	}
+
+	if (!mod_sigrokdecode) {
+		srd_err("sigrokdecode module not loaded.");
+		*fail_txt = "sigrokdecode(3) not loaded";
+		return SRD_ERR;
 	}
 
 	py_basedec = PyObject_GetAttrString(mod_sigrokdecode, "Decoder");
 	if (!py_basedec) {
-		fail_txt = "no 'Decoder' attribute in sigrokdecode(3)";
-		goto except_out;
+		*fail_txt = "no 'Decoder' attribute in sigrokdecode(3)";
+		return SRD_ERR_PYTHON;
 	}
 
 	is_subclass = PyObject_IsSubclass(d->py_dec, py_basedec);
@@ -732,8 +759,8 @@ SRD_API int srd_decoder_load(const char *module_name)
 	if (!is_subclass) {
 		srd_err("Decoder class in protocol decoder module %s is not "
 			"a subclass of sigrokdecode.Decoder.", module_name);
-		fail_txt = "not a subclass of sigrokdecode.Decoder";
-		goto err_out;
+		*fail_txt = "not a subclass of sigrokdecode.Decoder";
+		return SRD_ERR;
 	}
 
 	/*
@@ -744,22 +771,71 @@ SRD_API int srd_decoder_load(const char *module_name)
 	if (apiver != 3) {
 		srd_exception_catch("Only PD API version 3 is supported, "
 			"decoder %s has version %ld", module_name, apiver);
-		fail_txt = "API version mismatch";
-		goto err_out;
+		*fail_txt = "API version mismatch";
+		return SRD_ERR;
 	}
 
 	/* Check Decoder class for required methods.
 	 */
 	if (check_method(d->py_dec, module_name, "start") != SRD_OK) {
-		fail_txt = "no 'start()' method";
-		goto err_out;
+		*fail_txt = "no 'start()' method";
+		return SRD_ERR;
 	}
 
 	if (check_method(d->py_dec, module_name, "decode") != SRD_OK) {
-		fail_txt = "no 'decode()' method";
-		goto err_out;
+		*fail_txt = "no 'decode()' method";
+		return SRD_ERR;
 	}
 
+	return SRD_OK;
+}
+
+/**
+ * Load a protocol decoder module into the embedded Python interpreter.
+ *
+ * @param module_name The module name to be loaded.
+ *
+ * @return SRD_OK upon success, a (negative) error code otherwise.
+ *
+ * @since 0.1.0
+ */
+SRD_API int srd_decoder_load(const char *module_name)
+{
+	struct srd_decoder *d;
+	int ret;
+	const char *fail_txt;
+	PyGILState_STATE gstate;
+
+	if (!srd_check_init())
+		return SRD_ERR;
+
+	if (!module_name)
+		return SRD_ERR_ARG;
+
+	if (decoder_index_find(module_name)) {
+		/* Module was loaded from an index, and is imported on use. */
+		return SRD_OK;
+	}
+
+	gstate = PyGILState_Ensure();
+
+	if (PyDict_GetItemString(PyImport_GetModuleDict(), module_name)) {
+		/* Module was already imported. */
+		PyGILState_Release(gstate);
+		return SRD_OK;
+	}
+
+	srd_dbg("Loading protocol decoder '%s'.", module_name);
+
+	d = g_malloc0(sizeof(struct srd_decoder));
+	fail_txt = NULL;
+
+	ret = decoder_import(d, module_name, &fail_txt);
+	if (ret == SRD_ERR_PYTHON)
+		goto except_out;
+	else if (ret != SRD_OK)
+		goto err_out;
+
 	/* Store required fields in newly allocated strings. */
 	if (py_attr_as_str(d->py_dec, "id", &(d->id)) != SRD_OK) {
 		fail_txt = "no 'id' attribute";
@@ -853,6 +929,54 @@ err_out:
 	return SRD_ERR_PYTHON;
 }
 
+/**
+ * Import the Python module of a decoder which was loaded from an index.
+ *
+ * Decoders loaded from an index only carry their metadata, the module is
+ * imported once an instance of the decoder is needed.
+ *
+ * @param dec The decoder to import. Must not be NULL.
+ *
+ * @return SRD_OK upon success (also if the module was imported already),
+ *         a (negative) error code otherwise.
+ *
+ * @private
+ */
+SRD_PRIV int srd_decoder_import(struct srd_decoder *dec)
+{
+	struct decoder_index_entry *entry;
+	const char *fail_txt;
+	int ret;
+	PyGILState_STATE gstate;
+
+	if (dec->py_dec)
+		return SRD_OK;
+
+	entry = pd_index ? g_hash_table_lookup(pd_index, dec) : NULL;
+	if (!entry)
+		return SRD_ERR_BUG;
+
+	srd_dbg("Importing protocol decoder '%s'.", entry->module_name);
+
+	gstate = PyGILState_Ensure();
+
+	ret = decoder_import(dec, entry->module_name, &fail_txt);
+	if (ret == SRD_ERR_PYTHON)
+		srd_exception_catch("Failed to load decoder %s: %s",
+				entry->module_name, fail_txt);
+	else if (ret != SRD_OK)
+		srd_err("Failed to load decoder %s: %s",
+				entry->module_name, fail_txt);
+	if (ret != SRD_OK) {
+		Py_CLEAR(dec->py_dec);
+		Py_CLEAR(dec->py_mod);
+	}
+
+	PyGILState_Release(gstate);
+
+	return ret;
+}
+
 /**
  * Return a protocol decoder's docstring.
  *
@@ -865,6 +989,7 @@ err_out:
  */
 SRD_API char *srd_decoder_doc_get(const struct srd_decoder *dec)
 {
+	struct decoder_index_entry *entry;
 	PyObject *py_str;
 	char *doc;
 	PyGILState_STATE gstate;
@@ -875,6 +1000,10 @@ SRD_API char *srd_decoder_doc_get(const struct srd_decoder *dec)
 	if (!dec)
 		return NULL;
 
+	entry = pd_index ? g_hash_table_lookup(pd_index, dec) : NULL;
+	if (entry)
+		return g_strdup(entry->doc);
+
 	gstate = PyGILState_Ensure();
 
 	if (!PyObject_HasAttrString(dec->py_mod, "__doc__"))
@@ -941,6 +1070,336 @@ SRD_API int srd_decoder_unload(struct srd_decoder *dec)
 	return SRD_OK;
 }
 
+/* Latest modification time and total size of a decoder's Python files. */
+static void decoder_index_stamp(const char *pd_dir, gint64 *mtime,
+		gint64 *size)
+{
+	GDir *dir;
+	GStatBuf st;
+	const gchar *name;
+	char *filename;
+
+	*mtime = *size = 0;
+	if (!(dir = g_dir_open(pd_dir, 0, NULL)))
+		return;
+	while ((name = g_dir_read_name(dir)) != NULL) {
+		if (!g_str_has_suffix(name, ".py"))
+			continue;
+		filename = g_build_filename(pd_dir, name, NULL);
+		if (g_stat(filename, &st) == 0) {
+			*mtime = MAX(*mtime, (gint64)st.st_mtime);
+			*size += st.st_size;
+		}
+		g_free(filename);
+	}
+	g_dir_close(dir);
+}
+
+static GKeyFile *decoder_index_open(const char *path)
+{
+	GKeyFile *index;
+	char *filename;
+	int version;
+
+	filename = g_build_filename(path, DECODER_INDEX_FILE, NULL);
+	index = g_key_file_new();
+	if (!g_key_file_load_from_file(index, filename, G_KEY_FILE_NONE, NULL)) {
+		g_key_file_free(index);
+		g_free(filename);
+		return NULL;
+	}
+
+	version = g_key_file_get_integer(index, "index", "version", NULL);
+	if (version != DECODER_INDEX_VERSION) {
+		srd_dbg("Ignoring decoder index %s of version %d.",
+			filename, version);
+		g_key_file_free(index);
+		g_free(filename);
+		return NULL;
+	}
+
+	srd_dbg("Using decoder index %s.", filename);
+	g_free(filename);
+
+	return index;
+}
+
+/*
+ * Get a list of tuples, i.e. a list whose length is a multiple of the
+ * tuple size. An absent key is an empty list.
+ */
+static char **index_get_tuples(GKeyFile *index, const char *group,
+		const char *key, gsize tuple_size, gsize *num_tuples)
+{
+	char **items;
+	gsize len;
+
+	if (!g_key_file_has_key(index, group, key, NULL)) {
+		*num_tuples = 0;
+		return g_new0(char *, 1);
+	}
+
+	items = g_key_file_get_string_list(index, group, key, &len, NULL);
+	if (!items || len % tuple_size) {
+		g_strfreev(items);
+		return NULL;
+	}
+	*num_tuples = len / tuple_size;
+
+	return items;
+}
+
+static int index_get_channels(GKeyFile *index, const char *group,
+		const char *key, GSList **out_pdchl, int offset)
+{
+	struct srd_channel *pdch;
+	GSList *pdchl;
+	char **items;
+	gsize i, num;
+
+	if (!(items = index_get_tuples(index, group, key, 3, &num)))
+		return SRD_ERR;
+
+	pdchl = NULL;
+	for (i = 0; i < num; i++) {
+		pdch = g_malloc0(sizeof(struct srd_channel));
+		pdch->id = g_strdup(items[3 * i]);
+		pdch->name = g_strdup(items[3 * i + 1]);
+		pdch->desc = g_strdup(items[3 * i + 2]);
+		pdch->order = offset + i;
+		pdchl = g_slist_append(pdchl, pdch);
+	}
+	g_strfreev(items);
+	*out_pdchl = pdchl;
+
+	return SRD_OK;
+}
+
+static int index_get_options(GKeyFile *index, const char *group,
+		GSList **out_options)
+{
+	struct srd_decoder_option *o;
+	GVariantType *values_type;
+	GVariant *values;
+	GSList *options;
+	char **items;
+	gsize i, k, num;
+
+	if (!(items = index_get_tuples(index, group, "options", 4, &num)))
+		return SRD_ERR;
+
+	options = NULL;
+	for (i = 0; i < num; i++) {
+		o = g_malloc0(sizeof(struct srd_decoder_option));
+		/* Add to list right away so it doesn't get lost. */
+		options = g_slist_append(options, o);
+		o->id = g_strdup(items[4 * i]);
+		o->desc = g_strdup(items[4 * i + 1]);
+
+		/* Same types as py_obj_to_variant() produces. */
+		o->def = g_variant_parse(NULL, items[4 * i + 2], NULL, NULL, NULL);
+		if (!o->def || (!g_variant_is_of_type(o->def, G_VARIANT_TYPE_STRING)
+				&& !g_variant_is_of_type(o->def, G_VARIANT_TYPE_INT64)
+				&& !g_variant_is_of_type(o->def, G_VARIANT_TYPE_DOUBLE)))
+			goto err_out;
+
+		if (!*items[4 * i + 3])
+			continue;
+		values_type = g_variant_type_new_array(g_variant_get_type(o->def));
+		values = g_variant_parse(values_type, items[4 * i + 3],
+				NULL, NULL, NULL);
+		g_variant_type_free(values_type);
+		if (!values)
+			goto err_out;
+		for (k = 0; k < g_variant_n_children(values); k++)
+			o->values = g_slist_append(o->values,
+					g_variant_get_child_value(values, k));
+		g_variant_unref(values);
+	}
+	g_strfreev(items);
+	*out_options = options;
+
+	return SRD_OK;
+
+err_out:
+	g_slist_free_full(options, &decoder_option_free);
+	g_strfreev(items);
+
+	return SRD_ERR;
+}
+
+/* Get a list of string pairs as GSList of char **. */
+static int index_get_pairs(GKeyFile *index, const char *group,
+		const char *key, GSList **out_pairs)
+{
+	GSList *pairs;
+	char **items, **pair;
+	gsize i, num;
+
+	if (!(items = index_get_tuples(index, group, key, 2, &num)))
+		return SRD_ERR;
+
+	pairs = NULL;
+	for (i = 0; i < num; i++) {
+		pair = g_new0(char *, 3);
+		pair[0] = g_strdup(items[2 * i]);
+		pair[1] = g_strdup(items[2 * i + 1]);
+		pairs = g_slist_append(pairs, pair);
+	}
+	g_strfreev(items);
+	*out_pairs = pairs;
+
+	return SRD_OK;
+}
+
+static int index_get_annotation_rows(GKeyFile *index, const char *group,
+		GSList **out_rows)
+{
+	struct srd_decoder_annotation_row *ann_row;
+	GSList *annotation_rows;
+	char **items, **classes, *end;
+	guint64 class_idx;
+	gsize i, k, num;
+
+	if (!(items = index_get_tuples(index, group, "annotation_rows", 3, &num)))
+		return SRD_ERR;
+
+	annotation_rows = NULL;
+	for (i = 0; i < num; i++) {
+		ann_row = g_malloc0(sizeof(struct srd_decoder_annotation_row));
+		/* Add to list right away so it doesn't get lost. */
+		annotation_rows = g_slist_append(annotation_rows, ann_row);
+		ann_row->id = g_strdup(items[3 * i]);
+		ann_row->desc = g_strdup(items[3 * i + 1]);
+
+		classes = g_strsplit(items[3 * i + 2], ",", 0);
+		for (k = 0; classes[k] && *classes[k]; k++) {
+			class_idx = g_ascii_strtoull(classes[k], &end, 10);
+			if (*end)
+				break;
+			ann_row->ann_classes = g_slist_append(ann_row->ann_classes,
+					GSIZE_TO_POINTER(class_idx));
+		}
+		if (classes[k]) {
+			g_strfreev(classes);
+			g_slist_free_full(annotation_rows, &annotation_row_free);
+			g_strfreev(items);
+			return SRD_ERR;
+		}
+		g_strfreev(classes);
+	}
+	g_strfreev(items);
+	*out_rows = annotation_rows;
+
+	return SRD_OK;
+}
+
+/*
+ * Load a decoder from its index entry, without importing its module.
+ * Fails if there is no entry, or the decoder's files changed since the
+ * index was written, the caller then imports the decoder as usual.
+ */
+static int decoder_index_load(GKeyFile *index, const char *path,
+		const char *module_name)
+{
+	struct decoder_index_entry *entry;
+	struct srd_decoder *d;
+	char *group, *pd_dir, **items;
+	gint64 mtime, size;
+	gsize i, num;
+	gboolean imported;
+	GError *error;
+	PyGILState_STATE gstate;
+
+	/* Already loaded, from an index or by srd_decoder_load(). */
+	if (decoder_index_find(module_name))
+		return SRD_OK;
+	gstate = PyGILState_Ensure();
+	imported = PyDict_GetItemString(PyImport_GetModuleDict(),
+			module_name) != NULL;
+	PyGILState_Release(gstate);
+	if (imported)
+		return SRD_ERR;
+
+	group = g_strconcat("decoder ", module_name, NULL);
+	if (!g_key_file_has_group(index, group)) {
+		g_free(group);
+		return SRD_ERR;
+	}
+
+	pd_dir = g_build_filename(path, module_name, NULL);
+	decoder_index_stamp(pd_dir, &mtime, &size);
+	g_free(pd_dir);
+	error = NULL;
+	if (g_key_file_get_int64(index, group, "mtime", &error) != mtime
+			|| g_key_file_get_int64(index, group, "size", &error) != size
+			|| error) {
+		srd_dbg("Decoder index entry of '%s' is out of date.",
+			module_name);
+		g_clear_error(&error);
+		g_free(group);
+		return SRD_ERR;
+	}
+
+	d = g_malloc0(sizeof(struct srd_decoder));
+
+	if (!(d->id = g_key_file_get_string(index, group, "id", NULL))
+			|| !(d->name = g_key_file_get_string(index, group, "name", NULL))
+			|| !(d->longname = g_key_file_get_string(index, group, "longname", NULL))
+			|| !(d->desc = g_key_file_get_string(index, group, "desc", NULL))
+			|| !(d->license = g_key_file_get_string(index, group, "license", NULL)))
+		goto err_out;
+
+	if (!(items = index_get_tuples(index, group, "inputs", 1, &num)))
+		goto err_out;
+	for (i = 0; i < num; i++)
+		d->inputs = g_slist_append(d->inputs, g_strdup(items[i]));
+	g_strfreev(items);
+
+	if (!(items = index_get_tuples(index, group, "outputs", 1, &num)))
+		goto err_out;
+	for (i = 0; i < num; i++)
+		d->outputs = g_slist_append(d->outputs, g_strdup(items[i]));
+	g_strfreev(items);
+
+	if (index_get_options(index, group, &d->options) != SRD_OK
+			|| index_get_channels(index, group, "channels",
+				&d->channels, 0) != SRD_OK
+			|| index_get_channels(index, group, "optional_channels",
+				&d->opt_channels,
+				g_slist_length(d->channels)) != SRD_OK
+			|| index_get_pairs(index, group, "annotations",
+				&d->annotations) != SRD_OK
+			|| index_get_annotation_rows(index, group,
+				&d->annotation_rows) != SRD_OK
+			|| index_get_pairs(index, group, "binary",
+				&d->binary) != SRD_OK)
+		goto err_out;
+
+	entry = g_malloc0(sizeof(struct decoder_index_entry));
+	entry->module_name = g_strdup(module_name);
+	entry->doc = g_key_file_get_string(index, group, "doc", NULL);
+	if (!pd_index)
+		pd_index = g_hash_table_new_full(g_direct_hash, g_direct_equal,
+				NULL, &decoder_index_entry_free);
+	g_hash_table_insert(pd_index, d, entry);
+	g_free(group);
+
+	srd_dbg("Loaded protocol decoder '%s' from index.", module_name);
+
+	/* Append it to the list of loaded decoders. */
+	pd_list = g_slist_append(pd_list, d);
+
+	return SRD_OK;
+
+err_out:
+	srd_dbg("Decoder index entry of '%s' is malformed.", module_name);
+	decoder_free(d);
+	g_free(group);
+
+	return SRD_ERR;
+}
+
 static void srd_decoder_load_all_zip_path(char *path)
 {
 	PyObject *zipimport_mod, *zipimporter_class, *zipimporter;
@@ -1028,6 +1487,7 @@ err_out:
 static void srd_decoder_load_all_path(char *path)
 {
 	GDir *dir;
+	GKeyFile *index;
 	const gchar *direntry;
 
 	if (!(dir = g_dir_open(path, 0, NULL))) {
@@ -1037,20 +1497,36 @@ static void srd_decoder_load_all_path(char *path)
 		return;
 	}
 
+	/*
+	 * Decoders with an up-to-date index entry are loaded from that,
+	 * without importing their modules.
+	 */
+	index = decoder_index_open(path);
+
 	/* This ignores errors returned by srd_decoder_load(). That
 	 * function will have logged the cause, but in any case we
 	 * want to continue anyway. */
 	while ((direntry = g_dir_read_name(dir)) != NULL) {
+		if (!strcmp(direntry, DECODER_INDEX_FILE))
+			continue;
 		/* The directory name is the module name (e.g. "i2c"). */
+		if (index && decoder_index_load(index, path, direntry) == SRD_OK)
+			continue;
 		srd_decoder_load(direntry);
 	}
 	g_dir_close(dir);
+	if (index)
+		g_key_file_free(index);
 
 }
 
 /**
  * Load all installed protocol decoders.
  *
+ * Decoder directories may contain an index, which tools/install-decoders
+ * writes. Decoders with an up-to-date entry in it are listed from their
+ * metadata, and only get imported once an instance is created.
+ *
  * @return SRD_OK upon success, a (negative) error code otherwise.
  *
  * @since 0.1.0
@@ -1080,6 +1556,10 @@ SRD_API int srd_decoder_unload_all(void)
 	g_slist_foreach(pd_list, (GFunc)srd_decoder_unload, NULL);
 	g_slist_free(pd_list);
 	pd_list = NULL;
+	if (pd_index) {
+		g_hash_table_destroy(pd_index);
+		pd_index = NULL;
+	}
 
 	return SRD_OK;
 }
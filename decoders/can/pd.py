@@ -31,6 +31,8 @@ class Decoder(srd.Decoder):
     license = 'gplv2+'
     inputs = ['logic']
     outputs = ['can']
+    # Bus idle, after the end of frame and intermission.
+    resync = {'channels': {'can_rx': 'h'}, 'idle': 14, 'bitrate': 'bitrate'}
     channels = (
         {'id': 'can_rx', 'name': 'CAN RX', 'desc': 'CAN bus line'},
     )
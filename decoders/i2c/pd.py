@@ -74,6 +74,8 @@ class Decoder(srd.Decoder):
     license = 'gplv2+'
     inputs = ['logic']
     outputs = ['i2c']
+    # STOP condition.
+    resync = {'channels': {'scl': 'h', 'sda': 'r'}}
     channels = (
         {'id': 'scl', 'name': 'SCL', 'desc': 'Serial clock line'},
         {'id': 'sda', 'name': 'SDA', 'desc': 'Serial data line'},
@@ -129,6 +131,12 @@ def start(self):
         self.out_binary = self.register(srd.OUTPUT_BINARY)
         self.out_bitrate = self.register(srd.OUTPUT_META,
                 meta=(int, 'Bitrate', 'Bitrate from Start bit to Stop bit'))
+        # Bits, addresses and data only get put() as numbers, and get
+        # formatted as per these templates.
+        self.register_template(proto['BIT'][0], ['%d'])
+        for cmd in ('ADDRESS READ', 'ADDRESS WRITE', 'DATA READ', 'DATA WRITE'):
+            self.register_template(proto[cmd][0], ['%s: %%02X' % proto[cmd][1],
+                                   '%s: %%02X' % proto[cmd][2], '%02X'])
 
     def putx(self, data):
         self.put(self.ss, self.es, self.out_ann, data)
@@ -202,13 +210,17 @@ def handle_address_or_data(self, pins):
 
         self.ss, self.es = self.ss_byte, self.samplenum + self.bitwidth
 
-        self.putp(['BITS', self.bits])
-        self.putp([cmd, d])
+        if self.wants(self.out_python):
+            self.putp(['BITS', self.bits])
+            self.putp([cmd, d])
 
-        self.putb([bin_class, bytes([d])])
+        if self.wants(self.out_binary):
+            self.putb([bin_class, bytes([d])])
 
-        for bit in self.bits:
-            self.put(bit[1], bit[2], self.out_ann, [5, ['%d' % bit[0]]])
+        # Bit annotations, unless nobody uses them.
+        if self.wants(self.out_ann, proto['BIT'][0]):
+            for bit in self.bits:
+                self.put(bit[1], bit[2], self.out_ann, [5, (bit[0],)])
 
         if cmd.startswith('ADDRESS'):
             self.ss, self.es = self.samplenum, self.samplenum + self.bitwidth
@@ -216,8 +228,7 @@ def handle_address_or_data(self, pins):
             self.putx([proto[cmd][0], w])
             self.ss, self.es = self.ss_byte, self.samplenum
 
-        self.putx([proto[cmd][0], ['%s: %02X' % (proto[cmd][1], d),
-                   '%s: %02X' % (proto[cmd][2], d), '%02X' % d]])
+        self.putx([proto[cmd][0], (d,)])
 
         # Done with this packet.
         self.bitcount = self.databyte = 0
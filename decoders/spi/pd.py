@@ -82,6 +82,8 @@ class Decoder(srd.Decoder):
     license = 'gplv2+'
     inputs = ['logic']
     outputs = ['spi']
+    # CS# deassertion.
+    resync = {'channels': {'cs': 'r'}, 'options': {'cs_polarity': 'active-low'}}
     channels = (
         {'id': 'clk', 'name': 'CLK', 'desc': 'Clock'},
     )
@@ -159,33 +161,36 @@ def putdata(self):
 
         if self.have_miso:
             ss, es = self.misobits[-1][1], self.misobits[0][2]
-            bdata = so.to_bytes(self.bw, byteorder='big')
-            self.put(ss, es, self.out_binary, [0, bdata])
+            if self.wants(self.out_binary):
+                bdata = so.to_bytes(self.bw, byteorder='big')
+                self.put(ss, es, self.out_binary, [0, bdata])
         if self.have_mosi:
             ss, es = self.mosibits[-1][1], self.mosibits[0][2]
-            bdata = si.to_bytes(self.bw, byteorder='big')
-            self.put(ss, es, self.out_binary, [1, bdata])
+            if self.wants(self.out_binary):
+                bdata = si.to_bytes(self.bw, byteorder='big')
+                self.put(ss, es, self.out_binary, [1, bdata])
 
-        self.put(ss, es, self.out_python, ['BITS', si_bits, so_bits])
-        self.put(ss, es, self.out_python, ['DATA', si, so])
+        if self.wants(self.out_python):
+            self.put(ss, es, self.out_python, ['BITS', si_bits, so_bits])
+            self.put(ss, es, self.out_python, ['DATA', si, so])
 
         if self.have_miso:
             self.misobytes.append(Data(ss=ss, es=es, val=so))
         if self.have_mosi:
             self.mosibytes.append(Data(ss=ss, es=es, val=si))
 
-        # Bit annotations.
-        if self.have_miso:
+        # Bit annotations, unless nobody uses them.
+        if self.have_miso and self.wants(self.out_ann, 2):
             for bit in self.misobits:
                 self.put(bit[1], bit[2], self.out_ann, [2, ['%d' % bit[0]]])
-        if self.have_mosi:
+        if self.have_mosi and self.wants(self.out_ann, 3):
             for bit in self.mosibits:
                 self.put(bit[1], bit[2], self.out_ann, [3, ['%d' % bit[0]]])
 
         # Dataword annotations.
-        if self.have_miso:
+        if self.have_miso and self.wants(self.out_ann, 0):
             self.put(ss, es, self.out_ann, [0, ['%02X' % self.misodata]])
-        if self.have_mosi:
+        if self.have_mosi and self.wants(self.out_ann, 1):
             self.put(ss, es, self.out_ann, [1, ['%02X' % self.mosidata]])
 
     def reset_decoder_state(self):
@@ -247,6 +252,31 @@ def handle_bit(self, miso, mosi, clk, cs):
         if self.bitcount != ws:
             return
 
+        self.handle_word_done()
+
+    def handle_word(self, words, starts, ends):
+        # Take a whole data word, which shift_in() received.
+        ws = self.options['wordsize']
+        msb_first = self.options['bitorder'] == 'msb-first'
+        self.ss_block = starts[0]
+        self.cs_was_deasserted = False
+
+        words = iter(words)
+        if self.have_miso:
+            self.misodata = next(words)
+            self.misobits = [[(self.misodata >> (ws - 1 - i if msb_first else i)) & 1,
+                              starts[i], ends[i]] for i in reversed(range(ws))]
+        if self.have_mosi:
+            self.mosidata = next(words)
+            self.mosibits = [[(self.mosidata >> (ws - 1 - i if msb_first else i)) & 1,
+                              starts[i], ends[i]] for i in reversed(range(ws))]
+        self.bitcount = ws
+
+        self.handle_word_done()
+
+    def handle_word_done(self):
+        ws = self.options['wordsize']
+
         self.putdata()
 
         # Meta bitrate.
@@ -330,6 +360,23 @@ def decode(self):
         (clk, miso, mosi, cs) = self.wait({})
         self.find_clk_edge(miso, mosi, clk, cs, True)
 
+        # Data words which start while CS# is asserted get received in
+        # one go, until CS# changes.
+        mode = spi_mode[self.options['cpol'], self.options['cpha']]
+        edge = 'r' if mode in (0, 3) else 'f'
+        data = [ch for ch in (1, 2) if self.has_channel(ch)]
+        abort = [{3: 'e'}] if self.have_cs else None
+        ws = self.options['wordsize']
+        bo = self.options['bitorder']
+
         while True:
+            if self.bitcount == 0 and (not self.have_cs or self.cs_asserted(cs)):
+                (pins, words, starts, ends) = self.shift_in(0, edge, data, ws, bo, abort)
+                (clk, miso, mosi, cs) = pins
+                if len(starts) == ws:
+                    self.handle_word(words, starts, ends)
+                else:
+                    self.find_clk_edge(miso, mosi, clk, cs, False)
+                continue
             (clk, miso, mosi, cs) = self.wait(wait_cond)
             self.find_clk_edge(miso, mosi, clk, cs, False)
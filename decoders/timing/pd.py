@@ -89,36 +89,39 @@ def start(self):
         self.out_ann = self.register(srd.OUTPUT_ANN)
         self.edge = self.options['edge']
 
-    def decode(self):
-        if not self.samplerate:
-            raise SamplerateError('Cannot decode without samplerate.')
-        while True:
-            if self.edge == 'rising':
-                pin = self.wait({0: 'r'})
-            elif self.edge == 'falling':
-                pin = self.wait({0: 'f'})
-            else:
-                pin = self.wait({0: 'e'})
+    def handle_edge(self, samplenum):
+        if not self.last_samplenum:
+            self.last_samplenum = samplenum
+            return
+        samples = samplenum - self.last_samplenum
+        t = samples / self.samplerate
 
-            if not self.last_samplenum:
-                self.last_samplenum = self.samplenum
-                continue
-            samples = self.samplenum - self.last_samplenum
-            t = samples / self.samplerate
+        if t > 0:
+            self.last_n.append(t)
+        if len(self.last_n) > self.options['avg_period']:
+            self.last_n.popleft()
 
-            if t > 0:
-                self.last_n.append(t)
-            if len(self.last_n) > self.options['avg_period']:
-                self.last_n.popleft()
+        self.put(self.last_samplenum, samplenum, self.out_ann,
+                 [0, [normalize_time(t)]])
+        if self.options['avg_period'] > 0:
+            self.put(self.last_samplenum, samplenum, self.out_ann,
+                     [1, [normalize_time(sum(self.last_n) / len(self.last_n))]])
+        if self.last_t and self.options['delta'] == 'yes':
+            self.put(self.last_samplenum, samplenum, self.out_ann,
+                     [2, [normalize_time(t - self.last_t)]])
 
-            self.put(self.last_samplenum, self.samplenum, self.out_ann,
-                     [0, [normalize_time(t)]])
-            if self.options['avg_period'] > 0:
-                self.put(self.last_samplenum, self.samplenum, self.out_ann,
-                         [1, [normalize_time(sum(self.last_n) / len(self.last_n))]])
-            if self.last_t and self.options['delta'] == 'yes':
-                self.put(self.last_samplenum, self.samplenum, self.out_ann,
-                         [2, [normalize_time(t - self.last_t)]])
+        self.last_t = t
+        self.last_samplenum = samplenum
 
-            self.last_t = t
-            self.last_samplenum = self.samplenum
+    def decode(self):
+        if not self.samplerate:
+            raise SamplerateError('Cannot decode without samplerate.')
+        if self.edge == 'rising':
+            kind = 'r'
+        elif self.edge == 'falling':
+            kind = 'f'
+        else:
+            kind = 'e'
+        while True:
+            for samplenum in self.wait_edges(0, kind, 1024):
+                self.handle_edge(samplenum)
@@ -18,6 +18,7 @@
 ##
 
 import sigrokdecode as srd
+from fractions import Fraction
 from math import floor, ceil
 
 '''
@@ -83,6 +84,9 @@ class Decoder(srd.Decoder):
     license = 'gplv2+'
     inputs = ['logic']
     outputs = ['uart']
+    # Idle for longer than the longest frame.
+    resync = {'channels': {'rx': 'h', 'tx': 'h'}, 'idle': 14,
+        'bitrate': 'baudrate', 'options': {'invert_rx': 'no', 'invert_tx': 'no'}}
     optional_channels = (
         # Allow specifying only one of the signals, e.g. if only one data
         # direction exists (or is relevant).
@@ -171,18 +175,31 @@ def __init__(self):
         self.startsample = [-1, -1]
         self.state = ['WAIT FOR START BIT', 'WAIT FOR START BIT']
         self.databits = [[], []]
+        self.want_python = self.want_binary = True
+        self.want_data = [True, True]
+        self.want_bits = [True, True]
 
     def start(self):
         self.out_python = self.register(srd.OUTPUT_PYTHON)
         self.out_binary = self.register(srd.OUTPUT_BINARY)
         self.out_ann = self.register(srd.OUTPUT_ANN)
         self.bw = (self.options['num_data_bits'] + 7) // 8
+        # Data values and bits only get put() as numbers, and get
+        # formatted as per these templates.
+        self.value_template = self.get_value_template()
+        for rxtx in (RX, TX):
+            if self.value_template is not None:
+                self.register_template(rxtx, [self.value_template])
+            self.register_template(rxtx + 12, ['%d'])
 
     def metadata(self, key, value):
         if key == srd.SRD_CONF_SAMPLERATE:
             self.samplerate = value
             # The width of one UART bit in number of samples.
             self.bit_width = float(self.samplerate) / float(self.options['baudrate'])
+            self.bit_frac = Fraction(self.samplerate, self.options['baudrate'])
+            # The sample point of the first data bit within a frame.
+            self.data_offset = (self.bit_frac - 1) / 2 + self.bit_frac
 
     def get_sample_point(self, rxtx, bitnum):
         # Determine absolute sample number of a bit slot's sample point.
@@ -195,9 +212,18 @@ def get_sample_point(self, rxtx, bitnum):
         bitpos += bitnum * self.bit_width
         return bitpos
 
+    def update_wants(self, rxtx):
+        # Check once per frame which output gets used, so that creating
+        # the unused output can be skipped.
+        self.want_python = self.wants(self.out_python)
+        self.want_binary = self.wants(self.out_binary)
+        self.want_data[rxtx] = self.wants(self.out_ann, rxtx)
+        self.want_bits[rxtx] = self.wants(self.out_ann, rxtx + 12)
+
     def wait_for_start_bit(self, rxtx, signal):
         # Save the sample number where the start bit begins.
         self.frame_start[rxtx] = self.samplenum
+        self.update_wants(rxtx)
 
         self.state[rxtx] = 'GET START BIT'
 
@@ -235,28 +261,37 @@ def get_data_bits(self, rxtx, signal):
             self.datavalue[rxtx] <<= 1
             self.datavalue[rxtx] |= (signal << 0)
 
-        self.putg([rxtx + 12, ['%d' % signal]])
+        if self.want_bits[rxtx]:
+            self.putg([rxtx + 12, (signal,)])
 
         # Store individual data bits and their start/end samplenumbers.
-        s, halfbit = self.samplenum, int(self.bit_width / 2)
-        self.databits[rxtx].append([signal, s - halfbit, s + halfbit])
+        if self.want_python:
+            s, halfbit = self.samplenum, int(self.bit_width / 2)
+            self.databits[rxtx].append([signal, s - halfbit, s + halfbit])
 
         # Return here, unless we already received all data bits.
         self.cur_data_bit[rxtx] += 1
         if self.cur_data_bit[rxtx] < self.options['num_data_bits']:
             return
 
-        self.putpx(rxtx, ['DATA', rxtx,
-            (self.datavalue[rxtx], self.databits[rxtx])])
+        if self.want_python:
+            self.putpx(rxtx, ['DATA', rxtx,
+                (self.datavalue[rxtx], self.databits[rxtx])])
 
         b = self.datavalue[rxtx]
-        formatted = self.format_value(b)
-        if formatted is not None:
-            self.putx(rxtx, [rxtx, [formatted]])
+        if not self.want_data[rxtx]:
+            pass
+        elif self.value_template is not None:
+            self.putx(rxtx, [rxtx, (b,)])
+        else:
+            formatted = self.format_value(b)
+            if formatted is not None:
+                self.putx(rxtx, [rxtx, [formatted]])
 
-        bdata = b.to_bytes(self.bw, byteorder='big')
-        self.putbin(rxtx, [rxtx, bdata])
-        self.putbin(rxtx, [2, bdata])
+        if self.want_binary:
+            bdata = b.to_bytes(self.bw, byteorder='big')
+            self.putbin(rxtx, [rxtx, bdata])
+            self.putbin(rxtx, [2, bdata])
 
         self.databits[rxtx] = []
 
@@ -266,6 +301,19 @@ def get_data_bits(self, rxtx, signal):
         if self.options['parity_type'] == 'none':
             self.state[rxtx] = 'GET STOP BITS'
 
+    def get_value_template(self):
+        # The template for formatting data values as per the configured
+        # options, like format_value() does. None for formats which the
+        # templates don't support.
+        fmt, bits = self.options['format'], self.options['num_data_bits']
+        if fmt == 'dec':
+            return '%d'
+        if fmt == 'hex':
+            return '%%0%dX' % ((bits + 4 - 1) // 4)
+        if fmt == 'oct':
+            return '%%0%do' % ((bits + 3 - 1) // 3)
+        return None
+
     def format_value(self, v):
         # Format value 'v' according to configured options.
         # Reflects the user selected kind of representation, as well as
@@ -356,6 +404,28 @@ def get_wait_cond(self, rxtx, inv):
         want_num = ceil(self.get_sample_point(rxtx, bitnum))
         return {'skip': want_num - self.samplenum}
 
+    def get_frame_bits(self, rxtx, inv, has_pin):
+        # Read the data, parity and stop bits of a frame in one go, unless
+        # the other line is within a frame. A start bit on the other line
+        # ends the read early, the per-bit waits handle the rest.
+        other = TX if rxtx == RX else RX
+        abort = None
+        if has_pin[other]:
+            if self.state[other] != 'WAIT FOR START BIT':
+                return
+            abort = {other: 'r' if inv[other] else 'f'}
+        count = self.options['num_data_bits'] + 1
+        if self.options['parity_type'] != 'none':
+            count += 1
+        (pins, values, points) = self.sample_points(self.frame_start[rxtx],
+            self.bit_frac, count, [rxtx], abort, self.data_offset)
+        samplenum = self.samplenum
+        for (signal, self.samplenum) in zip(values[0], points):
+            self.inspect_sample(rxtx, signal, inv[rxtx])
+        self.samplenum = samplenum
+        if self.matched:
+            self.inspect_sample(other, pins[other], inv[other])
+
     def inspect_sample(self, rxtx, signal, inv):
         # Inspect a sample returned by .wait() for the specified UART line.
         if inv:
@@ -398,3 +468,7 @@ def decode(self):
                 self.inspect_sample(RX, rx, inv[RX])
             if cond_idx[TX] is not None and self.matched[cond_idx[TX]]:
                 self.inspect_sample(TX, tx, inv[TX])
+            for rxtx in (RX, TX):
+                if self.state[rxtx] == 'GET DATA BITS' and \
+                        self.cur_data_bit[rxtx] == 0:
+                    self.get_frame_bits(rxtx, inv, has_pin)
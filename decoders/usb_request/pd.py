@@ -95,8 +95,9 @@ def set_setup(self, data):
         self.header[14] = 0
         self.header[40:48] = data
 
-    def packet(self):
-        return bytes(self.header) + bytes(self.data)
+    def record(self):
+        # The record is put() as one block, which is concatenated in C.
+        return [self.record_header(), self.header, bytes(self.data)]
 
     def record_header(self):
         # See https://wiki.wireshark.org/Development/LibpcapFileFormat.
@@ -276,8 +277,7 @@ def handle_request(self, request_start, request_end):
             # Issue PCAP 'SUBMIT' packet.
             ts = self.ts_from_samplenum(ss)
             pkt = pcap_usb_pkt(request, ts, True)
-            self.putb(ss, [0, pkt.record_header()])
-            self.putb(ss, [0, pkt.packet()])
+            self.putb(ss, [0, pkt.record()])
 
         if request_end == 1:
             # Write annotation.
@@ -294,8 +294,7 @@ def handle_request(self, request_start, request_end):
             # Issue PCAP 'COMPLETE' packet.
             ts = self.ts_from_samplenum(es)
             pkt = pcap_usb_pkt(request, ts, False)
-            self.putb(ss, [0, pkt.record_header()])
-            self.putb(ss, [0, pkt.packet()])
+            self.putb(ss, [0, pkt.record()])
             del self.request[(addr, ep)]
 
     def decode(self, ss, es, data):
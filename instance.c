@@ -32,6 +32,7 @@ extern SRD_PRIV GSList *sessions;
 
 static void srd_inst_join_decode_thread(struct srd_decoder_inst *di);
 static void srd_inst_reset_state(struct srd_decoder_inst *di);
+static void srd_inst_chunks_flush(struct srd_decoder_inst *di);
 SRD_PRIV void oldpins_array_free(struct srd_decoder_inst *di);
 
 /** @endcond */
@@ -176,6 +177,20 @@ err_out:
 	return ret;
 }
 
+/* Derive the channels' positions in a sample from the channel map. */
+static void pins_update(struct srd_decoder_inst *di)
+{
+	int i, ch;
+
+	g_free(di->dec_pins);
+	di->dec_pins = g_malloc(sizeof(struct srd_pin) * di->dec_num_channels);
+	for (i = 0; i < di->dec_num_channels; i++) {
+		ch = di->dec_channelmap[i];
+		di->dec_pins[i].offset = (ch < 0) ? -1 : ch / 8;
+		di->dec_pins[i].mask = (ch < 0) ? 0 : 1 << (ch % 8);
+	}
+}
+
 /* Helper GComparefunc for g_slist_find_custom() in srd_inst_channel_set_all() */
 static gint compare_channel_id(const struct srd_channel *pdch,
 			const char *channel_id)
@@ -278,6 +293,7 @@ SRD_API int srd_inst_channel_set_all(struct srd_decoder_inst *di,
 
 	g_free(di->dec_channelmap);
 	di->dec_channelmap = new_channelmap;
+	pins_update(di);
 
 	return SRD_OK;
 }
@@ -317,6 +333,10 @@ SRD_API struct srd_decoder_inst *srd_inst_new(struct srd_session *sess,
 		return NULL;
 	}
 
+	/* Decoders loaded from an index get imported on first use. */
+	if (srd_decoder_import(dec) != SRD_OK)
+		return NULL;
+
 	di = g_malloc0(sizeof(struct srd_decoder_inst));
 
 	di->decoder = dec;
@@ -349,6 +369,7 @@ SRD_API struct srd_decoder_inst *srd_inst_new(struct srd_session *sess,
 				g_malloc(sizeof(int) * di->dec_num_channels);
 		for (i = 0; i < di->dec_num_channels; i++)
 			di->dec_channelmap[i] = i;
+		pins_update(di);
 		/*
 		 * Will be used to prepare a sample at every iteration
 		 * of the instance's decode() method.
@@ -372,20 +393,24 @@ SRD_API struct srd_decoder_inst *srd_inst_new(struct srd_session *sess,
 					decoder_id);
 		PyGILState_Release(gstate);
 		g_free(di->dec_channelmap);
+		g_free(di->dec_pins);
 		g_free(di);
 		return NULL;
 	}
 
+	/* Let the Python object know its decoder instance. */
+	((srd_Decoder *)di->py_inst)->di = di;
+
 	PyGILState_Release(gstate);
 
 	if (options && srd_inst_option_set(di, options) != SRD_OK) {
 		g_free(di->dec_channelmap);
+		g_free(di->dec_pins);
 		g_free(di);
 		return NULL;
 	}
 
 	di->condition_list = NULL;
-	di->match_array = NULL;
 	di->abs_start_samplenum = 0;
 	di->abs_end_samplenum = 0;
 	di->inbuf = NULL;
@@ -395,6 +420,14 @@ SRD_API struct srd_decoder_inst *srd_inst_new(struct srd_session *sess,
 	di->got_new_samples = FALSE;
 	di->handled_all_samples = FALSE;
 	di->want_wait_terminate = FALSE;
+	di->chunk = NULL;
+	g_queue_init(&di->chunk_queue);
+	di->ann_batch = NULL;
+	di->pulse_state = NULL;
+	di->trace = NULL;
+	di->ann_templates = NULL;
+	di->outputs_disabled = 0;
+	di->ann_classes_disabled = NULL;
 
 	/*
 	 * Strictly speaking initialization of statically allocated
@@ -408,11 +441,92 @@ SRD_API struct srd_decoder_inst *srd_inst_new(struct srd_session *sess,
 
 	/* Instance takes input from a frontend by default. */
 	sess->di_list = g_slist_append(sess->di_list, di);
+	if (!g_hash_table_lookup(sess->di_by_id, di->inst_id))
+		g_hash_table_insert(sess->di_by_id, di->inst_id, di);
 	srd_dbg("Created new %s instance with ID %s.", decoder_id, di->inst_id);
 
 	return di;
 }
 
+/**
+ * Create a copy of a decoder instance and the instances stacked on it.
+ *
+ * The copies get the original instances' IDs, options, channel maps,
+ * initial pins and output filters, but none of their decoding state.
+ *
+ * @param sess The session to create the copies in. Must not be NULL.
+ * @param di The instance to copy. Must not be NULL.
+ * @param originals A hash table which receives the original instance
+ *                  of every copy, keyed by the copy. Must not be NULL.
+ *
+ * @return The copy of 'di', or NULL in case of failure.
+ *
+ * @private
+ */
+SRD_PRIV struct srd_decoder_inst *srd_inst_clone(struct srd_session *sess,
+		const struct srd_decoder_inst *di, GHashTable *originals)
+{
+	struct srd_decoder_inst *copy, *next_copy;
+	GHashTable *options;
+	PyObject *py_options, *py_copy;
+	GSList *l;
+	int ret;
+	PyGILState_STATE gstate;
+
+	options = g_hash_table_new(g_str_hash, g_str_equal);
+	g_hash_table_insert(options, "id", di->inst_id);
+	copy = srd_inst_new(sess, di->decoder->id, options);
+	g_hash_table_destroy(options);
+	if (!copy)
+		return NULL;
+	g_hash_table_insert(originals, copy, (gpointer)di);
+
+	/* The options were already checked, copy their Python values. */
+	gstate = PyGILState_Ensure();
+	ret = SRD_OK;
+	py_options = PyObject_GetAttrString(di->py_inst, "options");
+	if (py_options && PyDict_Check(py_options)) {
+		py_copy = PyDict_Copy(py_options);
+		if (!py_copy || PyObject_SetAttrString(copy->py_inst,
+				"options", py_copy) < 0) {
+			srd_exception_catch("Failed to copy options of %s",
+				di->inst_id);
+			ret = SRD_ERR_PYTHON;
+		}
+		Py_XDECREF(py_copy);
+	}
+	Py_XDECREF(py_options);
+	PyErr_Clear();
+	PyGILState_Release(gstate);
+	if (ret != SRD_OK)
+		return NULL;
+
+	if (di->dec_num_channels) {
+		memcpy(copy->dec_channelmap, di->dec_channelmap,
+			sizeof(int) * di->dec_num_channels);
+		pins_update(copy);
+		memcpy(copy->old_pins_array->data, di->old_pins_array->data,
+			di->dec_num_channels);
+	}
+
+	copy->outputs_disabled = di->outputs_disabled;
+	if (di->ann_classes_disabled) {
+		copy->ann_classes_disabled = g_array_sized_new(FALSE, TRUE,
+			sizeof(gboolean), di->ann_classes_disabled->len);
+		g_array_append_vals(copy->ann_classes_disabled,
+			di->ann_classes_disabled->data,
+			di->ann_classes_disabled->len);
+	}
+
+	for (l = di->next_di; l; l = l->next) {
+		if (!(next_copy = srd_inst_clone(sess, l->data, originals)))
+			return NULL;
+		srd_inst_stack(sess, copy, next_copy);
+	}
+
+	return copy;
+}
+
 static void srd_inst_join_decode_thread(struct srd_decoder_inst *di)
 {
 	if (!di)
@@ -459,8 +573,10 @@ static void srd_inst_reset_state(struct srd_decoder_inst *di)
 	/*
 	 * Reset internal state of the decoder.
 	 */
+	srd_inst_chunks_flush(di);
 	condition_list_free(di);
-	match_array_free(di);
+	g_free(di->pulse_state);
+	di->pulse_state = NULL;
 	di->abs_start_samplenum = 0;
 	di->abs_end_samplenum = 0;
 	di->inbuf = NULL;
@@ -511,43 +627,10 @@ SRD_API int srd_inst_stack(struct srd_session *sess,
 	return SRD_OK;
 }
 
-/**
- * Search a decoder instance and its stack for instance ID.
- *
- * @param[in] inst_id ID to search for.
- * @param[in] stack A decoder instance, potentially with stacked instances.
- *
- * @return The matching instance, or NULL.
- */
-static struct srd_decoder_inst *srd_inst_find_by_id_stack(const char *inst_id,
-		struct srd_decoder_inst *stack)
-{
-	const GSList *l;
-	struct srd_decoder_inst *tmp, *di;
-
-	if (!strcmp(stack->inst_id, inst_id))
-		return stack;
-
-	/* Otherwise, look recursively in our stack. */
-	di = NULL;
-	if (stack->next_di) {
-		for (l = stack->next_di; l; l = l->next) {
-			tmp = l->data;
-			if (!strcmp(tmp->inst_id, inst_id)) {
-				di = tmp;
-				break;
-			}
-		}
-	}
-
-	return di;
-}
-
 /**
  * Find a decoder instance by its instance ID.
  *
- * This will recurse to find the instance anywhere in the stack tree of the
- * given session.
+ * This finds the instance anywhere in the stack tree of the given session.
  *
  * @param sess The session holding the protocol decoder instance.
  * @param inst_id The instance ID to be found.
@@ -559,22 +642,15 @@ static struct srd_decoder_inst *srd_inst_find_by_id_stack(const char *inst_id,
 SRD_API struct srd_decoder_inst *srd_inst_find_by_id(struct srd_session *sess,
 		const char *inst_id)
 {
-	GSList *l;
-	struct srd_decoder_inst *tmp, *di;
-
 	if (session_is_valid(sess) != SRD_OK) {
 		srd_err("Invalid session.");
 		return NULL;
 	}
 
-	di = NULL;
-	for (l = sess->di_list; l; l = l->next) {
-		tmp = l->data;
-		if ((di = srd_inst_find_by_id_stack(inst_id, tmp)) != NULL)
-			break;
-	}
+	if (!inst_id)
+		return NULL;
 
-	return di;
+	return g_hash_table_lookup(sess->di_by_id, inst_id);
 }
 
 static struct srd_decoder_inst *srd_sess_inst_find_by_obj(
@@ -605,13 +681,14 @@ static struct srd_decoder_inst *srd_sess_inst_find_by_obj(
  * Find a decoder instance by its Python object.
  *
  * I.e. find that instance's instantiation of the sigrokdecode.Decoder class.
- * This will recurse to find the instance anywhere in the stack tree of all
- * sessions.
+ * Without a stack, the instance is taken from the Python object itself.
+ * With a stack, this will recurse to find the instance anywhere in the
+ * stack tree of all sessions.
  *
  * @param stack Pointer to a GSList of struct srd_decoder_inst, indicating the
- *              stack to search. To start searching at the bottom level of
- *              decoder instances, pass NULL.
- * @param obj The Python class instantiation.
+ *              stack to search. To look up any instance, pass NULL.
+ * @param obj The Python class instantiation. Must be an instance of
+ *            sigrokdecode.Decoder when 'stack' is NULL.
  *
  * @return Pointer to struct srd_decoder_inst, or NULL if not found.
  *
@@ -626,6 +703,9 @@ SRD_PRIV struct srd_decoder_inst *srd_inst_find_by_obj(const GSList *stack,
 	struct srd_session *sess;
 	GSList *l;
 
+	if (!stack)
+		return obj ? ((const srd_Decoder *)obj)->di : NULL;
+
 	di = NULL;
 	for (l = sessions; di == NULL && l != NULL; l = l->next) {
 		sess = l->data;
@@ -683,6 +763,201 @@ SRD_API int srd_inst_initial_pins_set_all(struct srd_decoder_inst *di, GArray *i
 	return SRD_OK;
 }
 
+/**
+ * Enable or disable an output type of a decoder instance.
+ *
+ * The instance drops output of disabled types, and its decoder can skip
+ * creating it, see Decoder.wants(). All output types are enabled by
+ * default. This only affects output which gets created after the call.
+ *
+ * @param di Decoder instance.
+ * @param output_type The output type (SRD_OUTPUT_*).
+ * @param enable TRUE to enable the output type, FALSE to disable it.
+ *
+ * @return SRD_OK upon success, a (negative) error code otherwise.
+ *
+ * @since 0.6.0
+ */
+SRD_API int srd_inst_output_enable(struct srd_decoder_inst *di,
+		int output_type, gboolean enable)
+{
+	if (!di) {
+		srd_err("Invalid decoder instance.");
+		return SRD_ERR_ARG;
+	}
+
+	if (output_type < SRD_OUTPUT_ANN || output_type > SRD_OUTPUT_META) {
+		srd_err("Invalid output type %d.", output_type);
+		return SRD_ERR_ARG;
+	}
+
+	if (enable)
+		di->outputs_disabled &= ~(1U << output_type);
+	else
+		di->outputs_disabled |= 1U << output_type;
+
+	return SRD_OK;
+}
+
+/**
+ * Enable or disable an annotation class of a decoder instance.
+ *
+ * The instance drops annotations of disabled classes, and its decoder can
+ * skip creating them, see Decoder.wants(). All annotation classes are
+ * enabled by default. This only affects annotations which get created
+ * after the call.
+ *
+ * @param di Decoder instance.
+ * @param ann_class The annotation class.
+ * @param enable TRUE to enable the annotation class, FALSE to disable it.
+ *
+ * @return SRD_OK upon success, a (negative) error code otherwise.
+ *
+ * @since 0.6.0
+ */
+SRD_API int srd_inst_ann_class_enable(struct srd_decoder_inst *di,
+		int ann_class, gboolean enable)
+{
+	int num_classes;
+
+	if (!di) {
+		srd_err("Invalid decoder instance.");
+		return SRD_ERR_ARG;
+	}
+
+	num_classes = g_slist_length(di->decoder->annotations);
+	if (ann_class < 0 || ann_class >= num_classes) {
+		srd_err("Invalid annotation class %d.", ann_class);
+		return SRD_ERR_ARG;
+	}
+
+	if (!di->ann_classes_disabled) {
+		if (enable)
+			return SRD_OK;
+		di->ann_classes_disabled = g_array_sized_new(FALSE, TRUE,
+				sizeof(gboolean), num_classes);
+		g_array_set_size(di->ann_classes_disabled, num_classes);
+	}
+	g_array_index(di->ann_classes_disabled, gboolean, ann_class) = !enable;
+
+	return SRD_OK;
+}
+
+/**
+ * Enable or disable all annotation classes of an annotation row.
+ *
+ * See srd_inst_ann_class_enable().
+ *
+ * @param di Decoder instance.
+ * @param row_id The annotation row's ID. Must not be NULL.
+ * @param enable TRUE to enable the classes, FALSE to disable them.
+ *
+ * @return SRD_OK upon success, a (negative) error code otherwise.
+ *
+ * @since 0.6.0
+ */
+SRD_API int srd_inst_ann_row_enable(struct srd_decoder_inst *di,
+		const char *row_id, gboolean enable)
+{
+	GSList *l, *c;
+	struct srd_decoder_annotation_row *row;
+	int ret;
+
+	if (!di || !row_id) {
+		srd_err("Invalid decoder instance or annotation row.");
+		return SRD_ERR_ARG;
+	}
+
+	for (l = di->decoder->annotation_rows; l; l = l->next) {
+		row = l->data;
+		if (strcmp(row->id, row_id))
+			continue;
+		for (c = row->ann_classes; c; c = c->next) {
+			ret = srd_inst_ann_class_enable(di,
+					GPOINTER_TO_INT(c->data), enable);
+			if (ret != SRD_OK)
+				return ret;
+		}
+		return SRD_OK;
+	}
+
+	srd_err("Decoder %s has no annotation row %s.", di->decoder->id, row_id);
+
+	return SRD_ERR_ARG;
+}
+
+/**
+ * Get the performance counters of a decoder instance.
+ *
+ * The counters are always maintained, and are cheap enough for that:
+ * each is only updated by one thread, without atomic operations. While
+ * the instance is decoding, the values may thus lag slightly behind.
+ *
+ * @param di Decoder instance.
+ * @param stats Where to store the counters. Must not be NULL.
+ *
+ * @return SRD_OK upon success, a (negative) error code otherwise.
+ *
+ * @since 0.6.0
+ */
+SRD_API int srd_inst_stats_get(struct srd_decoder_inst *di,
+		struct srd_inst_stats *stats)
+{
+	if (!di || !stats) {
+		srd_err("Invalid decoder instance or stats.");
+		return SRD_ERR_ARG;
+	}
+
+	g_mutex_lock(&di->data_mutex);
+	*stats = di->stats;
+	g_mutex_unlock(&di->data_mutex);
+
+	if (di->condition_cache) {
+		stats->cond_cache_hits = di->condition_cache->hits;
+		stats->cond_cache_misses = di->condition_cache->misses;
+	}
+
+	return SRD_OK;
+}
+
+/**
+ * Check whether output of an instance has any receiver, and is enabled.
+ *
+ * @param di Decoder instance. Must not be NULL.
+ * @param pdo The output. Must not be NULL.
+ * @param ann_class The annotation class of annotation output, or -1.
+ *
+ * @return TRUE if the output is wanted, FALSE if it can be dropped.
+ *
+ * @private
+ */
+SRD_PRIV gboolean srd_inst_output_wanted(const struct srd_decoder_inst *di,
+		const struct srd_pd_output *pdo, int ann_class)
+{
+	GArray *disabled;
+
+	if (di->outputs_disabled & (1U << pdo->output_type))
+		return FALSE;
+
+	switch (pdo->output_type) {
+	case SRD_OUTPUT_ANN:
+		disabled = di->ann_classes_disabled;
+		if (disabled && ann_class >= 0 && (guint)ann_class < disabled->len
+				&& g_array_index(disabled, gboolean, ann_class))
+			return FALSE;
+		if (di->sess->ann_batch_cb)
+			return TRUE;
+		break;
+	case SRD_OUTPUT_PYTHON:
+		/* Python output goes up the stack, and to the callback. */
+		if (di->next_di)
+			return TRUE;
+		break;
+	}
+
+	return srd_pd_output_callback_find(di->sess, pdo->output_type) != NULL;
+}
+
 /** @private */
 SRD_PRIV void oldpins_array_free(struct srd_decoder_inst *di)
 {
@@ -720,11 +995,14 @@ SRD_PRIV int srd_inst_start(struct srd_decoder_inst *di)
 	}
 	Py_DecRef(py_res);
 
-	/* Set self.samplenum to 0. */
-	PyObject_SetAttrString(di->py_inst, "samplenum", PyLong_FromLong(0));
+	/*
+	 * Set self.matched to None, and drop the cached pin value tuples
+	 * (the channel map may have changed since the last run).
+	 */
+	srd_Decoder_state_clear(di->py_inst);
 
-	/* Set self.matched to None. */
-	PyObject_SetAttrString(di->py_inst, "matched", Py_None);
+	/* Set self.samplenum to where decoding starts, usually 0. */
+	((srd_Decoder *)di->py_inst)->samplenum = di->abs_cur_samplenum;
 
 	PyGILState_Release(gstate);
 
@@ -739,251 +1017,973 @@ SRD_PRIV int srd_inst_start(struct srd_decoder_inst *di)
 }
 
 /**
- * Check whether the specified sample matches the specified term.
+ * Create a condition program from parsed conditions and terms.
  *
- * In the case of SRD_TERM_SKIP, this function can modify
- * term->num_samples_already_skipped.
+ * The program takes ownership of both arrays. Its checks get compiled
+ * when the program is first used for matching, since the channel map
+ * and the sample layout are only known then.
  *
- * @param old_sample The value of the previous sample (0/1).
- * @param sample The value of the current sample (0/1).
- * @param term The term that should be checked for a match. Must not be NULL.
+ * @param conds The conditions (struct srd_condition). Must not be NULL.
+ * @param terms The terms of all conditions (struct srd_term).
+ *              Must not be NULL.
  *
- * @retval TRUE The current sample matches the specified term.
- * @retval FALSE The current sample doesn't match the specified term, or an
- *               invalid term was provided.
+ * @return The new condition program.
  *
  * @private
  */
-static gboolean sample_matches(uint8_t old_sample, uint8_t sample, struct srd_term *term)
+SRD_PRIV struct srd_cond_prog *cond_prog_new(GArray *conds, GArray *terms)
 {
-	/* Caller ensures term != NULL. */
+	struct srd_cond_prog *prog;
 
-	switch (term->type) {
-	case SRD_TERM_HIGH:
-		if (sample == 1)
-			return TRUE;
-		break;
-	case SRD_TERM_LOW:
-		if (sample == 0)
-			return TRUE;
-		break;
-	case SRD_TERM_RISING_EDGE:
-		if (old_sample == 0 && sample == 1)
-			return TRUE;
-		break;
-	case SRD_TERM_FALLING_EDGE:
-		if (old_sample == 1 && sample == 0)
-			return TRUE;
-		break;
-	case SRD_TERM_EITHER_EDGE:
-		if ((old_sample == 1 && sample == 0) || (old_sample == 0 && sample == 1))
-			return TRUE;
-		break;
-	case SRD_TERM_NO_EDGE:
-		if ((old_sample == 0 && sample == 0) || (old_sample == 1 && sample == 1))
-			return TRUE;
-		break;
-	case SRD_TERM_SKIP:
-		if (term->num_samples_already_skipped == term->num_samples_to_skip)
-			return TRUE;
-		term->num_samples_already_skipped++;
-		break;
-	default:
-		srd_err("Unknown term type %d.", term->type);
-		break;
-	}
+	prog = g_malloc0(sizeof(*prog));
+	prog->num_conds = conds->len;
+	prog->conds = (struct srd_condition *)g_array_free(conds, FALSE);
+	prog->num_terms = terms->len;
+	prog->terms = (struct srd_term *)g_array_free(terms, FALSE);
+	prog->matched = g_malloc0(prog->num_conds * sizeof(gboolean));
 
-	return FALSE;
+	return prog;
 }
 
 /** @private */
-SRD_PRIV void match_array_free(struct srd_decoder_inst *di)
+SRD_PRIV void cond_prog_free(struct srd_cond_prog *prog)
 {
-	if (!di || !di->match_array)
+	if (!prog)
 		return;
 
-	g_array_free(di->match_array, TRUE);
-	di->match_array = NULL;
+	g_free(prog->conds);
+	g_free(prog->terms);
+	g_free(prog->checks);
+	g_free(prog->old_sample);
+	g_free(prog->matched);
+	g_free(prog);
 }
 
 /** @private */
 SRD_PRIV void condition_list_free(struct srd_decoder_inst *di)
 {
-	GSList *l, *ll;
-
 	if (!di)
 		return;
 
-	for (l = di->condition_list; l; l = l->next) {
-		ll = l->data;
-		if (ll)
-			g_slist_free_full(ll, g_free);
-	}
-
+	/* Programs in the condition cache are kept for later use. */
+	if (di->condition_list && !di->condition_list->cached)
+		cond_prog_free(di->condition_list);
 	di->condition_list = NULL;
 }
 
-static gboolean have_non_null_conds(const struct srd_decoder_inst *di)
-{
-	GSList *l, *cond;
-
-	if (!di)
-		return FALSE;
-
-	for (l = di->condition_list; l; l = l->next) {
-		cond = l->data;
-		if (cond)
-			return TRUE;
-	}
-
-	return FALSE;
-}
-
-static void update_old_pins_array(struct srd_decoder_inst *di,
-		const uint8_t *sample_pos)
+/**
+ * Free a condition cache entry. The caller must hold the GIL.
+ *
+ * @private
+ */
+SRD_PRIV void cond_cache_entry_free(struct srd_cond_cache_entry *entry)
 {
-	uint8_t sample;
-	int i, byte_offset, bit_offset;
+	unsigned int i;
 
-	if (!di || !di->dec_channelmap || !sample_pos)
+	if (!entry)
 		return;
 
-	for (i = 0; i < di->dec_num_channels; i++) {
-		byte_offset = di->dec_channelmap[i] / 8;
-		bit_offset = di->dec_channelmap[i] % 8;
-		sample = *(sample_pos + byte_offset) & (1 << bit_offset) ? 1 : 0;
-		di->old_pins_array->data[i] = sample;
-	}
+	for (i = 0; i < entry->num_keys; i++)
+		Py_XDECREF(entry->keys[i].value);
+	g_free(entry->keys);
+	cond_prog_free(entry->prog);
+	g_free(entry);
 }
 
-static void update_old_pins_array_initial_pins(struct srd_decoder_inst *di)
+/** @private */
+SRD_PRIV void condition_cache_free(struct srd_decoder_inst *di)
 {
-	uint8_t sample;
-	int i, byte_offset, bit_offset;
-	const uint8_t *sample_pos;
+	struct srd_cond_cache *cache;
+	struct srd_cond_cache_entry *entry;
+	PyGILState_STATE gstate;
 
-	if (!di || !di->dec_channelmap)
+	if (!di || !di->condition_cache)
 		return;
 
-	sample_pos = di->inbuf + ((di->abs_cur_samplenum - di->abs_start_samplenum) * di->data_unitsize);
+	cache = di->condition_cache;
+	srd_dbg("%s: Condition cache: %" PRIu64 " hits, %" PRIu64 " misses.",
+		di->inst_id, cache->hits, cache->misses);
 
-	for (i = 0; i < di->dec_num_channels; i++) {
-		if (di->old_pins_array->data[i] != SRD_INITIAL_PIN_SAME_AS_SAMPLE0)
-			continue;
-		byte_offset = di->dec_channelmap[i] / 8;
-		bit_offset = di->dec_channelmap[i] % 8;
-		sample = *(sample_pos + byte_offset) & (1 << bit_offset) ? 1 : 0;
-		di->old_pins_array->data[i] = sample;
-	}
+	gstate = PyGILState_Ensure();
+	while ((entry = g_queue_pop_head(&cache->entries)))
+		cond_cache_entry_free(entry);
+	PyGILState_Release(gstate);
+
+	g_array_free(cache->keys, TRUE);
+	g_array_free(cache->skips, TRUE);
+	g_free(cache);
+	di->condition_cache = NULL;
 }
 
-static gboolean term_matches(const struct srd_decoder_inst *di,
-		struct srd_term *term, const uint8_t *sample_pos)
+static gboolean have_non_null_conds(const struct srd_cond_prog *prog)
 {
-	uint8_t old_sample, sample;
-	int byte_offset, bit_offset, ch;
-
-	/* Caller ensures di, di->dec_channelmap, term, sample_pos != NULL. */
-
-	if (term->type == SRD_TERM_SKIP)
-		return sample_matches(0, 0, term);
+	unsigned int i;
 
-	ch = term->channel;
-	byte_offset = di->dec_channelmap[ch] / 8;
-	bit_offset = di->dec_channelmap[ch] % 8;
-	sample = *(sample_pos + byte_offset) & (1 << bit_offset) ? 1 : 0;
-	old_sample = di->old_pins_array->data[ch];
+	for (i = 0; i < prog->num_conds; i++) {
+		if (!prog->conds[i].is_empty)
+			return TRUE;
+	}
 
-	return sample_matches(old_sample, sample, term);
+	return FALSE;
 }
 
-static gboolean all_terms_match(const struct srd_decoder_inst *di,
-		const GSList *cond, const uint8_t *sample_pos)
+/**
+ * Add a constraint on one sample bit to a check.
+ *
+ * @retval TRUE The constraint was added.
+ * @retval FALSE The constraint contradicts a previous constraint.
+ */
+static gboolean cond_check_constrain(uint8_t *mask, uint8_t *value,
+		uint8_t bit, gboolean set)
 {
-	const GSList *l;
-	struct srd_term *term;
-
-	/* Caller ensures di, cond, sample_pos != NULL. */
+	if ((*mask & bit) && !!(*value & bit) != !!set)
+		return FALSE;
 
-	for (l = cond; l; l = l->next) {
-		term = l->data;
-		if (!term_matches(di, term, sample_pos))
-			return FALSE;
-	}
+	*mask |= bit;
+	if (set)
+		*value |= bit;
 
 	return TRUE;
 }
 
-static gboolean at_least_one_condition_matched(
-		const struct srd_decoder_inst *di, unsigned int num_conditions)
+/**
+ * Compile the terms of a condition program into byte masks.
+ *
+ * Each condition gets one check per sample byte which its terms refer
+ * to. Terms on channels which are not available in the samples (unused
+ * optional channels) never match.
+ *
+ * @param di The decoder instance. Must not be NULL.
+ * @param prog The condition program. Must not be NULL.
+ */
+static void cond_prog_link(const struct srd_decoder_inst *di,
+		struct srd_cond_prog *prog)
 {
-	unsigned int i;
+	GArray *checks;
+	struct srd_condition *cond;
+	struct srd_cond_check *check;
+	const struct srd_term *term;
+	const struct srd_pin *pin;
+	unsigned int i, j, k;
+	int offset;
+	uint8_t bit;
+	gboolean ok;
+
+	/* Caller ensures di != NULL, prog != NULL. */
+
+	checks = g_array_new(FALSE, TRUE, sizeof(struct srd_cond_check));
+
+	for (i = 0; i < prog->num_conds; i++) {
+		cond = &prog->conds[i];
+		cond->first_check = checks->len;
+		cond->never_matches = FALSE;
+		for (j = 0; j < cond->num_terms; j++) {
+			term = &prog->terms[cond->first_term + j];
+			pin = &di->dec_pins[term->channel];
+			if (pin->offset < 0 || pin->offset >= di->data_unitsize) {
+				cond->never_matches = TRUE;
+				continue;
+			}
+			offset = pin->offset;
+			bit = pin->mask;
 
-	/* Caller ensures di != NULL. */
+			/* Find or add this condition's check for the byte. */
+			for (k = cond->first_check; k < checks->len; k++) {
+				if (g_array_index(checks, struct srd_cond_check, k).offset == offset)
+					break;
+			}
+			if (k == checks->len) {
+				g_array_set_size(checks, k + 1);
+				g_array_index(checks, struct srd_cond_check, k).offset = offset;
+			}
+			check = &g_array_index(checks, struct srd_cond_check, k);
 
-	for (i = 0; i < num_conditions; i++) {
-		if (di->match_array->data[i])
-			return TRUE;
+			switch (term->type) {
+			case SRD_TERM_HIGH:
+				ok = cond_check_constrain(&check->level_mask,
+					&check->level_value, bit, TRUE);
+				break;
+			case SRD_TERM_LOW:
+				ok = cond_check_constrain(&check->level_mask,
+					&check->level_value, bit, FALSE);
+				break;
+			case SRD_TERM_RISING_EDGE:
+				ok = cond_check_constrain(&check->level_mask,
+					&check->level_value, bit, TRUE);
+				ok &= cond_check_constrain(&check->edge_mask,
+					&check->edge_value, bit, TRUE);
+				break;
+			case SRD_TERM_FALLING_EDGE:
+				ok = cond_check_constrain(&check->level_mask,
+					&check->level_value, bit, FALSE);
+				ok &= cond_check_constrain(&check->edge_mask,
+					&check->edge_value, bit, TRUE);
+				break;
+			case SRD_TERM_EITHER_EDGE:
+				ok = cond_check_constrain(&check->edge_mask,
+					&check->edge_value, bit, TRUE);
+				break;
+			case SRD_TERM_NO_EDGE:
+				ok = cond_check_constrain(&check->edge_mask,
+					&check->edge_value, bit, FALSE);
+				break;
+			default:
+				ok = FALSE;
+				break;
+			}
+			if (!ok)
+				cond->never_matches = TRUE;
+		}
+		cond->num_checks = checks->len - cond->first_check;
+	}
+
+	g_free(prog->checks);
+	prog->num_checks = checks->len;
+	prog->checks = (struct srd_cond_check *)g_array_free(checks, FALSE);
+
+	g_free(prog->old_sample);
+	prog->old_sample = g_malloc0(di->data_unitsize);
+	prog->unitsize = di->data_unitsize;
+}
+
+/**
+ * Check whether a sample matches a condition.
+ *
+ * @param prog The condition program. Must not be NULL.
+ * @param cond The condition. Must not be NULL.
+ * @param samplenum The absolute sample number of the sample.
+ * @param sample_pos The sample to check. Must not be NULL.
+ * @param old_pos The previous sample. Must not be NULL.
+ *
+ * @retval TRUE The sample matches the condition.
+ * @retval FALSE The sample doesn't match the condition.
+ */
+static gboolean condition_matches(const struct srd_cond_prog *prog,
+		const struct srd_condition *cond, uint64_t samplenum,
+		const uint8_t *sample_pos, const uint8_t *old_pos)
+{
+	const struct srd_cond_check *check;
+	unsigned int i;
+	uint8_t sample;
+
+	/* Caller ensures prog, cond, sample_pos, old_pos != NULL. */
+
+	if (cond->has_skip && samplenum < cond->skip_samplenum)
+		return FALSE;
+
+	if (cond->never_matches)
+		return FALSE;
+
+	check = &prog->checks[cond->first_check];
+	for (i = 0; i < cond->num_checks; i++, check++) {
+		sample = sample_pos[check->offset];
+		if ((sample ^ check->level_value) & check->level_mask)
+			return FALSE;
+		if ((sample ^ old_pos[check->offset] ^ check->edge_value) &
+				check->edge_mask)
+			return FALSE;
+	}
+
+	return TRUE;
+}
+
+/**
+ * Get the number of samples which cannot match because of skip terms.
+ *
+ * @param prog The condition program. Must not be NULL.
+ * @param samplenum The absolute sample number to start from.
+ * @param all_skip Will be set to TRUE when all conditions which can
+ *                 match are waiting for their skip term.
+ *
+ * @return The number of samples from 'samplenum' on, which no skip term
+ *         allows to match. Zero when a condition consisting only of a
+ *         satisfied skip term matches right away.
+ */
+static uint64_t skip_distance(const struct srd_cond_prog *prog,
+		uint64_t samplenum, gboolean *all_skip)
+{
+	const struct srd_condition *cond;
+	uint64_t distance;
+	unsigned int i;
+
+	/* Caller ensures prog != NULL, all_skip != NULL. */
+
+	distance = G_MAXUINT64;
+	*all_skip = TRUE;
+	for (i = 0; i < prog->num_conds; i++) {
+		cond = &prog->conds[i];
+		if (cond->is_empty || cond->never_matches)
+			continue;
+		if (cond->has_skip && samplenum < cond->skip_samplenum)
+			distance = MIN(distance, cond->skip_samplenum - samplenum);
+		else if (!cond->num_checks)
+			return 0;
+		else
+			*all_skip = FALSE;
+	}
+
+	return distance;
+}
+
+static void update_old_pins_array(struct srd_decoder_inst *di,
+		const uint8_t *sample_pos)
+{
+	const struct srd_pin *pin;
+	int i;
+
+	if (!di || !di->dec_pins || !sample_pos)
+		return;
+
+	for (i = 0, pin = di->dec_pins; i < di->dec_num_channels; i++, pin++) {
+		if (pin->offset < 0)
+			continue;
+		di->old_pins_array->data[i] = (sample_pos[pin->offset] & pin->mask) ? 1 : 0;
+	}
+}
+
+/* Get the index of the run which contains a sample of an RLE chunk. */
+static uint64_t chunk_run_find(const struct srd_chunk *chunk,
+		uint64_t samplenum)
+{
+	uint64_t lo, hi, mid;
+
+	lo = 0;
+	hi = chunk->num_runs;
+	while (hi - lo > 1) {
+		mid = lo + (hi - lo) / 2;
+		if (chunk->samplenums[mid] <= samplenum)
+			lo = mid;
+		else
+			hi = mid;
+	}
+
+	return lo;
+}
+
+/**
+ * Get the instance's current sample (at abs_cur_samplenum).
+ *
+ * @param di The decoder instance. Must not be NULL, and must have
+ *           a chunk of samples which contains the current sample.
+ *
+ * @return Pointer to the sample, data_unitsize bytes.
+ *
+ * @private
+ */
+SRD_PRIV const uint8_t *srd_inst_cur_sample(const struct srd_decoder_inst *di)
+{
+	uint64_t idx;
+
+	if (di->chunk && di->chunk->samplenums)
+		idx = chunk_run_find(di->chunk, di->abs_cur_samplenum);
+	else
+		idx = di->abs_cur_samplenum - di->abs_start_samplenum;
+
+	return di->inbuf + idx * di->data_unitsize;
+}
+
+/**
+ * Move the current sample back to an earlier sample of the current chunk.
+ *
+ * The "old" pin values become those of that sample, like after wait()
+ * matched there.
+ *
+ * @param di The decoder instance. Must not be NULL.
+ * @param samplenum The absolute sample number, within the current chunk.
+ *
+ * @private
+ */
+SRD_PRIV void srd_inst_rewind(struct srd_decoder_inst *di, uint64_t samplenum)
+{
+	di->abs_cur_samplenum = samplenum;
+	update_old_pins_array(di, srd_inst_cur_sample(di));
+}
+
+static void update_old_pins_array_initial_pins(struct srd_decoder_inst *di)
+{
+	const struct srd_pin *pin;
+	const uint8_t *sample_pos;
+	int i;
+
+	if (!di || !di->dec_pins)
+		return;
+
+	sample_pos = srd_inst_cur_sample(di);
+
+	for (i = 0, pin = di->dec_pins; i < di->dec_num_channels; i++, pin++) {
+		if (di->old_pins_array->data[i] != SRD_INITIAL_PIN_SAME_AS_SAMPLE0)
+			continue;
+		if (pin->offset < 0)
+			continue;
+		di->old_pins_array->data[i] = (sample_pos[pin->offset] & pin->mask) ? 1 : 0;
+	}
+}
+
+/**
+ * Lay out the "old" pin values like a sample, for the first sample of
+ * a chunk (which has no previous sample in the chunk).
+ */
+static void fill_old_sample(const struct srd_decoder_inst *di,
+		struct srd_cond_prog *prog)
+{
+	const struct srd_pin *pin;
+	int i;
+
+	/* Caller ensures di != NULL, prog != NULL. */
+
+	memset(prog->old_sample, 0, prog->unitsize);
+	for (i = 0, pin = di->dec_pins; i < di->dec_num_channels; i++, pin++) {
+		if (pin->offset < 0 || pin->offset >= prog->unitsize)
+			continue;
+		if (di->old_pins_array->data[i] == 1)
+			prog->old_sample[pin->offset] |= pin->mask;
+	}
+}
+
+/** @cond PRIVATE */
+
+/* Max. number of distinct sample bytes the scanner can watch. */
+#define SCAN_MAX_BYTES 8
+
+/**
+ * Byte masks for the sample scanner.
+ *
+ * Every condition contributes one "anchor" term, which must be true in
+ * any sample that satisfies the condition. A sample where none of the
+ * anchors are true cannot match, and needs not be checked in detail.
+ */
+struct scan_plan {
+	unsigned int num_bytes;
+	int offset[SCAN_MAX_BYTES];
+	uint8_t edge[SCAN_MAX_BYTES];
+	uint8_t high[SCAN_MAX_BYTES];
+	uint8_t low[SCAN_MAX_BYTES];
+	/* Masks replicated to all samples in a 64bit word (if applicable). */
+	unsigned int samples_per_word;
+	uint64_t edge_word, high_word, low_word;
+};
+
+/** @endcond */
+
+static gboolean scan_plan_add(struct scan_plan *plan, int offset,
+		uint8_t edge, uint8_t high, uint8_t low)
+{
+	unsigned int i;
+
+	for (i = 0; i < plan->num_bytes; i++) {
+		if (plan->offset[i] == offset)
+			break;
+	}
+	if (i == plan->num_bytes) {
+		if (plan->num_bytes == SCAN_MAX_BYTES)
+			return FALSE;
+		plan->offset[i] = offset;
+		plan->edge[i] = plan->high[i] = plan->low[i] = 0;
+		plan->num_bytes++;
+	}
+	plan->edge[i] |= edge;
+	plan->high[i] |= high;
+	plan->low[i] |= low;
+
+	return TRUE;
+}
+
+/**
+ * Prepare the sample scanner for the current condition program.
+ *
+ * The scanner is only used when each condition with checks has at least
+ * one edge or level check (which becomes the condition's anchor).
+ * Conditions which only skip samples are handled by skip_distance().
+ *
+ * @param prog The condition program. Must not be NULL.
+ * @param plan The scanner masks to fill in. Must not be NULL.
+ *
+ * @retval TRUE The scanner can be used for the current condition list.
+ * @retval FALSE Samples must be checked one by one.
+ */
+static gboolean scan_plan_prepare(const struct srd_cond_prog *prog,
+		struct scan_plan *plan)
+{
+	const struct srd_condition *cond;
+	const struct srd_cond_check *check, *anchor;
+	int offset;
+	unsigned int i, j, k;
+	uint8_t bit, edge, high, low, lanes[8];
+
+	/* Caller ensures prog != NULL, plan != NULL. */
+
+	plan->num_bytes = 0;
+	plan->samples_per_word = 0;
+
+	for (i = 0; i < prog->num_conds; i++) {
+		cond = &prog->conds[i];
+		if (cond->is_empty || cond->never_matches || !cond->num_checks)
+			continue;
+		/* Edges are rare, prefer them over levels. */
+		anchor = NULL;
+		for (j = 0; j < cond->num_checks; j++) {
+			check = &prog->checks[cond->first_check + j];
+			if (check->edge_mask & check->edge_value) {
+				anchor = check;
+				break;
+			}
+			if (!anchor && check->level_mask)
+				anchor = check;
+		}
+		if (!anchor)
+			return FALSE;
+		edge = high = low = 0;
+		if (anchor->edge_mask & anchor->edge_value) {
+			bit = anchor->edge_mask & anchor->edge_value;
+			edge = bit & -bit;
+		} else {
+			bit = anchor->level_mask & -anchor->level_mask;
+			if (anchor->level_value & bit)
+				high = bit;
+			else
+				low = bit;
+		}
+		if (!scan_plan_add(plan, anchor->offset, edge, high, low))
+			return FALSE;
+	}
+
+	if (!plan->num_bytes)
+		return FALSE;
+
+	/*
+	 * Replicate the masks to every sample in a 64bit word, when an
+	 * integral number of samples fits into one word.
+	 */
+	if (prog->unitsize > 8 || 8 % prog->unitsize)
+		return TRUE;
+	plan->samples_per_word = 8 / prog->unitsize;
+	plan->edge_word = plan->high_word = plan->low_word = 0;
+	for (k = 0; k < 3; k++) {
+		memset(lanes, 0, sizeof(lanes));
+		for (i = 0; i < plan->num_bytes; i++) {
+			for (j = 0; j < plan->samples_per_word; j++) {
+				offset = j * prog->unitsize + plan->offset[i];
+				lanes[offset] = (k == 0) ? plan->edge[i] :
+					(k == 1) ? plan->high[i] : plan->low[i];
+			}
+		}
+		memcpy((k == 0) ? &plan->edge_word : (k == 1) ?
+			&plan->high_word : &plan->low_word, lanes, sizeof(lanes));
+	}
+
+	return TRUE;
+}
+
+static gboolean scan_sample_is_candidate(const struct scan_plan *plan,
+		const uint8_t *sample_pos, const uint8_t *prev_pos)
+{
+	unsigned int i;
+	uint8_t cur;
+
+	for (i = 0; i < plan->num_bytes; i++) {
+		cur = sample_pos[plan->offset[i]];
+		if ((cur ^ prev_pos[plan->offset[i]]) & plan->edge[i])
+			return TRUE;
+		if (cur & plan->high[i])
+			return TRUE;
+		if (~cur & plan->low[i])
+			return TRUE;
 	}
 
 	return FALSE;
 }
 
-static gboolean find_match(struct srd_decoder_inst *di)
+/**
+ * Find the next sample which may match one of the conditions.
+ *
+ * Samples get checked a 64bit word at a time where possible, the
+ * remainder (and the word which contains a candidate) gets checked
+ * one sample at a time.
+ *
+ * @param di The decoder instance. Must not be NULL.
+ * @param plan The scanner masks. Must not be NULL.
+ * @param idx Index of the first sample to check, relative to the start
+ *            of the current chunk. Must be > 0 (the previous sample is
+ *            taken from the chunk).
+ * @param num_samples Number of samples in the current chunk.
+ *
+ * @return The index of the first candidate sample (relative to the
+ *         start of the chunk), or num_samples if there is none.
+ */
+static uint64_t scan_for_candidate(const struct srd_decoder_inst *di,
+		const struct scan_plan *plan, uint64_t idx, uint64_t num_samples)
 {
-	static uint64_t s = 0;
-	uint64_t i, j, num_samples_to_process;
-	GSList *l, *cond;
 	const uint8_t *sample_pos;
-	unsigned int num_conditions;
+	uint64_t word, prev_word;
+	unsigned int unitsize;
+
+	/* Caller ensures di != NULL, plan != NULL, idx > 0. */
+
+	unitsize = di->data_unitsize;
+	sample_pos = di->inbuf + idx * unitsize;
+
+	if (plan->samples_per_word) {
+		while (idx + plan->samples_per_word <= num_samples) {
+			memcpy(&word, sample_pos, sizeof(word));
+			memcpy(&prev_word, sample_pos - unitsize, sizeof(prev_word));
+			if (((word ^ prev_word) & plan->edge_word) |
+					(word & plan->high_word) |
+					(~word & plan->low_word))
+				break;
+			idx += plan->samples_per_word;
+			sample_pos += sizeof(word);
+		}
+	}
+
+	while (idx < num_samples) {
+		if (scan_sample_is_candidate(plan, sample_pos,
+				sample_pos - unitsize))
+			break;
+		idx++;
+		sample_pos += unitsize;
+	}
+
+	return idx;
+}
+
+/**
+ * Check a sample against all conditions, and record which matched.
+ *
+ * @retval TRUE At least one condition matched.
+ * @retval FALSE No condition matched.
+ */
+static gboolean match_sample(struct srd_cond_prog *prog, uint64_t samplenum,
+		const uint8_t *sample_pos, const uint8_t *old_pos)
+{
+	struct srd_condition *cond;
+	unsigned int j;
+	gboolean found;
+
+	/* Caller ensures prog, sample_pos, old_pos != NULL. */
+
+	found = FALSE;
+	for (j = 0; j < prog->num_conds; j++) {
+		cond = &prog->conds[j];
+		prog->matched[j] = !cond->is_empty &&
+			condition_matches(prog, cond, samplenum,
+				sample_pos, old_pos);
+		if (prog->matched[j])
+			found = TRUE;
+	}
+
+	return found;
+}
+
+/**
+ * Find the first sample in a run (after its first sample) which matches
+ * any condition.
+ *
+ * All these samples are equal to their predecessor, so a condition either
+ * never matches within the run (edges), or from the first sample on which
+ * its skip term is satisfied.
+ *
+ * @param prog The condition program. Must not be NULL.
+ * @param start The first sample to check.
+ * @param end The end of the run.
+ * @param sample_pos The run's sample value. Must not be NULL.
+ *
+ * @return The matching sample, or 'end' if there is none.
+ */
+static uint64_t run_find_match(const struct srd_cond_prog *prog,
+		uint64_t start, uint64_t end, const uint8_t *sample_pos)
+{
+	const struct srd_condition *cond;
+	uint64_t first, samplenum;
+	unsigned int j;
+
+	/* Caller ensures prog, sample_pos != NULL. */
+
+	first = end;
+	for (j = 0; j < prog->num_conds; j++) {
+		cond = &prog->conds[j];
+		if (cond->is_empty)
+			continue;
+		/* Check the levels and edges, ignoring the skip term. */
+		if (!condition_matches(prog, cond, G_MAXUINT64, sample_pos,
+				sample_pos))
+			continue;
+		samplenum = start;
+		if (cond->has_skip)
+			samplenum = MAX(samplenum, cond->skip_samplenum);
+		first = MIN(first, samplenum);
+	}
+
+	return first;
+}
+
+/**
+ * Find a match in a run-length encoded chunk.
+ *
+ * Only the first sample of a run can have edges. Within a run, the
+ * samples are checked at once by run_find_match(), so the time taken
+ * depends on the number of runs, not the number of samples.
+ */
+static gboolean find_match_runs(struct srd_decoder_inst *di,
+		struct srd_cond_prog *prog)
+{
+	const struct srd_chunk *chunk;
+	const uint8_t *sample_pos, *old_pos;
+	uint64_t run, samplenum, run_end;
+	gboolean found;
+
+	/* Caller ensures di, prog != NULL and an RLE chunk. */
+
+	chunk = di->chunk;
+	run = chunk_run_find(chunk, di->abs_cur_samplenum);
+	samplenum = di->abs_cur_samplenum;
+	sample_pos = di->inbuf + run * di->data_unitsize;
+	old_pos = prog->old_sample;
+	found = FALSE;
+
+	while (TRUE) {
+		/* The first sample gets compared against the "old" pins. */
+		if (match_sample(prog, samplenum, sample_pos, old_pos)) {
+			found = TRUE;
+			break;
+		}
+
+		run_end = (run + 1 < chunk->num_runs) ?
+			chunk->samplenums[run + 1] : di->abs_end_samplenum;
+		samplenum = run_find_match(prog, samplenum + 1, run_end,
+			sample_pos);
+		if (samplenum < run_end) {
+			found = match_sample(prog, samplenum, sample_pos,
+				sample_pos);
+			break;
+		}
+		if (run_end >= di->abs_end_samplenum) {
+			samplenum = di->abs_end_samplenum;
+			break;
+		}
+
+		/* The next run's first sample. */
+		old_pos = sample_pos;
+		sample_pos += di->data_unitsize;
+		run++;
+	}
+
+	di->abs_cur_samplenum = samplenum;
+	prog->have_matched = found;
+
+	/* Keep the pin values of the last checked sample. */
+	update_old_pins_array(di, sample_pos);
+
+	return found;
+}
+
+/* Min. number of samples for which checking a chunk for steady bits pays. */
+#define STEADY_MIN_SAMPLES 64
+
+/*
+ * Find the bits which are the same in all samples of a chunk, comparing
+ * a 64bit word at a time where possible. Stops early when all bits
+ * change.
+ */
+static uint8_t *chunk_steady_bits_find(const struct srd_chunk *chunk)
+{
+	const uint8_t *sample_pos, *end;
+	uint8_t *steady, lanes[8];
+	uint64_t word, ref, diff;
+	unsigned int i, unitsize;
+
+	unitsize = chunk->unitsize;
+	steady = g_malloc0(unitsize);
+	sample_pos = chunk->inbuf;
+	end = chunk->inbuf + chunk->inbuflen / unitsize * unitsize;
+
+	if (unitsize <= 8 && 8 % unitsize == 0) {
+		for (i = 0; i < sizeof(lanes); i++)
+			lanes[i] = chunk->inbuf[i % unitsize];
+		memcpy(&ref, lanes, sizeof(ref));
+		diff = 0;
+		while (sample_pos + sizeof(word) <= end && diff != G_MAXUINT64) {
+			memcpy(&word, sample_pos, sizeof(word));
+			diff |= word ^ ref;
+			sample_pos += sizeof(word);
+		}
+		memcpy(lanes, &diff, sizeof(lanes));
+		for (i = 0; i < sizeof(lanes); i++)
+			steady[i % unitsize] |= lanes[i];
+	}
+	for (i = 0; sample_pos < end; sample_pos++) {
+		steady[i] |= *sample_pos ^ chunk->inbuf[i];
+		if (++i == unitsize)
+			i = 0;
+	}
+	for (i = 0; i < unitsize; i++)
+		steady[i] = ~steady[i];
+
+	return steady;
+}
+
+/**
+ * Check whether none of the bits which the conditions check changes
+ * within the current chunk.
+ *
+ * The chunk's steady bits get computed once, by the first stack which
+ * needs them, and are shared by all stacks and wait() calls. Afterwards
+ * the check takes one step per condition check, not per sample.
+ *
+ * @param di The decoder instance. Must not be NULL.
+ * @param prog The condition program. Must not be NULL.
+ * @param num_samples The number of samples which are left to check.
+ *
+ * @retval TRUE The checked bits are the same in all samples of the chunk.
+ * @retval FALSE They change, or the chunk is too short to tell.
+ */
+static gboolean chunk_is_steady(const struct srd_decoder_inst *di,
+		const struct srd_cond_prog *prog, uint64_t num_samples)
+{
+	struct srd_chunk *chunk;
+	const struct srd_cond_check *check;
+	unsigned int i;
+
+	/* Caller ensures di != NULL, prog != NULL. */
+
+	chunk = di->chunk;
+	if (!chunk || chunk->samplenums || num_samples < STEADY_MIN_SAMPLES)
+		return FALSE;
+	if (chunk->unitsize != (uint64_t)di->data_unitsize)
+		return FALSE;
+
+	if (g_once_init_enter(&chunk->steady_bits))
+		g_once_init_leave(&chunk->steady_bits,
+			chunk_steady_bits_find(chunk));
+
+	for (i = 0, check = prog->checks; i < prog->num_checks; i++, check++) {
+		if ((check->level_mask | check->edge_mask) &
+				~chunk->steady_bits[check->offset])
+			return FALSE;
+	}
+
+	return TRUE;
+}
+
+static gboolean find_match(struct srd_decoder_inst *di)
+{
+	uint64_t i, num_samples_to_process, rel, step;
+	const uint8_t *sample_pos, *old_pos;
+	struct srd_cond_prog *prog;
+	struct scan_plan plan;
+	gboolean use_scanner, all_skip, found;
 
 	/* Caller ensures di != NULL. */
 
+	prog = di->condition_list;
+
 	/* Check whether the condition list is NULL/empty. */
-	if (!di->condition_list) {
+	if (!prog) {
 		srd_dbg("NULL/empty condition list, automatic match.");
 		return TRUE;
 	}
 
 	/* Check whether we have any non-NULL conditions. */
-	if (!have_non_null_conds(di)) {
+	if (!have_non_null_conds(prog)) {
 		srd_dbg("Only NULL conditions in list, automatic match.");
 		return TRUE;
 	}
 
 	num_samples_to_process = di->abs_end_samplenum - di->abs_cur_samplenum;
-	num_conditions = g_slist_length(di->condition_list);
+	if (!num_samples_to_process)
+		return FALSE;
 
-	/* di->match_array is NULL here. Create a new GArray. */
-	di->match_array = g_array_sized_new(FALSE, TRUE, sizeof(gboolean), num_conditions);
-	g_array_set_size(di->match_array, num_conditions);
+	if (prog->unitsize != di->data_unitsize)
+		cond_prog_link(di, prog);
 
 	/* Sample 0: Set di->old_pins_array for SRD_INITIAL_PIN_SAME_AS_SAMPLE0 pins. */
 	if (di->abs_cur_samplenum == 0)
 		update_old_pins_array_initial_pins(di);
 
-	for (i = 0, s = 0; i < num_samples_to_process; i++, s++, (di->abs_cur_samplenum)++) {
+	/*
+	 * The first sample gets compared against the "old" pin values,
+	 * all others against their preceding sample in the chunk.
+	 */
+	fill_old_sample(di, prog);
+	old_pos = prog->old_sample;
 
-		sample_pos = di->inbuf + ((di->abs_cur_samplenum - di->abs_start_samplenum) * di->data_unitsize);
+	if (di->chunk && di->chunk->samplenums)
+		return find_match_runs(di, prog);
 
-		/* Check whether the current sample matches at least one of the conditions (logical OR). */
-		/* IMPORTANT: We need to check all conditions, even if there was a match already! */
-		for (l = di->condition_list, j = 0; l; l = l->next, j++) {
-			cond = l->data;
-			if (!cond)
-				continue;
-			/* All terms in 'cond' must match (logical AND). */
-			di->match_array->data[j] = all_terms_match(di, cond, sample_pos);
+	use_scanner = scan_plan_prepare(prog, &plan);
+
+	rel = di->abs_cur_samplenum - di->abs_start_samplenum;
+	sample_pos = di->inbuf + (rel * di->data_unitsize);
+	found = FALSE;
+
+	for (i = 0; i < num_samples_to_process; ) {
+		/*
+		 * Skip over samples which cannot match any condition: those
+		 * before the next skip term's sample, and those in which the
+		 * scanner finds no anchor. The scanner does not check the
+		 * first sample, since the "old" pin values need not be those
+		 * of the previous sample.
+		 */
+		step = skip_distance(prog, di->abs_start_samplenum + rel, &all_skip);
+		step = MIN(step, num_samples_to_process - i);
+		if (!all_skip) {
+			if (use_scanner && i > 0 && step > 0)
+				step = scan_for_candidate(di, &plan, rel, rel + step) - rel;
+			else
+				step = 0;
+		}
+		if (step > 0) {
+			i += step;
+			rel += step;
+			if (i == num_samples_to_process)
+				break;
+			sample_pos = di->inbuf + (rel * di->data_unitsize);
+			old_pos = sample_pos - di->data_unitsize;
 		}
 
-		update_old_pins_array(di, sample_pos);
+		/* Check whether the current sample matches at least one of the conditions (logical OR). */
+		/* IMPORTANT: We need to check all conditions, even if there was a match already! */
+		found = match_sample(prog, di->abs_start_samplenum + rel,
+			sample_pos, old_pos);
 
 		/* If at least one condition matched we're done. */
-		if (at_least_one_condition_matched(di, num_conditions))
-			return TRUE;
+		if (found)
+			break;
+
+		/*
+		 * When the checked channels don't change within the chunk,
+		 * the rest of it is a run of the first sample: only skip
+		 * terms can make conditions match, at a known sample.
+		 */
+		if (i == 0 && chunk_is_steady(di, prog, num_samples_to_process)) {
+			step = run_find_match(prog, di->abs_start_samplenum + rel + 1,
+				di->abs_end_samplenum, sample_pos);
+			step -= di->abs_start_samplenum + rel;
+			i += step;
+			rel += step;
+			if (i == num_samples_to_process)
+				break;
+			sample_pos = di->inbuf + (rel * di->data_unitsize);
+			old_pos = sample_pos - di->data_unitsize;
+			found = match_sample(prog, di->abs_start_samplenum + rel,
+				sample_pos, old_pos);
+			break;
+		}
+
+		old_pos = sample_pos;
+		sample_pos += di->data_unitsize;
+		rel++;
+		i++;
 	}
 
-	return FALSE;
+	di->abs_cur_samplenum += i;
+	prog->have_matched = found;
+
+	/* Keep the pin values of the last checked sample. */
+	if (!found)
+		sample_pos = di->inbuf + ((rel - 1) * di->data_unitsize);
+	update_old_pins_array(di, sample_pos);
+
+	return found;
 }
 
 /**
@@ -1005,6 +2005,9 @@ static gboolean find_match(struct srd_decoder_inst *di)
  */
 SRD_PRIV int process_samples_until_condition_match(struct srd_decoder_inst *di, gboolean *found_match)
 {
+	uint64_t start;
+	int64_t trace_start;
+
 	if (!di || !found_match)
 		return SRD_ERR_ARG;
 
@@ -1012,6 +2015,9 @@ SRD_PRIV int process_samples_until_condition_match(struct srd_decoder_inst *di,
 	if (di->want_wait_terminate)
 		return SRD_OK;
 
+	start = di->abs_cur_samplenum;
+	trace_start = di->trace ? srd_trace_time() : 0;
+
 	/* Check if any of the current condition(s) match. */
 	while (TRUE) {
 		/* Feed the (next chunk of the) buffer to find_match(). */
@@ -1022,7 +2028,7 @@ SRD_PRIV int process_samples_until_condition_match(struct srd_decoder_inst *di,
 			srd_dbg("Done, handled all samples (abs cur %" PRIu64
 				" / abs end %" PRIu64 ").",
 				di->abs_cur_samplenum, di->abs_end_samplenum);
-			return SRD_OK;
+			break;
 		}
 
 		/* If we didn't find a match, continue looking. */
@@ -1030,9 +2036,16 @@ SRD_PRIV int process_samples_until_condition_match(struct srd_decoder_inst *di,
 			continue;
 
 		/* At least one condition matched, return. */
-		return SRD_OK;
+		break;
 	}
 
+	di->stats.samples_scanned += di->abs_cur_samplenum - start;
+	if (*found_match)
+		di->stats.matches++;
+	if (di->trace)
+		srd_trace_event(di->trace, SRD_TRACE_MATCH, di->inst_id,
+			trace_start, start, di->abs_cur_samplenum);
+
 	return SRD_OK;
 }
 
@@ -1066,11 +2079,26 @@ static gpointer di_thread(gpointer data)
 	 */
 	Py_IncRef(di->py_inst);
 	srd_dbg("%s: Calling decode() method.", di->inst_id);
+	di->stats_cpu_start = srd_thread_cpu_time() - di->stats.cpu_time;
+	di->stats_mark = g_get_monotonic_time();
+	if (di->trace) {
+		di->trace_mark = srd_trace_time();
+		di->trace_mark_samplenum = di->abs_cur_samplenum;
+	}
 	py_res = PyObject_CallMethod(di->py_inst, "decode", NULL);
+	di->stats.python_time += g_get_monotonic_time() - di->stats_mark;
+	if (di->trace)
+		srd_trace_event(di->trace, SRD_TRACE_DECODE, di->inst_id,
+			di->trace_mark, di->trace_mark_samplenum,
+			di->abs_cur_samplenum);
+	di->stats.cpu_time = srd_thread_cpu_time() - di->stats_cpu_start;
 	srd_dbg("%s: decode() method terminated.", di->inst_id);
 
+	/* Deliver the annotations which were put() before termination. */
+	srd_inst_ann_batch_flush(di);
+
 	/*
-	 * Make sure to unblock potentially pending srd_inst_decode()
+	 * Make sure to unblock potentially pending srd_inst_decode_wait()
 	 * calls in application threads after the decode() method might
 	 * have terminated, while it neither has processed sample data
 	 * nor has terminated upon request. This happens e.g. when "need
@@ -1080,9 +2108,12 @@ static gpointer di_thread(gpointer data)
 	wanted_term = di->want_wait_terminate;
 	di->want_wait_terminate = TRUE;
 	di->handled_all_samples = TRUE;
-	g_cond_signal(&di->handled_all_samples_cond);
+	g_cond_broadcast(&di->handled_all_samples_cond);
 	g_mutex_unlock(&di->data_mutex);
 
+	/* Hand buffers of chunks which won't get decoded back. */
+	srd_inst_chunks_flush(di);
+
 	/*
 	 * Check for the termination cause of the decode() method.
 	 * Though this is mostly for information.
@@ -1128,43 +2159,12 @@ static gpointer di_thread(gpointer data)
 }
 
 /**
- * Decode a chunk of samples.
- *
- * The calls to this function must provide the samples that shall be
- * used by the protocol decoder
- *  - in the correct order ([...]5, 6, 4, 7, 8[...] is a bug),
- *  - starting from sample zero (2, 3, 4, 5, 6[...] is a bug),
- *  - consecutively, with no gaps (0, 1, 2, 4, 5[...] is a bug).
- *
- * The start- and end-sample numbers are absolute sample numbers (relative
- * to the start of the whole capture/file/stream), i.e. they are not relative
- * sample numbers within the chunk specified by 'inbuf' and 'inbuflen'.
- *
- * Correct example (4096 samples total, 4 chunks @ 1024 samples each):
- *   srd_inst_decode(di, 0,    1024, inbuf, 1024, 1);
- *   srd_inst_decode(di, 1024, 2048, inbuf, 1024, 1);
- *   srd_inst_decode(di, 2048, 3072, inbuf, 1024, 1);
- *   srd_inst_decode(di, 3072, 4096, inbuf, 1024, 1);
- *
- * The chunk size ('inbuflen') can be arbitrary and can differ between calls.
- *
- * Correct example (4096 samples total, 7 chunks @ various samples each):
- *   srd_inst_decode(di, 0,    1024, inbuf, 1024, 1);
- *   srd_inst_decode(di, 1024, 1124, inbuf,  100, 1);
- *   srd_inst_decode(di, 1124, 1424, inbuf,  300, 1);
- *   srd_inst_decode(di, 1424, 1643, inbuf,  219, 1);
- *   srd_inst_decode(di, 1643, 2048, inbuf,  405, 1);
- *   srd_inst_decode(di, 2048, 3072, inbuf, 1024, 1);
- *   srd_inst_decode(di, 3072, 4096, inbuf, 1024, 1);
- *
- * INCORRECT example (4096 samples total, 4 chunks @ 1024 samples each, but
- * the start- and end-samplenumbers are not absolute):
- *   srd_inst_decode(di, 0,    1024, inbuf, 1024, 1);
- *   srd_inst_decode(di, 0,    1024, inbuf, 1024, 1);
- *   srd_inst_decode(di, 0,    1024, inbuf, 1024, 1);
- *   srd_inst_decode(di, 0,    1024, inbuf, 1024, 1);
- *
- * @param di The decoder instance to call. Must not be NULL.
+ * Create a chunk of input samples.
+ *
+ * The chunk holds one reference, which the caller must drop with
+ * srd_chunk_unref(). The release callback gets invoked when the last
+ * reference was dropped.
+ *
  * @param abs_start_samplenum The absolute starting sample number for the
  * 		buffer's sample set, relative to the start of capture.
  * @param abs_end_samplenum The absolute ending sample number for the
@@ -1172,85 +2172,346 @@ static gpointer di_thread(gpointer data)
  * @param inbuf The buffer to decode. Must not be NULL.
  * @param inbuflen Length of the buffer. Must be > 0.
  * @param unitsize The number of bytes per sample. Must be > 0.
+ * @param cb The function to call when the buffer is no longer used.
+ * 		Can be NULL.
+ * @param cb_data Private data for the release callback. Can be NULL.
  *
- * @return SRD_OK upon success, a (negative) error code otherwise.
+ * @return The new chunk, or NULL upon unusable input.
  *
  * @private
  */
-SRD_PRIV int srd_inst_decode(struct srd_decoder_inst *di,
-		uint64_t abs_start_samplenum, uint64_t abs_end_samplenum,
-		const uint8_t *inbuf, uint64_t inbuflen, uint64_t unitsize)
+SRD_PRIV struct srd_chunk *srd_chunk_new(uint64_t abs_start_samplenum,
+		uint64_t abs_end_samplenum, const uint8_t *inbuf,
+		uint64_t inbuflen, uint64_t unitsize,
+		srd_chunk_release_callback cb, void *cb_data)
 {
+	struct srd_chunk *chunk;
+
 	/* Return an error upon unusable input. */
-	if (!di) {
-		srd_dbg("empty decoder instance");
-		return SRD_ERR_ARG;
-	}
 	if (!inbuf) {
 		srd_dbg("NULL buffer pointer");
-		return SRD_ERR_ARG;
+		return NULL;
 	}
 	if (inbuflen == 0) {
 		srd_dbg("empty buffer");
-		return SRD_ERR_ARG;
+		return NULL;
 	}
 	if (unitsize == 0) {
 		srd_dbg("unitsize 0");
-		return SRD_ERR_ARG;
+		return NULL;
+	}
+	if (abs_end_samplenum < abs_start_samplenum) {
+		srd_dbg("Incorrect sample numbers: start=%" PRIu64 ", end=%"
+			PRIu64 ".", abs_start_samplenum, abs_end_samplenum);
+		return NULL;
 	}
 
-	if (abs_start_samplenum != di->abs_cur_samplenum ||
-	    abs_end_samplenum < abs_start_samplenum) {
-		srd_dbg("Incorrect sample numbers: start=%" PRIu64 ", cur=%"
-			PRIu64 ", end=%" PRIu64 ".", abs_start_samplenum,
-			di->abs_cur_samplenum, abs_end_samplenum);
-		return SRD_ERR_ARG;
+	chunk = g_malloc(sizeof(struct srd_chunk));
+	chunk->refcount = 1;
+	chunk->abs_start_samplenum = abs_start_samplenum;
+	chunk->abs_end_samplenum = abs_end_samplenum;
+	chunk->inbuf = inbuf;
+	chunk->inbuflen = inbuflen;
+	chunk->unitsize = unitsize;
+	chunk->samplenums = NULL;
+	chunk->num_runs = 0;
+	chunk->steady_bits = NULL;
+	chunk->release_cb = cb;
+	chunk->cb_data = cb_data;
+
+	return chunk;
+}
+
+/**
+ * Drop a reference to a chunk of input samples.
+ *
+ * This must not be called while holding an instance's data mutex, as
+ * the release callback might get invoked.
+ *
+ * @param chunk The chunk. Can be NULL.
+ *
+ * @private
+ */
+SRD_PRIV void srd_chunk_unref(struct srd_chunk *chunk)
+{
+	if (!chunk)
+		return;
+	if (!g_atomic_int_dec_and_test(&chunk->refcount))
+		return;
+
+	if (chunk->release_cb)
+		chunk->release_cb(chunk->inbuf, chunk->cb_data);
+	g_free(chunk->steady_bits);
+	g_free(chunk);
+}
+
+/* Make a chunk the one which the worker thread handles. Needs the mutex. */
+static void srd_inst_chunk_set(struct srd_decoder_inst *di,
+		struct srd_chunk *chunk)
+{
+	di->chunk = chunk;
+	di->abs_start_samplenum = chunk->abs_start_samplenum;
+	di->abs_end_samplenum = chunk->abs_end_samplenum;
+	di->inbuf = chunk->inbuf;
+	di->inbuflen = chunk->inbuflen;
+	di->data_unitsize = chunk->unitsize;
+	di->got_new_samples = TRUE;
+	di->handled_all_samples = FALSE;
+}
+
+/**
+ * Have the worker thread continue with the next queued chunk (if any).
+ *
+ * Must be called with the instance's data mutex held. The returned chunk
+ * must be passed to srd_inst_chunk_release() after releasing the mutex.
+ *
+ * @param di The decoder instance. Must not be NULL.
+ *
+ * @return The chunk which the worker thread has finished, or NULL.
+ *
+ * @private
+ */
+SRD_PRIV struct srd_chunk *srd_inst_chunk_next(struct srd_decoder_inst *di)
+{
+	struct srd_chunk *done, *next;
+
+	done = di->chunk;
+
+	next = NULL;
+	if (!di->want_wait_terminate)
+		next = g_queue_pop_head(&di->chunk_queue);
+	if (next) {
+		srd_inst_chunk_set(di, next);
+	} else {
+		di->chunk = NULL;
+		di->got_new_samples = FALSE;
+		di->abs_start_samplenum = 0;
+		di->abs_end_samplenum = 0;
+		di->inbuf = NULL;
+		di->inbuflen = 0;
 	}
 
-	di->data_unitsize = unitsize;
+	return done;
+}
 
-	srd_dbg("Decoding: abs start sample %" PRIu64 ", abs end sample %"
-		PRIu64 " (%" PRIu64 " samples, %" PRIu64 " bytes, unitsize = "
-		"%d), instance %s.", abs_start_samplenum, abs_end_samplenum,
-		abs_end_samplenum - abs_start_samplenum, inbuflen, di->data_unitsize,
-		di->inst_id);
+/**
+ * Release a chunk which the worker thread has finished.
+ *
+ * Only then signal application threads that the instance is idle, or has
+ * space for another chunk. This way a buffer's release callback always
+ * ran before the application learns that its chunk got decoded.
+ *
+ * @param di The decoder instance. Must not be NULL.
+ * @param chunk The chunk returned by srd_inst_chunk_next(). Can be NULL.
+ *
+ * @private
+ */
+SRD_PRIV void srd_inst_chunk_release(struct srd_decoder_inst *di,
+		struct srd_chunk *chunk)
+{
+	srd_chunk_unref(chunk);
+
+	g_mutex_lock(&di->data_mutex);
+	if (!di->chunk)
+		di->handled_all_samples = TRUE;
+	g_cond_broadcast(&di->handled_all_samples_cond);
+	g_mutex_unlock(&di->data_mutex);
+}
+
+/**
+ * Pass the annotations collected by an instance's stack to the frontend's
+ * batch callback, and empty the batch.
+ *
+ * Must be called with the GIL held, from the stack's worker thread.
+ *
+ * @param di The decoder instance. Must not be NULL.
+ *
+ * @private
+ */
+SRD_PRIV void srd_inst_ann_batch_flush(struct srd_decoder_inst *di)
+{
+	struct srd_ann_batch *batch;
+	struct srd_session *sess;
+	unsigned int i;
+	int64_t start;
+
+	batch = di->ann_batch;
+	if (!batch || !batch->count)
+		return;
+
+	sess = di->sess;
+	start = di->trace ? srd_trace_time() : 0;
+	Py_BEGIN_ALLOW_THREADS
+	sess->ann_batch_cb(batch->pdata, batch->count, sess->ann_batch_cb_data);
+	Py_END_ALLOW_THREADS
+	if (di->trace)
+		srd_trace_event(di->trace, SRD_TRACE_CALLBACK, di->inst_id, start,
+			batch->pdata[0].start_sample,
+			batch->pdata[batch->count - 1].end_sample);
+
+	for (i = 0; i < batch->count; i++)
+		g_strfreev(batch->pda[i].ann_text);
+	batch->count = 0;
+}
+
+/* Drop the current and all queued chunks of an instance. */
+static void srd_inst_chunks_flush(struct srd_decoder_inst *di)
+{
+	struct srd_chunk *chunk;
+	GQueue chunks;
+
+	g_queue_init(&chunks);
+
+	g_mutex_lock(&di->data_mutex);
+	if (di->chunk)
+		g_queue_push_tail(&chunks, di->chunk);
+	di->chunk = NULL;
+	while ((chunk = g_queue_pop_head(&di->chunk_queue)))
+		g_queue_push_tail(&chunks, chunk);
+	g_mutex_unlock(&di->data_mutex);
+
+	while ((chunk = g_queue_pop_head(&chunks)))
+		srd_chunk_unref(chunk);
+}
+
+/**
+ * Hand a chunk of samples to the worker thread of a decoder instance.
+ *
+ * This returns without waiting for the samples to be handled, see
+ * srd_inst_decode_wait(). The instance takes its own reference to the
+ * chunk. When the worker thread is busy, the chunk gets queued after
+ * the chunks which were handed to the instance before.
+ *
+ * @param di The decoder instance. Must not be NULL.
+ * @param chunk The chunk of samples. Must not be NULL.
+ * @param max_chunks Wait until less than this many chunks are queued or
+ * 		being handled by the instance, 0 for no limit.
+ *
+ * @return SRD_OK upon success, a (negative) error code otherwise.
+ *
+ * @private
+ */
+SRD_PRIV int srd_inst_decode_start(struct srd_decoder_inst *di,
+		struct srd_chunk *chunk, unsigned int max_chunks)
+{
+	struct srd_chunk *last;
+	uint64_t next_samplenum;
+	int64_t start, trace_start;
+	gboolean blocked;
+
+	if (!di) {
+		srd_dbg("empty decoder instance");
+		return SRD_ERR_ARG;
+	}
+	if (!chunk)
+		return SRD_ERR_ARG;
 
 	/* If this is the first call, start the worker thread. */
 	if (!di->thread_handle) {
 		srd_dbg("No worker thread for this decoder stack "
 			"exists yet, creating one: %s.", di->inst_id);
+		di->want_wait_terminate = FALSE;
 		di->thread_handle = g_thread_new(di->inst_id,
 						 di_thread, di);
 	}
 
-	/* Push the new sample chunk to the worker thread. */
 	g_mutex_lock(&di->data_mutex);
-	di->abs_start_samplenum = abs_start_samplenum;
-	di->abs_end_samplenum = abs_end_samplenum;
-	di->inbuf = inbuf;
-	di->inbuflen = inbuflen;
-	di->got_new_samples = TRUE;
-	di->handled_all_samples = FALSE;
-	di->want_wait_terminate = FALSE;
 
-	/* Signal the thread that we have new data. */
-	g_cond_signal(&di->got_new_samples_cond);
+	/* Apply backpressure: wait for the worker thread to catch up. */
+	start = g_get_monotonic_time();
+	trace_start = di->sess->trace ? srd_trace_time() : 0;
+	blocked = FALSE;
+	while (max_chunks && !di->want_wait_terminate &&
+	       g_queue_get_length(&di->chunk_queue) + 1 >= max_chunks &&
+	       di->chunk) {
+		g_cond_wait(&di->handled_all_samples_cond, &di->data_mutex);
+		blocked = TRUE;
+	}
+	di->stats.send_wait_time += g_get_monotonic_time() - start;
+	if (blocked && di->sess->trace)
+		srd_trace_event(di->sess->trace, SRD_TRACE_SEND_WAIT,
+			di->inst_id, trace_start, chunk->abs_start_samplenum,
+			chunk->abs_end_samplenum);
+
+	/* The worker thread only terminates on its own when decode() died. */
+	if (di->want_wait_terminate) {
+		g_mutex_unlock(&di->data_mutex);
+		srd_dbg("%s: Decoder thread terminated.", di->inst_id);
+		return SRD_ERR;
+	}
+
+	/* The chunk must continue where previous chunks ended. */
+	last = g_queue_peek_tail(&di->chunk_queue);
+	if (!last)
+		last = di->chunk;
+	next_samplenum = last ? last->abs_end_samplenum : di->abs_cur_samplenum;
+	if (chunk->abs_start_samplenum != next_samplenum) {
+		g_mutex_unlock(&di->data_mutex);
+		srd_dbg("Incorrect sample numbers: start=%" PRIu64 ", cur=%"
+			PRIu64 ", end=%" PRIu64 ".", chunk->abs_start_samplenum,
+			next_samplenum, chunk->abs_end_samplenum);
+		return SRD_ERR_ARG;
+	}
+
+	srd_dbg("Decoding: abs start sample %" PRIu64 ", abs end sample %"
+		PRIu64 " (%" PRIu64 " samples, %" PRIu64 " bytes, unitsize = "
+		"%" PRIu64 "), instance %s.", chunk->abs_start_samplenum,
+		chunk->abs_end_samplenum,
+		chunk->abs_end_samplenum - chunk->abs_start_samplenum,
+		chunk->inbuflen, chunk->unitsize, di->inst_id);
+
+	/* Push the new sample chunk to the worker thread, or queue it. */
+	g_atomic_int_inc(&chunk->refcount);
+	if (di->chunk) {
+		g_queue_push_tail(&di->chunk_queue, chunk);
+	} else {
+		srd_inst_chunk_set(di, chunk);
+		/* Signal the thread that we have new data. */
+		g_cond_signal(&di->got_new_samples_cond);
+	}
 	g_mutex_unlock(&di->data_mutex);
 
-	/* When all samples in this chunk were handled, return. */
+	return SRD_OK;
+}
+
+/**
+ * Wait until the worker thread handled all chunks which were handed
+ * to the instance.
+ *
+ * @param di The decoder instance. Must not be NULL.
+ *
+ * @private
+ */
+SRD_PRIV void srd_inst_decode_wait(struct srd_decoder_inst *di)
+{
+	int64_t start, trace_start;
+	uint64_t samplenum;
+
+	/* Without a worker thread, the instance never received samples. */
+	if (!di->thread_handle)
+		return;
+
 	g_mutex_lock(&di->data_mutex);
+	start = g_get_monotonic_time();
+	trace_start = di->sess->trace ? srd_trace_time() : 0;
+	samplenum = di->abs_cur_samplenum;
 	while (!di->handled_all_samples && !di->want_wait_terminate)
 		g_cond_wait(&di->handled_all_samples_cond, &di->data_mutex);
+	di->stats.send_wait_time += g_get_monotonic_time() - start;
+	if (di->sess->trace)
+		srd_trace_event(di->sess->trace, SRD_TRACE_SEND_WAIT,
+			di->inst_id, trace_start, samplenum,
+			di->abs_cur_samplenum);
 	g_mutex_unlock(&di->data_mutex);
-
-	return SRD_OK;
 }
 
+
 /** @private */
 SRD_PRIV void srd_inst_free(struct srd_decoder_inst *di)
 {
 	GSList *l;
 	struct srd_pd_output *pdo;
+	unsigned int i, n;
 	PyGILState_STATE gstate;
 
 	srd_dbg("Freeing instance %s", di->inst_id);
@@ -1258,14 +2519,30 @@ SRD_PRIV void srd_inst_free(struct srd_decoder_inst *di)
 	srd_inst_join_decode_thread(di);
 
 	srd_inst_reset_state(di);
+	condition_cache_free(di);
+
+	if (g_hash_table_lookup(di->sess->di_by_id, di->inst_id) == di)
+		g_hash_table_remove(di->sess->di_by_id, di->inst_id);
 
 	gstate = PyGILState_Ensure();
+	srd_Decoder_state_clear(di->py_inst);
+	((srd_Decoder *)di->py_inst)->di = NULL;
+	Py_CLEAR(((srd_Decoder *)di->py_inst)->chunk_data);
 	Py_DecRef(di->py_inst);
 	PyGILState_Release(gstate);
 
 	g_free(di->inst_id);
 	g_free(di->dec_channelmap);
+	g_free(di->dec_pins);
 	g_free(di->channel_samples);
+	if (di->ann_templates) {
+		n = g_slist_length(di->decoder->annotations);
+		for (i = 0; i < n; i++)
+			g_strfreev(di->ann_templates[i].formats);
+		g_free(di->ann_templates);
+	}
+	if (di->ann_classes_disabled)
+		g_array_free(di->ann_classes_disabled, TRUE);
 	g_slist_free(di->next_di);
 	for (l = di->pd_output; l; l = l->next) {
 		pdo = l->data;
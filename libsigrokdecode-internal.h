@@ -34,18 +34,215 @@ enum {
 	SRD_TERM_FALLING_EDGE,
 	SRD_TERM_EITHER_EDGE,
 	SRD_TERM_NO_EDGE,
-	SRD_TERM_SKIP,
 };
 
 struct srd_term {
 	int type;
 	int channel;
-	uint64_t num_samples_to_skip;
-	uint64_t num_samples_already_skipped;
+};
+
+/* Where a decoder channel's bit is in a sample, as per the channel map. */
+struct srd_pin {
+	/* Byte offset in the sample, -1 for unused optional channels. */
+	int offset;
+	uint8_t mask;
+};
+
+/* Sample bits which one condition checks within one byte of a sample. */
+struct srd_cond_check {
+	int offset;
+	/* Bits which must have a specific value in the current sample. */
+	uint8_t level_mask;
+	uint8_t level_value;
+	/* Bits which must (not) have changed since the previous sample. */
+	uint8_t edge_mask;
+	uint8_t edge_value;
+};
+
+struct srd_condition {
+	/* The condition's terms in srd_cond_prog.terms. */
+	unsigned int first_term;
+	unsigned int num_terms;
+	/* The condition's checks in srd_cond_prog.checks. */
+	unsigned int first_check;
+	unsigned int num_checks;
+	/* TRUE for an empty condition, which is ignored. */
+	gboolean is_empty;
+	/* TRUE when the terms contradict, or use unavailable channels. */
+	gboolean never_matches;
+	gboolean has_skip;
+	/* Absolute sample number from which on the skip term is satisfied. */
+	uint64_t skip_samplenum;
+};
+
+/*
+ * A condition list as passed to self.wait(), compiled into per-condition
+ * byte masks. A sample matches a condition when all of its checks and
+ * its skip term are satisfied, conditions get OR-ed.
+ */
+struct srd_cond_prog {
+	unsigned int num_conds;
+	struct srd_condition *conds;
+	unsigned int num_terms;
+	struct srd_term *terms;
+	/* Compiled checks, valid for the channel map and 'unitsize'. */
+	unsigned int num_checks;
+	struct srd_cond_check *checks;
+	int unitsize;
+	/* Previous sample's pin values, in the layout of a sample. */
+	uint8_t *old_sample;
+	/* Which conditions matched, valid when 'have_matched' is set. */
+	gboolean *matched;
+	gboolean have_matched;
+	/* TRUE when the program is owned by the instance's condition cache. */
+	gboolean cached;
+};
+
+/* One term of a cached condition list, in the order of the Python dict. */
+struct srd_cond_key {
+	int cond;
+	/* The term's channel, or -1 for a skip term. */
+	int channel;
+	/* The term's value (compared by identity), NULL for a skip term. */
+	PyObject *value;
+};
+
+struct srd_cond_cache_entry {
+	guint hash;
+	unsigned int num_conds;
+	unsigned int num_keys;
+	struct srd_cond_key *keys;
+	struct srd_cond_prog *prog;
+};
+
+/* Per-instance cache of compiled condition lists. */
+struct srd_cond_cache {
+	/* Entries, most recently used first. */
+	GQueue entries;
+	/* Key and skip counts of the current wait() call. */
+	GArray *keys;
+	GArray *skips;
+	uint64_t hits;
+	uint64_t misses;
+};
+
+/* Where a pulses() call left off, for the next call to continue there. */
+struct srd_pulse_state {
+	/* The current sample when the call returned, and its arguments. */
+	uint64_t resume_samplenum;
+	int channel;
+	uint64_t glitch;
+	/* Where the run in progress started. */
+	uint64_t run_start;
+	/* An edge which ends the run unless it was a glitch, and its level. */
+	gboolean have_pending;
+	uint64_t pending;
+	uint8_t pending_level;
+};
+
+/*
+ * A chunk of input samples, shared by all stacks it got sent to. The
+ * release callback runs when the last reference was dropped.
+ *
+ * Run-length encoded chunks have one sample in 'inbuf' per run, which
+ * starts at the run's entry in 'samplenums'.
+ */
+struct srd_chunk {
+	gint refcount;
+	uint64_t abs_start_samplenum;
+	uint64_t abs_end_samplenum;
+	const uint8_t *inbuf;
+	uint64_t inbuflen;
+	uint64_t unitsize;
+	const uint64_t *samplenums;
+	uint64_t num_runs;
+	/* Bits which are the same in all samples, computed on first use. */
+	uint8_t *steady_bits;
+	srd_chunk_release_callback release_cb;
+	void *cb_data;
+};
+
+/* Max. number of annotations which get delivered in one batch. */
+#define SRD_ANN_BATCH_SIZE 256
+
+/*
+ * Annotations of a decoder stack, in the order in which its instances
+ * put() them. All instances of a stack share one batch, which only the
+ * stack's worker thread accesses.
+ */
+struct srd_ann_batch {
+	unsigned int count;
+	struct srd_proto_data pdata[SRD_ANN_BATCH_SIZE];
+	struct srd_proto_data_annotation pda[SRD_ANN_BATCH_SIZE];
+};
+
+/* Text formats of an annotation class, which a decoder registered. */
+struct srd_ann_template {
+	char **formats;
+	/* Max. number of arguments which the formats use. */
+	unsigned int num_args;
+};
+
+/* Types of trace events. */
+enum srd_trace_event_type {
+	SRD_TRACE_DECODE,
+	SRD_TRACE_SAMPLES_WAIT,
+	SRD_TRACE_MATCH,
+	SRD_TRACE_CALLBACK,
+	SRD_TRACE_SEND,
+	SRD_TRACE_SEND_WAIT,
+};
+
+/* An event of a trace, with times in nanoseconds. */
+struct srd_trace_event {
+	int type;
+	const char *inst_id;
+	int64_t start;
+	int64_t end;
+	uint64_t start_samplenum;
+	uint64_t end_samplenum;
+};
+
+/*
+ * The events which one thread recorded, in a ring buffer of 'size'
+ * events. Only this thread accesses the buffer while samples are being
+ * decoded. 'count' is the number of events recorded so far.
+ */
+struct srd_trace_buffer {
+	char *name;
+	int tid;
+	unsigned int size;
+	uint64_t count;
+	struct srd_trace_event *events;
 };
 
 /* Custom Python types: */
 
+/* Max. number of channels for which pin value tuples get cached. */
+#define DECODER_PIN_CACHE_CHANNELS 10
+/* Max. number of wait() conditions for which self.matched gets cached. */
+#define DECODER_MATCHED_CACHE_CONDS 8
+
+typedef struct {
+	PyObject_HEAD
+	/* The decoder instance which this Python object belongs to. */
+	struct srd_decoder_inst *di;
+	/* Samples of the chunk last returned by get_chunk(), and its range. */
+	PyObject *chunk_data;
+	uint64_t chunk_start;
+	uint64_t chunk_end;
+	/* self.samplenum, or the object which the decoder set it to instead. */
+	uint64_t samplenum;
+	PyObject *samplenum_obj;
+	/* self.matched, NULL for None. */
+	PyObject *matched;
+	/* Pin value tuples by packed pin values, see get_current_pinvalues(). */
+	PyObject **pin_tuples;
+	unsigned int num_pin_tuples;
+	/* self.matched tuples by bit mask of matched conditions, per count. */
+	PyObject **matched_tuples[DECODER_MATCHED_CACHE_CONDS + 1];
+} srd_Decoder;
+
 typedef struct {
 	PyObject_HEAD
 	struct srd_decoder_inst *di;
@@ -62,8 +259,37 @@ struct srd_session {
 	/* List of decoder instances. */
 	GSList *di_list;
 
+	/* Decoder instances of all stack levels, by instance ID. */
+	GHashTable *di_by_id;
+
+	/* How srd_session_send() hands chunks to the stacks (SRD_SEND_*). */
+	int send_mode;
+
+	/* Max. number of chunks per stack for srd_session_send_async(). */
+	unsigned int send_queue_size;
+
 	/* List of frontend callbacks to receive decoder output. */
 	GSList *callbacks;
+
+	/* Frontend callback to receive batches of annotations, if any. */
+	srd_pd_output_batch_callback ann_batch_cb;
+	void *ann_batch_cb_data;
+
+	/* The annotation batches of all stacks. */
+	GSList *ann_batches;
+
+	/* TRUE when templated annotations don't get formatted into text. */
+	gboolean lazy_ann_text;
+
+	/* The samplerate which was last set as metadata, 0 if none was. */
+	uint64_t samplerate;
+
+	/* The sending thread's trace buffer, NULL unless tracing is on. */
+	struct srd_trace_buffer *trace;
+
+	/* The trace buffers of all stacks, and when tracing started. */
+	GSList *trace_buffers;
+	int64_t trace_start;
 };
 
 /* srd.c */
@@ -78,15 +304,41 @@ SRD_PRIV struct srd_pd_callback *srd_pd_output_callback_find(struct srd_session
 SRD_PRIV struct srd_decoder_inst *srd_inst_find_by_obj( const GSList *stack,
 		const PyObject *obj);
 SRD_PRIV int srd_inst_start(struct srd_decoder_inst *di);
-SRD_PRIV void match_array_free(struct srd_decoder_inst *di);
+SRD_PRIV struct srd_decoder_inst *srd_inst_clone(struct srd_session *sess,
+		const struct srd_decoder_inst *di, GHashTable *originals);
+SRD_PRIV struct srd_cond_prog *cond_prog_new(GArray *conds, GArray *terms);
+SRD_PRIV void cond_prog_free(struct srd_cond_prog *prog);
 SRD_PRIV void condition_list_free(struct srd_decoder_inst *di);
-SRD_PRIV int srd_inst_decode(struct srd_decoder_inst *di,
-		uint64_t abs_start_samplenum, uint64_t abs_end_samplenum,
-		const uint8_t *inbuf, uint64_t inbuflen, uint64_t unitsize);
+SRD_PRIV void cond_cache_entry_free(struct srd_cond_cache_entry *entry);
+SRD_PRIV void condition_cache_free(struct srd_decoder_inst *di);
+SRD_PRIV struct srd_chunk *srd_chunk_new(uint64_t abs_start_samplenum,
+		uint64_t abs_end_samplenum, const uint8_t *inbuf,
+		uint64_t inbuflen, uint64_t unitsize,
+		srd_chunk_release_callback cb, void *cb_data);
+SRD_PRIV void srd_chunk_unref(struct srd_chunk *chunk);
+SRD_PRIV struct srd_chunk *srd_inst_chunk_next(struct srd_decoder_inst *di);
+SRD_PRIV void srd_inst_chunk_release(struct srd_decoder_inst *di,
+		struct srd_chunk *chunk);
+SRD_PRIV int srd_inst_decode_start(struct srd_decoder_inst *di,
+		struct srd_chunk *chunk, unsigned int max_chunks);
+SRD_PRIV void srd_inst_decode_wait(struct srd_decoder_inst *di);
+SRD_PRIV const uint8_t *srd_inst_cur_sample(const struct srd_decoder_inst *di);
+SRD_PRIV void srd_inst_rewind(struct srd_decoder_inst *di, uint64_t samplenum);
+SRD_PRIV void srd_inst_ann_batch_flush(struct srd_decoder_inst *di);
+SRD_PRIV gboolean srd_inst_output_wanted(const struct srd_decoder_inst *di,
+		const struct srd_pd_output *pdo, int ann_class);
 SRD_PRIV int process_samples_until_condition_match(struct srd_decoder_inst *di, gboolean *found_match);
 SRD_PRIV void srd_inst_free(struct srd_decoder_inst *di);
 SRD_PRIV void srd_inst_free_all(struct srd_session *sess);
 
+/* trace.c */
+SRD_PRIV void srd_trace_attach_all(struct srd_session *sess);
+SRD_PRIV void srd_trace_free_all(struct srd_session *sess);
+SRD_PRIV int64_t srd_trace_time(void);
+SRD_PRIV int64_t srd_trace_event(struct srd_trace_buffer *buf, int type,
+		const char *inst_id, int64_t start, uint64_t start_samplenum,
+		uint64_t end_samplenum);
+
 /* log.c */
 #if defined(G_OS_WIN32) && (__GNUC__ > 4 || (__GNUC__ == 4 && __GNUC_MINOR__ >= 4))
 /*
@@ -107,9 +359,11 @@ SRD_PRIV int srd_log(int loglevel, const char *format, ...) G_GNUC_PRINTF(2, 3);
 
 /* decoder.c */
 SRD_PRIV long srd_decoder_apiver(const struct srd_decoder *d);
+SRD_PRIV int srd_decoder_import(struct srd_decoder *dec);
 
 /* type_decoder.c */
 SRD_PRIV PyObject *srd_Decoder_type_new(void);
+SRD_PRIV void srd_Decoder_state_clear(PyObject *py_inst);
 
 /* type_logic.c */
 SRD_PRIV PyObject *srd_logic_type_new(void);
@@ -128,6 +382,9 @@ SRD_PRIV int py_pydictitem_as_long(PyObject *py_obj, PyObject *py_key, uint64_t
 SRD_PRIV int py_str_as_str(PyObject *py_str, char **outstr);
 SRD_PRIV int py_strseq_to_char(PyObject *py_strseq, char ***out_strv);
 SRD_PRIV GVariant *py_obj_to_variant(PyObject *py_obj);
+SRD_PRIV int ann_format_check(const char *format);
+SRD_PRIV char *ann_format_apply(const char *format, const int64_t *args);
+SRD_PRIV int64_t srd_thread_cpu_time(void);
 
 /* exception.c */
 #if defined(G_OS_WIN32) && (__GNUC__ > 4 || (__GNUC__ == 4 && __GNUC_MINOR__ >= 4))
@@ -29,6 +29,13 @@ extern "C" {
 #endif
 
 struct srd_session;
+struct srd_cond_prog;
+struct srd_cond_cache;
+struct srd_chunk;
+struct srd_pin;
+struct srd_ann_batch;
+struct srd_ann_template;
+struct srd_trace_buffer;
 
 /**
  * @file
@@ -135,6 +142,14 @@ enum srd_configkey {
 	SRD_CONF_SAMPLERATE = 10000,
 };
 
+/** How srd_session_send() hands a chunk to the session's decoder stacks. */
+enum srd_send_mode {
+	/** Stacks decode the chunk one after another (default). */
+	SRD_SEND_SEQUENTIAL = 10000,
+	/** All stacks decode the chunk concurrently. */
+	SRD_SEND_PARALLEL,
+};
+
 struct srd_decoder {
 	/** The decoder ID. Must be non-NULL and unique for all decoders. */
 	char *id;
@@ -228,6 +243,41 @@ struct srd_decoder_annotation_row {
 	GSList *ann_classes;
 };
 
+/**
+ * Performance counters of a decoder instance, see srd_inst_stats_get().
+ *
+ * Times are in microseconds. The wait() related counters and times are
+ * only maintained for the lowest instance of a stack, whose decode()
+ * runs in the stack's worker thread. Its Python time includes that of
+ * the instances stacked on top of it.
+ */
+struct srd_inst_stats {
+	/** Number of wait() calls, and of bulk waits like wait_edges() and pulses(). */
+	uint64_t wait_calls;
+	/** Number of samples which wait() advanced over to find matches. */
+	uint64_t samples_scanned;
+	/** Number of matches which wait() found. */
+	uint64_t matches;
+	/** Number of conditions lists which wait() found in its cache. */
+	uint64_t cond_cache_hits;
+	/** Number of conditions lists which wait() had to translate. */
+	uint64_t cond_cache_misses;
+	/** Number of put() calls, by output type (SRD_OUTPUT_*). */
+	uint64_t put_calls[SRD_OUTPUT_META + 1];
+	/** Number of bytes of binary output passed to the frontend. */
+	uint64_t binary_bytes;
+	/** Time spent in decode(), outside of wait(). */
+	int64_t python_time;
+	/** Time spent in wait(), finding matches and handling chunks. */
+	int64_t match_time;
+	/** Time wait() was blocked, waiting for samples. */
+	int64_t samples_wait_time;
+	/** Time the frontend was blocked, waiting for the worker thread. */
+	int64_t send_wait_time;
+	/** CPU time used by the worker thread, updated once per chunk. */
+	int64_t cpu_time;
+};
+
 struct srd_decoder_inst {
 	struct srd_decoder *decoder;
 	struct srd_session *sess;
@@ -236,15 +286,19 @@ struct srd_decoder_inst {
 	GSList *pd_output;
 	int dec_num_channels;
 	int *dec_channelmap;
+	struct srd_pin *dec_pins;
 	int data_unitsize;
 	uint8_t *channel_samples;
 	GSList *next_di;
 
-	/** List of conditions a PD wants to wait for. */
-	GSList *condition_list;
+	/** Conditions a PD wants to wait for, and which of them matched. */
+	struct srd_cond_prog *condition_list;
+
+	/** Previously used condition lists, for reuse by wait(). */
+	struct srd_cond_cache *condition_cache;
 
-	/** Array of booleans denoting which conditions matched. */
-	GArray *match_array;
+	/** Where the last pulses() call left off, NULL if there was none. */
+	struct srd_pulse_state *pulse_state;
 
 	/** Absolute start sample number. */
 	uint64_t abs_start_samplenum;
@@ -276,6 +330,40 @@ struct srd_decoder_inst {
 	/** Requests termination of wait() and decode(). */
 	gboolean want_wait_terminate;
 
+	/** The chunk of input samples which the worker thread handles. */
+	struct srd_chunk *chunk;
+
+	/** Chunks which are queued for the worker thread after 'chunk'. */
+	GQueue chunk_queue;
+
+	/** Annotations of this instance's stack which await delivery. */
+	struct srd_ann_batch *ann_batch;
+
+	/** Annotation templates, by annotation class. */
+	struct srd_ann_template *ann_templates;
+
+	/** Disabled output types, as bit mask of (1 << SRD_OUTPUT_*). */
+	unsigned int outputs_disabled;
+
+	/** Disabled annotation classes (gboolean), NULL if none is. */
+	GArray *ann_classes_disabled;
+
+	/** Performance counters, see srd_inst_stats_get(). */
+	struct srd_inst_stats stats;
+
+	/** When the worker thread last switched between Python and C. */
+	int64_t stats_mark;
+
+	/** The worker thread's CPU time when it started. */
+	int64_t stats_cpu_start;
+
+	/** The stack's trace buffer, NULL unless the session is traced. */
+	struct srd_trace_buffer *trace;
+
+	/** When, and at which sample, the worker thread last returned to Python. */
+	int64_t trace_mark;
+	uint64_t trace_mark_samplenum;
+
 	GCond got_new_samples_cond;
 	GCond handled_all_samples_cond;
 	GMutex data_mutex;
@@ -298,9 +386,19 @@ struct srd_proto_data {
 	struct srd_pd_output *pdo;
 	void *data;
 };
+/* Max. number of arguments of an annotation template. */
+#define SRD_ANN_MAX_ARGS 8
+
 struct srd_proto_data_annotation {
 	int ann_class;
 	char **ann_text;
+	/*
+	 * Only set for annotations which a decoder submitted as arguments
+	 * of its annotation class' template, see srd_ann_text_get().
+	 */
+	char **ann_formats;
+	unsigned int num_args;
+	int64_t ann_args[SRD_ANN_MAX_ARGS];
 };
 struct srd_proto_data_binary {
 	int bin_class;
@@ -317,6 +415,12 @@ struct srd_pd_callback {
 	void *cb_data;
 };
 
+typedef void (*srd_pd_output_batch_callback)(struct srd_proto_data *pdata,
+					unsigned int count, void *cb_data);
+
+typedef void (*srd_chunk_release_callback)(const uint8_t *inbuf,
+					void *cb_data);
+
 /* srd.c */
 SRD_API int srd_init(const char *path);
 SRD_API int srd_exit(void);
@@ -326,12 +430,30 @@ SRD_API int srd_session_new(struct srd_session **sess);
 SRD_API int srd_session_start(struct srd_session *sess);
 SRD_API int srd_session_metadata_set(struct srd_session *sess, int key,
 		GVariant *data);
+SRD_API int srd_session_send_mode_set(struct srd_session *sess, int mode);
 SRD_API int srd_session_send(struct srd_session *sess,
 		uint64_t abs_start_samplenum, uint64_t abs_end_samplenum,
 		const uint8_t *inbuf, uint64_t inbuflen, uint64_t unitsize);
+SRD_API int srd_session_send_transitions(struct srd_session *sess,
+		uint64_t abs_start_samplenum, uint64_t abs_end_samplenum,
+		const uint64_t *samplenums, const uint8_t *values,
+		uint64_t num_transitions, uint64_t unitsize);
+SRD_API int srd_session_send_queue_size_set(struct srd_session *sess,
+		unsigned int max_chunks);
+SRD_API int srd_session_send_async(struct srd_session *sess,
+		uint64_t abs_start_samplenum, uint64_t abs_end_samplenum,
+		const uint8_t *inbuf, uint64_t inbuflen, uint64_t unitsize,
+		srd_chunk_release_callback cb, void *cb_data);
+SRD_API int srd_session_send_drain(struct srd_session *sess);
+SRD_API int srd_session_lazy_ann_text_set(struct srd_session *sess,
+		gboolean lazy);
 SRD_API int srd_session_destroy(struct srd_session *sess);
 SRD_API int srd_pd_output_callback_add(struct srd_session *sess,
 		int output_type, srd_pd_output_callback cb, void *cb_data);
+SRD_API int srd_pd_output_batch_callback_add(struct srd_session *sess,
+		int output_type, srd_pd_output_batch_callback cb, void *cb_data);
+SRD_API char *srd_ann_text_get(const struct srd_proto_data_annotation *pda,
+		unsigned int idx);
 
 /* decoder.c */
 SRD_API const GSList *srd_decoder_list(void);
@@ -353,9 +475,29 @@ SRD_API int srd_inst_stack(struct srd_session *sess,
 		struct srd_decoder_inst *di_from, struct srd_decoder_inst *di_to);
 SRD_API struct srd_decoder_inst *srd_inst_find_by_id(struct srd_session *sess,
 		const char *inst_id);
+SRD_API int srd_inst_output_enable(struct srd_decoder_inst *di,
+		int output_type, gboolean enable);
+SRD_API int srd_inst_ann_class_enable(struct srd_decoder_inst *di,
+		int ann_class, gboolean enable);
+SRD_API int srd_inst_ann_row_enable(struct srd_decoder_inst *di,
+		const char *row_id, gboolean enable);
+SRD_API int srd_inst_stats_get(struct srd_decoder_inst *di,
+		struct srd_inst_stats *stats);
 SRD_API int srd_inst_initial_pins_set_all(struct srd_decoder_inst *di,
 		GArray *initial_pins);
 
+/* segment.c */
+SRD_API int srd_session_send_segments(struct srd_session *sess,
+		uint64_t abs_start_samplenum, uint64_t abs_end_samplenum,
+		const uint8_t *inbuf, uint64_t inbuflen, uint64_t unitsize,
+		unsigned int max_segments);
+
+/* trace.c */
+SRD_API int srd_session_trace_start(struct srd_session *sess,
+		unsigned int max_events);
+SRD_API int srd_session_trace_save(struct srd_session *sess,
+		const char *filename);
+
 /* log.c */
 typedef int (*srd_log_callback)(void *cb_data, int loglevel,
 				  const char *format, va_list args);
@@ -0,0 +1,625 @@
+/*
+ * This file is part of the libsigrokdecode project.
+ *
+ * Copyright (C) 2026 agent <agent@local>
+ *
+ * This program is free software: you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation, either version 3 of the License, or
+ * (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with this program.  If not, see <http://www.gnu.org/licenses/>.
+ */
+
+#include <config.h>
+#include "libsigrokdecode-internal.h" /* First, so we avoid a _POSIX_C_SOURCE warning. */
+#include "libsigrokdecode.h"
+#include <inttypes.h>
+#include <string.h>
+#include <glib.h>
+
+/**
+ * @file
+ *
+ * Segmented decoding of captures.
+ */
+
+/**
+ * @defgroup grp_segment Segmented decoding
+ *
+ * Decoding parts of a capture in parallel.
+ *
+ * Many protocols have points at which a decoder can start decoding
+ * without knowing what came before, e.g. a UART line which was idle
+ * for longer than a frame, an I2C STOP condition or an SPI chip-select
+ * deassertion. Decoders declare these resynchronisation points in their
+ * 'resync' class attribute:
+ *
+ * @code{.py}
+ * resync = {
+ *     # Conditions of the channels at a resynchronisation point, in the
+ *     # form of wait() terms. Unassigned channels of 'h' and 'l' terms
+ *     # are left out.
+ *     'channels': {'rx': 'h', 'tx': 'h'},
+ *     # Optional: How many bit times the channels must have met their
+ *     # conditions, and which option holds the bitrate.
+ *     'idle': 13, 'bitrate': 'baudrate',
+ *     # Optional: Option values which the points are only valid for.
+ *     'options': {'invert_rx': 'no', 'invert_tx': 'no'},
+ * }
+ * @endcode
+ *
+ * srd_session_send_segments() splits a capture at such points, decodes
+ * the segments by copies of the session's stacks, and delivers their
+ * output as if the capture had been decoded in one go.
+ *
+ * @{
+ */
+
+/** @cond PRIVATE */
+
+/* A wait() style term, which resynchronisation points meet. */
+struct resync_term {
+	struct srd_pin pin;
+	char type;
+};
+
+struct resync {
+	GArray *terms;
+	/* How many samples the terms must have been met for. */
+	uint64_t idle_samples;
+};
+
+/* An output of a segment, kept until all segments were decoded. */
+struct segment_output {
+	/* pdata.pdo, which goes away with the copy. */
+	int output_type;
+	struct srd_proto_data pdata;
+	struct srd_proto_data_annotation pda;
+	struct srd_proto_data_binary pdb;
+};
+
+struct segment {
+	/* The session with the copy of the stack, and the originals. */
+	struct srd_session *sess;
+	GHashTable *originals;
+	/* The first decoded sample, and where the segment's output starts. */
+	uint64_t start;
+	uint64_t cut;
+	uint64_t end;
+	GArray *outputs;
+};
+
+/** @endcond */
+
+static const struct srd_pin *channel_pin(const struct srd_decoder_inst *di,
+		const char *id)
+{
+	const struct srd_channel *pdch;
+	GSList *l;
+
+	for (l = di->decoder->channels; l; l = l->next) {
+		pdch = l->data;
+		if (!strcmp(pdch->id, id))
+			return &di->dec_pins[pdch->order];
+	}
+	for (l = di->decoder->opt_channels; l; l = l->next) {
+		pdch = l->data;
+		if (!strcmp(pdch->id, id))
+			return &di->dec_pins[pdch->order];
+	}
+
+	return NULL;
+}
+
+/*
+ * Get the resynchronisation points of an instance's decoder. Returns
+ * FALSE if it has none, or none which apply to the instance.
+ */
+static gboolean resync_get(const struct srd_decoder_inst *di,
+		uint64_t samplerate, struct resync *rs)
+{
+	PyObject *py_resync, *py_options, *py_dict, *py_key, *py_value;
+	PyObject *py_opt;
+	Py_ssize_t pos;
+	struct resync_term term;
+	const struct srd_pin *pin;
+	char *key, *value;
+	double idle, bitrate;
+	gboolean ret;
+	PyGILState_STATE gstate;
+
+	rs->terms = g_array_new(FALSE, FALSE, sizeof(struct resync_term));
+	rs->idle_samples = 0;
+
+	gstate = PyGILState_Ensure();
+
+	ret = FALSE;
+	py_resync = py_options = NULL;
+	key = value = NULL;
+
+	if (!PyObject_HasAttrString(di->decoder->py_dec, "resync")) {
+		srd_dbg("%s: Decoder has no resynchronisation points.",
+			di->inst_id);
+		goto out;
+	}
+	py_resync = PyObject_GetAttrString(di->decoder->py_dec, "resync");
+	if (!py_resync || !PyDict_Check(py_resync))
+		goto err;
+
+	py_options = PyObject_GetAttrString(di->py_inst, "options");
+	if (py_options && !PyDict_Check(py_options)) {
+		/* Decoders without options keep the class' empty tuple. */
+		Py_DECREF(py_options);
+		py_options = NULL;
+	}
+	PyErr_Clear();
+
+	if ((py_dict = PyDict_GetItemString(py_resync, "options"))) {
+		if (!PyDict_Check(py_dict))
+			goto err;
+		pos = 0;
+		while (PyDict_Next(py_dict, &pos, &py_key, &py_value)) {
+			py_opt = py_options ? PyDict_GetItem(py_options, py_key) : NULL;
+			if (!py_opt || PyObject_RichCompareBool(py_opt,
+					py_value, Py_EQ) != 1) {
+				PyErr_Clear();
+				srd_dbg("%s: Options rule out resynchronisation.",
+					di->inst_id);
+				goto out;
+			}
+		}
+	}
+
+	py_dict = PyDict_GetItemString(py_resync, "channels");
+	if (!py_dict || !PyDict_Check(py_dict))
+		goto err;
+	pos = 0;
+	while (PyDict_Next(py_dict, &pos, &py_key, &py_value)) {
+		if (py_str_as_str(py_key, &key) != SRD_OK)
+			goto err;
+		if (py_str_as_str(py_value, &value) != SRD_OK)
+			goto err;
+		if (strlen(value) != 1 || !strchr("hlrfe", value[0]))
+			goto err;
+		if (!(pin = channel_pin(di, key)))
+			goto err;
+		if (pin->offset >= 0) {
+			term.pin = *pin;
+			term.type = value[0];
+			g_array_append_val(rs->terms, term);
+		} else if (value[0] != 'h' && value[0] != 'l') {
+			srd_dbg("%s: Channel %s is unassigned, can't "
+				"resynchronise.", di->inst_id, key);
+			goto out;
+		}
+		g_free(key);
+		g_free(value);
+		key = value = NULL;
+	}
+	if (!rs->terms->len) {
+		srd_dbg("%s: No resynchronisation channels are assigned.",
+			di->inst_id);
+		goto out;
+	}
+
+	if ((py_value = PyDict_GetItemString(py_resync, "idle"))) {
+		idle = PyFloat_AsDouble(py_value);
+		py_key = PyDict_GetItemString(py_resync, "bitrate");
+		py_opt = (py_key && py_options) ? PyDict_GetItem(py_options, py_key) : NULL;
+		if (!py_opt)
+			goto err;
+		bitrate = PyFloat_AsDouble(py_opt);
+		if (PyErr_Occurred() || idle < 0)
+			goto err;
+		if (!samplerate || bitrate <= 0) {
+			srd_dbg("%s: Resynchronisation needs the samplerate "
+				"and bitrate.", di->inst_id);
+			goto out;
+		}
+		rs->idle_samples = (uint64_t)(idle * samplerate / bitrate) + 1;
+	}
+
+	ret = TRUE;
+	goto out;
+
+err:
+	PyErr_Clear();
+	srd_err("Protocol decoder %s has invalid resynchronisation points.",
+		di->decoder->name);
+
+out:
+	g_free(key);
+	g_free(value);
+	Py_XDECREF(py_options);
+	Py_XDECREF(py_resync);
+	PyGILState_Release(gstate);
+
+	return ret;
+}
+
+/*
+ * Find the first resynchronisation point at or after sample 'from', and
+ * return the sample after it, or 'end' if there is none. The buffer's
+ * samples start at sample 'start'.
+ */
+static uint64_t resync_find(const struct resync *rs, const uint8_t *inbuf,
+		uint64_t unitsize, uint64_t start, uint64_t from, uint64_t end)
+{
+	const struct resync_term *term;
+	const uint8_t *sample;
+	uint64_t samplenum, run;
+	gboolean levels, edges;
+	int cur, old;
+	guint i;
+
+	run = 0;
+	for (samplenum = MAX(from, start + 1); samplenum < end; samplenum++) {
+		sample = inbuf + (samplenum - start) * unitsize;
+		levels = edges = TRUE;
+		for (i = 0; i < rs->terms->len; i++) {
+			term = &g_array_index(rs->terms, struct resync_term, i);
+			cur = (sample[term->pin.offset] & term->pin.mask) ? 1 : 0;
+			old = (sample[term->pin.offset - unitsize] & term->pin.mask) ? 1 : 0;
+			switch (term->type) {
+			case 'h':
+				levels = levels && cur;
+				break;
+			case 'l':
+				levels = levels && !cur;
+				break;
+			case 'r':
+				edges = edges && !old && cur;
+				break;
+			case 'f':
+				edges = edges && old && !cur;
+				break;
+			default:
+				edges = edges && old != cur;
+				break;
+			}
+		}
+		run = levels ? run + 1 : 0;
+		if (levels && edges && run >= rs->idle_samples)
+			return samplenum + 1;
+	}
+
+	return end;
+}
+
+/* Keep a segment's output, unless it belongs to the previous segment. */
+static void segment_collect(struct srd_proto_data *pdata, void *cb_data)
+{
+	struct segment *seg;
+	struct segment_output out;
+	const struct srd_proto_data_annotation *pda;
+	const struct srd_proto_data_binary *pdb;
+
+	seg = cb_data;
+	if (pdata->start_sample < seg->cut)
+		return;
+
+	out.output_type = pdata->pdo->output_type;
+	out.pdata = *pdata;
+	switch (out.output_type) {
+	case SRD_OUTPUT_ANN:
+		pda = pdata->data;
+		out.pda = *pda;
+		out.pda.ann_text = g_strdupv(pda->ann_text);
+		break;
+	case SRD_OUTPUT_BINARY:
+		pdb = pdata->data;
+		out.pdb = *pdb;
+		out.pdb.data = g_memdup(pdb->data, pdb->size);
+		break;
+	case SRD_OUTPUT_META:
+		g_variant_ref_sink(pdata->data);
+		break;
+	default:
+		return;
+	}
+	g_array_append_val(seg->outputs, out);
+}
+
+static void segment_free(struct segment *seg)
+{
+	struct segment_output *out;
+	guint i;
+
+	/*
+	 * Stop the copy before freeing what its callbacks write to, it may
+	 * put() output until its worker thread terminated.
+	 */
+	if (seg->sess)
+		srd_session_destroy(seg->sess);
+
+	for (i = 0; seg->outputs && i < seg->outputs->len; i++) {
+		out = &g_array_index(seg->outputs, struct segment_output, i);
+		switch (out->output_type) {
+		case SRD_OUTPUT_ANN:
+			g_strfreev(out->pda.ann_text);
+			break;
+		case SRD_OUTPUT_BINARY:
+			g_free((void *)out->pdb.data);
+			break;
+		case SRD_OUTPUT_META:
+			g_variant_unref(out->pdata.data);
+			break;
+		}
+	}
+	if (seg->outputs)
+		g_array_free(seg->outputs, TRUE);
+	if (seg->originals)
+		g_hash_table_destroy(seg->originals);
+}
+
+/* Set up a copy of a stack, which decodes a segment. */
+static int segment_new(struct srd_session *sess, struct srd_decoder_inst *di,
+		struct segment *seg, const uint8_t *inbuf)
+{
+	struct srd_decoder_inst *copy;
+	const struct srd_pin *pin;
+	int i, type, ret;
+
+	if ((ret = srd_session_new(&seg->sess)) != SRD_OK)
+		return ret;
+	seg->sess->lazy_ann_text = sess->lazy_ann_text;
+	seg->originals = g_hash_table_new(g_direct_hash, g_direct_equal);
+	seg->outputs = g_array_new(FALSE, FALSE, sizeof(struct segment_output));
+
+	if (!(copy = srd_inst_clone(seg->sess, di, seg->originals)))
+		return SRD_ERR;
+	copy->abs_cur_samplenum = seg->start;
+
+	/* The segment's first sample is the copy's sample 0. */
+	for (i = 0, pin = copy->dec_pins; i < copy->dec_num_channels; i++, pin++) {
+		if (copy->old_pins_array->data[i] != SRD_INITIAL_PIN_SAME_AS_SAMPLE0)
+			continue;
+		if (pin->offset < 0)
+			continue;
+		copy->old_pins_array->data[i] = (inbuf[pin->offset] & pin->mask) ? 1 : 0;
+	}
+
+	/* Only collect the output which the session's frontend receives. */
+	for (type = SRD_OUTPUT_ANN; type <= SRD_OUTPUT_META; type++) {
+		if (type == SRD_OUTPUT_PYTHON)
+			continue;
+		if (!srd_pd_output_callback_find(sess, type) &&
+				!(type == SRD_OUTPUT_ANN && sess->ann_batch_cb))
+			continue;
+		srd_pd_output_callback_add(seg->sess, type, segment_collect, seg);
+	}
+
+	if (sess->samplerate) {
+		ret = srd_session_metadata_set(seg->sess, SRD_CONF_SAMPLERATE,
+			g_variant_new_uint64(sess->samplerate));
+		if (ret != SRD_OK)
+			return ret;
+	}
+
+	return srd_session_start(seg->sess);
+}
+
+static void batch_flush(struct srd_session *sess, struct srd_ann_batch *batch)
+{
+	unsigned int i;
+
+	if (!batch->count)
+		return;
+
+	sess->ann_batch_cb(batch->pdata, batch->count, sess->ann_batch_cb_data);
+	for (i = 0; i < batch->count; i++)
+		g_strfreev(batch->pda[i].ann_text);
+	batch->count = 0;
+}
+
+/* Deliver a segment's output, as if the original stack had put() it. */
+static void segment_deliver(struct srd_session *sess, struct segment *seg,
+		struct srd_ann_batch *batch)
+{
+	struct segment_output *out;
+	struct srd_decoder_inst *di;
+	struct srd_proto_data pdata;
+	struct srd_pd_callback *cb;
+	guint i;
+
+	for (i = 0; i < seg->outputs->len; i++) {
+		out = &g_array_index(seg->outputs, struct segment_output, i);
+		di = g_hash_table_lookup(seg->originals, out->pdata.pdo->di);
+		pdata = out->pdata;
+		pdata.pdo = g_slist_nth_data(di->pd_output, out->pdata.pdo->pdo_id);
+		if (!pdata.pdo)
+			continue;
+
+		if (pdata.pdo->output_type == SRD_OUTPUT_ANN) {
+			/* Templates of the copies go away with the copies. */
+			if (out->pda.ann_formats)
+				out->pda.ann_formats = di->ann_templates[out->pda.ann_class].formats;
+			if (sess->ann_batch_cb) {
+				batch->pdata[batch->count] = pdata;
+				batch->pdata[batch->count].data = &batch->pda[batch->count];
+				batch->pda[batch->count] = out->pda;
+				out->pda.ann_text = NULL;
+				if (++batch->count == SRD_ANN_BATCH_SIZE)
+					batch_flush(sess, batch);
+				continue;
+			}
+			pdata.data = &out->pda;
+		} else if (pdata.pdo->output_type == SRD_OUTPUT_BINARY) {
+			pdata.data = &out->pdb;
+		}
+
+		/* Keep the order of the different output types. */
+		batch_flush(sess, batch);
+		if ((cb = srd_pd_output_callback_find(sess, pdata.pdo->output_type)))
+			cb->cb(&pdata, cb->cb_data);
+	}
+	batch_flush(sess, batch);
+}
+
+/* Decode a capture with multiple copies of a stack, and merge their output. */
+static int stack_send_segments(struct srd_session *sess,
+		struct srd_decoder_inst *di, uint64_t abs_start_samplenum,
+		uint64_t abs_end_samplenum, const uint8_t *inbuf,
+		uint64_t unitsize, unsigned int max_segments)
+{
+	struct resync rs;
+	struct segment *segs;
+	struct srd_ann_batch *batch;
+	GArray *cuts;
+	uint64_t cut, from, len;
+	unsigned int i, num_segments;
+	int ret;
+
+	cuts = g_array_new(FALSE, FALSE, sizeof(uint64_t));
+	if (resync_get(di, sess->samplerate, &rs)) {
+		len = abs_end_samplenum - abs_start_samplenum;
+		cut = abs_start_samplenum;
+		for (i = 1; i < max_segments; i++) {
+			/* The next segment must start after the previous one. */
+			from = abs_start_samplenum + len / max_segments * i;
+			from = MAX(from, cut + rs.idle_samples + 1);
+			cut = resync_find(&rs, inbuf, unitsize,
+				abs_start_samplenum, from, abs_end_samplenum);
+			if (cut >= abs_end_samplenum)
+				break;
+			g_array_append_val(cuts, cut);
+		}
+	}
+	g_array_free(rs.terms, TRUE);
+
+	/*
+	 * Every segment but the first starts with the samples before its
+	 * resynchronisation point, which the previous segment decodes too.
+	 * Its output from there gets dropped.
+	 */
+	num_segments = cuts->len + 1;
+	segs = g_malloc0(sizeof(struct segment) * num_segments);
+	for (i = 0; i < num_segments; i++) {
+		segs[i].cut = i ? g_array_index(cuts, uint64_t, i - 1) :
+			abs_start_samplenum;
+		segs[i].start = i ? segs[i].cut - rs.idle_samples :
+			abs_start_samplenum;
+		segs[i].end = (i + 1 < num_segments) ?
+			g_array_index(cuts, uint64_t, i) : abs_end_samplenum;
+	}
+	g_array_free(cuts, TRUE);
+
+	srd_dbg("%s: Decoding samples %" PRIu64 "-%" PRIu64 " in %u segments.",
+		di->inst_id, abs_start_samplenum, abs_end_samplenum, num_segments);
+
+	/* All sessions must exist before any of them starts decoding. */
+	ret = SRD_OK;
+	for (i = 0; i < num_segments && ret == SRD_OK; i++)
+		ret = segment_new(sess, di, &segs[i], inbuf +
+			(segs[i].start - abs_start_samplenum) * unitsize);
+	for (i = 0; i < num_segments && ret == SRD_OK; i++)
+		ret = srd_session_send_async(segs[i].sess, segs[i].start,
+			segs[i].end, inbuf + (segs[i].start -
+			abs_start_samplenum) * unitsize, (segs[i].end -
+			segs[i].start) * unitsize, unitsize, NULL, NULL);
+	for (i = 0; i < num_segments; i++) {
+		if (segs[i].sess)
+			srd_session_send_drain(segs[i].sess);
+	}
+
+	if (ret == SRD_OK) {
+		batch = g_malloc(sizeof(struct srd_ann_batch));
+		batch->count = 0;
+		for (i = 0; i < num_segments; i++)
+			segment_deliver(sess, &segs[i], batch);
+		g_free(batch);
+	}
+
+	for (i = 0; i < num_segments; i++)
+		segment_free(&segs[i]);
+	g_free(segs);
+
+	return ret;
+}
+
+/**
+ * Decode a capture in segments, which get decoded in parallel.
+ *
+ * Every stack of the session gets the capture split at up to
+ * 'max_segments' - 1 resynchronisation points of its bottom decoder,
+ * see @ref grp_segment. Copies of the stack decode the segments, each
+ * in a worker thread of its own. Their matching of samples against
+ * wait() conditions runs in parallel, while their Python code takes
+ * turns. Stacks whose decoder has no resynchronisation points, or whose
+ * options or channel assignments rule them out, decode the capture in
+ * one segment.
+ *
+ * The stacks' output reaches the session's callbacks in sample order,
+ * as if the stack had decoded the capture in one go, but only after the
+ * stack decoded all segments. The copies' counters don't add to those
+ * of the session's instances, and the copies don't get traced.
+ *
+ * Must be called after srd_session_start(), instead of sending the
+ * capture with srd_session_send() or similar. The session's stacks must
+ * not have received samples before.
+ *
+ * @param sess The session to use. Must not be NULL.
+ * @param abs_start_samplenum The absolute starting sample number for the
+ *              buffer's sample set, relative to the start of capture.
+ * @param abs_end_samplenum The absolute ending sample number for the
+ *              buffer's sample set, relative to the start of capture.
+ * @param inbuf Pointer to sample data of the whole capture. Must not be NULL.
+ * @param inbuflen Length in bytes of the buffer. Must be > 0.
+ * @param unitsize The number of bytes per sample. Must be > 0.
+ * @param max_segments The max. number of segments per stack. Must be > 0.
+ *
+ * @return SRD_OK upon success, a (negative) error code otherwise.
+ *
+ * @since 0.6.0
+ */
+SRD_API int srd_session_send_segments(struct srd_session *sess,
+		uint64_t abs_start_samplenum, uint64_t abs_end_samplenum,
+		const uint8_t *inbuf, uint64_t inbuflen, uint64_t unitsize,
+		unsigned int max_segments)
+{
+	GSList *d;
+	struct srd_decoder_inst *di;
+	int ret;
+
+	if (session_is_valid(sess) != SRD_OK) {
+		srd_err("Invalid session.");
+		return SRD_ERR_ARG;
+	}
+
+	if (!inbuf || !unitsize || abs_end_samplenum <= abs_start_samplenum ||
+			inbuflen / unitsize < abs_end_samplenum - abs_start_samplenum) {
+		srd_err("Invalid sample buffer.");
+		return SRD_ERR_ARG;
+	}
+
+	if (!max_segments) {
+		srd_err("Invalid number of segments 0.");
+		return SRD_ERR_ARG;
+	}
+
+	for (d = sess->di_list; d; d = d->next) {
+		di = d->data;
+		if (di->thread_handle || di->abs_cur_samplenum != abs_start_samplenum) {
+			srd_err("%s: Samples were already sent.", di->inst_id);
+			return SRD_ERR_ARG;
+		}
+	}
+
+	for (d = sess->di_list; d; d = d->next) {
+		ret = stack_send_segments(sess, d->data, abs_start_samplenum,
+			abs_end_samplenum, inbuf, unitsize, max_segments);
+		if (ret != SRD_OK)
+			return ret;
+	}
+
+	return SRD_OK;
+}
+
+/** @} */
@@ -79,6 +79,16 @@ SRD_API int srd_session_new(struct srd_session **sess)
 	*sess = g_malloc(sizeof(struct srd_session));
 	(*sess)->session_id = ++max_session_id;
 	(*sess)->di_list = (*sess)->callbacks = NULL;
+	(*sess)->di_by_id = g_hash_table_new(g_str_hash, g_str_equal);
+	(*sess)->send_mode = SRD_SEND_SEQUENTIAL;
+	(*sess)->send_queue_size = 2;
+	(*sess)->ann_batch_cb = NULL;
+	(*sess)->ann_batch_cb_data = NULL;
+	(*sess)->ann_batches = NULL;
+	(*sess)->lazy_ann_text = FALSE;
+	(*sess)->samplerate = 0;
+	(*sess)->trace = NULL;
+	(*sess)->trace_buffers = NULL;
 
 	/* Keep a list of all sessions, so we can clean up as needed. */
 	sessions = g_slist_append(sessions, *sess);
@@ -88,6 +98,26 @@ SRD_API int srd_session_new(struct srd_session **sess)
 	return SRD_OK;
 }
 
+/* Have all instances of a stack share the stack's annotation batch. */
+static void ann_batch_attach(struct srd_decoder_inst *di,
+		struct srd_ann_batch *batch)
+{
+	GSList *l;
+
+	di->ann_batch = batch;
+	for (l = di->next_di; l; l = l->next)
+		ann_batch_attach(l->data, batch);
+}
+
+static void ann_batch_free(struct srd_ann_batch *batch)
+{
+	unsigned int i;
+
+	for (i = 0; i < batch->count; i++)
+		g_strfreev(batch->pda[i].ann_text);
+	g_free(batch);
+}
+
 /**
  * Start a decoding session.
  *
@@ -104,6 +134,7 @@ SRD_API int srd_session_start(struct srd_session *sess)
 {
 	GSList *d;
 	struct srd_decoder_inst *di;
+	struct srd_ann_batch *batch;
 	int ret;
 
 	if (session_is_valid(sess) != SRD_OK) {
@@ -111,6 +142,20 @@ SRD_API int srd_session_start(struct srd_session *sess)
 		return SRD_ERR;
 	}
 
+	/* Every stack collects its annotations in a batch of its own. */
+	for (d = sess->di_list; sess->ann_batch_cb && d; d = d->next) {
+		di = d->data;
+		if (di->ann_batch)
+			continue;
+		batch = g_malloc(sizeof(struct srd_ann_batch));
+		batch->count = 0;
+		sess->ann_batches = g_slist_append(sess->ann_batches, batch);
+		ann_batch_attach(di, batch);
+	}
+
+	/* Stacks which were set up after tracing started need buffers. */
+	srd_trace_attach_all(sess);
+
 	srd_dbg("Calling start() on all instances in session %d.", sess->session_id);
 
 	/* Run the start() method on all decoders receiving frontend data. */
@@ -207,6 +252,8 @@ SRD_API int srd_session_metadata_set(struct srd_session *sess, int key,
 	srd_dbg("Setting session %d samplerate to %"G_GUINT64_FORMAT".",
 			sess->session_id, g_variant_get_uint64(data));
 
+	sess->samplerate = g_variant_get_uint64(data);
+
 	ret = SRD_OK;
 	for (l = sess->di_list; l; l = l->next) {
 		if ((ret = srd_inst_send_meta(l->data, key, data)) != SRD_OK)
@@ -218,6 +265,75 @@ SRD_API int srd_session_metadata_set(struct srd_session *sess, int key,
 	return ret;
 }
 
+/**
+ * Set how srd_session_send() hands chunks to the session's decoder stacks.
+ *
+ * With SRD_SEND_SEQUENTIAL (the default), each stack decodes a chunk
+ * before the next stack receives it. With SRD_SEND_PARALLEL, all stacks
+ * receive the chunk first, and srd_session_send() then waits until all
+ * of them decoded it. This lets the sample matching of different stacks
+ * run on multiple cores. Every stack still sees its samples and emits
+ * its output in the same order as in sequential mode, but the output of
+ * different stacks can interleave differently.
+ *
+ * @param sess The session to configure. Must not be NULL.
+ * @param mode The send mode (SRD_SEND_*).
+ *
+ * @return SRD_OK upon success, a (negative) error code otherwise.
+ *
+ * @since 0.6.0
+ */
+SRD_API int srd_session_send_mode_set(struct srd_session *sess, int mode)
+{
+	if (session_is_valid(sess) != SRD_OK) {
+		srd_err("Invalid session.");
+		return SRD_ERR_ARG;
+	}
+
+	if (mode != SRD_SEND_SEQUENTIAL && mode != SRD_SEND_PARALLEL) {
+		srd_err("Invalid send mode %d.", mode);
+		return SRD_ERR_ARG;
+	}
+
+	sess->send_mode = mode;
+
+	return SRD_OK;
+}
+
+/* Hand a chunk to all stacks, as per the session's send mode. */
+static int session_send_chunk(struct srd_session *sess,
+		struct srd_chunk *chunk)
+{
+	GSList *d, *l;
+	int64_t start;
+	int ret;
+
+	start = sess->trace ? srd_trace_time() : 0;
+
+	ret = SRD_OK;
+	if (sess->send_mode == SRD_SEND_SEQUENTIAL) {
+		for (d = sess->di_list; d; d = d->next) {
+			if ((ret = srd_inst_decode_start(d->data, chunk, 0)) != SRD_OK)
+				break;
+			srd_inst_decode_wait(d->data);
+		}
+	} else {
+		/* Hand the chunk to all stacks, then wait for all of them. */
+		for (d = sess->di_list; d; d = d->next) {
+			if ((ret = srd_inst_decode_start(d->data, chunk, 0)) != SRD_OK)
+				break;
+		}
+		for (l = sess->di_list; l != d; l = l->next)
+			srd_inst_decode_wait(l->data);
+	}
+
+	if (sess->trace)
+		srd_trace_event(sess->trace, SRD_TRACE_SEND, NULL, start,
+			chunk->abs_start_samplenum, chunk->abs_end_samplenum);
+
+	return ret;
+}
+
 /**
  * Send a chunk of logic sample data to a running decoder session.
  *
@@ -263,6 +379,11 @@ SRD_API int srd_session_metadata_set(struct srd_session *sess, int key,
  *   srd_session_send(s, 0,    1023, inbuf, 1024, 1);
  *   srd_session_send(s, 0,    1023, inbuf, 1024, 1);
  *
+ * See srd_session_send_mode_set() for how the chunk gets handed to the
+ * session's decoder stacks. This function returns when all stacks have
+ * decoded the chunk, and all chunks which were sent before by
+ * srd_session_send_async(). The buffer can be reused after that.
+ *
  * @param sess The session to use. Must not be NULL.
  * @param abs_start_samplenum The absolute starting sample number for the
  *              buffer's sample set, relative to the start of capture.
@@ -280,20 +401,268 @@ SRD_API int srd_session_send(struct srd_session *sess,
 		uint64_t abs_start_samplenum, uint64_t abs_end_samplenum,
 		const uint8_t *inbuf, uint64_t inbuflen, uint64_t unitsize)
 {
+	struct srd_chunk *chunk;
+	int ret;
+
+	if (session_is_valid(sess) != SRD_OK) {
+		srd_err("Invalid session.");
+		return SRD_ERR_ARG;
+	}
+
+	chunk = srd_chunk_new(abs_start_samplenum, abs_end_samplenum,
+		inbuf, inbuflen, unitsize, NULL, NULL);
+	if (!chunk)
+		return SRD_ERR_ARG;
+	ret = session_send_chunk(sess, chunk);
+	srd_chunk_unref(chunk);
+
+	return ret;
+}
+
+/**
+ * Send a run-length encoded chunk of logic sample data to a running
+ * decoder session.
+ *
+ * The chunk consists of transitions, i.e. the sample numbers at which the
+ * logic levels change, and the sample value from then on. The first
+ * transition must be at 'abs_start_samplenum' (it provides the value of
+ * the chunk's first sample), the sample numbers must be increasing and
+ * less than 'abs_end_samplenum'. The value of the last transition lasts
+ * until the end of the chunk. Two transitions may have the same value.
+ *
+ * Decoding a mostly idle signal this way takes time in proportion to the
+ * number of transitions, not the number of samples. Apart from the sample
+ * representation, this is equivalent to srd_session_send(), and both can
+ * be mixed (in consecutive chunks).
+ *
+ * Correct example (a pulse on channel 0 at samples 100-109, in a chunk
+ * of 1000 samples with unitsize 1):
+ *   samplenums = { 0, 100, 110 }, values = { 0x00, 0x01, 0x00 }
+ *   srd_session_send_transitions(s, 0, 1000, samplenums, values, 3, 1);
+ *
+ * @param sess The session to use. Must not be NULL.
+ * @param abs_start_samplenum The absolute starting sample number for the
+ *              chunk, relative to the start of capture.
+ * @param abs_end_samplenum The absolute ending sample number for the
+ *              chunk, relative to the start of capture.
+ * @param samplenums The absolute sample numbers of the transitions.
+ *              Must not be NULL.
+ * @param values The sample values of the transitions, 'unitsize' bytes
+ *              each. Must not be NULL.
+ * @param num_transitions The number of transitions. Must be > 0.
+ * @param unitsize The number of bytes per sample. Must be > 0.
+ *
+ * @return SRD_OK upon success, a (negative) error code otherwise.
+ *
+ * @since 0.6.0
+ */
+SRD_API int srd_session_send_transitions(struct srd_session *sess,
+		uint64_t abs_start_samplenum, uint64_t abs_end_samplenum,
+		const uint64_t *samplenums, const uint8_t *values,
+		uint64_t num_transitions, uint64_t unitsize)
+{
+	struct srd_chunk *chunk;
+	uint64_t i;
+	int ret;
+
+	if (session_is_valid(sess) != SRD_OK) {
+		srd_err("Invalid session.");
+		return SRD_ERR_ARG;
+	}
+
+	if (!samplenums || !values || num_transitions == 0) {
+		srd_err("Invalid transitions.");
+		return SRD_ERR_ARG;
+	}
+
+	if (samplenums[0] != abs_start_samplenum) {
+		srd_err("First transition must be at the chunk's start sample.");
+		return SRD_ERR_ARG;
+	}
+	for (i = 1; i < num_transitions; i++) {
+		if (samplenums[i] <= samplenums[i - 1])
+			break;
+	}
+	if (i < num_transitions ||
+	    samplenums[num_transitions - 1] >= abs_end_samplenum) {
+		srd_err("Transition sample numbers must be increasing and "
+			"within the chunk.");
+		return SRD_ERR_ARG;
+	}
+
+	chunk = srd_chunk_new(abs_start_samplenum, abs_end_samplenum,
+		values, num_transitions * unitsize, unitsize, NULL, NULL);
+	if (!chunk)
+		return SRD_ERR_ARG;
+	chunk->samplenums = samplenums;
+	chunk->num_runs = num_transitions;
+	ret = session_send_chunk(sess, chunk);
+	srd_chunk_unref(chunk);
+
+	return ret;
+}
+
+/**
+ * Set the maximum number of chunks per decoder stack for
+ * srd_session_send_async().
+ *
+ * This is the number of chunks which a stack may have queued, including
+ * the chunk which it currently decodes. When a stack has reached this
+ * limit, srd_session_send_async() waits until the stack has decoded a
+ * chunk. The default is 2, which lets a stack decode one chunk while
+ * the next one is getting acquired.
+ *
+ * @param sess The session to use. Must not be NULL.
+ * @param max_chunks The maximum number of chunks per stack. Must be > 0.
+ *
+ * @return SRD_OK upon success, a (negative) error code otherwise.
+ *
+ * @since 0.6.0
+ */
+SRD_API int srd_session_send_queue_size_set(struct srd_session *sess,
+		unsigned int max_chunks)
+{
+	if (session_is_valid(sess) != SRD_OK) {
+		srd_err("Invalid session.");
+		return SRD_ERR_ARG;
+	}
+
+	if (max_chunks == 0) {
+		srd_err("Invalid send queue size 0.");
+		return SRD_ERR_ARG;
+	}
+
+	sess->send_queue_size = max_chunks;
+
+	return SRD_OK;
+}
+
+/**
+ * Send a chunk of logic sample data to a running decoder session, without
+ * waiting for the decoder stacks to handle it.
+ *
+ * The chunk gets queued for all of the session's decoder stacks, which
+ * decode it in their worker threads. The requirements for the sample
+ * numbers and the buffer are those of srd_session_send(). When a stack
+ * already has the maximum number of chunks queued (see
+ * srd_session_send_queue_size_set()), this function waits until it
+ * has decoded one.
+ *
+ * The buffer is owned by libsigrokdecode until 'cb' gets called, and must
+ * neither be modified nor freed before. The callback gets called exactly
+ * once, also when this function returns an error. It can get called from
+ * any thread (including the calling thread, before this function returns),
+ * and must not call libsigrokdecode functions.
+ *
+ * Use srd_session_send_drain() to wait until all chunks were decoded.
+ *
+ * @param sess The session to use. Must not be NULL.
+ * @param abs_start_samplenum The absolute starting sample number for the
+ *              buffer's sample set, relative to the start of capture.
+ * @param abs_end_samplenum The absolute ending sample number for the
+ *              buffer's sample set, relative to the start of capture.
+ * @param inbuf Pointer to sample data. Must not be NULL.
+ * @param inbuflen Length in bytes of the buffer. Must be > 0.
+ * @param unitsize The number of bytes per sample. Must be > 0.
+ * @param cb The function to call when the buffer is no longer used.
+ *           Can be NULL.
+ * @param cb_data Private data for the callback function. Can be NULL.
+ *
+ * @return SRD_OK upon success, a (negative) error code otherwise.
+ *
+ * @since 0.6.0
+ */
+SRD_API int srd_session_send_async(struct srd_session *sess,
+		uint64_t abs_start_samplenum, uint64_t abs_end_samplenum,
+		const uint8_t *inbuf, uint64_t inbuflen, uint64_t unitsize,
+		srd_chunk_release_callback cb, void *cb_data)
+{
+	struct srd_chunk *chunk;
 	GSList *d;
+	int64_t start;
 	int ret;
 
 	if (session_is_valid(sess) != SRD_OK) {
 		srd_err("Invalid session.");
+		if (cb)
+			cb(inbuf, cb_data);
+		return SRD_ERR_ARG;
+	}
+
+	start = sess->trace ? srd_trace_time() : 0;
+
+	chunk = srd_chunk_new(abs_start_samplenum, abs_end_samplenum,
+		inbuf, inbuflen, unitsize, cb, cb_data);
+	if (!chunk) {
+		if (cb)
+			cb(inbuf, cb_data);
 		return SRD_ERR_ARG;
 	}
 
+	ret = SRD_OK;
 	for (d = sess->di_list; d; d = d->next) {
-		if ((ret = srd_inst_decode(d->data, abs_start_samplenum,
-				abs_end_samplenum, inbuf, inbuflen, unitsize)) != SRD_OK)
-			return ret;
+		if ((ret = srd_inst_decode_start(d->data, chunk,
+				sess->send_queue_size)) != SRD_OK)
+			break;
+	}
+	if (sess->trace)
+		srd_trace_event(sess->trace, SRD_TRACE_SEND, NULL, start,
+			abs_start_samplenum, abs_end_samplenum);
+	srd_chunk_unref(chunk);
+
+	return ret;
+}
+
+/**
+ * Set whether templated annotations get formatted into text.
+ *
+ * Decoders can submit annotations as arguments of a template, which they
+ * registered for the annotation class. By default, the library formats
+ * such annotations into ann_text. In lazy mode, ann_text is NULL for
+ * templated annotations, and frontends can format the text of those
+ * annotations they display with srd_ann_text_get().
+ *
+ * @param sess The session to configure. Must not be NULL.
+ * @param lazy TRUE to not format templated annotations into text.
+ *
+ * @return SRD_OK upon success, a (negative) error code otherwise.
+ *
+ * @since 0.6.0
+ */
+SRD_API int srd_session_lazy_ann_text_set(struct srd_session *sess,
+		gboolean lazy)
+{
+	if (session_is_valid(sess) != SRD_OK) {
+		srd_err("Invalid session.");
+		return SRD_ERR_ARG;
 	}
 
+	sess->lazy_ann_text = lazy;
+
+	return SRD_OK;
+}
+
+/**
+ * Wait until the session's decoder stacks have decoded all chunks.
+ *
+ * @param sess The session to use. Must not be NULL.
+ *
+ * @return SRD_OK upon success, a (negative) error code otherwise.
+ *
+ * @since 0.6.0
+ */
+SRD_API int srd_session_send_drain(struct srd_session *sess)
+{
+	GSList *d;
+
+	if (session_is_valid(sess) != SRD_OK) {
+		srd_err("Invalid session.");
+		return SRD_ERR_ARG;
+	}
+
+	for (d = sess->di_list; d; d = d->next)
+		srd_inst_decode_wait(d->data);
+
 	return SRD_OK;
 }
 
@@ -322,6 +691,9 @@ SRD_API int srd_session_destroy(struct srd_session *sess)
 		srd_inst_free_all(sess);
 	if (sess->callbacks)
 		g_slist_free_full(sess->callbacks, g_free);
+	g_slist_free_full(sess->ann_batches, (GDestroyNotify)ann_batch_free);
+	srd_trace_free_all(sess);
+	g_hash_table_destroy(sess->di_by_id);
 	sessions = g_slist_remove(sessions, sess);
 	g_free(sess);
 
@@ -335,7 +707,7 @@ SRD_API int srd_session_destroy(struct srd_session *sess)
  *
  * The function will be called when a protocol decoder sends output back
  * to the PD controller (except for Python objects, which only go up the
- * stack).
+ * stack). The output's data is only valid during the callback.
  *
  * @param sess The output session in which to register the callback.
  * @param output_type The output type this callback will receive. Only one
@@ -366,6 +738,94 @@ SRD_API int srd_pd_output_callback_add(struct srd_session *sess,
 	return SRD_OK;
 }
 
+/**
+ * Register a callback function which receives decoder output in batches.
+ *
+ * Instead of calling the callback function of srd_pd_output_callback_add()
+ * for every annotation, each decoder stack collects its annotations, and
+ * passes them to this callback function when a chunk of samples was
+ * handled, or when SRD_ANN_BATCH_SIZE annotations were collected. All
+ * annotations of a chunk get delivered before srd_session_send() returns.
+ * The annotations of a stack are passed in the order in which its decoders
+ * created them. The array and the annotations' data are only valid during
+ * the callback.
+ *
+ * In parallel send mode the callback function gets invoked from multiple
+ * threads at the same time.
+ *
+ * Must be called before srd_session_start(). Only one batch callback per
+ * session can be registered.
+ *
+ * @param sess The output session in which to register the callback.
+ * @param output_type The output type this callback will receive. Only
+ *                    SRD_OUTPUT_ANN is supported.
+ * @param cb The function to call. Must not be NULL.
+ * @param cb_data Private data for the callback function. Can be NULL.
+ *
+ * @return SRD_OK upon success, a (negative) error code otherwise.
+ *
+ * @since 0.6.0
+ */
+SRD_API int srd_pd_output_batch_callback_add(struct srd_session *sess,
+		int output_type, srd_pd_output_batch_callback cb, void *cb_data)
+{
+	if (session_is_valid(sess) != SRD_OK) {
+		srd_err("Invalid session.");
+		return SRD_ERR_ARG;
+	}
+
+	if (output_type != SRD_OUTPUT_ANN) {
+		srd_err("Batches of output type %d are not supported.",
+			output_type);
+		return SRD_ERR_ARG;
+	}
+
+	if (!cb) {
+		srd_err("Invalid callback.");
+		return SRD_ERR_ARG;
+	}
+
+	srd_dbg("Registering new batch callback for output type %d.",
+		output_type);
+
+	sess->ann_batch_cb = cb;
+	sess->ann_batch_cb_data = cb_data;
+
+	return SRD_OK;
+}
+
+/**
+ * Get the text of an annotation.
+ *
+ * This works for all annotations, whether they were formatted into
+ * ann_text or not, see srd_session_lazy_ann_text_set().
+ *
+ * @param pda The annotation. Must not be NULL.
+ * @param idx Which of the annotation's texts to get, 0 for the longest.
+ *
+ * @return The newly allocated text, which the caller must g_free(), or
+ *         NULL if the annotation has no text with that index.
+ *
+ * @since 0.6.0
+ */
+SRD_API char *srd_ann_text_get(const struct srd_proto_data_annotation *pda,
+		unsigned int idx)
+{
+	if (!pda)
+		return NULL;
+
+	if (pda->ann_formats) {
+		if (idx >= g_strv_length(pda->ann_formats))
+			return NULL;
+		return ann_format_apply(pda->ann_formats[idx], pda->ann_args);
+	}
+
+	if (!pda->ann_text || idx >= g_strv_length(pda->ann_text))
+		return NULL;
+
+	return g_strdup(pda->ann_text[idx]);
+}
+
 /** @private */
 SRD_PRIV struct srd_pd_callback *srd_pd_output_callback_find(
 		struct srd_session *sess, int output_type)
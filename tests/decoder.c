@@ -20,6 +20,9 @@
 #include <config.h>
 #include <libsigrokdecode.h> /* First, to avoid compiler warning. */
 #include <stdlib.h>
+#include <string.h>
+#include <unistd.h>
+#include <glib/gstdio.h>
 #include <check.h>
 #include "lib.h"
 
@@ -38,6 +41,162 @@ START_TEST(test_load_all)
 }
 END_TEST
 
+static const char *idxtest_init = "'Docstring from module.'\n"
+	"from .pd import Decoder\n";
+
+static const char *idxtest_pd = "import sigrokdecode as srd\n"
+	"class Decoder(srd.Decoder):\n"
+	"    api_version = 3\n"
+	"    id = 'idxtest'\n"
+	"    name = 'idxtest'\n"
+	"    longname = 'From module'\n"
+	"    desc = 'Index test.'\n"
+	"    license = 'gplv2+'\n"
+	"    inputs = ['logic']\n"
+	"    outputs = []\n"
+	"    channels = ({'id': 'data', 'name': 'Data', 'desc': 'Data line'},)\n"
+	"    options = ({'id': 'ratio', 'desc': 'Ratio; of bits',\n"
+	"        'default': 0.5, 'values': (0.25, 0.5)},)\n"
+	"    annotations = (('bit', 'Bit'),)\n"
+	"    def start(self):\n"
+	"        pass\n"
+	"    def decode(self):\n"
+	"        pass\n";
+
+/*
+ * Create a decoder directory with the "idxtest" decoder in it, and an
+ * index (as tools/install-decoders writes it), which tells apart the
+ * decoder's metadata from the index by its longname and docstring.
+ */
+static char *idxtest_create(gboolean stale)
+{
+	char *dir, *pd_dir, *init_py, *pd_py, *index;
+	GStatBuf st1, st2;
+
+	dir = g_strdup_printf("%s/srd-idxtest-%d", g_get_tmp_dir(), (int)getpid());
+	pd_dir = g_build_filename(dir, "idxtest", NULL);
+	init_py = g_build_filename(pd_dir, "__init__.py", NULL);
+	pd_py = g_build_filename(pd_dir, "pd.py", NULL);
+	fail_unless(g_mkdir_with_parents(pd_dir, 0700) == 0);
+	fail_unless(g_file_set_contents(init_py, idxtest_init, -1, NULL));
+	fail_unless(g_file_set_contents(pd_py, idxtest_pd, -1, NULL));
+	fail_unless(g_stat(init_py, &st1) == 0 && g_stat(pd_py, &st2) == 0);
+
+	index = g_strdup_printf("[index]\nversion=1\n\n"
+		"[decoder idxtest]\nmtime=%" G_GINT64_FORMAT "\n"
+		"size=%" G_GINT64_FORMAT "\n"
+		"id=idxtest\nname=idxtest\nlongname=From index\n"
+		"desc=Index test.\nlicense=gplv2+\ninputs=logic;\noutputs=\n"
+		"channels=data;Data;Data line;\noptional_channels=\n"
+		"options=ratio;Ratio\\; of bits;double 0.5;[double 0.25, 0.5];\n"
+		"annotations=bit;Bit;\nannotation_rows=\nbinary=\n"
+		"doc=Docstring from index.\n",
+		(gint64)MAX(st1.st_mtime, st2.st_mtime) + (stale ? 1 : 0),
+		(gint64)(st1.st_size + st2.st_size));
+	g_free(pd_py);
+	pd_py = g_build_filename(dir, "decoders.index", NULL);
+	fail_unless(g_file_set_contents(pd_py, index, -1, NULL));
+
+	g_free(index);
+	g_free(pd_py);
+	g_free(init_py);
+	g_free(pd_dir);
+
+	return dir;
+}
+
+static void idxtest_remove(char *dir)
+{
+	char *path;
+
+	path = g_build_filename(dir, "decoders.index", NULL);
+	g_remove(path);
+	g_free(path);
+	path = g_build_filename(dir, "idxtest", "__init__.py", NULL);
+	g_remove(path);
+	g_free(path);
+	path = g_build_filename(dir, "idxtest", "pd.py", NULL);
+	g_remove(path);
+	g_free(path);
+	path = g_build_filename(dir, "idxtest", "__pycache__", NULL);
+	g_rmdir(path);
+	g_free(path);
+	path = g_build_filename(dir, "idxtest", NULL);
+	g_rmdir(path);
+	g_free(path);
+	g_rmdir(dir);
+	g_free(dir);
+}
+
+/*
+ * Check whether srd_decoder_load_all() loads decoders from an index,
+ * and imports them when an instance gets created.
+ */
+START_TEST(test_load_all_index)
+{
+	struct srd_session *sess;
+	struct srd_decoder *dec;
+	struct srd_decoder_option *o;
+	const GSList *l;
+	char *dir, *doc;
+	int num;
+
+	dir = idxtest_create(FALSE);
+	srd_init(dir);
+	fail_unless(srd_decoder_load_all() == SRD_OK);
+	dec = srd_decoder_get_by_id("idxtest");
+	fail_unless(dec != NULL);
+	fail_unless(!strcmp(dec->longname, "From index"));
+	fail_unless(dec->py_dec == NULL, "Decoder was imported.");
+	fail_unless(g_slist_length(dec->channels) == 1);
+	fail_unless(g_slist_length(dec->annotations) == 1);
+	fail_unless(g_slist_length(dec->options) == 1);
+	o = dec->options->data;
+	fail_unless(!strcmp(o->desc, "Ratio; of bits"));
+	fail_unless(g_variant_get_double(o->def) == 0.5);
+	fail_unless(g_slist_length(o->values) == 2);
+	doc = srd_decoder_doc_get(dec);
+	fail_unless(doc && !strcmp(doc, "Docstring from index."));
+	g_free(doc);
+
+	/* Neither loading it again, nor using it, adds another decoder. */
+	fail_unless(srd_decoder_load("idxtest") == SRD_OK);
+	srd_session_new(&sess);
+	fail_unless(srd_inst_new(sess, "idxtest", NULL) != NULL);
+	fail_unless(dec->py_dec != NULL, "Decoder was not imported.");
+	for (num = 0, l = srd_decoder_list(); l; l = l->next)
+		num += !strcmp(((struct srd_decoder *)l->data)->id, "idxtest");
+	fail_unless(num == 1);
+	srd_session_destroy(sess);
+	srd_exit();
+	idxtest_remove(dir);
+}
+END_TEST
+
+/*
+ * Check whether srd_decoder_load_all() imports decoders whose files
+ * changed since the index was written.
+ */
+START_TEST(test_load_all_index_stale)
+{
+	struct srd_decoder *dec;
+	char *dir, *doc;
+
+	dir = idxtest_create(TRUE);
+	srd_init(dir);
+	fail_unless(srd_decoder_load_all() == SRD_OK);
+	dec = srd_decoder_get_by_id("idxtest");
+	fail_unless(dec != NULL);
+	fail_unless(!strcmp(dec->longname, "From module"));
+	fail_unless(dec->py_dec != NULL, "Decoder was not imported.");
+	doc = srd_decoder_doc_get(dec);
+	fail_unless(doc && !strcmp(doc, "Docstring from module."));
+	g_free(doc);
+	srd_exit();
+	idxtest_remove(dir);
+}
+END_TEST
+
 /*
  * Check whether srd_decoder_load_all() fails without prior srd_init().
  * If it returns != SRD_OK (or segfaults) this test will fail.
@@ -422,6 +581,8 @@ Suite *suite_decoder(void)
 	tcase_add_checked_fixture(tc, srdtest_setup, srdtest_teardown);
 	tcase_add_test(tc, test_load_all);
 	tcase_add_test(tc, test_load_all_no_init);
+	tcase_add_test(tc, test_load_all_index);
+	tcase_add_test(tc, test_load_all_index_stale);
 	tcase_add_test(tc, test_load);
 	tcase_add_test(tc, test_load_bogus);
 	tcase_add_test(tc, test_load_valid_and_bogus);
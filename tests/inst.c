@@ -140,6 +140,76 @@ START_TEST(test_inst_option_set_bogus)
 }
 END_TEST
 
+/*
+ * Check whether srd_inst_find_by_id() finds instances on all stack levels.
+ * If it returns the wrong instance (or segfaults) this test will fail.
+ */
+START_TEST(test_inst_find_by_id)
+{
+	struct srd_session *sess;
+	struct srd_decoder_inst *inst1, *inst2, *inst3;
+
+	srd_init(DECODERS_TESTDIR);
+	srd_decoder_load_all();
+	srd_session_new(&sess);
+	inst1 = srd_inst_new(sess, "uart", NULL);
+	inst2 = srd_inst_new(sess, "midi", NULL);
+	inst3 = srd_inst_new(sess, "uart", NULL);
+	srd_inst_stack(sess, inst1, inst2);
+
+	fail_unless(srd_inst_find_by_id(sess, inst1->inst_id) == inst1);
+	fail_unless(srd_inst_find_by_id(sess, inst2->inst_id) == inst2);
+	fail_unless(srd_inst_find_by_id(sess, inst3->inst_id) == inst3);
+	fail_unless(srd_inst_find_by_id(sess, "nonexisting") == NULL);
+	fail_unless(srd_inst_find_by_id(sess, NULL) == NULL);
+	fail_unless(srd_inst_find_by_id(NULL, inst1->inst_id) == NULL);
+
+	srd_exit();
+}
+END_TEST
+
+/*
+ * Check whether output types, annotation classes and rows can be enabled
+ * and disabled, and whether bogus ones are rejected.
+ * If it returns the wrong result (or segfaults) this test will fail.
+ */
+START_TEST(test_inst_output_enable)
+{
+	int ret;
+	struct srd_session *sess;
+	struct srd_decoder_inst *inst;
+
+	srd_init(DECODERS_TESTDIR);
+	srd_decoder_load_all();
+	srd_session_new(&sess);
+	inst = srd_inst_new(sess, "uart", NULL);
+
+	ret = srd_inst_output_enable(inst, SRD_OUTPUT_BINARY, FALSE);
+	fail_unless(ret == SRD_OK, "srd_inst_output_enable() failed: %d.", ret);
+	ret = srd_inst_output_enable(inst, SRD_OUTPUT_BINARY, TRUE);
+	fail_unless(ret == SRD_OK, "srd_inst_output_enable() failed: %d.", ret);
+	ret = srd_inst_ann_class_enable(inst, 0, FALSE);
+	fail_unless(ret == SRD_OK, "srd_inst_ann_class_enable() failed: %d.", ret);
+	ret = srd_inst_ann_row_enable(inst, "rx-data-bits", FALSE);
+	fail_unless(ret == SRD_OK, "srd_inst_ann_row_enable() failed: %d.", ret);
+	ret = srd_inst_ann_row_enable(inst, "rx-data-bits", TRUE);
+	fail_unless(ret == SRD_OK, "srd_inst_ann_row_enable() failed: %d.", ret);
+
+	ret = srd_inst_output_enable(NULL, SRD_OUTPUT_ANN, FALSE);
+	fail_unless(ret != SRD_OK, "NULL instance worked.");
+	ret = srd_inst_output_enable(inst, -1, FALSE);
+	fail_unless(ret != SRD_OK, "Output type -1 worked.");
+	ret = srd_inst_ann_class_enable(inst, 1000, FALSE);
+	fail_unless(ret != SRD_OK, "Annotation class 1000 worked.");
+	ret = srd_inst_ann_row_enable(inst, "nonexisting", FALSE);
+	fail_unless(ret != SRD_OK, "Nonexisting annotation row worked.");
+	ret = srd_inst_ann_row_enable(inst, NULL, FALSE);
+	fail_unless(ret != SRD_OK, "NULL annotation row worked.");
+
+	srd_exit();
+}
+END_TEST
+
 Suite *suite_inst(void)
 {
 	Suite *s;
@@ -159,5 +229,15 @@ Suite *suite_inst(void)
 	tcase_add_test(tc, test_inst_option_set_bogus);
 	suite_add_tcase(s, tc);
 
+	tc = tcase_create("find");
+	tcase_add_checked_fixture(tc, srdtest_setup, srdtest_teardown);
+	tcase_add_test(tc, test_inst_find_by_id);
+	suite_add_tcase(s, tc);
+
+	tc = tcase_create("output");
+	tcase_add_checked_fixture(tc, srdtest_setup, srdtest_teardown);
+	tcase_add_test(tc, test_inst_output_enable);
+	suite_add_tcase(s, tc);
+
 	return s;
 }
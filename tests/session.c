@@ -20,8 +20,12 @@
 #include <config.h>
 #include <libsigrokdecode-internal.h> /* First, to avoid compiler warning. */
 #include <libsigrokdecode.h>
+#include <inttypes.h>
 #include <stdint.h>
 #include <stdlib.h>
+#include <string.h>
+#include <unistd.h>
+#include <glib/gstdio.h>
 #include <check.h>
 #include "lib.h"
 
@@ -224,6 +228,1530 @@ START_TEST(test_session_metadata_set_bogus)
 }
 END_TEST
 
+/*
+ * Check whether srd_session_send_mode_set() works.
+ * If it returns != SRD_OK (or segfaults) this test will fail.
+ */
+START_TEST(test_session_send_mode_set)
+{
+	int ret;
+	struct srd_session *sess;
+
+	srd_init(NULL);
+	srd_session_new(&sess);
+	ret = srd_session_send_mode_set(sess, SRD_SEND_PARALLEL);
+	fail_unless(ret == SRD_OK, "srd_session_send_mode_set() failed: %d.", ret);
+	ret = srd_session_send_mode_set(sess, SRD_SEND_SEQUENTIAL);
+	fail_unless(ret == SRD_OK, "srd_session_send_mode_set() failed: %d.", ret);
+	srd_session_destroy(sess);
+	srd_exit();
+}
+END_TEST
+
+/*
+ * Check whether srd_session_send_mode_set() fails with invalid input.
+ * If it returns SRD_OK (or segfaults) this test will fail.
+ */
+START_TEST(test_session_send_mode_set_bogus)
+{
+	int ret;
+	struct srd_session *sess;
+
+	srd_init(NULL);
+	srd_session_new(&sess);
+	ret = srd_session_send_mode_set(NULL, SRD_SEND_PARALLEL);
+	fail_unless(ret != SRD_OK, "srd_session_send_mode_set(NULL) worked.");
+	ret = srd_session_send_mode_set(sess, 0);
+	fail_unless(ret != SRD_OK, "srd_session_send_mode_set(0) worked.");
+	ret = srd_session_send_mode_set(sess, -1);
+	fail_unless(ret != SRD_OK, "srd_session_send_mode_set(-1) worked.");
+	srd_session_destroy(sess);
+	srd_exit();
+}
+END_TEST
+
+#define NUM_STACKS 4
+#define NUM_SAMPLES 20000
+
+/* Which API send_uart() passes the samples through. */
+enum send_path {
+	/* srd_session_send(), in chunks of 1000 samples. */
+	SEND_CHUNKS,
+	/* srd_session_send_async(), in chunks of 1000 samples. */
+	SEND_ASYNC,
+	/* srd_session_send_transitions(), in chunks of 1000 samples. */
+	SEND_TRANSITIONS,
+	/* srd_session_send_segments(), all samples in 4 segments. */
+	SEND_SEGMENTS,
+};
+
+/* How send_uart() receives the annotations, and what else it records. */
+struct send_options {
+	/* Receive the annotations in batches. */
+	gboolean batch;
+	/* Disable the annotations of all instances. */
+	gboolean ann_disabled;
+	/* Save a trace of the session into this file, unless NULL. */
+	const char *trace_file;
+};
+
+static struct srd_decoder_inst *send_inst[NUM_STACKS];
+static uint64_t send_anns[NUM_STACKS];
+static uint64_t send_hash[NUM_STACKS];
+static struct srd_inst_stats send_stats[NUM_STACKS];
+static int send_released;
+
+static void send_ann_cb(struct srd_proto_data *pdata, void *cb_data)
+{
+	struct srd_proto_data_annotation *pda;
+	int i;
+
+	(void)cb_data;
+
+	pda = pdata->data;
+	for (i = 0; i < NUM_STACKS; i++) {
+		if (pdata->pdo->di != send_inst[i])
+			continue;
+		send_anns[i]++;
+		/* Depends on the order of the annotations. */
+		send_hash[i] = send_hash[i] * 31 + pdata->start_sample;
+		send_hash[i] = send_hash[i] * 31 + pda->ann_class;
+	}
+}
+
+static void send_ann_batch_cb(struct srd_proto_data *pdata,
+		unsigned int count, void *cb_data)
+{
+	unsigned int i;
+
+	for (i = 0; i < count; i++)
+		send_ann_cb(&pdata[i], cb_data);
+}
+
+static void send_release_cb(const uint8_t *inbuf, void *cb_data)
+{
+	(void)cb_data;
+
+	g_free((uint8_t *)inbuf);
+	g_atomic_int_inc(&send_released);
+}
+
+static void send_chunk_transitions(struct srd_session *sess,
+		const uint8_t *buf, uint64_t start, uint64_t end)
+{
+	uint8_t values[1000];
+	uint64_t i, n, samplenums[1000];
+	int ret;
+
+	for (i = start, n = 0; i < end; i++) {
+		if (i > start && buf[i] == buf[i - 1])
+			continue;
+		samplenums[n] = i;
+		values[n++] = buf[i];
+	}
+	ret = srd_session_send_transitions(sess, start, end, samplenums,
+		values, n, 1);
+	fail_unless(ret == SRD_OK, "srd_session_send_transitions() "
+		"failed: %d.", ret);
+}
+
+static void send_samples(struct srd_session *sess, enum send_path path,
+		const uint8_t *buf)
+{
+	uint64_t i;
+	int ret;
+
+	if (path == SEND_SEGMENTS) {
+		ret = srd_session_send_segments(sess, 0, NUM_SAMPLES, buf,
+			NUM_SAMPLES, 1, 4);
+		fail_unless(ret == SRD_OK, "srd_session_send_segments() "
+			"failed: %d.", ret);
+		return;
+	}
+
+	send_released = 0;
+	for (i = 0; i < NUM_SAMPLES; i += 1000) {
+		switch (path) {
+		case SEND_TRANSITIONS:
+			send_chunk_transitions(sess, buf, i, i + 1000);
+			break;
+		case SEND_ASYNC:
+			/* Every chunk gets its own buffer, freed upon release. */
+			ret = srd_session_send_async(sess, i, i + 1000,
+				g_memdup(buf + i, 1000), 1000, 1,
+				send_release_cb, NULL);
+			fail_unless(ret == SRD_OK, "srd_session_send_async() "
+				"failed: %d.", ret);
+			break;
+		default:
+			ret = srd_session_send(sess, i, i + 1000, buf + i, 1000, 1);
+			fail_unless(ret == SRD_OK, "srd_session_send() failed: %d.", ret);
+			break;
+		}
+	}
+
+	if (path == SEND_ASYNC) {
+		ret = srd_session_send_drain(sess);
+		fail_unless(ret == SRD_OK, "srd_session_send_drain() failed: %d.", ret);
+		fail_unless(g_atomic_int_get(&send_released) == NUM_SAMPLES / 1000,
+			"%d buffers released.", g_atomic_int_get(&send_released));
+	}
+}
+
+/*
+ * Decode the same UART signal (1MHz, 115200 baud) on multiple stacks.
+ * The options may be NULL.
+ */
+static void send_uart(int mode, enum send_path path,
+		const struct send_options *opts, uint64_t *anns)
+{
+	const struct send_options no_opts = { FALSE, FALSE, NULL };
+	struct srd_session *sess;
+	GHashTable *options;
+	uint8_t *buf;
+	uint64_t i, bit, byte;
+	int ret;
+
+	if (!opts)
+		opts = &no_opts;
+
+	/* Idle high, then one byte every 100 bit times (LSB first, 8N1). */
+	buf = g_malloc(NUM_SAMPLES);
+	for (i = 0; i < NUM_SAMPLES; i++) {
+		bit = i * 115200 / 1000000;
+		byte = bit / 100;
+		bit %= 100;
+		if (bit == 0)
+			buf[i] = 0x00;
+		else if (bit <= 8)
+			buf[i] = ((byte * 37) >> (bit - 1)) & 1 ? 0x03 : 0x00;
+		else
+			buf[i] = 0x03;
+	}
+
+	srd_session_new(&sess);
+	ret = srd_session_send_mode_set(sess, mode);
+	fail_unless(ret == SRD_OK, "srd_session_send_mode_set() failed: %d.", ret);
+	options = g_hash_table_new_full(g_str_hash, g_str_equal, g_free,
+			(GDestroyNotify)g_variant_unref);
+	for (i = 0; i < NUM_STACKS; i++) {
+		send_inst[i] = srd_inst_new(sess, "uart", options);
+		fail_unless(send_inst[i] != NULL, "srd_inst_new() failed.");
+		send_anns[i] = 0;
+		send_hash[i] = 0;
+		if (opts->ann_disabled)
+			srd_inst_output_enable(send_inst[i], SRD_OUTPUT_ANN, FALSE);
+	}
+	g_hash_table_destroy(options);
+	srd_pd_output_callback_add(sess, SRD_OUTPUT_ANN, send_ann_cb, NULL);
+	if (opts->batch) {
+		ret = srd_pd_output_batch_callback_add(sess, SRD_OUTPUT_ANN,
+			send_ann_batch_cb, NULL);
+		fail_unless(ret == SRD_OK, "srd_pd_output_batch_callback_add() "
+			"failed: %d.", ret);
+	}
+	if (opts->trace_file) {
+		ret = srd_session_trace_start(sess, 100000);
+		fail_unless(ret == SRD_OK, "srd_session_trace_start() failed: %d.", ret);
+	}
+	srd_session_metadata_set(sess, SRD_CONF_SAMPLERATE,
+		g_variant_new_uint64(1000000));
+	srd_session_start(sess);
+	send_samples(sess, path, buf);
+
+	/* All annotations must have been delivered by now. */
+	for (i = 0; i < NUM_STACKS; i++) {
+		anns[i] = send_anns[i];
+		ret = srd_inst_stats_get(send_inst[i], &send_stats[i]);
+		fail_unless(ret == SRD_OK, "srd_inst_stats_get() failed: %d.", ret);
+	}
+	if (opts->trace_file) {
+		ret = srd_session_trace_save(sess, opts->trace_file);
+		fail_unless(ret == SRD_OK, "srd_session_trace_save() failed: %d.", ret);
+	}
+
+	srd_session_destroy(sess);
+	g_free(buf);
+}
+
+/*
+ * Check whether all stacks decode the same in parallel send mode.
+ * If the annotation counts differ from sequential mode (or it segfaults)
+ * this test will fail.
+ */
+START_TEST(test_session_send_parallel)
+{
+	uint64_t seq[NUM_STACKS], par[NUM_STACKS];
+	int i;
+
+	srd_init(DECODERS_TESTDIR);
+	srd_decoder_load("uart");
+	send_uart(SRD_SEND_SEQUENTIAL, SEND_CHUNKS, NULL, seq);
+	send_uart(SRD_SEND_PARALLEL, SEND_CHUNKS, NULL, par);
+	for (i = 0; i < NUM_STACKS; i++) {
+		fail_unless(seq[i] > 0, "No annotations in sequential mode.");
+		fail_unless(par[i] == seq[i], "Stack %d: %" PRIu64 " annotations "
+			"in parallel mode, %" PRIu64 " expected.", i, par[i], seq[i]);
+	}
+	srd_exit();
+}
+END_TEST
+
+/*
+ * Check whether queued chunks get decoded like synchronously sent ones,
+ * and whether all buffers get released after srd_session_send_drain().
+ * If the annotation counts differ (or it segfaults) this test will fail.
+ */
+START_TEST(test_session_send_async)
+{
+	uint64_t seq[NUM_STACKS], async[NUM_STACKS];
+	int i;
+
+	srd_init(DECODERS_TESTDIR);
+	srd_decoder_load("uart");
+	send_uart(SRD_SEND_SEQUENTIAL, SEND_CHUNKS, NULL, seq);
+	send_uart(SRD_SEND_SEQUENTIAL, SEND_ASYNC, NULL, async);
+	for (i = 0; i < NUM_STACKS; i++) {
+		fail_unless(seq[i] > 0, "No annotations in sequential mode.");
+		fail_unless(async[i] == seq[i], "Stack %d: %" PRIu64 " annotations "
+			"when sent asynchronously, %" PRIu64 " expected.", i,
+			async[i], seq[i]);
+	}
+	srd_exit();
+}
+END_TEST
+
+/*
+ * Check whether srd_session_send_async() rejects invalid input, and
+ * still releases the buffer.
+ * If it returns SRD_OK (or segfaults) this test will fail.
+ */
+START_TEST(test_session_send_async_bogus)
+{
+	int ret;
+	struct srd_session *sess;
+
+	srd_init(NULL);
+	srd_session_new(&sess);
+	send_released = 0;
+	ret = srd_session_send_async(NULL, 0, 1000, g_malloc0(1000), 1000, 1,
+		send_release_cb, NULL);
+	fail_unless(ret != SRD_OK, "srd_session_send_async(NULL) worked.");
+	ret = srd_session_send_async(sess, 0, 1000, g_malloc0(1000), 1000, 0,
+		send_release_cb, NULL);
+	fail_unless(ret != SRD_OK, "srd_session_send_async(unitsize 0) worked.");
+	fail_unless(send_released == 2, "%d buffers released.", send_released);
+	srd_session_destroy(sess);
+	srd_exit();
+}
+END_TEST
+
+/*
+ * Check whether srd_session_send_queue_size_set() works.
+ * If it returns != SRD_OK (or segfaults) this test will fail.
+ */
+START_TEST(test_session_send_queue_size_set)
+{
+	int ret;
+	struct srd_session *sess;
+
+	srd_init(NULL);
+	srd_session_new(&sess);
+	ret = srd_session_send_queue_size_set(sess, 1);
+	fail_unless(ret == SRD_OK, "srd_session_send_queue_size_set() failed: %d.", ret);
+	ret = srd_session_send_queue_size_set(sess, 16);
+	fail_unless(ret == SRD_OK, "srd_session_send_queue_size_set() failed: %d.", ret);
+	ret = srd_session_send_queue_size_set(sess, 0);
+	fail_unless(ret != SRD_OK, "srd_session_send_queue_size_set(0) worked.");
+	ret = srd_session_send_queue_size_set(NULL, 2);
+	fail_unless(ret != SRD_OK, "srd_session_send_queue_size_set(NULL) worked.");
+	srd_session_destroy(sess);
+	srd_exit();
+}
+END_TEST
+
+/*
+ * Check whether srd_session_lazy_ann_text_set() works.
+ * If it returns != SRD_OK (or segfaults) this test will fail.
+ */
+START_TEST(test_session_lazy_ann_text_set)
+{
+	int ret;
+	struct srd_session *sess;
+
+	srd_init(NULL);
+	srd_session_new(&sess);
+	ret = srd_session_lazy_ann_text_set(sess, TRUE);
+	fail_unless(ret == SRD_OK, "srd_session_lazy_ann_text_set() failed: %d.", ret);
+	ret = srd_session_lazy_ann_text_set(sess, FALSE);
+	fail_unless(ret == SRD_OK, "srd_session_lazy_ann_text_set() failed: %d.", ret);
+	ret = srd_session_lazy_ann_text_set(NULL, TRUE);
+	fail_unless(ret != SRD_OK, "srd_session_lazy_ann_text_set(NULL) worked.");
+	srd_session_destroy(sess);
+	srd_exit();
+}
+END_TEST
+
+/*
+ * Check whether srd_ann_text_get() formats templated annotations, and
+ * returns the text of other annotations.
+ * If the texts differ (or it segfaults) this test will fail.
+ */
+START_TEST(test_ann_text_get)
+{
+	struct srd_proto_data_annotation pda;
+	char *formats[] = { "Data: %02X (%d%%)", "%-3o|%c", NULL };
+	char *texts[] = { "Start", "S", NULL };
+	char *text;
+
+	memset(&pda, 0, sizeof(pda));
+	pda.ann_formats = formats;
+	pda.num_args = 2;
+	pda.ann_args[0] = 10;
+	pda.ann_args[1] = 65;
+	text = srd_ann_text_get(&pda, 0);
+	fail_unless(!g_strcmp0(text, "Data: 0A (65%)"), "Got '%s'.", text);
+	g_free(text);
+	text = srd_ann_text_get(&pda, 1);
+	fail_unless(!g_strcmp0(text, "12 |A"), "Got '%s'.", text);
+	g_free(text);
+	fail_unless(srd_ann_text_get(&pda, 2) == NULL, "Text 2 exists.");
+
+	memset(&pda, 0, sizeof(pda));
+	pda.ann_text = texts;
+	text = srd_ann_text_get(&pda, 1);
+	fail_unless(!g_strcmp0(text, "S"), "Got '%s'.", text);
+	g_free(text);
+	fail_unless(srd_ann_text_get(&pda, 2) == NULL, "Text 2 exists.");
+	fail_unless(srd_ann_text_get(NULL, 0) == NULL, "NULL annotation worked.");
+}
+END_TEST
+
+/*
+ * Check whether transitions get decoded like the equivalent samples.
+ * If the annotation counts differ (or it segfaults) this test will fail.
+ */
+START_TEST(test_session_send_transitions)
+{
+	uint64_t seq[NUM_STACKS], rle[NUM_STACKS];
+	int i;
+
+	srd_init(DECODERS_TESTDIR);
+	srd_decoder_load("uart");
+	send_uart(SRD_SEND_SEQUENTIAL, SEND_CHUNKS, NULL, seq);
+	send_uart(SRD_SEND_SEQUENTIAL, SEND_TRANSITIONS, NULL, rle);
+	for (i = 0; i < NUM_STACKS; i++) {
+		fail_unless(seq[i] > 0, "No annotations in sequential mode.");
+		fail_unless(rle[i] == seq[i], "Stack %d: %" PRIu64 " annotations "
+			"from transitions, %" PRIu64 " expected.", i,
+			rle[i], seq[i]);
+	}
+	srd_exit();
+}
+END_TEST
+
+/*
+ * Check whether batches contain the same annotations in the same order
+ * as the per-annotation callback receives them.
+ * If the annotation counts or order differ (or it segfaults) this test
+ * will fail.
+ */
+START_TEST(test_session_send_batch)
+{
+	const struct send_options opts = { .batch = TRUE };
+	uint64_t seq[NUM_STACKS], batch[NUM_STACKS], hash[NUM_STACKS];
+	int i;
+
+	srd_init(DECODERS_TESTDIR);
+	srd_decoder_load("uart");
+	send_uart(SRD_SEND_SEQUENTIAL, SEND_CHUNKS, NULL, seq);
+	memcpy(hash, send_hash, sizeof(hash));
+	send_uart(SRD_SEND_SEQUENTIAL, SEND_CHUNKS, &opts, batch);
+	for (i = 0; i < NUM_STACKS; i++) {
+		fail_unless(seq[i] > 0, "No annotations in sequential mode.");
+		fail_unless(batch[i] == seq[i], "Stack %d: %" PRIu64 " annotations "
+			"in batches, %" PRIu64 " expected.", i, batch[i], seq[i]);
+		fail_unless(send_hash[i] == hash[i], "Stack %d: Annotations "
+			"in batches are out of order.", i);
+	}
+	srd_exit();
+}
+END_TEST
+
+/*
+ * Check whether decoding in segments yields the same annotations in the
+ * same order as decoding in one go, and whether bogus arguments get
+ * rejected.
+ * If the annotation counts or order differ (or it segfaults) this test
+ * will fail.
+ */
+START_TEST(test_session_send_segments)
+{
+	uint64_t seq[NUM_STACKS], seg[NUM_STACKS], hash[NUM_STACKS];
+	struct srd_session *sess;
+	uint8_t buf[16];
+	int i;
+
+	srd_init(DECODERS_TESTDIR);
+	srd_decoder_load("uart");
+	send_uart(SRD_SEND_SEQUENTIAL, SEND_CHUNKS, NULL, seq);
+	memcpy(hash, send_hash, sizeof(hash));
+	send_uart(SRD_SEND_SEQUENTIAL, SEND_SEGMENTS, NULL, seg);
+	for (i = 0; i < NUM_STACKS; i++) {
+		fail_unless(seq[i] > 0, "No annotations in sequential mode.");
+		fail_unless(seg[i] == seq[i], "Stack %d: %" PRIu64 " annotations "
+			"in segments, %" PRIu64 " expected.", i, seg[i], seq[i]);
+		fail_unless(send_hash[i] == hash[i], "Stack %d: Annotations "
+			"in segments are out of order.", i);
+	}
+
+	memset(buf, 0, sizeof(buf));
+	srd_session_new(&sess);
+	fail_unless(srd_session_send_segments(NULL, 0, 16, buf, 16, 1, 2) != SRD_OK);
+	fail_unless(srd_session_send_segments(sess, 0, 16, NULL, 16, 1, 2) != SRD_OK);
+	fail_unless(srd_session_send_segments(sess, 0, 16, buf, 8, 1, 2) != SRD_OK);
+	fail_unless(srd_session_send_segments(sess, 16, 16, buf, 16, 1, 2) != SRD_OK);
+	fail_unless(srd_session_send_segments(sess, 0, 16, buf, 16, 0, 2) != SRD_OK);
+	fail_unless(srd_session_send_segments(sess, 0, 16, buf, 16, 1, 0) != SRD_OK);
+	srd_session_destroy(sess);
+	srd_exit();
+}
+END_TEST
+
+static GString *uart_rx;
+
+static void uart_ann_cb(struct srd_proto_data *pdata, void *cb_data)
+{
+	struct srd_proto_data_annotation *pda;
+
+	(void)cb_data;
+
+	pda = pdata->data;
+	if (pda->ann_class == 0)
+		g_string_append_printf(uart_rx, "%s ", pda->ann_text[0]);
+}
+
+/*
+ * Check whether UART frames which get read at once, across chunks, are
+ * decoded like the frames of send_uart(). Only RX is active, so that
+ * the frames' bits get read by sample_points().
+ * If the RX data differs (or it segfaults) this test will fail.
+ */
+START_TEST(test_session_send_uart_frames)
+{
+	struct srd_session *sess;
+	GHashTable *options;
+	GString *expected;
+	uint8_t *buf;
+	uint64_t i, bit, byte;
+	int ret;
+
+	/* Idle high, then one byte every 100 bit times (LSB first, 8N1). */
+	buf = g_malloc(NUM_SAMPLES);
+	expected = g_string_new(NULL);
+	for (i = 0; i < NUM_SAMPLES; i++) {
+		bit = i * 115200 / 1000000;
+		byte = bit / 100;
+		bit %= 100;
+		if (bit == 0)
+			buf[i] = 0x02;
+		else if (bit <= 8)
+			buf[i] = ((byte * 37) >> (bit - 1)) & 1 ? 0x03 : 0x02;
+		else
+			buf[i] = 0x03;
+	}
+	/* The first byte has no start bit edge, the last one is cut short. */
+	for (byte = 1; (byte * 100 + 10) * 1000000 / 115200 < NUM_SAMPLES; byte++)
+		g_string_append_printf(expected, "%02X ",
+			(unsigned int)(byte * 37) & 0xff);
+
+	srd_init(DECODERS_TESTDIR);
+	srd_decoder_load("uart");
+	srd_session_new(&sess);
+	options = g_hash_table_new_full(g_str_hash, g_str_equal, g_free,
+			(GDestroyNotify)g_variant_unref);
+	fail_unless(srd_inst_new(sess, "uart", options) != NULL,
+		"srd_inst_new() failed.");
+	g_hash_table_destroy(options);
+	srd_pd_output_callback_add(sess, SRD_OUTPUT_ANN, uart_ann_cb, NULL);
+	srd_session_metadata_set(sess, SRD_CONF_SAMPLERATE,
+		g_variant_new_uint64(1000000));
+	srd_session_start(sess);
+	uart_rx = g_string_new(NULL);
+	for (i = 0; i < NUM_SAMPLES; i += 13) {
+		ret = srd_session_send(sess, i, MIN(i + 13, NUM_SAMPLES),
+			buf + i, MIN(13, NUM_SAMPLES - i), 1);
+		fail_unless(ret == SRD_OK, "srd_session_send() failed: %d.", ret);
+	}
+	fail_unless(!strcmp(uart_rx->str, expected->str),
+		"Got RX data '%s', expected '%s'.", uart_rx->str, expected->str);
+
+	srd_session_destroy(sess);
+	g_string_free(uart_rx, TRUE);
+	g_string_free(expected, TRUE);
+	g_free(buf);
+	srd_exit();
+}
+END_TEST
+
+/* Decode RX of a 4MHz, 115200 baud signal, in one go or in segments. */
+static void segments_uart_rx(const uint8_t *buf, uint64_t num_samples,
+		unsigned int max_segments)
+{
+	struct srd_session *sess;
+	GHashTable *options;
+	int ret;
+
+	srd_session_new(&sess);
+	options = g_hash_table_new_full(g_str_hash, g_str_equal, g_free,
+			(GDestroyNotify)g_variant_unref);
+	fail_unless(srd_inst_new(sess, "uart", options) != NULL,
+		"srd_inst_new() failed.");
+	g_hash_table_destroy(options);
+	srd_pd_output_callback_add(sess, SRD_OUTPUT_ANN, uart_ann_cb, NULL);
+	srd_session_metadata_set(sess, SRD_CONF_SAMPLERATE,
+		g_variant_new_uint64(4000000));
+	srd_session_start(sess);
+	if (max_segments > 1) {
+		ret = srd_session_send_segments(sess, 0, num_samples, buf,
+			num_samples, 1, max_segments);
+		fail_unless(ret == SRD_OK, "srd_session_send_segments() "
+			"failed: %d.", ret);
+	} else {
+		ret = srd_session_send(sess, 0, num_samples, buf, num_samples, 1);
+		fail_unless(ret == SRD_OK, "srd_session_send() failed: %d.", ret);
+	}
+	srd_session_destroy(sess);
+}
+
+/*
+ * Check whether segments which end within a UART frame get decoded like
+ * the capture in one go. The capture ends in the middle of a frame, so
+ * that the last segment's copy is reading the frame's bits while its
+ * session gets destroyed.
+ * If the RX data differs (or it segfaults) this test will fail.
+ */
+START_TEST(test_session_send_segments_frame_cut)
+{
+	GByteArray *bits;
+	GString *expected;
+	uint8_t *buf, level;
+	uint64_t i, num_samples;
+	unsigned int byte, b, gap;
+	const unsigned int segments[] = { 2, 8 };
+
+	/* Bytes with gaps of 1-3 bit times, and every 6th gap is idle. */
+	bits = g_byte_array_new();
+	level = 1;
+	for (i = 0; i < 20; i++)
+		g_byte_array_append(bits, &level, 1);
+	for (byte = 0; byte < 300; byte++) {
+		level = 0;
+		g_byte_array_append(bits, &level, 1);
+		for (b = 0; b < 8; b++) {
+			level = ((byte * 37) >> b) & 1;
+			g_byte_array_append(bits, &level, 1);
+		}
+		level = 1;
+		gap = (byte % 6 == 5) ? 20 : 1 + byte % 3;
+		for (b = 0; b < gap; b++)
+			g_byte_array_append(bits, &level, 1);
+	}
+	/* End within the last byte's data bits. */
+	g_byte_array_set_size(bits, bits->len - gap - 5);
+	num_samples = (uint64_t)bits->len * 4000000 / 115200;
+	buf = g_malloc(num_samples);
+	for (i = 0; i < num_samples; i++)
+		buf[i] = bits->data[i * 115200 / 4000000] ? 0x03 : 0x02;
+	g_byte_array_free(bits, TRUE);
+
+	srd_init(DECODERS_TESTDIR);
+	srd_decoder_load("uart");
+	uart_rx = g_string_new(NULL);
+	segments_uart_rx(buf, num_samples, 1);
+	expected = uart_rx;
+	fail_unless(expected->len > 0, "No RX data.");
+	for (i = 0; i < G_N_ELEMENTS(segments); i++) {
+		uart_rx = g_string_new(NULL);
+		segments_uart_rx(buf, num_samples, segments[i]);
+		fail_unless(!strcmp(uart_rx->str, expected->str),
+			"Got RX data '%s' from %u segments, expected '%s'.",
+			uart_rx->str, segments[i], expected->str);
+		g_string_free(uart_rx, TRUE);
+	}
+
+	g_string_free(expected, TRUE);
+	g_free(buf);
+	srd_exit();
+}
+END_TEST
+
+/*
+ * Check whether UART frames get decoded from chunks in which the UART's
+ * channels don't change, while an unused channel does.
+ * If the RX data differs (or it segfaults) this test will fail.
+ */
+START_TEST(test_session_send_steady)
+{
+	struct srd_session *sess;
+	GHashTable *options;
+	GString *expected;
+	uint8_t *buf;
+	uint64_t i, pos, bit, byte;
+	int ret;
+
+	/*
+	 * 9600 baud at 1MHz, one byte every 3000 samples (LSB first, 8N1),
+	 * starting at 0x00, so that whole chunks are within a frame's low
+	 * bits. Channel 2 toggles all the time.
+	 */
+	buf = g_malloc(30000);
+	expected = g_string_new(NULL);
+	for (i = 0; i < 30000; i++) {
+		byte = i / 3000;
+		pos = i % 3000;
+		bit = pos < 100 ? 99 : (pos - 100) * 9600 / 1000000;
+		if (bit == 0)
+			buf[i] = 0x02;
+		else if (bit <= 8)
+			buf[i] = ((byte * 37) >> (bit - 1)) & 1 ? 0x03 : 0x02;
+		else
+			buf[i] = 0x03;
+		buf[i] |= (i & 1) << 2;
+	}
+	for (byte = 0; byte < 10; byte++)
+		g_string_append_printf(expected, "%02X ",
+			(unsigned int)(byte * 37) & 0xff);
+
+	srd_init(DECODERS_TESTDIR);
+	srd_decoder_load("uart");
+	srd_session_new(&sess);
+	options = g_hash_table_new_full(g_str_hash, g_str_equal, g_free,
+			(GDestroyNotify)g_variant_unref);
+	g_hash_table_insert(options, g_strdup("baudrate"),
+		g_variant_ref_sink(g_variant_new_int64(9600)));
+	fail_unless(srd_inst_new(sess, "uart", options) != NULL,
+		"srd_inst_new() failed.");
+	g_hash_table_destroy(options);
+	srd_pd_output_callback_add(sess, SRD_OUTPUT_ANN, uart_ann_cb, NULL);
+	srd_session_metadata_set(sess, SRD_CONF_SAMPLERATE,
+		g_variant_new_uint64(1000000));
+	srd_session_start(sess);
+	uart_rx = g_string_new(NULL);
+	for (i = 0; i < 30000; i += 100) {
+		ret = srd_session_send(sess, i, i + 100, buf + i, 100, 1);
+		fail_unless(ret == SRD_OK, "srd_session_send() failed: %d.", ret);
+	}
+	fail_unless(!strcmp(uart_rx->str, expected->str),
+		"Got RX data '%s', expected '%s'.", uart_rx->str, expected->str);
+
+	srd_session_destroy(sess);
+	g_string_free(uart_rx, TRUE);
+	g_string_free(expected, TRUE);
+	g_free(buf);
+	srd_exit();
+}
+END_TEST
+
+/*
+ * Write a decoder's source to a new temporary decoder directory.
+ * Returns the directory, which must be passed to pd_dir_remove().
+ */
+static char *pd_dir_new(const char *id, const char *source)
+{
+	char *dir, *pd_dir, *init_py, *pd_py;
+
+	dir = g_strdup_printf("%s/srd-%s-%d", g_get_tmp_dir(), id, (int)getpid());
+	pd_dir = g_build_filename(dir, id, NULL);
+	init_py = g_build_filename(pd_dir, "__init__.py", NULL);
+	pd_py = g_build_filename(pd_dir, "pd.py", NULL);
+	fail_unless(g_mkdir_with_parents(pd_dir, 0700) == 0);
+	fail_unless(g_file_set_contents(init_py, "from .pd import Decoder\n", -1, NULL));
+	fail_unless(g_file_set_contents(pd_py, source, -1, NULL));
+	g_free(pd_py);
+	g_free(init_py);
+	g_free(pd_dir);
+
+	return dir;
+}
+
+static void pd_dir_remove(char *dir, const char *id)
+{
+	char *pd_dir, *path;
+
+	pd_dir = g_build_filename(dir, id, NULL);
+	path = g_build_filename(pd_dir, "__init__.py", NULL);
+	g_remove(path);
+	g_free(path);
+	path = g_build_filename(pd_dir, "pd.py", NULL);
+	g_remove(path);
+	g_free(path);
+	g_rmdir(pd_dir);
+	g_rmdir(dir);
+	g_free(pd_dir);
+	g_free(dir);
+}
+
+static const char *pulsetest_pd = "import sigrokdecode as srd\n"
+	"class Decoder(srd.Decoder):\n"
+	"    api_version = 3\n"
+	"    id = 'pulsetest'\n"
+	"    name = 'pulsetest'\n"
+	"    longname = 'Pulse test'\n"
+	"    desc = 'Pulse test.'\n"
+	"    license = 'gplv2+'\n"
+	"    inputs = ['logic']\n"
+	"    outputs = []\n"
+	"    channels = ({'id': 'data', 'name': 'Data', 'desc': 'Data line'},)\n"
+	"    options = ({'id': 'glitch', 'desc': 'Glitch', 'default': 0},)\n"
+	"    annotations = (('low', 'Low'), ('high', 'High'))\n"
+	"    def start(self):\n"
+	"        self.out_ann = self.register(srd.OUTPUT_ANN)\n"
+	"    def decode(self):\n"
+	"        while True:\n"
+	"            s = self.samplenum\n"
+	"            (levels, lengths) = self.pulses(0, 3, self.options['glitch'])\n"
+	"            for (level, length) in zip(levels, lengths):\n"
+	"                self.put(s, s + length, self.out_ann, [level, ['']])\n"
+	"                s += length\n"
+	"            if s != self.samplenum:\n"
+	"                raise Exception('samplenum %d, expected %d' % (self.samplenum, s))\n";
+
+static GString *pulses;
+
+static void pulses_ann_cb(struct srd_proto_data *pdata, void *cb_data)
+{
+	struct srd_proto_data_annotation *pda;
+
+	(void)cb_data;
+
+	pda = pdata->data;
+	g_string_append_printf(pulses, "%d:%" PRIu64 "-%" PRIu64 " ",
+		pda->ann_class, pdata->start_sample, pdata->end_sample);
+}
+
+static void send_pulses(const char *dir, uint64_t glitch, const char *expected)
+{
+	struct srd_session *sess;
+	GHashTable *options;
+	uint8_t buf[120];
+	unsigned int i;
+	int ret;
+
+	/*
+	 * Low, high with a short low pulse, low with a short high pulse,
+	 * high, low, and high until the end.
+	 */
+	for (i = 0; i < sizeof(buf); i++)
+		buf[i] = (i >= 10 && i < 30) || i == 45 || (i >= 60 && i < 100) || i >= 110;
+	buf[18] = buf[19] = 0;
+
+	srd_init(dir);
+	srd_decoder_load("pulsetest");
+	srd_session_new(&sess);
+	options = g_hash_table_new_full(g_str_hash, g_str_equal, g_free,
+			(GDestroyNotify)g_variant_unref);
+	g_hash_table_insert(options, g_strdup("glitch"),
+		g_variant_ref_sink(g_variant_new_int64(glitch)));
+	fail_unless(srd_inst_new(sess, "pulsetest", options) != NULL,
+		"srd_inst_new() failed.");
+	g_hash_table_destroy(options);
+	srd_pd_output_callback_add(sess, SRD_OUTPUT_ANN, pulses_ann_cb, NULL);
+	srd_session_start(sess);
+	pulses = g_string_new(NULL);
+	for (i = 0; i < sizeof(buf); i += 7) {
+		ret = srd_session_send(sess, i, MIN(i + 7, sizeof(buf)),
+			buf + i, MIN(7, sizeof(buf) - i), 1);
+		fail_unless(ret == SRD_OK, "srd_session_send() failed: %d.", ret);
+	}
+	fail_unless(!strcmp(pulses->str, expected),
+		"Got pulses '%s', expected '%s'.", pulses->str, expected);
+
+	srd_session_destroy(sess);
+	g_string_free(pulses, TRUE);
+	srd_exit();
+}
+
+/*
+ * Check whether pulses() measures runs across chunks, and whether it
+ * drops glitches.
+ * If the runs differ (or it segfaults) this test will fail.
+ */
+START_TEST(test_session_send_pulses)
+{
+	char *dir;
+
+	dir = pd_dir_new("pulsetest", pulsetest_pd);
+
+	send_pulses(dir, 0, "0:0-10 1:10-18 0:18-20 1:20-30 0:30-45 1:45-46 "
+		"0:46-60 1:60-100 0:100-110 ");
+	send_pulses(dir, 3, "0:0-10 1:10-30 0:30-60 1:60-100 0:100-110 ");
+
+	pd_dir_remove(dir, "pulsetest");
+}
+END_TEST
+
+static const char *waittest_pd = "import sigrokdecode as srd\n"
+	"class Decoder(srd.Decoder):\n"
+	"    api_version = 3\n"
+	"    id = 'waittest'\n"
+	"    name = 'waittest'\n"
+	"    longname = 'Wait test'\n"
+	"    desc = 'Wait test.'\n"
+	"    license = 'gplv2+'\n"
+	"    inputs = ['logic']\n"
+	"    outputs = []\n"
+	"    channels = ({'id': 'data', 'name': 'Data', 'desc': 'Data line'},)\n"
+	"    annotations = (('fall', 'Fall'), ('rise', 'Rise'))\n"
+	"    def __init__(self):\n"
+	"        self.samplenum = None\n"
+	"    def start(self):\n"
+	"        self.out_ann = self.register(srd.OUTPUT_ANN)\n"
+	"    def decode(self):\n"
+	"        if self.samplenum != 0 or self.matched is not None:\n"
+	"            raise Exception('samplenum %r, matched %r' % (self.samplenum, self.matched))\n"
+	"        while True:\n"
+	"            self.samplenum = -1\n"
+	"            if self.samplenum != -1:\n"
+	"                raise Exception('samplenum %r' % self.samplenum)\n"
+	"            (d,) = self.wait([{0: 'r'}, {0: 'e'}])\n"
+	"            if self.matched != (d == 1, True):\n"
+	"                raise Exception('matched %r' % (self.matched,))\n"
+	"            self.put(self.samplenum, self.samplenum, self.out_ann, [d, ['']])\n";
+
+/*
+ * Check whether self.samplenum and self.matched keep the values which a
+ * decoder assigns, and get set by wait().
+ * If the matches differ (or it segfaults) this test will fail.
+ */
+START_TEST(test_session_send_wait_attrs)
+{
+	struct srd_session *sess;
+	char *dir;
+	uint8_t buf[40];
+	unsigned int i;
+	int ret;
+
+	dir = pd_dir_new("waittest", waittest_pd);
+
+	for (i = 0; i < sizeof(buf); i++)
+		buf[i] = (i >= 10 && i < 25) || i >= 30;
+
+	srd_init(dir);
+	srd_decoder_load("waittest");
+	srd_session_new(&sess);
+	fail_unless(srd_inst_new(sess, "waittest", NULL) != NULL,
+		"srd_inst_new() failed.");
+	srd_pd_output_callback_add(sess, SRD_OUTPUT_ANN, pulses_ann_cb, NULL);
+	srd_session_start(sess);
+	pulses = g_string_new(NULL);
+	for (i = 0; i < sizeof(buf); i += 7) {
+		ret = srd_session_send(sess, i, MIN(i + 7, sizeof(buf)),
+			buf + i, MIN(7, sizeof(buf) - i), 1);
+		fail_unless(ret == SRD_OK, "srd_session_send() failed: %d.", ret);
+	}
+	fail_unless(!strcmp(pulses->str, "1:10-10 0:25-25 1:30-30 "),
+		"Got matches '%s'.", pulses->str);
+
+	srd_session_destroy(sess);
+	g_string_free(pulses, TRUE);
+	srd_exit();
+
+	pd_dir_remove(dir, "waittest");
+}
+END_TEST
+
+static const char *edgetest_pd = "import sigrokdecode as srd\n"
+	"class Decoder(srd.Decoder):\n"
+	"    api_version = 3\n"
+	"    id = 'edgetest'\n"
+	"    name = 'edgetest'\n"
+	"    longname = 'Edge test'\n"
+	"    desc = 'Edge test.'\n"
+	"    license = 'gplv2+'\n"
+	"    inputs = ['logic']\n"
+	"    outputs = []\n"
+	"    channels = ({'id': 'data', 'name': 'Data', 'desc': 'Data line'},)\n"
+	"    options = ({'id': 'batch', 'desc': 'Batch size', 'default': 0},)\n"
+	"    annotations = (('batch', 'Batch'), ('wait', 'Wait'))\n"
+	"    def start(self):\n"
+	"        self.out_ann = self.register(srd.OUTPUT_ANN)\n"
+	"    def decode(self):\n"
+	"        batch = self.options['batch']\n"
+	"        while True:\n"
+	"            if batch:\n"
+	"                edges = self.wait_edges(0, 'e', batch)\n"
+	"                for e in edges:\n"
+	"                    self.put(e, e, self.out_ann, [0, ['']])\n"
+	"                if self.samplenum != edges[-1]:\n"
+	"                    raise Exception('samplenum %d, last edge %d' % (self.samplenum, edges[-1]))\n"
+	"            self.wait({0: 'e'})\n"
+	"            self.put(self.samplenum, self.samplenum, self.out_ann, [1, ['']])\n";
+
+static void send_edges(const char *dir, int64_t batch, const char *expected)
+{
+	struct srd_session *sess;
+	GHashTable *options;
+	uint8_t buf[42];
+	unsigned int i;
+	int ret;
+
+	/* Edges at 3, 5, 9, 12, 20, 22, 23, 30 and 40. */
+	for (i = 0; i < sizeof(buf); i++) {
+		buf[i] = (i >= 3 && i < 5) || (i >= 9 && i < 12) ||
+			(i >= 20 && i < 22) || (i >= 23 && i < 30) || i >= 40;
+	}
+
+	srd_init(dir);
+	srd_decoder_load("edgetest");
+	srd_session_new(&sess);
+	options = g_hash_table_new_full(g_str_hash, g_str_equal, g_free,
+			(GDestroyNotify)g_variant_unref);
+	g_hash_table_insert(options, g_strdup("batch"),
+		g_variant_ref_sink(g_variant_new_int64(batch)));
+	fail_unless(srd_inst_new(sess, "edgetest", options) != NULL,
+		"srd_inst_new() failed.");
+	g_hash_table_destroy(options);
+	srd_pd_output_callback_add(sess, SRD_OUTPUT_ANN, pulses_ann_cb, NULL);
+	srd_session_start(sess);
+	pulses = g_string_new(NULL);
+	for (i = 0; i < sizeof(buf); i += 7) {
+		ret = srd_session_send(sess, i, i + 7, buf + i, 7, 1);
+		fail_unless(ret == SRD_OK, "srd_session_send() failed: %d.", ret);
+	}
+	fail_unless(!strcmp(pulses->str, expected),
+		"Got edges '%s', expected '%s'.", pulses->str, expected);
+
+	srd_session_destroy(sess);
+	g_string_free(pulses, TRUE);
+	srd_exit();
+}
+
+/*
+ * Check whether wait_edges() finds the edges which wait() finds, returns
+ * the edges found so far when a chunk runs out, and lets the next wait()
+ * continue from the last edge.
+ * If the edges differ (or it segfaults) this test will fail.
+ */
+START_TEST(test_session_wait_edges)
+{
+	char *dir;
+
+	dir = pd_dir_new("edgetest", edgetest_pd);
+
+	/* Only wait(). */
+	send_edges(dir, 0, "1:3-3 1:5-5 1:9-9 1:12-12 1:20-20 1:22-22 "
+		"1:23-23 1:30-30 1:40-40 ");
+	/*
+	 * Batches of up to three edges, each followed by a wait(). The
+	 * chunks end at 7, 14, 21, 28 and 35, which cuts the batches short.
+	 */
+	send_edges(dir, 3, "0:3-3 0:5-5 1:9-9 0:12-12 1:20-20 0:22-22 "
+		"0:23-23 1:30-30 0:40-40 ");
+
+	pd_dir_remove(dir, "edgetest");
+}
+END_TEST
+
+static const char *chunktest_pd = "import sigrokdecode as srd\n"
+	"class Decoder(srd.Decoder):\n"
+	"    api_version = 3\n"
+	"    id = 'chunktest'\n"
+	"    name = 'chunktest'\n"
+	"    longname = 'Chunk test'\n"
+	"    desc = 'Chunk test.'\n"
+	"    license = 'gplv2+'\n"
+	"    inputs = ['logic']\n"
+	"    outputs = []\n"
+	"    channels = ({'id': 'data', 'name': 'Data', 'desc': 'Data line'},)\n"
+	"    annotations = (('chunk', 'Chunk'),)\n"
+	"    def start(self):\n"
+	"        self.out_ann = self.register(srd.OUTPUT_ANN)\n"
+	"        self.before = self.get_chunk()\n"
+	"    def decode(self):\n"
+	"        if self.before is not None:\n"
+	"            raise Exception('chunk %r before samples' % (self.before,))\n"
+	"        prev = None\n"
+	"        while True:\n"
+	"            (start, unitsize, data) = self.get_chunk()\n"
+	"            if self.get_chunk()[2] is not data:\n"
+	"                raise Exception('samples copied twice')\n"
+	"            if data is prev:\n"
+	"                raise Exception('samples of the previous chunk')\n"
+	"            prev = data\n"
+	"            end = start + len(data) // unitsize\n"
+	"            self.put(start, end, self.out_ann, [0, [data.hex()]])\n"
+	"            self.wait({'skip': end - self.samplenum})\n";
+
+static GString *chunks;
+
+static void chunks_ann_cb(struct srd_proto_data *pdata, void *cb_data)
+{
+	struct srd_proto_data_annotation *pda;
+
+	(void)cb_data;
+
+	pda = pdata->data;
+	g_string_append_printf(chunks, "%" PRIu64 "-%" PRIu64 ":%s ",
+		pdata->start_sample, pdata->end_sample, pda->ann_text[0]);
+}
+
+static struct srd_session *chunks_session_new(void)
+{
+	struct srd_session *sess;
+
+	srd_session_new(&sess);
+	fail_unless(srd_inst_new(sess, "chunktest", NULL) != NULL,
+		"srd_inst_new() failed.");
+	srd_pd_output_callback_add(sess, SRD_OUTPUT_ANN, chunks_ann_cb, NULL);
+	srd_session_start(sess);
+	chunks = g_string_new(NULL);
+
+	return sess;
+}
+
+/*
+ * Check whether get_chunk() returns the samples of dense and run-length
+ * encoded chunks, copies them once per chunk, and returns None before
+ * any samples were sent.
+ * If the samples differ (or it segfaults) this test will fail.
+ */
+START_TEST(test_session_get_chunk)
+{
+	struct srd_session *sess;
+	char *dir;
+	uint8_t buf[20];
+	const uint64_t samplenums[] = { 0, 4, 10, 13 };
+	const uint8_t values[] = { 1, 2, 3, 0 };
+	unsigned int i;
+	int ret;
+
+	dir = pd_dir_new("chunktest", chunktest_pd);
+	srd_init(dir);
+	srd_decoder_load("chunktest");
+
+	for (i = 0; i < sizeof(buf); i++)
+		buf[i] = i;
+	sess = chunks_session_new();
+	for (i = 0; i < sizeof(buf); i += 7) {
+		ret = srd_session_send(sess, i, MIN(i + 7, sizeof(buf)),
+			buf + i, MIN(7, sizeof(buf) - i), 1);
+		fail_unless(ret == SRD_OK, "srd_session_send() failed: %d.", ret);
+	}
+	fail_unless(!strcmp(chunks->str, "0-7:00010203040506 "
+		"7-14:0708090a0b0c0d 14-20:0e0f10111213 "),
+		"Got chunks '%s'.", chunks->str);
+	srd_session_destroy(sess);
+	g_string_free(chunks, TRUE);
+
+	sess = chunks_session_new();
+	ret = srd_session_send_transitions(sess, 0, 10, samplenums, values, 2, 1);
+	fail_unless(ret == SRD_OK, "srd_session_send_transitions() failed: %d.", ret);
+	ret = srd_session_send_transitions(sess, 10, 16, samplenums + 2,
+		values + 2, 2, 1);
+	fail_unless(ret == SRD_OK, "srd_session_send_transitions() failed: %d.", ret);
+	fail_unless(!strcmp(chunks->str, "0-10:01010101020202020202 "
+		"10-16:030303000000 "), "Got chunks '%s'.", chunks->str);
+	srd_session_destroy(sess);
+	g_string_free(chunks, TRUE);
+
+	srd_exit();
+	pd_dir_remove(dir, "chunktest");
+}
+END_TEST
+
+static const char *pointtest_pd = "import sigrokdecode as srd\n"
+	"class Decoder(srd.Decoder):\n"
+	"    api_version = 3\n"
+	"    id = 'pointtest'\n"
+	"    name = 'pointtest'\n"
+	"    longname = 'Sample point test'\n"
+	"    desc = 'Sample point test.'\n"
+	"    license = 'gplv2+'\n"
+	"    inputs = ['logic']\n"
+	"    outputs = []\n"
+	"    channels = ({'id': 'data', 'name': 'Data', 'desc': 'Data line'},)\n"
+	"    annotations = (('points', 'Points'),)\n"
+	"    def start(self):\n"
+	"        self.out_ann = self.register(srd.OUTPUT_ANN)\n"
+	"    def decode(self):\n"
+	"        start = 0\n"
+	"        while True:\n"
+	"            (pins, values, points) = self.sample_points(start, 4, 10, [0])\n"
+	"            self.put(points[0], points[-1], self.out_ann, [0, [values[0].hex()]])\n"
+	"            start = points[-1] + 4\n";
+
+/*
+ * Check whether sample_points() doesn't return the points read so far
+ * when decoding ends, so that the decoder doesn't run on after the
+ * termination request.
+ * If there is output after the first batch of points (or it segfaults)
+ * this test will fail.
+ */
+START_TEST(test_session_sample_points_terminate)
+{
+	struct srd_session *sess;
+	char *dir;
+	uint8_t buf[60];
+	unsigned int i;
+	int ret;
+
+	dir = pd_dir_new("pointtest", pointtest_pd);
+	srd_init(dir);
+	srd_decoder_load("pointtest");
+
+	/* The first batch reads 0 .. 36, the second one runs out at 56. */
+	for (i = 0; i < sizeof(buf); i++)
+		buf[i] = (i / 4) % 2;
+	srd_session_new(&sess);
+	fail_unless(srd_inst_new(sess, "pointtest", NULL) != NULL,
+		"srd_inst_new() failed.");
+	srd_pd_output_callback_add(sess, SRD_OUTPUT_ANN, chunks_ann_cb, NULL);
+	srd_session_start(sess);
+	chunks = g_string_new(NULL);
+	for (i = 0; i < sizeof(buf); i += 7) {
+		ret = srd_session_send(sess, i, MIN(i + 7, sizeof(buf)),
+			buf + i, MIN(7, sizeof(buf) - i), 1);
+		fail_unless(ret == SRD_OK, "srd_session_send() failed: %d.", ret);
+	}
+	srd_session_destroy(sess);
+	fail_unless(!strcmp(chunks->str, "0-36:00010001000100010001 "),
+		"Got points '%s'.", chunks->str);
+	g_string_free(chunks, TRUE);
+
+	srd_exit();
+	pd_dir_remove(dir, "pointtest");
+}
+END_TEST
+
+static const char *bintest_pd = "import sigrokdecode as srd\n"
+	"class Decoder(srd.Decoder):\n"
+	"    api_version = 3\n"
+	"    id = 'bintest'\n"
+	"    name = 'bintest'\n"
+	"    longname = 'Binary test'\n"
+	"    desc = 'Binary test.'\n"
+	"    license = 'gplv2+'\n"
+	"    inputs = ['logic']\n"
+	"    outputs = []\n"
+	"    channels = ({'id': 'data', 'name': 'Data', 'desc': 'Data line'},)\n"
+	"    binary = (('raw', 'Raw'),)\n"
+	"    def start(self):\n"
+	"        self.out_binary = self.register(srd.OUTPUT_BINARY)\n"
+	"    def decode(self):\n"
+	"        self.put(0, 1, self.out_binary, [0, [b'ab', bytearray(b'cd'), memoryview(b'ef')]])\n"
+	"        self.put(1, 2, self.out_binary, [0, memoryview(b'gh')])\n"
+	"        self.put(2, 3, self.out_binary, [0, [b'ij', 5]])\n"
+	"        self.put(3, 4, self.out_binary, [0, (b'kl', b'')])\n"
+	"        while True:\n"
+	"            self.wait({'skip': 1})\n";
+
+static GString *binary;
+
+static void binary_cb(struct srd_proto_data *pdata, void *cb_data)
+{
+	struct srd_proto_data_binary *pdb;
+
+	(void)cb_data;
+
+	pdb = pdata->data;
+	g_string_append_printf(binary, "%" PRIu64 "-%" PRIu64 ":%d:%" PRIu64
+		":%.*s ", pdata->start_sample, pdata->end_sample,
+		pdb->bin_class, pdb->size, (int)pdb->size, pdb->data);
+}
+
+/*
+ * Check whether binary output gets passed as one block for lists and
+ * tuples of bytes-like objects, and for memoryviews, and whether a list
+ * with other items gets dropped.
+ * If the binary output differs (or it segfaults) this test will fail.
+ */
+START_TEST(test_session_put_binary)
+{
+	struct srd_session *sess;
+	char *dir;
+	uint8_t buf[8];
+	int ret;
+
+	dir = pd_dir_new("bintest", bintest_pd);
+	srd_init(dir);
+	srd_decoder_load("bintest");
+	srd_session_new(&sess);
+	fail_unless(srd_inst_new(sess, "bintest", NULL) != NULL,
+		"srd_inst_new() failed.");
+	srd_pd_output_callback_add(sess, SRD_OUTPUT_BINARY, binary_cb, NULL);
+	srd_session_start(sess);
+	binary = g_string_new(NULL);
+	memset(buf, 0, sizeof(buf));
+	ret = srd_session_send(sess, 0, sizeof(buf), buf, sizeof(buf), 1);
+	fail_unless(ret == SRD_OK, "srd_session_send() failed: %d.", ret);
+	fail_unless(!strcmp(binary->str, "0-1:0:6:abcdef 1-2:0:2:gh 3-4:0:2:kl "),
+		"Got binary output '%s'.", binary->str);
+
+	srd_session_destroy(sess);
+	g_string_free(binary, TRUE);
+	srd_exit();
+	pd_dir_remove(dir, "bintest");
+}
+END_TEST
+
+#define SPI_WORDS 40
+
+static GString *spi_mosi;
+
+static void spi_ann_cb(struct srd_proto_data *pdata, void *cb_data)
+{
+	struct srd_proto_data_annotation *pda;
+
+	(void)cb_data;
+
+	pda = pdata->data;
+	if (pda->ann_class == 1)
+		g_string_append_printf(spi_mosi, "%s ", pda->ann_text[0]);
+}
+
+/*
+ * Check whether SPI words which shift_in() receives across chunks get
+ * decoded, and whether words which CS# cuts short get dropped.
+ * If the MOSI data differs (or it segfaults) this test will fail.
+ */
+START_TEST(test_session_send_spi)
+{
+	struct srd_session *sess;
+	GHashTable *options;
+	GByteArray *buf;
+	GString *expected;
+	uint8_t sample, cs;
+	unsigned int i, bit, num_bits;
+	int ret;
+
+	/* CLK, MISO, MOSI and CS# are bits 0-3. Mode 0, MSB first. */
+	buf = g_byte_array_new();
+	expected = g_string_new(NULL);
+	cs = 0x08;
+	for (i = 0; i < 4; i++)
+		g_byte_array_append(buf, &cs, 1);
+	for (i = 0; i < SPI_WORDS; i++) {
+		/* Every 5th word gets cut short. */
+		num_bits = (i % 5 == 4) ? 3 : 8;
+		if (num_bits == 8)
+			g_string_append_printf(expected, "%02X ", (i * 37) & 0xff);
+		for (bit = 0; bit < num_bits; bit++) {
+			sample = (((i * 37) >> (7 - bit)) & 1) ? 0x04 : 0x00;
+			g_byte_array_append(buf, &sample, 1);
+			g_byte_array_append(buf, &sample, 1);
+			sample |= 0x01;
+			g_byte_array_append(buf, &sample, 1);
+			g_byte_array_append(buf, &sample, 1);
+		}
+		sample = 0x00;
+		g_byte_array_append(buf, &sample, 1);
+		if (i % 5 == 4) {
+			g_byte_array_append(buf, &cs, 1);
+			g_byte_array_append(buf, &cs, 1);
+		}
+	}
+
+	srd_init(DECODERS_TESTDIR);
+	srd_decoder_load("spi");
+	srd_session_new(&sess);
+	options = g_hash_table_new_full(g_str_hash, g_str_equal, g_free,
+			(GDestroyNotify)g_variant_unref);
+	fail_unless(srd_inst_new(sess, "spi", options) != NULL,
+		"srd_inst_new() failed.");
+	g_hash_table_destroy(options);
+	srd_pd_output_callback_add(sess, SRD_OUTPUT_ANN, spi_ann_cb, NULL);
+	srd_session_start(sess);
+	spi_mosi = g_string_new(NULL);
+	for (i = 0; i < buf->len; i += 13) {
+		ret = srd_session_send(sess, i, MIN(i + 13, buf->len),
+			buf->data + i, MIN(13, buf->len - i), 1);
+		fail_unless(ret == SRD_OK, "srd_session_send() failed: %d.", ret);
+	}
+	fail_unless(!strcmp(spi_mosi->str, expected->str),
+		"Got MOSI data '%s', expected '%s'.", spi_mosi->str, expected->str);
+
+	srd_session_destroy(sess);
+	g_string_free(spi_mosi, TRUE);
+	g_string_free(expected, TRUE);
+	g_byte_array_free(buf, TRUE);
+	srd_exit();
+}
+END_TEST
+
+/*
+ * Check whether instances don't put() annotations after disabling them.
+ * If there are annotations (or it segfaults) this test will fail.
+ */
+START_TEST(test_session_send_ann_disabled)
+{
+	const struct send_options opts = { .ann_disabled = TRUE };
+	uint64_t anns[NUM_STACKS];
+	int i;
+
+	srd_init(DECODERS_TESTDIR);
+	srd_decoder_load("uart");
+	send_uart(SRD_SEND_SEQUENTIAL, SEND_CHUNKS, &opts, anns);
+	for (i = 0; i < NUM_STACKS; i++)
+		fail_unless(anns[i] == 0, "Stack %d: %" PRIu64 " annotations.",
+			i, anns[i]);
+	srd_exit();
+}
+END_TEST
+
+/*
+ * Check whether srd_inst_stats_get() reports the decoding work.
+ * If the counters don't add up (or it segfaults) this test will fail.
+ */
+START_TEST(test_inst_stats_get)
+{
+	uint64_t anns[NUM_STACKS];
+	struct srd_inst_stats *stats;
+	int i;
+
+	srd_init(DECODERS_TESTDIR);
+	srd_decoder_load("uart");
+	send_uart(SRD_SEND_PARALLEL, SEND_CHUNKS, NULL, anns);
+	for (i = 0; i < NUM_STACKS; i++) {
+		stats = &send_stats[i];
+		fail_unless(stats->wait_calls > 0, "Stack %d: No wait() calls.", i);
+		fail_unless(stats->matches > 0 && stats->matches <= stats->wait_calls,
+			"Stack %d: %" PRIu64 " matches.", i, stats->matches);
+		fail_unless(stats->samples_scanned > 0 &&
+			stats->samples_scanned <= NUM_SAMPLES,
+			"Stack %d: %" PRIu64 " samples scanned.", i,
+			stats->samples_scanned);
+		fail_unless(stats->cond_cache_hits > 0, "Stack %d: No condition "
+			"cache hits.", i);
+		fail_unless(stats->put_calls[SRD_OUTPUT_ANN] == anns[i],
+			"Stack %d: %" PRIu64 " annotations put, %" PRIu64
+			" received.", i, stats->put_calls[SRD_OUTPUT_ANN], anns[i]);
+		fail_unless(stats->python_time >= 0 && stats->match_time >= 0 &&
+			stats->samples_wait_time >= 0 && stats->send_wait_time >= 0,
+			"Stack %d: Negative times.", i);
+	}
+	fail_unless(srd_inst_stats_get(NULL, stats) != SRD_OK);
+	srd_exit();
+}
+END_TEST
+
+/*
+ * Check whether a session's trace has the events of all threads.
+ * If an event type or thread is missing (or it segfaults) this test
+ * will fail.
+ */
+START_TEST(test_session_trace)
+{
+	uint64_t anns[NUM_STACKS];
+	struct send_options opts = { .trace_file = NULL };
+	struct srd_session *sess;
+	char *trace_file, *json, *name;
+	const char *events[] = { "decode", "wait for samples", "match",
+		"output callback", "send", "wait for stack" };
+	unsigned int i;
+	int ret;
+
+	trace_file = g_strdup_printf("%s/srd-trace-%d.json", g_get_tmp_dir(),
+		(int)getpid());
+	opts.trace_file = trace_file;
+	srd_init(DECODERS_TESTDIR);
+	srd_decoder_load("uart");
+	send_uart(SRD_SEND_SEQUENTIAL, SEND_CHUNKS, &opts, anns);
+	fail_unless(g_file_get_contents(trace_file, &json, NULL, NULL),
+		"No trace file.");
+	g_remove(trace_file);
+	fail_unless(g_str_has_prefix(json, "{") && strstr(json, "]}\n"),
+		"Trace is no JSON object.");
+	for (i = 0; i < G_N_ELEMENTS(events); i++) {
+		name = g_strdup_printf("\"name\": \"%s\"", events[i]);
+		fail_unless(strstr(json, name) != NULL, "No %s event.", events[i]);
+		g_free(name);
+	}
+	/* One thread per stack, and the sending thread. */
+	for (i = 0, name = json; (name = strstr(name, "thread_name")); i++)
+		name++;
+	fail_unless(i == NUM_STACKS + 1, "%u threads.", i);
+	g_free(json);
+
+	srd_session_new(&sess);
+	ret = srd_session_trace_start(NULL, 100);
+	fail_unless(ret != SRD_OK, "srd_session_trace_start(NULL) worked.");
+	ret = srd_session_trace_start(sess, 0);
+	fail_unless(ret != SRD_OK, "Zero trace size worked.");
+	ret = srd_session_trace_save(sess, trace_file);
+	fail_unless(ret != SRD_OK, "Saving without tracing worked.");
+	ret = srd_session_trace_start(sess, 100);
+	fail_unless(ret == SRD_OK, "srd_session_trace_start() failed: %d.", ret);
+	ret = srd_session_trace_start(sess, 100);
+	fail_unless(ret != SRD_OK, "Starting twice worked.");
+	ret = srd_session_trace_save(sess, NULL);
+	fail_unless(ret != SRD_OK, "NULL file name worked.");
+	srd_session_destroy(sess);
+	g_free(trace_file);
+	srd_exit();
+}
+END_TEST
+
+/*
+ * Check whether srd_pd_output_batch_callback_add() fails with invalid input.
+ * If it returns SRD_OK (or segfaults) this test will fail.
+ */
+START_TEST(test_session_batch_callback_add_bogus)
+{
+	int ret;
+	struct srd_session *sess;
+
+	srd_init(NULL);
+	srd_session_new(&sess);
+	ret = srd_pd_output_batch_callback_add(NULL, SRD_OUTPUT_ANN,
+		send_ann_batch_cb, NULL);
+	fail_unless(ret != SRD_OK, "NULL session worked.");
+	ret = srd_pd_output_batch_callback_add(sess, SRD_OUTPUT_ANN,
+		NULL, NULL);
+	fail_unless(ret != SRD_OK, "NULL callback worked.");
+	ret = srd_pd_output_batch_callback_add(sess, SRD_OUTPUT_BINARY,
+		send_ann_batch_cb, NULL);
+	fail_unless(ret != SRD_OK, "Binary output batches worked.");
+	srd_session_destroy(sess);
+	srd_exit();
+}
+END_TEST
+
+/*
+ * Check whether srd_session_send_transitions() fails with invalid input.
+ * If it returns SRD_OK (or segfaults) this test will fail.
+ */
+START_TEST(test_session_send_transitions_bogus)
+{
+	int ret;
+	struct srd_session *sess;
+	uint64_t samplenums[] = { 100, 200, 200 };
+	uint8_t values[] = { 0x00, 0x01, 0x00 };
+
+	srd_init(NULL);
+	srd_session_new(&sess);
+	ret = srd_session_send_transitions(NULL, 100, 1000, samplenums,
+		values, 2, 1);
+	fail_unless(ret != SRD_OK, "srd_session_send_transitions(NULL) worked.");
+	ret = srd_session_send_transitions(sess, 100, 1000, NULL, values, 2, 1);
+	fail_unless(ret != SRD_OK, "NULL sample numbers worked.");
+	ret = srd_session_send_transitions(sess, 100, 1000, samplenums,
+		values, 0, 1);
+	fail_unless(ret != SRD_OK, "Zero transitions worked.");
+	ret = srd_session_send_transitions(sess, 0, 1000, samplenums,
+		values, 2, 1);
+	fail_unless(ret != SRD_OK, "Transition after chunk start worked.");
+	ret = srd_session_send_transitions(sess, 100, 1000, samplenums,
+		values, 3, 1);
+	fail_unless(ret != SRD_OK, "Duplicate transition worked.");
+	ret = srd_session_send_transitions(sess, 100, 200, samplenums,
+		values, 2, 1);
+	fail_unless(ret != SRD_OK, "Transition after chunk end worked.");
+	srd_session_destroy(sess);
+	srd_exit();
+}
+END_TEST
+
 Suite *suite_session(void)
 {
 	Suite *s;
@@ -244,6 +1772,36 @@ Suite *suite_session(void)
 	tcase_add_checked_fixture(tc, srdtest_setup, srdtest_teardown);
 	tcase_add_test(tc, test_session_metadata_set);
 	tcase_add_test(tc, test_session_metadata_set_bogus);
+	tcase_add_test(tc, test_session_send_mode_set);
+	tcase_add_test(tc, test_session_send_mode_set_bogus);
+	tcase_add_test(tc, test_session_send_queue_size_set);
+	tcase_add_test(tc, test_session_lazy_ann_text_set);
+	tcase_add_test(tc, test_ann_text_get);
+	suite_add_tcase(s, tc);
+
+	tc = tcase_create("send");
+	tcase_add_checked_fixture(tc, srdtest_setup, srdtest_teardown);
+	tcase_add_test(tc, test_session_send_parallel);
+	tcase_add_test(tc, test_session_send_async);
+	tcase_add_test(tc, test_session_send_async_bogus);
+	tcase_add_test(tc, test_session_send_transitions);
+	tcase_add_test(tc, test_session_send_transitions_bogus);
+	tcase_add_test(tc, test_session_send_batch);
+	tcase_add_test(tc, test_session_batch_callback_add_bogus);
+	tcase_add_test(tc, test_session_send_segments);
+	tcase_add_test(tc, test_session_send_segments_frame_cut);
+	tcase_add_test(tc, test_session_send_spi);
+	tcase_add_test(tc, test_session_send_uart_frames);
+	tcase_add_test(tc, test_session_send_steady);
+	tcase_add_test(tc, test_session_send_pulses);
+	tcase_add_test(tc, test_session_send_wait_attrs);
+	tcase_add_test(tc, test_session_get_chunk);
+	tcase_add_test(tc, test_session_wait_edges);
+	tcase_add_test(tc, test_session_put_binary);
+	tcase_add_test(tc, test_session_sample_points_terminate);
+	tcase_add_test(tc, test_session_send_ann_disabled);
+	tcase_add_test(tc, test_inst_stats_get);
+	tcase_add_test(tc, test_session_trace);
 	suite_add_tcase(s, tc);
 
 	return s;
@@ -0,0 +1,350 @@
+/*
+ * This file is part of the libsigrokdecode project.
+ *
+ * Copyright (C) 2026 agent <agent@local>
+ *
+ * This program is free software: you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation, either version 3 of the License, or
+ * (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with this program.  If not, see <http://www.gnu.org/licenses/>.
+ */
+
+#include <config.h>
+#include "libsigrokdecode-internal.h" /* First, so we avoid a _POSIX_C_SOURCE warning. */
+#include "libsigrokdecode.h"
+#include <inttypes.h>
+#include <stdio.h>
+#include <time.h>
+#include <glib.h>
+#include <glib/gstdio.h>
+
+/**
+ * @file
+ *
+ * Timeline tracing of decoding sessions.
+ */
+
+/**
+ * @defgroup grp_trace Tracing
+ *
+ * Recording where the time of a decoding session goes.
+ *
+ * A trace records what the session's threads did when: how long the
+ * worker threads waited for samples, matched samples against wait()
+ * conditions, ran the decoders' Python code and ran output callbacks,
+ * and how long the sending thread waited for the worker threads. The
+ * trace can be saved in the Chrome trace event format, which e.g.
+ * https://ui.perfetto.dev and chrome://tracing display.
+ *
+ * @{
+ */
+
+/** @cond PRIVATE */
+
+static const char *const event_names[] = {
+	[SRD_TRACE_DECODE] = "decode",
+	[SRD_TRACE_SAMPLES_WAIT] = "wait for samples",
+	[SRD_TRACE_MATCH] = "match",
+	[SRD_TRACE_CALLBACK] = "output callback",
+	[SRD_TRACE_SEND] = "send",
+	[SRD_TRACE_SEND_WAIT] = "wait for stack",
+};
+
+/** @endcond */
+
+static struct srd_trace_buffer *trace_buffer_new(const char *name, int tid,
+		unsigned int size)
+{
+	struct srd_trace_buffer *buf;
+
+	buf = g_malloc(sizeof(struct srd_trace_buffer));
+	buf->name = g_strdup(name);
+	buf->tid = tid;
+	buf->size = size;
+	buf->count = 0;
+	buf->events = g_malloc(sizeof(struct srd_trace_event) * size);
+
+	return buf;
+}
+
+static void trace_buffer_free(struct srd_trace_buffer *buf)
+{
+	g_free(buf->name);
+	g_free(buf->events);
+	g_free(buf);
+}
+
+/* Have all instances of a stack record into the stack's buffer. */
+static void trace_attach(struct srd_decoder_inst *di,
+		struct srd_trace_buffer *buf)
+{
+	GSList *l;
+
+	di->trace = buf;
+	for (l = di->next_di; l; l = l->next)
+		trace_attach(l->data, buf);
+}
+
+/**
+ * Give every stack of a tracing session, which doesn't have one yet,
+ * a trace buffer for its worker thread.
+ *
+ * @param sess The session. Must not be NULL.
+ *
+ * @private
+ */
+SRD_PRIV void srd_trace_attach_all(struct srd_session *sess)
+{
+	GSList *d;
+	struct srd_decoder_inst *di;
+	struct srd_trace_buffer *buf;
+
+	if (!sess->trace)
+		return;
+
+	for (d = sess->di_list; d; d = d->next) {
+		di = d->data;
+		if (di->trace)
+			continue;
+		buf = trace_buffer_new(di->inst_id,
+			g_slist_length(sess->trace_buffers) + 1,
+			sess->trace->size);
+		sess->trace_buffers = g_slist_append(sess->trace_buffers, buf);
+		trace_attach(di, buf);
+	}
+}
+
+/**
+ * Free the trace buffers of a session.
+ *
+ * @param sess The session. Must not be NULL.
+ *
+ * @private
+ */
+SRD_PRIV void srd_trace_free_all(struct srd_session *sess)
+{
+	if (sess->trace)
+		trace_buffer_free(sess->trace);
+	g_slist_free_full(sess->trace_buffers, (GDestroyNotify)trace_buffer_free);
+	sess->trace = NULL;
+	sess->trace_buffers = NULL;
+}
+
+/**
+ * Get the time for trace events.
+ *
+ * @return A monotonic time in nanoseconds.
+ *
+ * @private
+ */
+SRD_PRIV int64_t srd_trace_time(void)
+{
+#ifdef CLOCK_MONOTONIC
+	struct timespec ts;
+
+	if (clock_gettime(CLOCK_MONOTONIC, &ts) == 0)
+		return (int64_t)ts.tv_sec * 1000000000 + ts.tv_nsec;
+#endif
+
+	return g_get_monotonic_time() * 1000;
+}
+
+/**
+ * Record an event which ends now.
+ *
+ * Only the thread which the buffer belongs to records events into it,
+ * which needs no locking. When the buffer is full, the event replaces
+ * the oldest one.
+ *
+ * @param buf The calling thread's trace buffer. Must not be NULL.
+ * @param type The event type (SRD_TRACE_*).
+ * @param inst_id The ID of the instance which the event is about, or NULL.
+ *                Must remain valid until the trace was saved.
+ * @param start When the event started, see srd_trace_time().
+ * @param start_samplenum The first sample which the event is about.
+ * @param end_samplenum The sample after the last one which the event is
+ *                      about.
+ *
+ * @return The current time, see srd_trace_time().
+ *
+ * @private
+ */
+SRD_PRIV int64_t srd_trace_event(struct srd_trace_buffer *buf, int type,
+		const char *inst_id, int64_t start, uint64_t start_samplenum,
+		uint64_t end_samplenum)
+{
+	struct srd_trace_event *ev;
+	int64_t now;
+
+	now = srd_trace_time();
+	ev = &buf->events[buf->count++ % buf->size];
+	ev->type = type;
+	ev->inst_id = inst_id;
+	ev->start = start;
+	ev->end = now;
+	ev->start_samplenum = start_samplenum;
+	ev->end_samplenum = end_samplenum;
+
+	return now;
+}
+
+/**
+ * Start recording a trace of a decoding session.
+ *
+ * Every thread of the session records its events into a buffer of its
+ * own, which keeps the most recent 'max_events' events. When tracing is
+ * off, its overhead is one pointer check per event. When it's on, every
+ * wait() and put() call of a decoder records events, which takes about
+ * as long as reading the clock.
+ *
+ * The stacks of the session should have been set up. Must not be called
+ * while samples are being decoded. Tracing stays on until the session
+ * gets destroyed.
+ *
+ * @param sess The session to trace. Must not be NULL.
+ * @param max_events The max. number of events per thread. Must be > 0.
+ *
+ * @return SRD_OK upon success, a (negative) error code otherwise.
+ *
+ * @since 0.6.0
+ */
+SRD_API int srd_session_trace_start(struct srd_session *sess,
+		unsigned int max_events)
+{
+	if (session_is_valid(sess) != SRD_OK) {
+		srd_err("Invalid session.");
+		return SRD_ERR_ARG;
+	}
+
+	if (max_events == 0) {
+		srd_err("Invalid trace size 0.");
+		return SRD_ERR_ARG;
+	}
+
+	if (sess->trace) {
+		srd_err("Session %d is already being traced.", sess->session_id);
+		return SRD_ERR;
+	}
+
+	sess->trace = trace_buffer_new("send", 0, max_events);
+	sess->trace_start = srd_trace_time();
+	srd_trace_attach_all(sess);
+
+	return SRD_OK;
+}
+
+/* Write a time in microseconds, without locale dependent formatting. */
+static void write_time(FILE *f, const char *key, int64_t ns)
+{
+	ns = MAX(ns, 0);
+	fprintf(f, "\"%s\": %" PRId64 ".%03d", key, ns / 1000,
+		(int)(ns % 1000));
+}
+
+static void write_thread_name(FILE *f, int pid, int tid, const char *name)
+{
+	fprintf(f, ",\n{\"name\": \"thread_name\", \"ph\": \"M\", "
+		"\"pid\": %d, \"tid\": %d, \"args\": {\"name\": \"%s\"}}",
+		pid, tid, name);
+}
+
+static void write_events(FILE *f, int pid, int64_t t0,
+		const struct srd_trace_buffer *buf)
+{
+	const struct srd_trace_event *ev;
+	uint64_t i;
+
+	write_thread_name(f, pid, buf->tid, buf->name);
+
+	/* Oldest first, in case the buffer wrapped. */
+	i = buf->count > buf->size ? buf->count - buf->size : 0;
+	for (; i < buf->count; i++) {
+		ev = &buf->events[i % buf->size];
+		fprintf(f, ",\n{\"name\": \"%s\", \"cat\": \"srd\", "
+			"\"ph\": \"X\", \"pid\": %d, \"tid\": %d, ",
+			event_names[ev->type], pid, buf->tid);
+		write_time(f, "ts", ev->start - t0);
+		fprintf(f, ", ");
+		write_time(f, "dur", ev->end - ev->start);
+		fprintf(f, ", \"args\": {");
+		if (ev->inst_id)
+			fprintf(f, "\"inst\": \"%s\", ", ev->inst_id);
+		fprintf(f, "\"start_sample\": %" PRIu64 ", \"end_sample\": %"
+			PRIu64 "}}", ev->start_samplenum, ev->end_samplenum);
+	}
+}
+
+/**
+ * Save the trace of a decoding session.
+ *
+ * The file gets written in the JSON format of Chrome trace events. Every
+ * stack's worker thread is a thread of its own, named after the stack's
+ * bottom instance, and the thread which sends the samples is the "send"
+ * thread. Event times are in microseconds since tracing started, and
+ * the events' arguments name the instance and range of samples which
+ * they are about.
+ *
+ * Must not be called while samples are being decoded, e.g. only after
+ * srd_session_send() or srd_session_send_drain() returned.
+ *
+ * @param sess The traced session. Must not be NULL.
+ * @param filename The file to write. Must not be NULL.
+ *
+ * @return SRD_OK upon success, a (negative) error code otherwise.
+ *
+ * @since 0.6.0
+ */
+SRD_API int srd_session_trace_save(struct srd_session *sess,
+		const char *filename)
+{
+	GSList *l;
+	FILE *f;
+	int pid;
+
+	if (session_is_valid(sess) != SRD_OK) {
+		srd_err("Invalid session.");
+		return SRD_ERR_ARG;
+	}
+
+	if (!filename) {
+		srd_err("Invalid trace file name.");
+		return SRD_ERR_ARG;
+	}
+
+	if (!sess->trace) {
+		srd_err("Session %d is not being traced.", sess->session_id);
+		return SRD_ERR;
+	}
+
+	if (!(f = g_fopen(filename, "w"))) {
+		srd_err("Failed to open trace file %s.", filename);
+		return SRD_ERR;
+	}
+
+	pid = sess->session_id;
+	fprintf(f, "{\"displayTimeUnit\": \"ns\", \"traceEvents\": [\n"
+		"{\"name\": \"process_name\", \"ph\": \"M\", \"pid\": %d, "
+		"\"args\": {\"name\": \"libsigrokdecode session %d\"}}",
+		pid, pid);
+	write_events(f, pid, sess->trace_start, sess->trace);
+	for (l = sess->trace_buffers; l; l = l->next)
+		write_events(f, pid, sess->trace_start, l->data);
+	fprintf(f, "\n]}\n");
+
+	if (fclose(f) != 0) {
+		srd_err("Failed to write trace file %s.", filename);
+		return SRD_ERR;
+	}
+
+	return SRD_OK;
+}
+
+/** @} */
@@ -21,10 +21,7 @@
 #include "libsigrokdecode-internal.h" /* First, so we avoid a _POSIX_C_SOURCE warning. */
 #include "libsigrokdecode.h"
 #include <inttypes.h>
-
-typedef struct {
-        PyObject_HEAD
-} srd_Decoder;
+#include <string.h>
 
 /* This is only used for nicer srd_dbg() output.
  */
@@ -40,19 +37,76 @@ static const char *output_type_name(unsigned int idx)
 	return names[MIN(idx, G_N_ELEMENTS(names) - 1)];
 }
 
+/* Get the integer arguments of a templated annotation. */
+static int convert_ann_args(struct srd_decoder_inst *di,
+		const struct srd_ann_template *tmpl, PyObject *py_args,
+		int64_t *args, unsigned int *num_args)
+{
+	PyObject *py_arg;
+	Py_ssize_t i, size;
+
+	size = PyTuple_Size(py_args);
+	if (size < tmpl->num_args || size > SRD_ANN_MAX_ARGS) {
+		srd_err("Protocol decoder %s submitted %zd template arguments "
+			"instead of %u.", di->decoder->name, size, tmpl->num_args);
+		return SRD_ERR_PYTHON;
+	}
+
+	memset(args, 0, sizeof(*args) * SRD_ANN_MAX_ARGS);
+	for (i = 0; i < size; i++) {
+		py_arg = PyTuple_GetItem(py_args, i);
+		if (PyLong_Check(py_arg))
+			args[i] = PyLong_AsLongLong(py_arg);
+		if (!PyLong_Check(py_arg) || PyErr_Occurred()) {
+			PyErr_Clear();
+			srd_err("Protocol decoder %s submitted template argument "
+				"which is not a 64bit integer.", di->decoder->name);
+			return SRD_ERR_PYTHON;
+		}
+	}
+	*num_args = size;
+
+	return SRD_OK;
+}
+
+/* Format the texts of a templated annotation. */
+static char **ann_template_texts(const struct srd_ann_template *tmpl,
+		const int64_t *args)
+{
+	char **ann_text;
+	unsigned int i, num_formats;
+
+	num_formats = g_strv_length(tmpl->formats);
+	ann_text = g_malloc0(sizeof(char *) * (num_formats + 1));
+	for (i = 0; i < num_formats; i++)
+		ann_text[i] = ann_format_apply(tmpl->formats[i], args);
+
+	return ann_text;
+}
+
+/*
+ * Convert an annotation into pdata->data, which gets allocated unless
+ * the caller provides storage.
+ */
 static int convert_annotation(struct srd_decoder_inst *di, PyObject *obj,
 		struct srd_proto_data *pdata)
 {
 	PyObject *py_tmp;
 	struct srd_pd_output *pdo;
 	struct srd_proto_data_annotation *pda;
+	struct srd_ann_template *tmpl;
 	int ann_class;
+	unsigned int num_args;
+	int64_t args[SRD_ANN_MAX_ARGS];
 	char **ann_text;
 	PyGILState_STATE gstate;
 
 	gstate = PyGILState_Ensure();
 
-	/* Should be a list of [annotation class, [string, ...]]. */
+	/*
+	 * Should be a list of [annotation class, [string, ...]], or of
+	 * [annotation class, (template argument, ...)].
+	 */
 	if (!PyList_Check(obj)) {
 		srd_err("Protocol decoder %s submitted an annotation that"
 			" is not a list", di->decoder->name);
@@ -84,22 +138,47 @@ static int convert_annotation(struct srd_decoder_inst *di, PyObject *obj,
 		goto err;
 	}
 
-	/* Second element must be a list. */
+	/*
+	 * Second element must be a list of strings, or a tuple of
+	 * arguments for the annotation class' template.
+	 */
 	py_tmp = PyList_GetItem(obj, 1);
-	if (!PyList_Check(py_tmp)) {
-		srd_err("Protocol decoder %s submitted annotation list, but "
-			"second element was not a list.", di->decoder->name);
-		goto err;
-	}
-	if (py_strseq_to_char(py_tmp, &ann_text) != SRD_OK) {
-		srd_err("Protocol decoder %s submitted annotation list, but "
-			"second element was malformed.", di->decoder->name);
-		goto err;
+	tmpl = NULL;
+	num_args = 0;
+	if (PyTuple_Check(py_tmp)) {
+		if (!di->ann_templates || !di->ann_templates[ann_class].formats) {
+			srd_err("Protocol decoder %s submitted template arguments "
+				"for annotation class %d without template.",
+				di->decoder->name, ann_class);
+			goto err;
+		}
+		tmpl = &di->ann_templates[ann_class];
+		if (convert_ann_args(di, tmpl, py_tmp, args, &num_args) != SRD_OK)
+			goto err;
+		ann_text = NULL;
+		if (!di->sess->lazy_ann_text)
+			ann_text = ann_template_texts(tmpl, args);
+	} else {
+		if (!PyList_Check(py_tmp)) {
+			srd_err("Protocol decoder %s submitted annotation list, but "
+				"second element was not a list.", di->decoder->name);
+			goto err;
+		}
+		if (py_strseq_to_char(py_tmp, &ann_text) != SRD_OK) {
+			srd_err("Protocol decoder %s submitted annotation list, but "
+				"second element was malformed.", di->decoder->name);
+			goto err;
+		}
 	}
 
-	pda = g_malloc(sizeof(struct srd_proto_data_annotation));
+	pda = pdata->data;
+	if (!pda)
+		pda = g_malloc(sizeof(struct srd_proto_data_annotation));
 	pda->ann_class = ann_class;
 	pda->ann_text = ann_text;
+	pda->ann_formats = tmpl ? tmpl->formats : NULL;
+	pda->num_args = num_args;
+	memcpy(pda->ann_args, args, sizeof(pda->ann_args));
 	pdata->data = pda;
 
 	PyGILState_Release(gstate);
@@ -112,14 +191,109 @@ err:
 	return SRD_ERR_PYTHON;
 }
 
+static void release_annotation(struct srd_proto_data_annotation *pda)
+{
+	if (!pda)
+		return;
+	g_strfreev(pda->ann_text);
+	g_free(pda);
+}
+
+/*
+ * Get the data of a bytes-like object. The returned reference keeps the
+ * data valid. The data of bytes and bytearray objects doesn't get copied,
+ * other objects (e.g. memoryview) get copied once, since the limited API
+ * doesn't provide access to their buffers.
+ */
+static PyObject *binary_data(PyObject *obj, const char **data,
+		Py_ssize_t *size)
+{
+	PyObject *py_bytes;
+
+	if (PyBytes_Check(obj)) {
+		*data = PyBytes_AsString(obj);
+		*size = PyBytes_Size(obj);
+		Py_IncRef(obj);
+		return obj;
+	}
+	if (PyByteArray_Check(obj)) {
+		*data = PyByteArray_AsString(obj);
+		*size = PyByteArray_Size(obj);
+		Py_IncRef(obj);
+		return obj;
+	}
+	if (!PyMemoryView_Check(obj))
+		return NULL;
+	if (!(py_bytes = PyBytes_FromObject(obj)))
+		return NULL;
+	*data = PyBytes_AsString(py_bytes);
+	*size = PyBytes_Size(py_bytes);
+
+	return py_bytes;
+}
+
+/* Concatenate a list or tuple of bytes-like objects into one block. */
+static PyObject *binary_block(PyObject *obj, const char **data,
+		Py_ssize_t *size)
+{
+	PyObject *py_parts, *py_refs, *py_block;
+	const char **parts;
+	char *block;
+	Py_ssize_t i, num_parts, *part_sizes;
+
+	if (!(py_parts = PySequence_Tuple(obj)))
+		return NULL;
+	num_parts = PyTuple_Size(py_parts);
+	if (!(py_refs = PyTuple_New(num_parts))) {
+		Py_DecRef(py_parts);
+		return NULL;
+	}
+	parts = g_malloc0(sizeof(*parts) * num_parts);
+	part_sizes = g_malloc0(sizeof(*part_sizes) * num_parts);
+
+	py_block = NULL;
+	*size = 0;
+	for (i = 0; i < num_parts; i++) {
+		if (!(obj = binary_data(PyTuple_GetItem(py_parts, i),
+				&parts[i], &part_sizes[i])))
+			goto out;
+		/* Keep the part's data valid until it got copied. */
+		PyTuple_SetItem(py_refs, i, obj);
+		*size += part_sizes[i];
+	}
+
+	if (!(py_block = PyBytes_FromStringAndSize(NULL, *size)))
+		goto out;
+	block = PyBytes_AsString(py_block);
+	for (i = 0; i < num_parts; i++) {
+		memcpy(block, parts[i], part_sizes[i]);
+		block += part_sizes[i];
+	}
+	*data = PyBytes_AsString(py_block);
+
+out:
+	g_free(parts);
+	g_free(part_sizes);
+	Py_DecRef(py_refs);
+	Py_DecRef(py_parts);
+
+	return py_block;
+}
+
+/*
+ * Convert binary output into *pdb, which gets passed in pdata->data. The
+ * data isn't copied, and stays valid as long as the reference which gets
+ * returned in *py_ref is kept.
+ */
 static int convert_binary(struct srd_decoder_inst *di, PyObject *obj,
-		struct srd_proto_data *pdata)
+		struct srd_proto_data *pdata, struct srd_proto_data_binary *pdb,
+		PyObject **py_ref)
 {
-	struct srd_proto_data_binary *pdb;
 	PyObject *py_tmp;
 	Py_ssize_t size;
 	int bin_class;
-	char *class_name, *buf;
+	char *class_name;
+	const char *buf;
 	PyGILState_STATE gstate;
 
 	gstate = PyGILState_Ensure();
@@ -153,32 +327,35 @@ static int convert_binary(struct srd_decoder_inst *di, PyObject *obj,
 		goto err;
 	}
 
-	/* Second element should be bytes. */
+	/*
+	 * Second element should be bytes-like, or a list/tuple of
+	 * bytes-like objects which get passed as one block.
+	 */
 	py_tmp = PyList_GetItem(obj, 1);
-	if (!PyBytes_Check(py_tmp)) {
+	if (PyList_Check(py_tmp) || PyTuple_Check(py_tmp))
+		*py_ref = binary_block(py_tmp, &buf, &size);
+	else
+		*py_ref = binary_data(py_tmp, &buf, &size);
+	if (!*py_ref) {
+		PyErr_Clear();
 		srd_err("Protocol decoder %s submitted SRD_OUTPUT_BINARY list, "
 			"but second element was not bytes.", di->decoder->name);
 		goto err;
 	}
 
 	/* Consider an empty set of bytes a bug. */
-	if (PyBytes_Size(py_tmp) == 0) {
+	if (size == 0) {
 		srd_err("Protocol decoder %s submitted SRD_OUTPUT_BINARY "
 				"with empty data set.", di->decoder->name);
+		Py_DecRef(*py_ref);
 		goto err;
 	}
 
-	pdb = g_malloc(sizeof(struct srd_proto_data_binary));
-	if (PyBytes_AsStringAndSize(py_tmp, &buf, &size) == -1)
-		goto err;
-
 	PyGILState_Release(gstate);
 
 	pdb->bin_class = bin_class;
 	pdb->size = size;
-	if (!(pdb->data = g_try_malloc(pdb->size)))
-		return SRD_ERR_MALLOC;
-	memcpy((void *)pdb->data, (const void *)buf, pdb->size);
+	pdb->data = (const unsigned char *)buf;
 	pdata->data = pdb;
 
 	return SRD_OK;
@@ -229,6 +406,27 @@ err:
 	return SRD_ERR_PYTHON;
 }
 
+/* Annotation classes out of range become -1, which put() ignores. */
+static int ann_class_from_long(long ann_class)
+{
+	return (ann_class >= 0 && ann_class <= G_MAXINT) ? ann_class : -1;
+}
+
+/* Run a frontend's output callback, without holding the GIL. */
+static void output_callback(struct srd_decoder_inst *di,
+		const struct srd_pd_callback *cb, struct srd_proto_data *pdata)
+{
+	int64_t start;
+
+	start = di->trace ? srd_trace_time() : 0;
+	Py_BEGIN_ALLOW_THREADS
+	cb->cb(pdata, cb->cb_data);
+	Py_END_ALLOW_THREADS
+	if (di->trace)
+		srd_trace_event(di->trace, SRD_TRACE_CALLBACK, di->inst_id,
+			start, pdata->start_sample, pdata->end_sample);
+}
+
 static PyObject *Decoder_put(PyObject *self, PyObject *args)
 {
 	GSList *l;
@@ -237,8 +435,10 @@ static PyObject *Decoder_put(PyObject *self, PyObject *args)
 	struct srd_pd_output *pdo;
 	struct srd_proto_data pdata;
 	uint64_t start_sample, end_sample;
-	int output_id;
+	int output_id, ann_class;
 	struct srd_pd_callback *cb;
+	struct srd_ann_batch *batch;
+	struct srd_proto_data_binary pdb;
 	PyGILState_STATE gstate;
 
 	gstate = PyGILState_Ensure();
@@ -265,11 +465,27 @@ static PyObject *Decoder_put(PyObject *self, PyObject *args)
 		goto err;
 	}
 	pdo = l->data;
+	if ((unsigned int)pdo->output_type < G_N_ELEMENTS(di->stats.put_calls))
+		di->stats.put_calls[pdo->output_type]++;
 
 	srd_spew("Instance %s put %" PRIu64 "-%" PRIu64 " %s on oid %d.",
 		 di->inst_id, start_sample, end_sample,
 		 output_type_name(pdo->output_type), output_id);
 
+	/* Drop output which isn't wanted, before converting it. */
+	ann_class = -1;
+	if (pdo->output_type == SRD_OUTPUT_ANN && PyList_Check(py_data)
+			&& PyList_Size(py_data) == 2) {
+		py_res = PyList_GetItem(py_data, 0);
+		if (PyLong_Check(py_res))
+			ann_class = ann_class_from_long(PyLong_AsLong(py_res));
+		PyErr_Clear();
+	}
+	if (!srd_inst_output_wanted(di, pdo, ann_class)) {
+		PyGILState_Release(gstate);
+		Py_RETURN_NONE;
+	}
+
 	pdata.start_sample = start_sample;
 	pdata.end_sample = end_sample;
 	pdata.pdo = pdo;
@@ -278,15 +494,25 @@ static PyObject *Decoder_put(PyObject *self, PyObject *args)
 	switch (pdo->output_type) {
 	case SRD_OUTPUT_ANN:
 		/* Annotations are only fed to callbacks. */
-		if ((cb = srd_pd_output_callback_find(di->sess, pdo->output_type))) {
+		if ((batch = di->ann_batch)) {
+			/* Collect the annotation, deliver full batches. */
+			batch->pdata[batch->count] = pdata;
+			batch->pdata[batch->count].data = &batch->pda[batch->count];
+			if (convert_annotation(di, py_data,
+					&batch->pdata[batch->count]) != SRD_OK) {
+				/* An error was already logged. */
+				break;
+			}
+			if (++batch->count == SRD_ANN_BATCH_SIZE)
+				srd_inst_ann_batch_flush(di);
+		} else if ((cb = srd_pd_output_callback_find(di->sess, pdo->output_type))) {
 			/* Convert from PyDict to srd_proto_data_annotation. */
 			if (convert_annotation(di, py_data, &pdata) != SRD_OK) {
 				/* An error was already logged. */
 				break;
 			}
-			Py_BEGIN_ALLOW_THREADS
-			cb->cb(&pdata, cb->cb_data);
-			Py_END_ALLOW_THREADS
+			output_callback(di, cb, &pdata);
+			release_annotation(pdata.data);
 		}
 		break;
 	case SRD_OUTPUT_PYTHON:
@@ -311,14 +537,15 @@ static PyObject *Decoder_put(PyObject *self, PyObject *args)
 		break;
 	case SRD_OUTPUT_BINARY:
 		if ((cb = srd_pd_output_callback_find(di->sess, pdo->output_type))) {
-			/* Convert from PyDict to srd_proto_data_binary. */
-			if (convert_binary(di, py_data, &pdata) != SRD_OK) {
+			/* Convert from PyList to srd_proto_data_binary. */
+			if (convert_binary(di, py_data, &pdata, &pdb,
+					&py_res) != SRD_OK) {
 				/* An error was already logged. */
 				break;
 			}
-			Py_BEGIN_ALLOW_THREADS
-			cb->cb(&pdata, cb->cb_data);
-			Py_END_ALLOW_THREADS
+			di->stats.binary_bytes += pdb.size;
+			output_callback(di, cb, &pdata);
+			Py_DecRef(py_res);
 		}
 		break;
 	case SRD_OUTPUT_META:
@@ -328,9 +555,7 @@ static PyObject *Decoder_put(PyObject *self, PyObject *args)
 				/* An exception was already set up. */
 				break;
 			}
-			Py_BEGIN_ALLOW_THREADS
-			cb->cb(&pdata, cb->cb_data);
-			Py_END_ALLOW_THREADS
+			output_callback(di, cb, &pdata);
 		}
 		break;
 	default:
@@ -424,6 +649,137 @@ err:
 	return NULL;
 }
 
+/*
+ * Register the text formats of an annotation class, for annotations which
+ * put() a tuple of integer arguments instead of a list of strings.
+ */
+static PyObject *Decoder_register_template(PyObject *self, PyObject *args)
+{
+	struct srd_decoder_inst *di;
+	struct srd_ann_template *tmpl;
+	PyObject *py_formats;
+	char **formats;
+	int ann_class, num_classes, num_args, max_args;
+	unsigned int i;
+	PyGILState_STATE gstate;
+
+	gstate = PyGILState_Ensure();
+
+	if (!(di = srd_inst_find_by_obj(NULL, self))) {
+		PyErr_SetString(PyExc_Exception, "decoder instance not found");
+		goto err;
+	}
+
+	if (!PyArg_ParseTuple(args, "iO", &ann_class, &py_formats)) {
+		/* Let Python raise this exception. */
+		goto err;
+	}
+
+	num_classes = g_slist_length(di->decoder->annotations);
+	if (ann_class < 0 || ann_class >= num_classes) {
+		PyErr_Format(PyExc_ValueError, "Invalid annotation class %d.",
+			ann_class);
+		goto err;
+	}
+
+	if (!PyList_Check(py_formats) && !PyTuple_Check(py_formats)) {
+		PyErr_SetString(PyExc_TypeError, "Formats must be a list.");
+		goto err;
+	}
+	if (py_strseq_to_char(py_formats, &formats) != SRD_OK) {
+		PyErr_SetString(PyExc_TypeError, "Formats must be strings.");
+		goto err;
+	}
+	if (!formats[0]) {
+		g_strfreev(formats);
+		PyErr_SetString(PyExc_ValueError, "No formats.");
+		goto err;
+	}
+
+	/* Check the formats now, so put() doesn't need to. */
+	max_args = 0;
+	for (i = 0; formats[i]; i++) {
+		if ((num_args = ann_format_check(formats[i])) < 0) {
+			PyErr_Format(PyExc_ValueError,
+				"Unsupported annotation format '%s'.", formats[i]);
+			g_strfreev(formats);
+			goto err;
+		}
+		max_args = MAX(max_args, num_args);
+	}
+	if (max_args > SRD_ANN_MAX_ARGS) {
+		PyErr_Format(PyExc_ValueError, "Formats use more than %d "
+			"arguments.", SRD_ANN_MAX_ARGS);
+		g_strfreev(formats);
+		goto err;
+	}
+
+	if (!di->ann_templates)
+		di->ann_templates = g_malloc0(sizeof(struct srd_ann_template)
+				* num_classes);
+	tmpl = &di->ann_templates[ann_class];
+	if (tmpl->formats) {
+		/* Batched annotations might still use the old formats. */
+		srd_inst_ann_batch_flush(di);
+		g_strfreev(tmpl->formats);
+	}
+	tmpl->formats = formats;
+	tmpl->num_args = max_args;
+
+	PyGILState_Release(gstate);
+
+	Py_RETURN_NONE;
+
+err:
+	PyGILState_Release(gstate);
+
+	return NULL;
+}
+
+/*
+ * Report whether output which the decoder would put() gets used, so the
+ * decoder can skip creating it. Output is unused when nobody receives it,
+ * or when the frontend disabled its type or annotation class.
+ */
+static PyObject *Decoder_wants(PyObject *self, PyObject *args)
+{
+	struct srd_decoder_inst *di;
+	struct srd_pd_output *pdo;
+	int output_id, ann_class;
+	gboolean wanted;
+	PyGILState_STATE gstate;
+
+	gstate = PyGILState_Ensure();
+
+	if (!(di = srd_inst_find_by_obj(NULL, self))) {
+		PyErr_SetString(PyExc_Exception, "decoder instance not found");
+		goto err;
+	}
+
+	ann_class = -1;
+	if (!PyArg_ParseTuple(args, "i|i", &output_id, &ann_class)) {
+		/* Let Python raise this exception. */
+		goto err;
+	}
+
+	if (!(pdo = g_slist_nth_data(di->pd_output, output_id))) {
+		PyErr_Format(PyExc_ValueError, "Invalid output ID %d.",
+			output_id);
+		goto err;
+	}
+
+	wanted = srd_inst_output_wanted(di, pdo, ann_class);
+
+	PyGILState_Release(gstate);
+
+	return PyBool_FromLong(wanted);
+
+err:
+	PyGILState_Release(gstate);
+
+	return NULL;
+}
+
 static int get_term_type(const char *v)
 {
 	switch (v[0]) {
@@ -444,21 +800,50 @@ static int get_term_type(const char *v)
 	return -1;
 }
 
+/* Build the tuple of pin values at the given sample. */
+static PyObject *pinvalues_new(const struct srd_decoder_inst *di,
+		const uint8_t *sample_pos)
+{
+	int i;
+	uint8_t sample;
+	const struct srd_pin *pin;
+	PyObject *py_pinvalues;
+
+	py_pinvalues = PyTuple_New(di->dec_num_channels);
+	for (i = 0, pin = di->dec_pins; i < di->dec_num_channels; i++, pin++) {
+		/* An offset of -1 means "unused optional channel". */
+		if (pin->offset < 0) {
+			/* Value of unused channel is 0xff, instead of 0 or 1. */
+			PyTuple_SetItem(py_pinvalues, i, PyLong_FromLong(0xff));
+		} else {
+			sample = (sample_pos[pin->offset] & pin->mask) ? 1 : 0;
+			PyTuple_SetItem(py_pinvalues, i, PyLong_FromLong(sample));
+		}
+	}
+
+	return py_pinvalues;
+}
+
 /**
  * Get the pin values at the current sample number.
  *
+ * For decoders with up to DECODER_PIN_CACHE_CHANNELS channels, the
+ * tuples get cached by pin values, and only the first wait() which
+ * returns a combination of pin values builds its tuple.
+ *
  * @param di The decoder instance to use. Must not be NULL.
  *           The number of channels must be >= 1.
  *
- * @return A newly allocated PyTuple containing the pin values at the
+ * @return A new reference to a PyTuple containing the pin values at the
  *         current sample number.
  */
 static PyObject *get_current_pinvalues(const struct srd_decoder_inst *di)
 {
 	int i;
-	uint8_t sample;
+	unsigned int pattern;
 	const uint8_t *sample_pos;
-	int byte_offset, bit_offset;
+	const struct srd_pin *pin;
+	srd_Decoder *py_dec;
 	PyObject *py_pinvalues;
 	PyGILState_STATE gstate;
 
@@ -470,52 +855,160 @@ static PyObject *get_current_pinvalues(const struct srd_decoder_inst *di)
 		return NULL;
 	}
 
-	py_pinvalues = PyTuple_New(di->dec_num_channels);
+	sample_pos = srd_inst_cur_sample(di);
 
-	for (i = 0; i < di->dec_num_channels; i++) {
-		/* A channelmap value of -1 means "unused optional channel". */
-		if (di->dec_channelmap[i] == -1) {
-			/* Value of unused channel is 0xff, instead of 0 or 1. */
-			PyTuple_SetItem(py_pinvalues, i, PyLong_FromLong(0xff));
-		} else {
-			sample_pos = di->inbuf + ((di->abs_cur_samplenum - di->abs_start_samplenum) * di->data_unitsize);
-			byte_offset = di->dec_channelmap[i] / 8;
-			bit_offset = di->dec_channelmap[i] % 8;
-			sample = *(sample_pos + byte_offset) & (1 << bit_offset) ? 1 : 0;
-			PyTuple_SetItem(py_pinvalues, i, PyLong_FromLong(sample));
-		}
+	if (di->dec_num_channels > DECODER_PIN_CACHE_CHANNELS) {
+		py_pinvalues = pinvalues_new(di, sample_pos);
+		PyGILState_Release(gstate);
+		return py_pinvalues;
+	}
+
+	pattern = 0;
+	for (i = 0, pin = di->dec_pins; i < di->dec_num_channels; i++, pin++) {
+		if (pin->offset >= 0 && (sample_pos[pin->offset] & pin->mask))
+			pattern |= 1 << i;
+	}
+
+	py_dec = (srd_Decoder *)di->py_inst;
+	if (!py_dec->pin_tuples) {
+		py_dec->num_pin_tuples = 1 << di->dec_num_channels;
+		py_dec->pin_tuples = g_malloc0(sizeof(PyObject *)
+			* py_dec->num_pin_tuples);
 	}
+	py_pinvalues = py_dec->pin_tuples[pattern];
+	if (!py_pinvalues) {
+		py_pinvalues = pinvalues_new(di, sample_pos);
+		py_dec->pin_tuples[pattern] = py_pinvalues;
+	}
+	Py_IncRef(py_pinvalues);
 
 	PyGILState_Release(gstate);
 
 	return py_pinvalues;
 }
 
+/* Set self.samplenum. */
+static void samplenum_set(const struct srd_decoder_inst *di, uint64_t samplenum)
+{
+	srd_Decoder *py_dec;
+
+	py_dec = (srd_Decoder *)di->py_inst;
+	py_dec->samplenum = samplenum;
+	Py_CLEAR(py_dec->samplenum_obj);
+}
+
+/* Set self.matched, stealing the reference. NULL means None. */
+static void matched_set(const struct srd_decoder_inst *di, PyObject *py_matched)
+{
+	srd_Decoder *py_dec;
+	PyObject *py_old;
+
+	py_dec = (srd_Decoder *)di->py_inst;
+	py_old = py_dec->matched;
+	py_dec->matched = py_matched;
+	Py_XDECREF(py_old);
+}
+
+/**
+ * Get the self.matched tuple for the conditions which matched.
+ *
+ * For up to DECODER_MATCHED_CACHE_CONDS conditions, the tuples get cached
+ * by the bit mask of matched conditions.
+ *
+ * @param di The decoder instance. Must not be NULL.
+ * @param prog The condition list. Must not be NULL, and must have
+ *             conditions.
+ *
+ * @return A new reference to a tuple of booleans.
+ */
+static PyObject *matched_get(const struct srd_decoder_inst *di,
+		const struct srd_cond_prog *prog)
+{
+	srd_Decoder *py_dec;
+	PyObject **cache;
+	PyObject *py_matched;
+	unsigned int i, mask;
+
+	if (prog->num_conds > DECODER_MATCHED_CACHE_CONDS) {
+		py_matched = PyTuple_New(prog->num_conds);
+		for (i = 0; i < prog->num_conds; i++)
+			PyTuple_SetItem(py_matched, i, PyBool_FromLong(prog->matched[i]));
+		return py_matched;
+	}
+
+	py_dec = (srd_Decoder *)di->py_inst;
+	cache = py_dec->matched_tuples[prog->num_conds];
+	if (!cache) {
+		cache = g_malloc0(sizeof(PyObject *) << prog->num_conds);
+		py_dec->matched_tuples[prog->num_conds] = cache;
+	}
+
+	mask = 0;
+	for (i = 0; i < prog->num_conds; i++) {
+		if (prog->matched[i])
+			mask |= 1 << i;
+	}
+
+	py_matched = cache[mask];
+	if (!py_matched) {
+		py_matched = PyTuple_New(prog->num_conds);
+		for (i = 0; i < prog->num_conds; i++)
+			PyTuple_SetItem(py_matched, i, PyBool_FromLong((mask >> i) & 1));
+		cache[mask] = py_matched;
+	}
+	Py_IncRef(py_matched);
+
+	return py_matched;
+}
+
+/**
+ * Get the sample number at which a skip term is satisfied.
+ *
+ * Skips are counted from the current sample, which is the first sample
+ * that a wait() call checks.
+ *
+ * @param di The decoder instance. Must not be NULL.
+ * @param count The number of samples to skip.
+ *
+ * @return The absolute sample number.
+ */
+static uint64_t skip_target(const struct srd_decoder_inst *di, uint64_t count)
+{
+	if (count > G_MAXUINT64 - di->abs_cur_samplenum)
+		return G_MAXUINT64;
+
+	return di->abs_cur_samplenum + count;
+}
+
 /**
- * Create a list of terms in the specified condition.
+ * Parse the terms of the specified condition.
  *
- * If there are no terms in the condition, 'term_list' will be NULL.
+ * Channel terms get appended to 'terms', a skip term gets stored in the
+ * condition itself. If there are no terms in the condition, the
+ * condition is marked as empty.
  *
+ * @param di The decoder instance. Must not be NULL.
  * @param py_dict A Python dict containing terms. Must not be NULL.
- * @param term_list Pointer to a GSList which will be set to the newly
- *                  created list of terms. Must not be NULL.
+ * @param cond The condition to fill in. Must not be NULL.
+ * @param terms The array of terms to append to. Must not be NULL.
  *
  * @return SRD_OK upon success, a negative error code otherwise.
  */
-static int create_term_list(PyObject *py_dict, GSList **term_list)
+static int create_term_list(const struct srd_decoder_inst *di,
+		PyObject *py_dict, struct srd_condition *cond, GArray *terms)
 {
 	Py_ssize_t pos = 0;
 	PyObject *py_key, *py_value;
-	struct srd_term *term;
+	struct srd_term term;
 	uint64_t num_samples_to_skip;
 	char *term_str;
 	PyGILState_STATE gstate;
 
-	if (!py_dict || !term_list)
+	if (!di || !py_dict || !cond || !terms)
 		return SRD_ERR_ARG;
 
-	/* "Create" an empty GSList of terms. */
-	*term_list = NULL;
+	memset(cond, 0, sizeof(*cond));
+	cond->first_term = terms->len;
 
 	gstate = PyGILState_Ensure();
 
@@ -524,16 +1017,23 @@ static int create_term_list(PyObject *py_dict, GSList **term_list)
 		/* Check whether the current key is a string or a number. */
 		if (PyLong_Check(py_key)) {
 			/* The key is a number. */
-			/* TODO: Check if the number is a valid channel. */
+			term.channel = PyLong_AsLong(py_key);
+			if (term.channel < 0 || term.channel >= di->dec_num_channels) {
+				srd_err("Invalid channel %d in condition.", term.channel);
+				PyErr_SetString(PyExc_Exception, "invalid channel in condition");
+				goto err;
+			}
 			/* Get the value string. */
 			if ((py_pydictitem_as_str(py_dict, py_key, &term_str)) != SRD_OK) {
 				srd_err("Failed to get the value.");
 				goto err;
 			}
-			term = g_malloc0(sizeof(struct srd_term));
-			term->type = get_term_type(term_str);
-			term->channel = PyLong_AsLong(py_key);
+			term.type = get_term_type(term_str);
+			if (term.type < 0)
+				srd_err("Unknown term type '%s'.", term_str);
 			g_free(term_str);
+			/* Add the term to the list of terms. */
+			g_array_append_val(terms, term);
 		} else if (PyUnicode_Check(py_key)) {
 			/* The key is a string. */
 			/* TODO: Check if it's "skip". */
@@ -541,19 +1041,17 @@ static int create_term_list(PyObject *py_dict, GSList **term_list)
 				srd_err("Failed to get number of samples to skip.");
 				goto err;
 			}
-			term = g_malloc0(sizeof(struct srd_term));
-			term->type = SRD_TERM_SKIP;
-			term->num_samples_to_skip = num_samples_to_skip;
-			term->num_samples_already_skipped = 0;
+			cond->has_skip = TRUE;
+			cond->skip_samplenum = skip_target(di, num_samples_to_skip);
 		} else {
 			srd_err("Term key is neither a string nor a number.");
 			goto err;
 		}
-
-		/* Add the term to the list of terms. */
-		*term_list = g_slist_append(*term_list, term);
 	}
 
+	cond->num_terms = terms->len - cond->first_term;
+	cond->is_empty = !cond->num_terms && !cond->has_skip;
+
 	PyGILState_Release(gstate);
 
 	return SRD_OK;
@@ -564,32 +1062,183 @@ err:
 	return SRD_ERR;
 }
 
+/* Max. number of compiled condition lists kept per decoder instance. */
+#define COND_CACHE_MAX_ENTRIES 16
+
 /**
- * Replace the current condition list with the new one.
+ * Collect the cache key of a condition list.
  *
- * @param self TODO. Must not be NULL.
- * @param args TODO. Must not be NULL.
+ * The key consists of the channel terms and the presence of skip terms,
+ * in the order of the Python dicts. Term values are compared by identity,
+ * which is cheap and works for the string constants which decoders pass
+ * to wait(). Skip counts are not part of the key, they get collected in
+ * cache->skips and are applied to the cached conditions.
  *
- * @retval SRD_OK The new condition list was set successfully.
- * @retval SRD_ERR There was an error setting the new condition list.
- *                 The contents of di->condition_list are undefined.
- * @retval 9999 TODO.
+ * @param cache The condition cache. Must not be NULL.
+ * @param py_conditionlist The list of conditions. Must not be NULL.
+ * @param num_conditions The number of conditions in the list.
+ * @param hash Will be set to the key's hash value. Must not be NULL.
+ *
+ * @retval TRUE The key was collected.
+ * @retval FALSE The condition list cannot be cached.
  */
-static int set_new_condition_list(PyObject *self, PyObject *args)
+static gboolean cond_cache_make_key(struct srd_cond_cache *cache,
+		PyObject *py_conditionlist, int num_conditions, guint *hash)
 {
-	struct srd_decoder_inst *di;
-	GSList *term_list;
-	PyObject *py_conditionlist, *py_conds, *py_dict;
-	int i, num_conditions, ret;
-	PyGILState_STATE gstate;
+	Py_ssize_t pos;
+	PyObject *py_dict, *py_key, *py_value;
+	struct srd_cond_key key;
+	uint64_t skip;
+	guint h;
+	int i;
 
-	if (!self || !args)
-		return SRD_ERR_ARG;
+	g_array_set_size(cache->keys, 0);
+	g_array_set_size(cache->skips, num_conditions);
 
-	gstate = PyGILState_Ensure();
+	h = num_conditions;
+	for (i = 0; i < num_conditions; i++) {
+		py_dict = PyList_GetItem(py_conditionlist, i);
+		if (!PyDict_Check(py_dict))
+			return FALSE;
+		skip = 0;
+		pos = 0;
+		while (PyDict_Next(py_dict, &pos, &py_key, &py_value)) {
+			key.cond = i;
+			if (PyLong_Check(py_key)) {
+				key.channel = PyLong_AsLong(py_key);
+				key.value = py_value;
+			} else if (PyUnicode_Check(py_key) && PyLong_Check(py_value)) {
+				key.channel = -1;
+				key.value = NULL;
+				skip = PyLong_AsUnsignedLongLong(py_value);
+			} else {
+				return FALSE;
+			}
+			g_array_append_val(cache->keys, key);
+			h = (h * 31 + key.cond) * 31 + key.channel;
+			h = h * 31 + GPOINTER_TO_UINT(key.value);
+		}
+		g_array_index(cache->skips, uint64_t, i) = skip;
+	}
 
-	/* Get the decoder instance. */
-	if (!(di = srd_inst_find_by_obj(NULL, self))) {
+	*hash = h;
+
+	return TRUE;
+}
+
+/**
+ * Look up the current key in the condition cache.
+ *
+ * Upon a hit, the entry becomes the most recently used one, and the
+ * skip counts of the current wait() call get applied to its conditions.
+ *
+ * @return The cached condition program, or NULL if there is none.
+ */
+static struct srd_cond_prog *cond_cache_lookup(const struct srd_decoder_inst *di,
+		guint hash, unsigned int num_conds)
+{
+	struct srd_cond_cache *cache;
+	GList *l;
+	struct srd_cond_cache_entry *entry;
+	const struct srd_cond_key *key;
+	struct srd_condition *cond;
+	unsigned int i;
+
+	cache = di->condition_cache;
+	for (l = cache->entries.head; l; l = l->next) {
+		entry = l->data;
+		if (entry->hash != hash || entry->num_conds != num_conds)
+			continue;
+		if (entry->num_keys != cache->keys->len)
+			continue;
+		for (i = 0; i < entry->num_keys; i++) {
+			key = &g_array_index(cache->keys, struct srd_cond_key, i);
+			if (entry->keys[i].cond != key->cond ||
+					entry->keys[i].channel != key->channel ||
+					entry->keys[i].value != key->value)
+				break;
+		}
+		if (i < entry->num_keys)
+			continue;
+
+		g_queue_unlink(&cache->entries, l);
+		g_queue_push_head_link(&cache->entries, l);
+
+		for (i = 0; i < entry->prog->num_conds; i++) {
+			cond = &entry->prog->conds[i];
+			if (!cond->has_skip)
+				continue;
+			cond->skip_samplenum = skip_target(di,
+				g_array_index(cache->skips, uint64_t, i));
+		}
+		entry->prog->have_matched = FALSE;
+
+		return entry->prog;
+	}
+
+	return NULL;
+}
+
+/**
+ * Add a condition program for the current key to the condition cache.
+ *
+ * The least recently used entry gets evicted when the cache is full.
+ */
+static void cond_cache_insert(struct srd_cond_cache *cache, guint hash,
+		unsigned int num_conds, struct srd_cond_prog *prog)
+{
+	struct srd_cond_cache_entry *entry;
+	unsigned int i;
+
+	if (cache->entries.length >= COND_CACHE_MAX_ENTRIES)
+		cond_cache_entry_free(g_queue_pop_tail(&cache->entries));
+
+	entry = g_malloc(sizeof(*entry));
+	entry->hash = hash;
+	entry->num_conds = num_conds;
+	entry->num_keys = cache->keys->len;
+	entry->keys = g_malloc(entry->num_keys * sizeof(struct srd_cond_key));
+	memcpy(entry->keys, cache->keys->data,
+		entry->num_keys * sizeof(struct srd_cond_key));
+	for (i = 0; i < entry->num_keys; i++)
+		Py_XINCREF(entry->keys[i].value);
+	entry->prog = prog;
+	prog->cached = TRUE;
+
+	g_queue_push_head(&cache->entries, entry);
+}
+
+/**
+ * Replace the current condition list with the new one.
+ *
+ * @param self TODO. Must not be NULL.
+ * @param args TODO. Must not be NULL.
+ *
+ * @retval SRD_OK The new condition list was set successfully.
+ * @retval SRD_ERR There was an error setting the new condition list.
+ *                 The contents of di->condition_list are undefined.
+ * @retval 9999 TODO.
+ */
+static int set_new_condition_list(PyObject *self, PyObject *args)
+{
+	struct srd_decoder_inst *di;
+	struct srd_cond_cache *cache;
+	GArray *conds, *terms;
+	struct srd_condition *cond;
+	struct srd_cond_prog *prog;
+	PyObject *py_conditionlist, *py_conds, *py_dict;
+	int i, num_conditions, ret;
+	gboolean cacheable;
+	guint hash;
+	PyGILState_STATE gstate;
+
+	if (!self || !args)
+		return SRD_ERR_ARG;
+
+	gstate = PyGILState_Ensure();
+
+	/* Get the decoder instance. */
+	if (!(di = srd_inst_find_by_obj(NULL, self))) {
 		PyErr_SetString(PyExc_Exception, "decoder instance not found");
 		goto err;
 	}
@@ -642,9 +1291,30 @@ static int set_new_condition_list(PyObject *self, PyObject *args)
 	/* Free the old condition list. */
 	condition_list_free(di);
 
+	/* Re-use the compiled form of a previously seen condition list. */
+	if (!di->condition_cache) {
+		di->condition_cache = g_malloc0(sizeof(struct srd_cond_cache));
+		g_queue_init(&di->condition_cache->entries);
+		di->condition_cache->keys = g_array_new(FALSE, FALSE, sizeof(struct srd_cond_key));
+		di->condition_cache->skips = g_array_new(FALSE, FALSE, sizeof(uint64_t));
+	}
+	cache = di->condition_cache;
+	cacheable = cond_cache_make_key(cache, py_conditionlist, num_conditions, &hash);
+	if (cacheable && (prog = cond_cache_lookup(di, hash, num_conditions))) {
+		cache->hits++;
+		di->condition_list = prog;
+		Py_DecRef(py_conditionlist);
+		PyGILState_Release(gstate);
+		return SRD_OK;
+	}
+	cache->misses++;
+
 	ret = SRD_OK;
 
-	/* Iterate over the conditions, set di->condition_list accordingly. */
+	/* Iterate over the conditions, collect their terms. */
+	conds = g_array_sized_new(FALSE, TRUE, sizeof(struct srd_condition), num_conditions);
+	g_array_set_size(conds, num_conditions);
+	terms = g_array_new(FALSE, TRUE, sizeof(struct srd_term));
 	for (i = 0; i < num_conditions; i++) {
 		/* Get a condition (dict) from the condition list. */
 		py_dict = PyList_GetItem(py_conditionlist, i);
@@ -655,11 +1325,19 @@ static int set_new_condition_list(PyObject *self, PyObject *args)
 		}
 
 		/* Create the list of terms in this condition. */
-		if ((ret = create_term_list(py_dict, &term_list)) < 0)
+		cond = &g_array_index(conds, struct srd_condition, i);
+		if ((ret = create_term_list(di, py_dict, cond, terms)) < 0)
 			break;
+	}
 
-		/* Add the new condition to the PD instance's condition list. */
-		di->condition_list = g_slist_append(di->condition_list, term_list);
+	/* Set di->condition_list to the compiled conditions. */
+	if (ret == SRD_OK) {
+		di->condition_list = cond_prog_new(conds, terms);
+		if (cacheable)
+			cond_cache_insert(cache, hash, num_conditions, di->condition_list);
+	} else {
+		g_array_free(conds, TRUE);
+		g_array_free(terms, TRUE);
 	}
 
 	Py_DecRef(py_conditionlist);
@@ -679,6 +1357,104 @@ ret_9999:
 	return 9999;
 }
 
+/*
+ * Count the time since the last switch as Python time, at wait() entry.
+ * It's a decode event of the trace.
+ */
+static void stats_wait_enter(struct srd_decoder_inst *di)
+{
+	int64_t now;
+
+	now = g_get_monotonic_time();
+	di->stats.wait_calls++;
+	di->stats.python_time += now - di->stats_mark;
+	di->stats_mark = now;
+
+	if (di->trace)
+		srd_trace_event(di->trace, SRD_TRACE_DECODE, di->inst_id,
+			di->trace_mark, di->trace_mark_samplenum,
+			di->abs_cur_samplenum);
+}
+
+/* Count the time since wait() entry as matching time, at wait() exit. */
+static void stats_wait_leave(struct srd_decoder_inst *di)
+{
+	int64_t now;
+
+	now = g_get_monotonic_time();
+	di->stats.match_time += now - di->stats_mark;
+	di->stats_mark = now;
+
+	if (di->trace) {
+		di->trace_mark = srd_trace_time();
+		di->trace_mark_samplenum = di->abs_cur_samplenum;
+	}
+}
+
+/*
+ * Wait for new samples to process, or a termination request. The time
+ * this blocks doesn't count as matching time.
+ */
+static void wait_for_samples(struct srd_decoder_inst *di)
+{
+	int64_t start, blocked, trace_start;
+
+	/* Caller holds di->data_mutex. */
+
+	if (di->got_new_samples || di->want_wait_terminate)
+		return;
+
+	start = g_get_monotonic_time();
+	trace_start = di->trace ? srd_trace_time() : 0;
+	while (!di->got_new_samples && !di->want_wait_terminate)
+		g_cond_wait(&di->got_new_samples_cond, &di->data_mutex);
+	blocked = g_get_monotonic_time() - start;
+	di->stats.samples_wait_time += blocked;
+	di->stats_mark += blocked;
+	if (di->trace)
+		srd_trace_event(di->trace, SRD_TRACE_SAMPLES_WAIT, di->inst_id,
+			trace_start, di->abs_cur_samplenum, di->abs_cur_samplenum);
+}
+
+/**
+ * Finish the current chunk after all of its samples were checked, and
+ * continue with the next queued chunk.
+ *
+ * Must be called with the instance's data mutex held, which gets
+ * released. The stack's batched annotations get delivered before the
+ * finished chunk is released, which signals the main thread when all
+ * samples were handled.
+ *
+ * @param di The decoder instance. Must not be NULL.
+ *
+ * @retval TRUE Continue waiting for samples.
+ * @retval FALSE Termination of wait() and decode() was requested.
+ */
+static gboolean finish_chunk(struct srd_decoder_inst *di)
+{
+	struct srd_chunk *chunk;
+	gboolean want_term;
+
+	chunk = srd_inst_chunk_next(di);
+
+	/*
+	 * When termination of wait() and decode() was requested,
+	 * then exit the loop after releasing the mutex.
+	 */
+	want_term = di->want_wait_terminate;
+	if (want_term)
+		srd_dbg("%s: %s: Will return from wait().",
+			di->inst_id, __func__);
+
+	g_mutex_unlock(&di->data_mutex);
+	srd_inst_ann_batch_flush(di);
+	srd_inst_chunk_release(di, chunk);
+
+	di->stats.cpu_time = srd_thread_cpu_time() - di->stats_cpu_start;
+
+	return !want_term;
+}
+
 /**
  * Create a SKIP condition list for condition-less .wait() calls.
  *
@@ -700,16 +1476,17 @@ ret_9999:
  */
 static int set_skip_condition(struct srd_decoder_inst *di, uint64_t count)
 {
-	struct srd_term *term;
-	GSList *term_list;
+	GArray *conds, *terms;
+	struct srd_condition cond;
 
 	condition_list_free(di);
-	term = g_malloc0(sizeof(*term));
-	term->type = SRD_TERM_SKIP;
-	term->num_samples_to_skip = count;
-	term->num_samples_already_skipped = 0;
-	term_list = g_slist_append(NULL, term);
-	di->condition_list = g_slist_append(di->condition_list, term_list);
+	memset(&cond, 0, sizeof(cond));
+	cond.has_skip = TRUE;
+	cond.skip_samplenum = skip_target(di, count);
+	conds = g_array_new(FALSE, TRUE, sizeof(struct srd_condition));
+	g_array_append_val(conds, cond);
+	terms = g_array_new(FALSE, TRUE, sizeof(struct srd_term));
+	di->condition_list = cond_prog_new(conds, terms);
 
 	return SRD_OK;
 }
@@ -718,10 +1495,10 @@ static PyObject *Decoder_wait(PyObject *self, PyObject *args)
 {
 	int ret;
 	uint64_t skip_count;
-	unsigned int i;
 	gboolean found_match;
 	struct srd_decoder_inst *di;
-	PyObject *py_pinvalues, *py_matched;
+	struct srd_cond_prog *prog;
+	PyObject *py_pinvalues;
 	PyGILState_STATE gstate;
 
 	if (!self || !args)
@@ -735,6 +1512,8 @@ static PyObject *Decoder_wait(PyObject *self, PyObject *args)
 		Py_RETURN_NONE;
 	}
 
+	stats_wait_enter(di);
+
 	ret = set_new_condition_list(self, args);
 	if (ret < 0) {
 		srd_dbg("%s: %s: Aborting wait().", di->inst_id, __func__);
@@ -768,8 +1547,7 @@ static PyObject *Decoder_wait(PyObject *self, PyObject *args)
 
 		/* Wait for new samples to process, or termination request. */
 		g_mutex_lock(&di->data_mutex);
-		while (!di->got_new_samples && !di->want_wait_terminate)
-			g_cond_wait(&di->got_new_samples_cond, &di->data_mutex);
+		wait_for_samples(di);
 
 		/*
 		 * Check whether any of the current condition(s) match.
@@ -786,51 +1564,29 @@ static PyObject *Decoder_wait(PyObject *self, PyObject *args)
 		/* If there's a match, set self.samplenum etc. and return. */
 		if (found_match) {
 			/* Set self.samplenum to the (absolute) sample number that matched. */
-			PyObject_SetAttrString(di->py_inst, "samplenum",
-				PyLong_FromLong(di->abs_cur_samplenum));
-
-			if (di->match_array && di->match_array->len > 0) {
-				py_matched = PyTuple_New(di->match_array->len);
-				for (i = 0; i < di->match_array->len; i++)
-					PyTuple_SetItem(py_matched, i, PyBool_FromLong(di->match_array->data[i]));
-				PyObject_SetAttrString(di->py_inst, "matched", py_matched);
-				match_array_free(di);
+			samplenum_set(di, di->abs_cur_samplenum);
+
+			prog = di->condition_list;
+			if (prog && prog->have_matched && prog->num_conds > 0) {
+				matched_set(di, matched_get(di, prog));
+				prog->have_matched = FALSE;
 			} else {
-				PyObject_SetAttrString(di->py_inst, "matched", Py_None);
+				matched_set(di, NULL);
 			}
-	
+
 			py_pinvalues = get_current_pinvalues(di);
 
 			g_mutex_unlock(&di->data_mutex);
 
+			stats_wait_leave(di);
 			PyGILState_Release(gstate);
 
 			return py_pinvalues;
 		}
 
-		/* No match, reset state for the next chunk. */
-		di->got_new_samples = FALSE;
-		di->handled_all_samples = TRUE;
-		di->abs_start_samplenum = 0;
-		di->abs_end_samplenum = 0;
-		di->inbuf = NULL;
-		di->inbuflen = 0;
-
-		/* Signal the main thread that we handled all samples. */
-		g_cond_signal(&di->handled_all_samples_cond);
-
-		/*
-		 * When termination of wait() and decode() was requested,
-		 * then exit the loop after releasing the mutex.
-		 */
-		if (di->want_wait_terminate) {
-			srd_dbg("%s: %s: Will return from wait().",
-				di->inst_id, __func__);
-			g_mutex_unlock(&di->data_mutex);
+		/* No match, continue with the next chunk. */
+		if (!finish_chunk(di))
 			goto err;
-		}
-
-		g_mutex_unlock(&di->data_mutex);
 	}
 
 	PyGILState_Release(gstate);
@@ -838,26 +1594,58 @@ static PyObject *Decoder_wait(PyObject *self, PyObject *args)
 	Py_RETURN_NONE;
 
 err:
+	stats_wait_leave(di);
 	PyGILState_Release(gstate);
 
 	return NULL;
 }
 
+/* Convert sample numbers into an array('Q'). */
+static PyObject *samplenum_array(const GArray *samplenums)
+{
+	PyObject *py_mod, *py_bytes, *py_res;
+
+	if (!(py_mod = py_import_by_name("array")))
+		return NULL;
+	py_bytes = PyBytes_FromStringAndSize((const char *)samplenums->data,
+		samplenums->len * sizeof(uint64_t));
+	if (!py_bytes) {
+		Py_DecRef(py_mod);
+		return NULL;
+	}
+	py_res = PyObject_CallMethod(py_mod, "array", "sO", "Q", py_bytes);
+	Py_DecRef(py_bytes);
+	Py_DecRef(py_mod);
+
+	return py_res;
+}
+
 /**
- * Return whether the specified channel was supplied to the decoder.
+ * Wait for multiple edges on one channel.
  *
- * @param self TODO. Must not be NULL.
- * @param args TODO. Must not be NULL.
+ * This is the equivalent of calling self.wait({channel: kind}) up to
+ * 'max_count' times, in a single call. It returns early (with at least
+ * one edge) when the current chunk of samples is exhausted, so edges
+ * don't get held back until more samples arrive.
  *
- * @retval Py_True The channel has been supplied by the frontend.
- * @retval Py_False The channel has been supplied by the frontend.
- * @retval NULL An error occurred.
+ * Afterwards self.samplenum is the last edge's sample number, and the
+ * next wait() continues from there.
+ *
+ * @param self The Decoder object. Must not be NULL.
+ * @param args The channel index, the edge kind ('r', 'f' or 'e') and
+ *             the max. number of edges. Must not be NULL.
+ *
+ * @return An array('Q') of the edges' absolute sample numbers.
  */
-static PyObject *Decoder_has_channel(PyObject *self, PyObject *args)
+static PyObject *Decoder_wait_edges(PyObject *self, PyObject *args)
 {
-	int idx, max_idx;
+	int channel, ret;
+	unsigned long max_count;
+	uint64_t samplenum;
+	gboolean found_match;
+	GArray *edges;
 	struct srd_decoder_inst *di;
-	PyObject *py_channel;
+	PyObject *py_kind, *py_args, *py_res;
 	PyGILState_STATE gstate;
 
 	if (!self || !args)
@@ -865,53 +1653,1346 @@ static PyObject *Decoder_has_channel(PyObject *self, PyObject *args)
 
 	gstate = PyGILState_Ensure();
 
+	edges = NULL;
+
 	if (!(di = srd_inst_find_by_obj(NULL, self))) {
 		PyErr_SetString(PyExc_Exception, "decoder instance not found");
 		goto err;
 	}
 
-	/* Parse the argument of self.has_channel() into 'py_channel'. */
-	if (!PyArg_ParseTuple(args, "O", &py_channel)) {
+	stats_wait_enter(di);
+
+	if (!PyArg_ParseTuple(args, "iOk", &channel, &py_kind, &max_count)) {
 		/* Let Python raise this exception. */
 		goto err;
 	}
+	if (!PyUnicode_Check(py_kind) ||
+	    (PyUnicode_CompareWithASCIIString(py_kind, "r") &&
+	     PyUnicode_CompareWithASCIIString(py_kind, "f") &&
+	     PyUnicode_CompareWithASCIIString(py_kind, "e"))) {
+		PyErr_SetString(PyExc_Exception, "invalid edge kind");
+		goto err;
+	}
 
-	if (!PyLong_Check(py_channel)) {
-		PyErr_SetString(PyExc_Exception, "channel index not a number");
+	/* Use the condition list of self.wait({channel: kind}). */
+	py_args = Py_BuildValue("({iO})", channel, py_kind);
+	if (!py_args)
+		goto err;
+	ret = set_new_condition_list(self, py_args);
+	Py_DecRef(py_args);
+	if (ret < 0) {
+		srd_dbg("%s: %s: Aborting wait_edges().", di->inst_id, __func__);
 		goto err;
 	}
 
-	idx = PyLong_AsLong(py_channel);
-	max_idx = g_slist_length(di->decoder->channels)
-		+ g_slist_length(di->decoder->opt_channels) - 1;
+	edges = g_array_new(FALSE, FALSE, sizeof(uint64_t));
+	samplenum = 0;
+	while (edges->len < max_count) {
 
-	if (idx < 0 || idx > max_idx) {
-		srd_err("Invalid channel index %d/%d.", idx, max_idx);
-		PyErr_SetString(PyExc_Exception, "invalid channel");
-		goto err;
+		Py_BEGIN_ALLOW_THREADS
+
+		/* Wait for new samples to process, or termination request. */
+		g_mutex_lock(&di->data_mutex);
+		wait_for_samples(di);
+
+		/*
+		 * Collect the edges in the current chunk. The next search
+		 * starts at the edge, which won't match again since its
+		 * "old" pins are its own.
+		 */
+		while (edges->len < max_count) {
+			found_match = FALSE;
+			process_samples_until_condition_match(di, &found_match);
+			if (!found_match)
+				break;
+			samplenum = di->abs_cur_samplenum;
+			g_array_append_val(edges, samplenum);
+		}
+
+		Py_END_ALLOW_THREADS
+
+		if (edges->len >= max_count) {
+			g_mutex_unlock(&di->data_mutex);
+			break;
+		}
+
+		/*
+		 * Return the edges of this chunk before waiting for more
+		 * samples. Continue from the last edge, like wait() does.
+		 */
+		if (edges->len > 0) {
+			srd_inst_rewind(di, samplenum);
+			g_mutex_unlock(&di->data_mutex);
+			break;
+		}
+
+		/* No edge, continue with the next chunk. */
+		if (!finish_chunk(di))
+			goto err;
+	}
+
+	stats_wait_leave(di);
+
+	if (edges->len > 0) {
+		samplenum_set(di, samplenum);
+		matched_set(di, NULL);
 	}
 
+	py_res = samplenum_array(edges);
+	g_array_free(edges, TRUE);
+
 	PyGILState_Release(gstate);
 
-	return (di->dec_channelmap[idx] == -1) ? Py_False : Py_True;
+	return py_res;
 
 err:
+	if (edges) {
+		stats_wait_leave(di);
+		g_array_free(edges, TRUE);
+	}
 	PyGILState_Release(gstate);
 
 	return NULL;
 }
 
-static PyMethodDef Decoder_methods[] = {
-	{"put", Decoder_put, METH_VARARGS,
-	 "Accepts a dictionary with the following keys: startsample, endsample, data"},
-	{"register", (PyCFunction)Decoder_register, METH_VARARGS|METH_KEYWORDS,
-			"Register a new output stream"},
-	{"wait", Decoder_wait, METH_VARARGS,
-			"Wait for one or more conditions to occur"},
-	{"has_channel", Decoder_has_channel, METH_VARARGS,
-			"Report whether a channel was supplied"},
-	{NULL, NULL, 0, NULL}
-};
+/*
+ * Look up where the channels of a list of channel indices are in a
+ * sample. Returns NULL and raises an exception for invalid channels.
+ */
+static struct srd_pin *channel_pins(const struct srd_decoder_inst *di,
+		PyObject *py_channels, unsigned int *num_channels)
+{
+	struct srd_pin *pins;
+	PyObject *py_item;
+	unsigned int i;
+	long channel;
+
+	if (!PySequence_Check(py_channels)) {
+		PyErr_SetString(PyExc_Exception, "channels are not a list");
+		return NULL;
+	}
+	*num_channels = PySequence_Size(py_channels);
+	pins = g_malloc0(sizeof(struct srd_pin) * MAX(*num_channels, 1));
+	for (i = 0; i < *num_channels; i++) {
+		py_item = PySequence_GetItem(py_channels, i);
+		channel = py_item && PyLong_Check(py_item) ? PyLong_AsLong(py_item) : -1;
+		Py_XDECREF(py_item);
+		if (channel < 0 || channel >= di->dec_num_channels) {
+			PyErr_Clear();
+			PyErr_SetString(PyExc_Exception, "invalid channel");
+			g_free(pins);
+			return NULL;
+		}
+		pins[i] = di->dec_pins[channel];
+	}
+
+	return pins;
+}
+
+/*
+ * Make the condition list of a bulk wait: the condition which the caller
+ * waits for, followed by the abort condition(s) of the decoder, which is
+ * None, a dict or a list of dicts.
+ */
+static PyObject *abort_condition_list(PyObject *py_cond, PyObject *py_abort)
+{
+	PyObject *py_conds;
+	Py_ssize_t i;
+
+	if (py_abort != Py_None && !PyDict_Check(py_abort) &&
+	    !PyList_Check(py_abort)) {
+		PyErr_SetString(PyExc_Exception, "abort is neither a list nor a dict");
+		return NULL;
+	}
+
+	if (!(py_conds = PyList_New(0)))
+		return NULL;
+	if (PyList_Append(py_conds, py_cond) < 0)
+		goto err;
+	if (PyDict_Check(py_abort)) {
+		if (PyList_Append(py_conds, py_abort) < 0)
+			goto err;
+	} else if (PyList_Check(py_abort)) {
+		for (i = 0; i < PyList_Size(py_abort); i++) {
+			if (PyList_Append(py_conds, PyList_GetItem(py_abort, i)) < 0)
+				goto err;
+		}
+	}
+
+	return py_conds;
+
+err:
+	Py_DecRef(py_conds);
+
+	return NULL;
+}
+
+/* Convert the bits of a shift_in() word into a Python int. */
+static PyObject *shift_in_word(const uint8_t *bytes, unsigned long count)
+{
+	PyObject *py_bytes, *py_res;
+	uint64_t word;
+	unsigned long i;
+
+	if (count <= 64) {
+		word = 0;
+		for (i = 0; i < (count + 7) / 8; i++)
+			word |= (uint64_t)bytes[i] << (i * 8);
+		return PyLong_FromUnsignedLongLong(word);
+	}
+
+	py_bytes = PyBytes_FromStringAndSize((const char *)bytes, (count + 7) / 8);
+	if (!py_bytes)
+		return NULL;
+	py_res = PyObject_CallMethod((PyObject *)&PyLong_Type, "from_bytes",
+		"Os", py_bytes, "little");
+	Py_DecRef(py_bytes);
+
+	return py_res;
+}
+
+/**
+ * Shift in bits of data channels on edges of a clock channel.
+ *
+ * This is the equivalent of calling self.wait() with the clock edge and
+ * the abort conditions up to 'count' times, and shifting the values of
+ * the data channels at the clock edges into words, in a single call.
+ * When an abort condition matches, the bits so far are returned, and a
+ * clock edge at the same sample doesn't get shifted in.
+ *
+ * Afterwards self.samplenum is the sample number of the last bit, or of
+ * the abort condition's match, and the next wait() continues from there.
+ * self.matched is None when all bits were shifted in, and tells which of
+ * the clock edge and the abort conditions matched otherwise.
+ *
+ * Every bit starts at its clock edge and ends at the next bit's edge.
+ * The last bit is assumed to be as long as the one before it.
+ *
+ * @param self The Decoder object. Must not be NULL.
+ * @param args The clock channel index, the edge kind ('r', 'f' or 'e'),
+ *             a list of data channel indices, the number of bits, and
+ *             optionally the bit order ('msb-first' or 'lsb-first') and
+ *             abort conditions like those of wait(). Must not be NULL.
+ * @param kwargs The same as keyword arguments: clock, edge, data, count,
+ *               bitorder and abort.
+ *
+ * @return A tuple of the pin values at self.samplenum (like wait()
+ *         returns them), a list of the data channels' words, and
+ *         array('Q')s of the bits' start and end sample numbers.
+ */
+static PyObject *Decoder_shift_in(PyObject *self, PyObject *args,
+		PyObject *kwargs)
+{
+	int clock, ret;
+	unsigned long count;
+	unsigned int i, num_data, nbytes, weight;
+	uint64_t samplenum, end;
+	gboolean found_match, aborted, msb_first;
+	const char *bitorder;
+	const uint8_t *sample_pos;
+	struct srd_pin *data_pins;
+	uint8_t *words;
+	GArray *starts, *ends;
+	struct srd_decoder_inst *di;
+	struct srd_cond_prog *prog;
+	PyObject *py_edge, *py_data, *py_abort, *py_cond, *py_conds, *py_args;
+	PyObject *py_pinvalues, *py_words, *py_starts, *py_ends;
+	PyObject *py_item;
+	char *keywords[] = {"clock", "edge", "data", "count", "bitorder",
+		"abort", NULL};
+	PyGILState_STATE gstate;
+
+	if (!self || !args)
+		return NULL;
+
+	gstate = PyGILState_Ensure();
+
+	data_pins = NULL;
+	words = NULL;
+	starts = ends = NULL;
+	py_conds = NULL;
+
+	if (!(di = srd_inst_find_by_obj(NULL, self))) {
+		PyErr_SetString(PyExc_Exception, "decoder instance not found");
+		PyGILState_Release(gstate);
+		return NULL;
+	}
+
+	stats_wait_enter(di);
+
+	bitorder = "msb-first";
+	py_abort = Py_None;
+	if (!PyArg_ParseTupleAndKeywords(args, kwargs, "iOOk|sO", keywords,
+			&clock, &py_edge, &py_data, &count, &bitorder, &py_abort)) {
+		/* Let Python raise this exception. */
+		goto err;
+	}
+	if (!PyUnicode_Check(py_edge) ||
+	    (PyUnicode_CompareWithASCIIString(py_edge, "r") &&
+	     PyUnicode_CompareWithASCIIString(py_edge, "f") &&
+	     PyUnicode_CompareWithASCIIString(py_edge, "e"))) {
+		PyErr_SetString(PyExc_Exception, "invalid edge kind");
+		goto err;
+	}
+	if (strcmp(bitorder, "msb-first") && strcmp(bitorder, "lsb-first")) {
+		PyErr_SetString(PyExc_Exception, "invalid bit order");
+		goto err;
+	}
+	msb_first = !strcmp(bitorder, "msb-first");
+	if (!count || count > G_MAXUINT - 7) {
+		PyErr_SetString(PyExc_Exception, "invalid bit count");
+		goto err;
+	}
+
+	if (!(data_pins = channel_pins(di, py_data, &num_data)))
+		goto err;
+
+	/* Wait for the clock edge, or any of the abort conditions. */
+	py_cond = Py_BuildValue("{iO}", clock, py_edge);
+	if (!py_cond)
+		goto err;
+	py_conds = abort_condition_list(py_cond, py_abort);
+	Py_DecRef(py_cond);
+	if (!py_conds)
+		goto err;
+	py_args = Py_BuildValue("(O)", py_conds);
+	if (!py_args)
+		goto err;
+	ret = set_new_condition_list(self, py_args);
+	Py_DecRef(py_args);
+	if (ret < 0) {
+		srd_dbg("%s: %s: Aborting shift_in().", di->inst_id, __func__);
+		goto err;
+	}
+	prog = di->condition_list;
+
+	nbytes = (count + 7) / 8;
+	words = g_malloc0(MAX(num_data, 1) * nbytes);
+	starts = g_array_new(FALSE, FALSE, sizeof(uint64_t));
+	aborted = FALSE;
+	samplenum = 0;
+	while (1) {
+
+		Py_BEGIN_ALLOW_THREADS
+
+		/* Wait for new samples to process, or termination request. */
+		g_mutex_lock(&di->data_mutex);
+		wait_for_samples(di);
+
+		/* Collect the bits in the current chunk. */
+		while (starts->len < count) {
+			found_match = FALSE;
+			process_samples_until_condition_match(di, &found_match);
+			if (!found_match)
+				break;
+			samplenum = di->abs_cur_samplenum;
+			for (i = 1; i < prog->num_conds; i++)
+				aborted = aborted || prog->matched[i];
+			if (aborted)
+				break;
+			weight = msb_first ? count - 1 - starts->len : starts->len;
+			sample_pos = srd_inst_cur_sample(di);
+			for (i = 0; i < num_data; i++) {
+				if (data_pins[i].offset < 0)
+					continue;
+				if (sample_pos[data_pins[i].offset] & data_pins[i].mask)
+					words[i * nbytes + weight / 8] |= 1 << (weight % 8);
+			}
+			g_array_append_val(starts, samplenum);
+		}
+
+		Py_END_ALLOW_THREADS
+
+		if (starts->len >= count || aborted) {
+			g_mutex_unlock(&di->data_mutex);
+			break;
+		}
+
+		/* The bits so far are kept, continue with the next chunk. */
+		if (!finish_chunk(di))
+			goto err;
+	}
+
+	stats_wait_leave(di);
+
+	samplenum_set(di, samplenum);
+	matched_set(di, aborted ? matched_get(di, prog) : NULL);
+	prog->have_matched = FALSE;
+
+	ends = g_array_sized_new(FALSE, FALSE, sizeof(uint64_t), starts->len);
+	for (i = 0; i < starts->len; i++) {
+		if (i + 1 < starts->len)
+			end = g_array_index(starts, uint64_t, i + 1);
+		else if (i > 0)
+			end = 2 * g_array_index(starts, uint64_t, i) -
+				g_array_index(starts, uint64_t, i - 1);
+		else
+			end = g_array_index(starts, uint64_t, i);
+		g_array_append_val(ends, end);
+	}
+
+	py_words = PyList_New(num_data);
+	for (i = 0; py_words && i < num_data; i++) {
+		if (!(py_item = shift_in_word(&words[i * nbytes], count))) {
+			Py_DecRef(py_words);
+			py_words = NULL;
+			break;
+		}
+		PyList_SetItem(py_words, i, py_item);
+	}
+	py_pinvalues = get_current_pinvalues(di);
+	py_starts = samplenum_array(starts);
+	py_ends = samplenum_array(ends);
+
+	g_array_free(starts, TRUE);
+	g_array_free(ends, TRUE);
+	g_free(words);
+	g_free(data_pins);
+	Py_DecRef(py_conds);
+
+	PyGILState_Release(gstate);
+
+	if (!py_pinvalues || !py_words || !py_starts || !py_ends) {
+		Py_XDECREF(py_pinvalues);
+		Py_XDECREF(py_words);
+		Py_XDECREF(py_starts);
+		Py_XDECREF(py_ends);
+		return NULL;
+	}
+
+	return Py_BuildValue("(NNNN)", py_pinvalues, py_words, py_starts,
+		py_ends);
+
+err:
+	stats_wait_leave(di);
+	if (starts)
+		g_array_free(starts, TRUE);
+	g_free(words);
+	g_free(data_pins);
+	Py_XDECREF(py_conds);
+	PyGILState_Release(gstate);
+
+	return NULL;
+}
+
+/* Max. denominator of the sample_points() offset and width fractions. */
+#define SAMPLE_POINT_MAX_DENOMINATOR (1 << 24)
+
+/*
+ * Split a number of samples into its whole part and a fraction. Ints and
+ * fractions.Fraction get used as they are, other numbers (floats) get
+ * approximated by the closest fraction with a small denominator, which
+ * e.g. turns 1e6 / 115200 back into 625 / 72.
+ */
+static int sample_point_fraction(PyObject *py_value, uint64_t *whole,
+		uint64_t *num, uint64_t *den)
+{
+	PyObject *py_mod, *py_frac, *py_num, *py_den, *py_divmod;
+	int ret;
+
+	if (PyLong_Check(py_value)) {
+		*whole = PyLong_AsUnsignedLongLong(py_value);
+		*num = 0;
+		*den = 1;
+		return PyErr_Occurred() ? SRD_ERR : SRD_OK;
+	}
+
+	py_frac = py_num = py_den = py_divmod = NULL;
+	ret = SRD_ERR;
+
+	py_num = PyObject_GetAttrString(py_value, "numerator");
+	py_den = PyObject_GetAttrString(py_value, "denominator");
+	if (!py_num || !py_den || !PyLong_Check(py_num) ||
+	    !PyLong_Check(py_den) ||
+	    PyLong_AsUnsignedLongLong(py_den) > SAMPLE_POINT_MAX_DENOMINATOR) {
+		PyErr_Clear();
+		Py_XDECREF(py_num);
+		Py_XDECREF(py_den);
+		if (!(py_mod = py_import_by_name("fractions")))
+			return SRD_ERR;
+		py_frac = PyObject_CallMethod(py_mod, "Fraction", "O", py_value);
+		Py_DecRef(py_mod);
+		if (!py_frac)
+			return SRD_ERR;
+		py_value = PyObject_CallMethod(py_frac, "limit_denominator", "K",
+			(unsigned long long)SAMPLE_POINT_MAX_DENOMINATOR);
+		Py_DecRef(py_frac);
+		if (!(py_frac = py_value))
+			return SRD_ERR;
+		py_num = PyObject_GetAttrString(py_frac, "numerator");
+		py_den = PyObject_GetAttrString(py_frac, "denominator");
+		if (!py_num || !py_den)
+			goto out;
+	}
+	if (!(py_divmod = PyNumber_Divmod(py_num, py_den)))
+		goto out;
+	*whole = PyLong_AsUnsignedLongLong(PyTuple_GetItem(py_divmod, 0));
+	*num = PyLong_AsUnsignedLongLong(PyTuple_GetItem(py_divmod, 1));
+	*den = PyLong_AsUnsignedLongLong(py_den);
+	if (!PyErr_Occurred())
+		ret = SRD_OK;
+
+out:
+	Py_XDECREF(py_divmod);
+	Py_XDECREF(py_den);
+	Py_XDECREF(py_num);
+	Py_XDECREF(py_frac);
+
+	return ret;
+}
+
+/**
+ * Read the values of channels at a series of sample points.
+ *
+ * The sample points are start + ceil(offset + i * width) for
+ * i = 0 .. count - 1, e.g. the centres of the bits of an asynchronous
+ * frame which starts at sample 'start'. They get computed in exact
+ * fractions, so they don't drift over long frames. Floats get
+ * approximated by the closest fraction with a denominator of up to 2^24,
+ * decoders can pass fractions.Fraction for exact values.
+ *
+ * This is the equivalent of calling self.wait() with a skip to the next
+ * sample point and the abort conditions up to 'count' times, in a single
+ * call. When an abort condition matches, the values so far are returned,
+ * and a sample point at the same sample doesn't get read. When decoding
+ * ends, the values so far get dropped, like wait() doesn't return then.
+ *
+ * Afterwards self.samplenum is the last sample point, or the abort
+ * condition's match, and the next wait() continues from there.
+ * self.matched is None when no abort condition matched, and tells which
+ * of the sample point and the abort conditions matched otherwise.
+ *
+ * @param self The Decoder object. Must not be NULL.
+ * @param args The start sample number, the distance of the sample points
+ *             in samples, their number, a list of channel indices, and
+ *             optionally abort conditions like those of wait() and the
+ *             first sample point's offset from the start. Must not be
+ *             NULL.
+ * @param kwargs The same as keyword arguments: start, width, count,
+ *               channels, abort and offset.
+ *
+ * @return A tuple of the pin values at self.samplenum (like wait()
+ *         returns them), a list of bytes with the channels' values
+ *         (0 or 1) at the sample points, and an array('Q') of the
+ *         sample points which were read.
+ */
+static PyObject *Decoder_sample_points(PyObject *self, PyObject *args,
+		PyObject *kwargs)
+{
+	int ret;
+	unsigned long count;
+	unsigned int i, num_channels;
+	uint64_t samplenum, start, point, pos, pos_rem, step, step_rem, den;
+	uint64_t offset_num, offset_den, width_num, width_den, a, b;
+	gboolean found_match, aborted;
+	const uint8_t *sample_pos;
+	struct srd_pin *pins;
+	uint8_t *values;
+	GArray *points;
+	struct srd_decoder_inst *di;
+	struct srd_cond_prog *prog;
+	PyObject *py_offset, *py_width, *py_channels, *py_abort, *py_cond;
+	PyObject *py_conds, *py_args, *py_pinvalues, *py_values, *py_points;
+	PyObject *py_item;
+	char *keywords[] = {"start", "width", "count", "channels", "abort",
+		"offset", NULL};
+	PyGILState_STATE gstate;
+
+	if (!self || !args)
+		return NULL;
+
+	gstate = PyGILState_Ensure();
+
+	pins = NULL;
+	values = NULL;
+	points = NULL;
+	py_conds = NULL;
+
+	if (!(di = srd_inst_find_by_obj(NULL, self))) {
+		PyErr_SetString(PyExc_Exception, "decoder instance not found");
+		PyGILState_Release(gstate);
+		return NULL;
+	}
+
+	stats_wait_enter(di);
+
+	py_abort = Py_None;
+	py_offset = NULL;
+	if (!PyArg_ParseTupleAndKeywords(args, kwargs, "KOkO|OO", keywords,
+			&start, &py_width, &count, &py_channels, &py_abort,
+			&py_offset)) {
+		/* Let Python raise this exception. */
+		goto err;
+	}
+	if (!count) {
+		PyErr_SetString(PyExc_Exception, "invalid sample point count");
+		goto err;
+	}
+	pos = offset_num = 0;
+	offset_den = 1;
+	if (py_offset && sample_point_fraction(py_offset, &pos,
+			&offset_num, &offset_den) < 0)
+		goto err;
+	if (sample_point_fraction(py_width, &step, &width_num, &width_den) < 0)
+		goto err;
+	if (!step && !width_num) {
+		PyErr_SetString(PyExc_Exception, "invalid sample point width");
+		goto err;
+	}
+
+	/*
+	 * Keep the position as a whole number of samples and a remainder
+	 * of 'den'ths of a sample, den = lcm(offset_den, width_den) <= 2^48.
+	 */
+	for (a = offset_den, b = width_den; b; ) {
+		den = a % b;
+		a = b;
+		b = den;
+	}
+	den = offset_den / a * width_den;
+	pos += start;
+	pos_rem = offset_num * (den / offset_den);
+	step_rem = width_num * (den / width_den);
+	point = pos + (pos_rem ? 1 : 0);
+	if (point < di->abs_cur_samplenum) {
+		PyErr_SetString(PyExc_Exception, "sample point is in the past");
+		goto err;
+	}
+
+	if (!(pins = channel_pins(di, py_channels, &num_channels)))
+		goto err;
+
+	/* Skip to the sample point, or wait for any of the abort conditions. */
+	py_cond = Py_BuildValue("{sK}", "skip",
+		(unsigned long long)(point - di->abs_cur_samplenum));
+	if (!py_cond)
+		goto err;
+	py_conds = abort_condition_list(py_cond, py_abort);
+	Py_DecRef(py_cond);
+	if (!py_conds)
+		goto err;
+	py_args = Py_BuildValue("(O)", py_conds);
+	if (!py_args)
+		goto err;
+	ret = set_new_condition_list(self, py_args);
+	Py_DecRef(py_args);
+	if (ret < 0) {
+		srd_dbg("%s: %s: Aborting sample_points().", di->inst_id, __func__);
+		goto err;
+	}
+	prog = di->condition_list;
+
+	values = g_malloc0(MAX(num_channels, 1) * count);
+	points = g_array_new(FALSE, FALSE, sizeof(uint64_t));
+	aborted = FALSE;
+	samplenum = 0;
+	while (1) {
+
+		Py_BEGIN_ALLOW_THREADS
+
+		/* Wait for new samples to process, or termination request. */
+		g_mutex_lock(&di->data_mutex);
+		wait_for_samples(di);
+
+		/* Read the sample points in the current chunk. */
+		while (points->len < count) {
+			found_match = FALSE;
+			process_samples_until_condition_match(di, &found_match);
+			if (!found_match)
+				break;
+			samplenum = di->abs_cur_samplenum;
+			for (i = 1; i < prog->num_conds; i++)
+				aborted = aborted || prog->matched[i];
+			if (aborted)
+				break;
+			sample_pos = srd_inst_cur_sample(di);
+			for (i = 0; i < num_channels; i++) {
+				if (pins[i].offset < 0)
+					continue;
+				if (sample_pos[pins[i].offset] & pins[i].mask)
+					values[i * count + points->len] = 1;
+			}
+			g_array_append_val(points, samplenum);
+
+			/* Advance to the next sample point. */
+			pos += step;
+			pos_rem += step_rem;
+			if (pos_rem >= den) {
+				pos_rem -= den;
+				pos++;
+			}
+			prog->conds[0].skip_samplenum = pos + (pos_rem ? 1 : 0);
+		}
+
+		Py_END_ALLOW_THREADS
+
+		if (points->len >= count || aborted) {
+			g_mutex_unlock(&di->data_mutex);
+			break;
+		}
+
+		/* The values so far are kept, continue with the next chunk. */
+		if (!finish_chunk(di))
+			goto err;
+	}
+
+	stats_wait_leave(di);
+
+	samplenum_set(di, samplenum);
+	matched_set(di, aborted ? matched_get(di, prog) : NULL);
+	prog->have_matched = FALSE;
+
+	py_values = PyList_New(num_channels);
+	for (i = 0; py_values && i < num_channels; i++) {
+		py_item = PyBytes_FromStringAndSize((const char *)&values[i * count],
+			points->len);
+		if (!py_item) {
+			Py_DecRef(py_values);
+			py_values = NULL;
+			break;
+		}
+		PyList_SetItem(py_values, i, py_item);
+	}
+	py_pinvalues = get_current_pinvalues(di);
+	py_points = samplenum_array(points);
+
+	g_array_free(points, TRUE);
+	g_free(values);
+	g_free(pins);
+	Py_DecRef(py_conds);
+
+	PyGILState_Release(gstate);
+
+	if (!py_pinvalues || !py_values || !py_points) {
+		Py_XDECREF(py_pinvalues);
+		Py_XDECREF(py_values);
+		Py_XDECREF(py_points);
+		return NULL;
+	}
+
+	return Py_BuildValue("(NNN)", py_pinvalues, py_values, py_points);
+
+err:
+	stats_wait_leave(di);
+	if (points)
+		g_array_free(points, TRUE);
+	g_free(values);
+	g_free(pins);
+	Py_XDECREF(py_conds);
+	PyGILState_Release(gstate);
+
+	return NULL;
+}
+
+/* Append a run of a pulses() call. */
+static void pulse_run_add(GByteArray *levels, GArray *lengths,
+		uint8_t level, uint64_t start, uint64_t end)
+{
+	uint64_t length;
+
+	length = end - start;
+	g_byte_array_append(levels, &level, 1);
+	g_array_append_val(lengths, length);
+}
+
+/**
+ * Measure the runs of constant level on one channel.
+ *
+ * This is the equivalent of calling self.wait({channel: 'e'}) until
+ * 'max_count' runs (high or low pulses) are complete, and computing
+ * their lengths, in a single call. It returns early (with at least one
+ * run) when the current chunk of samples is exhausted, so runs don't get
+ * held back until more samples arrive.
+ *
+ * The first run starts at self.samplenum. Runs alternate between high
+ * and low. A pulse which is shorter than 'glitch' samples is a glitch,
+ * and doesn't end the run it occurs in.
+ *
+ * Afterwards self.samplenum is where the run in progress started, which
+ * is the end of the last complete run. The next pulses() call on the
+ * same channel continues that run, even when its start is in an earlier
+ * chunk. The next wait() continues after the last sample that got
+ * checked, which can be up to 'glitch' samples later.
+ *
+ * @param self The Decoder object. Must not be NULL.
+ * @param args The channel index, the max. number of runs, and optionally
+ *             the glitch threshold in samples. Must not be NULL.
+ * @param kwargs The same as keyword arguments: channel, max_count and
+ *               glitch.
+ *
+ * @return A tuple of bytes with the runs' levels (0 or 1), and an
+ *         array('Q') of their lengths in samples.
+ */
+static PyObject *Decoder_pulses(PyObject *self, PyObject *args,
+		PyObject *kwargs)
+{
+	int channel, ret;
+	unsigned long max_count;
+	unsigned long long glitch;
+	uint64_t samplenum;
+	uint8_t level;
+	gboolean found_match;
+	const struct srd_pin *pin;
+	struct srd_pulse_state *state;
+	GByteArray *levels;
+	GArray *lengths;
+	struct srd_decoder_inst *di;
+	struct srd_cond_prog *prog;
+	PyObject *py_args, *py_levels, *py_lengths;
+	char *keywords[] = {"channel", "max_count", "glitch", NULL};
+	PyGILState_STATE gstate;
+
+	if (!self || !args)
+		return NULL;
+
+	gstate = PyGILState_Ensure();
+
+	levels = NULL;
+	lengths = NULL;
+
+	if (!(di = srd_inst_find_by_obj(NULL, self))) {
+		PyErr_SetString(PyExc_Exception, "decoder instance not found");
+		PyGILState_Release(gstate);
+		return NULL;
+	}
+
+	stats_wait_enter(di);
+
+	glitch = 0;
+	if (!PyArg_ParseTupleAndKeywords(args, kwargs, "ik|K", keywords,
+			&channel, &max_count, &glitch)) {
+		/* Let Python raise this exception. */
+		goto err;
+	}
+	if (channel < 0 || channel >= di->dec_num_channels) {
+		PyErr_SetString(PyExc_Exception, "invalid channel");
+		goto err;
+	}
+	if (!max_count) {
+		PyErr_SetString(PyExc_Exception, "invalid run count");
+		goto err;
+	}
+	pin = &di->dec_pins[channel];
+
+	/*
+	 * Wait for edges, and for the end of the glitch threshold after
+	 * an edge, which confirms that the edge ends a run.
+	 */
+	if (glitch)
+		py_args = Py_BuildValue("([{is}{sK}])", channel, "e", "skip", 0ULL);
+	else
+		py_args = Py_BuildValue("({is})", channel, "e");
+	if (!py_args)
+		goto err;
+	ret = set_new_condition_list(self, py_args);
+	Py_DecRef(py_args);
+	if (ret < 0) {
+		srd_dbg("%s: %s: Aborting pulses().", di->inst_id, __func__);
+		goto err;
+	}
+	prog = di->condition_list;
+
+	/* Continue where the last call left off, or start a new run. */
+	state = di->pulse_state;
+	if (!state)
+		state = di->pulse_state = g_malloc0(sizeof(*state));
+	if (state->resume_samplenum != di->abs_cur_samplenum ||
+	    state->channel != channel || state->glitch != glitch ||
+	    state->run_start > di->abs_cur_samplenum) {
+		state->channel = channel;
+		state->glitch = glitch;
+		state->run_start = di->abs_cur_samplenum;
+		state->have_pending = FALSE;
+	}
+	if (glitch)
+		prog->conds[1].skip_samplenum = state->have_pending ?
+			state->pending + glitch : G_MAXUINT64;
+
+	levels = g_byte_array_new();
+	lengths = g_array_new(FALSE, FALSE, sizeof(uint64_t));
+	while (1) {
+
+		Py_BEGIN_ALLOW_THREADS
+
+		/* Wait for new samples to process, or termination request. */
+		g_mutex_lock(&di->data_mutex);
+		wait_for_samples(di);
+
+		/* Measure the runs in the current chunk. */
+		while (lengths->len < max_count) {
+			found_match = FALSE;
+			process_samples_until_condition_match(di, &found_match);
+			if (!found_match)
+				break;
+			samplenum = di->abs_cur_samplenum;
+			if (!prog->matched[0]) {
+				/* No edge within the glitch threshold. */
+				pulse_run_add(levels, lengths, !state->pending_level,
+					state->run_start, state->pending);
+				state->run_start = state->pending;
+				state->have_pending = FALSE;
+			} else if (state->have_pending &&
+					samplenum - state->pending < glitch) {
+				/* Drop the glitch, continue its run. */
+				state->have_pending = FALSE;
+			} else {
+				level = (srd_inst_cur_sample(di)[pin->offset] &
+					pin->mask) ? 1 : 0;
+				if (state->have_pending) {
+					pulse_run_add(levels, lengths,
+						!state->pending_level,
+						state->run_start, state->pending);
+					state->run_start = state->pending;
+				}
+				if (glitch) {
+					state->have_pending = TRUE;
+					state->pending = samplenum;
+					state->pending_level = level;
+				} else {
+					pulse_run_add(levels, lengths, !level,
+						state->run_start, samplenum);
+					state->run_start = samplenum;
+				}
+			}
+			if (glitch)
+				prog->conds[1].skip_samplenum = state->have_pending ?
+					state->pending + glitch : G_MAXUINT64;
+		}
+
+		Py_END_ALLOW_THREADS
+
+		/* Return the runs so far before waiting for more samples. */
+		if (lengths->len > 0) {
+			g_mutex_unlock(&di->data_mutex);
+			break;
+		}
+
+		/* No complete run, continue with the next chunk. */
+		if (!finish_chunk(di))
+			goto err;
+	}
+	prog->have_matched = FALSE;
+	state->resume_samplenum = di->abs_cur_samplenum;
+
+	stats_wait_leave(di);
+
+	samplenum_set(di, state->run_start);
+	matched_set(di, NULL);
+
+	py_levels = PyBytes_FromStringAndSize((const char *)levels->data,
+		levels->len);
+	py_lengths = samplenum_array(lengths);
+	g_byte_array_free(levels, TRUE);
+	g_array_free(lengths, TRUE);
+
+	PyGILState_Release(gstate);
+
+	if (!py_levels || !py_lengths) {
+		Py_XDECREF(py_levels);
+		Py_XDECREF(py_lengths);
+		return NULL;
+	}
+
+	return Py_BuildValue("(NN)", py_levels, py_lengths);
+
+err:
+	stats_wait_leave(di);
+	if (levels)
+		g_byte_array_free(levels, TRUE);
+	if (lengths)
+		g_array_free(lengths, TRUE);
+	PyGILState_Release(gstate);
+
+	return NULL;
+}
+
+/**
+ * Return whether the specified channel was supplied to the decoder.
+ *
+ * @param self TODO. Must not be NULL.
+ * @param args TODO. Must not be NULL.
+ *
+ * @retval Py_True The channel has been supplied by the frontend.
+ * @retval Py_False The channel has been supplied by the frontend.
+ * @retval NULL An error occurred.
+ */
+static PyObject *Decoder_has_channel(PyObject *self, PyObject *args)
+{
+	int idx, max_idx;
+	struct srd_decoder_inst *di;
+	PyObject *py_channel;
+	PyGILState_STATE gstate;
+
+	if (!self || !args)
+		return NULL;
+
+	gstate = PyGILState_Ensure();
+
+	if (!(di = srd_inst_find_by_obj(NULL, self))) {
+		PyErr_SetString(PyExc_Exception, "decoder instance not found");
+		goto err;
+	}
+
+	/* Parse the argument of self.has_channel() into 'py_channel'. */
+	if (!PyArg_ParseTuple(args, "O", &py_channel)) {
+		/* Let Python raise this exception. */
+		goto err;
+	}
+
+	if (!PyLong_Check(py_channel)) {
+		PyErr_SetString(PyExc_Exception, "channel index not a number");
+		goto err;
+	}
+
+	idx = PyLong_AsLong(py_channel);
+	max_idx = g_slist_length(di->decoder->channels)
+		+ g_slist_length(di->decoder->opt_channels) - 1;
+
+	if (idx < 0 || idx > max_idx) {
+		srd_err("Invalid channel index %d/%d.", idx, max_idx);
+		PyErr_SetString(PyExc_Exception, "invalid channel");
+		goto err;
+	}
+
+	PyGILState_Release(gstate);
+
+	return (di->dec_channelmap[idx] == -1) ? Py_False : Py_True;
+
+err:
+	PyGILState_Release(gstate);
+
+	return NULL;
+}
+
+/**
+ * Copy a chunk's samples into a Python bytes object.
+ *
+ * Run-length encoded chunks get expanded, one sample per sample number.
+ *
+ * @param chunk The chunk. Must not be NULL.
+ *
+ * @return A new reference to the bytes object, or NULL upon errors
+ *         (with a Python exception set).
+ */
+static PyObject *chunk_to_bytes(const struct srd_chunk *chunk)
+{
+	PyObject *py_data;
+	uint8_t *data;
+	uint64_t num_samples, run, samplenum, run_end;
+
+	if (!chunk->samplenums)
+		return PyBytes_FromStringAndSize((const char *)chunk->inbuf,
+			chunk->inbuflen);
+
+	num_samples = chunk->abs_end_samplenum - chunk->abs_start_samplenum;
+	if (num_samples > PY_SSIZE_T_MAX / chunk->unitsize)
+		return PyErr_NoMemory();
+	py_data = PyBytes_FromStringAndSize(NULL, num_samples * chunk->unitsize);
+	if (!py_data)
+		return NULL;
+	data = (uint8_t *)PyBytes_AsString(py_data);
+
+	samplenum = chunk->abs_start_samplenum;
+	for (run = 0; run < chunk->num_runs; run++) {
+		run_end = (run + 1 < chunk->num_runs) ?
+			chunk->samplenums[run + 1] : chunk->abs_end_samplenum;
+		for (; samplenum < run_end; samplenum++) {
+			memcpy(data, chunk->inbuf + run * chunk->unitsize,
+				chunk->unitsize);
+			data += chunk->unitsize;
+		}
+	}
+
+	return py_data;
+}
+
+/**
+ * Get the samples of the chunk which the decoder currently works on.
+ *
+ * This lets decoders analyse the samples around self.samplenum in bulk
+ * (bytes methods, struct, array, etc.), instead of with one wait() call
+ * per change. The samples get copied once per chunk, the copy remains
+ * valid after wait() moved on to the next chunk.
+ *
+ * @param self The Decoder object. Must not be NULL.
+ * @param args Unused.
+ *
+ * @return A (abs start samplenum, unitsize, bytes) tuple, or None when
+ *         no samples were received yet.
+ */
+static PyObject *Decoder_get_chunk(PyObject *self, PyObject *args)
+{
+	struct srd_decoder_inst *di;
+	const struct srd_chunk *chunk;
+	srd_Decoder *py_dec;
+	PyObject *py_res;
+	PyGILState_STATE gstate;
+
+	(void)args;
+
+	if (!self)
+		return NULL;
+
+	gstate = PyGILState_Ensure();
+
+	if (!(di = srd_inst_find_by_obj(NULL, self))) {
+		PyErr_SetString(PyExc_Exception, "decoder instance not found");
+		goto err;
+	}
+	py_dec = (srd_Decoder *)self;
+
+	g_mutex_lock(&di->data_mutex);
+
+	if (!(chunk = di->chunk)) {
+		g_mutex_unlock(&di->data_mutex);
+		PyGILState_Release(gstate);
+		Py_RETURN_NONE;
+	}
+
+	/* Chunks of an instance never overlap, their range identifies them. */
+	if (!py_dec->chunk_data ||
+	    py_dec->chunk_start != chunk->abs_start_samplenum ||
+	    py_dec->chunk_end != chunk->abs_end_samplenum) {
+		Py_CLEAR(py_dec->chunk_data);
+		py_dec->chunk_data = chunk_to_bytes(chunk);
+		py_dec->chunk_start = chunk->abs_start_samplenum;
+		py_dec->chunk_end = chunk->abs_end_samplenum;
+	}
+	py_res = NULL;
+	if (py_dec->chunk_data)
+		py_res = Py_BuildValue("(KKO)",
+			(unsigned long long)chunk->abs_start_samplenum,
+			(unsigned long long)chunk->unitsize, py_dec->chunk_data);
+
+	g_mutex_unlock(&di->data_mutex);
+
+	PyGILState_Release(gstate);
+
+	return py_res;
+
+err:
+	PyGILState_Release(gstate);
+
+	return NULL;
+}
+
+/**
+ * Get the performance counters of the decoder instance.
+ *
+ * @param self The Decoder object. Must not be NULL.
+ * @param args Unused.
+ *
+ * @return A dict of the fields of struct srd_inst_stats. The put() calls
+ *         are a tuple, indexed by output type.
+ */
+static PyObject *Decoder_get_stats(PyObject *self, PyObject *args)
+{
+	struct srd_decoder_inst *di;
+	struct srd_inst_stats stats;
+	PyObject *py_res;
+	PyGILState_STATE gstate;
+
+	(void)args;
+
+	gstate = PyGILState_Ensure();
+
+	if (!(di = srd_inst_find_by_obj(NULL, self))) {
+		PyErr_SetString(PyExc_Exception, "decoder instance not found");
+		PyGILState_Release(gstate);
+		return NULL;
+	}
+
+	srd_inst_stats_get(di, &stats);
+	py_res = Py_BuildValue("{s:K,s:K,s:K,s:K,s:K,s:(KKKK),s:K,"
+			"s:L,s:L,s:L,s:L,s:L}",
+		"wait_calls", (unsigned long long)stats.wait_calls,
+		"samples_scanned", (unsigned long long)stats.samples_scanned,
+		"matches", (unsigned long long)stats.matches,
+		"cond_cache_hits", (unsigned long long)stats.cond_cache_hits,
+		"cond_cache_misses", (unsigned long long)stats.cond_cache_misses,
+		"put_calls",
+		(unsigned long long)stats.put_calls[SRD_OUTPUT_ANN],
+		(unsigned long long)stats.put_calls[SRD_OUTPUT_PYTHON],
+		(unsigned long long)stats.put_calls[SRD_OUTPUT_BINARY],
+		(unsigned long long)stats.put_calls[SRD_OUTPUT_META],
+		"binary_bytes", (unsigned long long)stats.binary_bytes,
+		"python_time", (long long)stats.python_time,
+		"match_time", (long long)stats.match_time,
+		"samples_wait_time", (long long)stats.samples_wait_time,
+		"send_wait_time", (long long)stats.send_wait_time,
+		"cpu_time", (long long)stats.cpu_time);
+
+	PyGILState_Release(gstate);
+
+	return py_res;
+}
+
+static PyObject *Decoder_samplenum_get(PyObject *self, void *closure)
+{
+	srd_Decoder *py_dec;
+
+	(void)closure;
+
+	py_dec = (srd_Decoder *)self;
+	if (py_dec->samplenum_obj) {
+		Py_IncRef(py_dec->samplenum_obj);
+		return py_dec->samplenum_obj;
+	}
+
+	return PyLong_FromUnsignedLongLong(py_dec->samplenum);
+}
+
+static int Decoder_samplenum_set(PyObject *self, PyObject *value,
+		void *closure)
+{
+	srd_Decoder *py_dec;
+	unsigned long long samplenum;
+	PyObject *py_old;
+
+	(void)closure;
+
+	if (!value) {
+		PyErr_SetString(PyExc_AttributeError, "cannot delete samplenum");
+		return -1;
+	}
+
+	py_dec = (srd_Decoder *)self;
+
+	/* Keep what doesn't fit a sample number (e.g. None or -1) as is. */
+	if (PyLong_Check(value)) {
+		samplenum = PyLong_AsUnsignedLongLong(value);
+		if (!PyErr_Occurred()) {
+			py_dec->samplenum = samplenum;
+			Py_CLEAR(py_dec->samplenum_obj);
+			return 0;
+		}
+		PyErr_Clear();
+	}
+
+	py_old = py_dec->samplenum_obj;
+	Py_IncRef(value);
+	py_dec->samplenum_obj = value;
+	Py_XDECREF(py_old);
+
+	return 0;
+}
+
+static PyObject *Decoder_matched_get(PyObject *self, void *closure)
+{
+	srd_Decoder *py_dec;
+
+	(void)closure;
+
+	py_dec = (srd_Decoder *)self;
+	if (!py_dec->matched)
+		Py_RETURN_NONE;
+
+	Py_IncRef(py_dec->matched);
+	return py_dec->matched;
+}
+
+static int Decoder_matched_set(PyObject *self, PyObject *value,
+		void *closure)
+{
+	srd_Decoder *py_dec;
+	PyObject *py_old;
+
+	(void)closure;
+
+	if (!value) {
+		PyErr_SetString(PyExc_AttributeError, "cannot delete matched");
+		return -1;
+	}
+
+	py_dec = (srd_Decoder *)self;
+	py_old = py_dec->matched;
+	if (value == Py_None) {
+		py_dec->matched = NULL;
+	} else {
+		Py_IncRef(value);
+		py_dec->matched = value;
+	}
+	Py_XDECREF(py_old);
+
+	return 0;
+}
+
+static PyGetSetDef Decoder_getset[] = {
+	{"samplenum", Decoder_samplenum_get, Decoder_samplenum_set,
+			"The sample number of the last wait() match", NULL},
+	{"matched", Decoder_matched_get, Decoder_matched_set,
+			"Which conditions of the last wait() matched", NULL},
+	{NULL, NULL, NULL, NULL, NULL}
+};
+
+static PyMethodDef Decoder_methods[] = {
+	{"put", Decoder_put, METH_VARARGS,
+	 "Accepts a dictionary with the following keys: startsample, endsample, data"},
+	{"register", (PyCFunction)Decoder_register, METH_VARARGS|METH_KEYWORDS,
+			"Register a new output stream"},
+	{"register_template", Decoder_register_template, METH_VARARGS,
+			"Register text formats for an annotation class"},
+	{"wait", Decoder_wait, METH_VARARGS,
+			"Wait for one or more conditions to occur"},
+	{"wait_edges", Decoder_wait_edges, METH_VARARGS,
+			"Wait for multiple edges on one channel"},
+	{"shift_in", (PyCFunction)Decoder_shift_in, METH_VARARGS|METH_KEYWORDS,
+			"Shift in bits of data channels on clock edges"},
+	{"sample_points", (PyCFunction)Decoder_sample_points,
+			METH_VARARGS|METH_KEYWORDS,
+			"Read channels at a series of sample points"},
+	{"pulses", (PyCFunction)Decoder_pulses, METH_VARARGS|METH_KEYWORDS,
+			"Measure the runs of constant level on one channel"},
+	{"has_channel", Decoder_has_channel, METH_VARARGS,
+			"Report whether a channel was supplied"},
+	{"wants", Decoder_wants, METH_VARARGS,
+			"Report whether output gets used"},
+	{"get_chunk", Decoder_get_chunk, METH_NOARGS,
+			"Get the samples of the current chunk"},
+	{"get_stats", Decoder_get_stats, METH_NOARGS,
+			"Get the performance counters of the instance"},
+	{NULL, NULL, 0, NULL}
+};
+
+/**
+ * Reset the state which a Decoder object keeps for wait().
+ *
+ * Sets self.samplenum to 0 and self.matched to None, and drops the
+ * cached pin value and self.matched tuples. Must be called with the GIL
+ * held, before decoding starts (the channel map may have changed) and
+ * before the object gets released.
+ *
+ * @param py_inst The Decoder object. Must not be NULL.
+ *
+ * @private
+ */
+SRD_PRIV void srd_Decoder_state_clear(PyObject *py_inst)
+{
+	srd_Decoder *py_dec;
+	unsigned int i, n;
+
+	py_dec = (srd_Decoder *)py_inst;
+	py_dec->samplenum = 0;
+	Py_CLEAR(py_dec->samplenum_obj);
+	Py_CLEAR(py_dec->matched);
+
+	if (py_dec->pin_tuples) {
+		for (i = 0; i < py_dec->num_pin_tuples; i++)
+			Py_XDECREF(py_dec->pin_tuples[i]);
+		g_free(py_dec->pin_tuples);
+		py_dec->pin_tuples = NULL;
+		py_dec->num_pin_tuples = 0;
+	}
+
+	for (n = 0; n <= DECODER_MATCHED_CACHE_CONDS; n++) {
+		if (!py_dec->matched_tuples[n])
+			continue;
+		for (i = 0; i < (1U << n); i++)
+			Py_XDECREF(py_dec->matched_tuples[n][i]);
+		g_free(py_dec->matched_tuples[n]);
+		py_dec->matched_tuples[n] = NULL;
+	}
+}
 
 /**
  * Create the sigrokdecode.Decoder type.
@@ -926,6 +3007,7 @@ SRD_PRIV PyObject *srd_Decoder_type_new(void)
 	PyType_Slot slots[] = {
 		{ Py_tp_doc, "sigrok Decoder base class" },
 		{ Py_tp_methods, Decoder_methods },
+		{ Py_tp_getset, Decoder_getset },
 		{ Py_tp_new, (void *)&PyType_GenericNew },
 		{ 0, NULL }
 	};
@@ -20,6 +20,8 @@
 
 #include <config.h>
 #include "libsigrokdecode-internal.h" /* First, so we avoid a _POSIX_C_SOURCE warning. */
+#include <string.h>
+#include <time.h>
 
 /**
  * Import a Python module by name.
@@ -513,3 +515,133 @@ SRD_PRIV GVariant *py_obj_to_variant(PyObject *py_obj)
 
 	return var;
 }
+
+/*
+ * Parse the conversion which starts at 'format', into a printf() format
+ * for 64bit arguments. Returns the length of the conversion, 0 if it is
+ * not supported.
+ */
+static size_t ann_format_spec(const char *format, char *spec, char *conv)
+{
+	size_t len, num_flags, num_digits;
+
+	len = 1;
+	for (num_flags = 0; num_flags < 5; num_flags++, len++) {
+		if (!format[len] || !strchr("-0+ #", format[len]))
+			break;
+	}
+	for (num_digits = 0; num_digits < 2; num_digits++, len++) {
+		if (!g_ascii_isdigit(format[len]))
+			break;
+	}
+	if (!format[len] || !strchr("diuxXoc", format[len]))
+		return 0;
+
+	*conv = format[len];
+	memcpy(spec, format, len);
+	spec[len] = '\0';
+	if (*conv != 'c')
+		strcat(spec, "ll");
+	strncat(spec, conv, 1);
+
+	return len + 1;
+}
+
+/**
+ * Check an annotation template's format.
+ *
+ * Formats support the printf() conversions d, i, u, x, X, o and c, with
+ * the flags "-0+ #" and a field width of up to two digits, and "%%".
+ *
+ * @param format The format. Must not be NULL.
+ *
+ * @return The number of arguments which the format uses, or -1 if the
+ *         format is not supported.
+ *
+ * @private
+ */
+SRD_PRIV int ann_format_check(const char *format)
+{
+	const char *p;
+	char spec[16], conv;
+	size_t len;
+	int num_args;
+
+	num_args = 0;
+	for (p = format; *p; p++) {
+		if (*p != '%')
+			continue;
+		if (p[1] == '%') {
+			p++;
+			continue;
+		}
+		if (!(len = ann_format_spec(p, spec, &conv)))
+			return -1;
+		p += len - 1;
+		num_args++;
+	}
+
+	return num_args;
+}
+
+/**
+ * Format an annotation's text from its template.
+ *
+ * @param format The format, which ann_format_check() accepted.
+ * @param args The arguments, as many as the format uses.
+ *
+ * @return The newly allocated text.
+ *
+ * @private
+ */
+SRD_PRIV char *ann_format_apply(const char *format, const int64_t *args)
+{
+	GString *text;
+	const char *p;
+	char spec[16], conv;
+	size_t len;
+
+	text = g_string_sized_new(32);
+	for (p = format; *p; p++) {
+		if (*p != '%') {
+			g_string_append_c(text, *p);
+			continue;
+		}
+		if (p[1] == '%') {
+			g_string_append_c(text, '%');
+			p++;
+			continue;
+		}
+		len = ann_format_spec(p, spec, &conv);
+		if (conv == 'c')
+			g_string_append_printf(text, spec, (int)*args++);
+		else if (conv == 'd' || conv == 'i')
+			g_string_append_printf(text, spec, (long long)*args++);
+		else
+			g_string_append_printf(text, spec,
+				(unsigned long long)*args++);
+		p += len - 1;
+	}
+
+	return g_string_free(text, FALSE);
+}
+
+/**
+ * Get the CPU time which the calling thread has used so far.
+ *
+ * @return The CPU time in microseconds, or 0 if the platform lacks a
+ *         per-thread CPU time clock.
+ *
+ * @private
+ */
+SRD_PRIV int64_t srd_thread_cpu_time(void)
+{
+#ifdef CLOCK_THREAD_CPUTIME_ID
+	struct timespec ts;
+
+	if (clock_gettime(CLOCK_THREAD_CPUTIME_ID, &ts) == 0)
+		return (int64_t)ts.tv_sec * 1000000 + ts.tv_nsec / 1000;
+#endif
+
+	return 0;
+}